@@ -36,6 +36,7 @@ import stat
 import pprint
 from collections import OrderedDict
 from ankiutils import mail_tools, svn_tools
+from ankiutils.bulk_rename import RenameTransaction
 
 
 def get_anim_groups(anim_group_dir, strip_ext=True, return_full_paths=False):
@@ -139,24 +140,77 @@ def rename_anim_group(rename_mapping, json_file, files_to_commit,
 def update_anim_group_reference(trigger_map_file, rename_mapping,
                                 anim_group_name_key=ANIM_GROUP_NAME_KEY):
     print("Renaming animation groups in %s using: %s" % (trigger_map_file, rename_mapping))
-    fh = open(trigger_map_file, 'r')
-    orig_contents = fh.read()
-    fh.close()
-    new_contents = []
-    for one_line in orig_contents.split(os.linesep):
-        if anim_group_name_key in one_line:
-            for before, after in rename_mapping.iteritems():
-                if before in one_line:
-                    one_line = one_line.replace(before, after)
-        new_contents.append(one_line)
-    new_contents = os.linesep.join(new_contents)
-    if new_contents != orig_contents:
-        fh = open(trigger_map_file, 'w')
-        fh.write(new_contents)
-        fh.close()
+    txn = RenameTransaction(rename_mapping)
+    txn.add_file(trigger_map_file, value_key=anim_group_name_key)
+    if txn.commit():
         print("Updated %s" % trigger_map_file)
 
 
+def rename_anim_groups(rename_mapping, json_files, trigger_map_files=ANIM_TRIGGER_MAP_FILES):
+    """
+    Renames a batch of animation group .json files and then updates the
+    references to all of them in the trigger map file(s) with one pass.
+    Returns the list of animation group names that were renamed.
+    """
+    renamed = {}
+    for json_file in json_files:
+        file_name = os.path.basename(json_file)
+        file_name = os.path.splitext(file_name)[0]
+        new_name = rename_mapping.get(file_name)
+        if not new_name or new_name == file_name:
+            continue
+        try:
+            svn_tools.rename_svn_file(json_file, new_name)
+        except RuntimeError, e:
+            print("Failed to rename '%s' to '%s' because: %s" % (file_name, new_name, e))
+        else:
+            renamed[file_name] = new_name
+    if renamed:
+        trigger_map_files = [os.path.expandvars(x) for x in trigger_map_files]
+        txn = RenameTransaction(renamed)
+        txn.add_files(trigger_map_files, value_key=ANIM_GROUP_NAME_KEY)
+        try:
+            txn.commit()
+        except BaseException, e:
+            print("ERROR: %s" % e)
+        for file_name, new_name in sorted(renamed.items()):
+            print("Successfully renamed '%s' to '%s'" % (file_name, new_name))
+    return sorted(renamed.keys())
+
+
+def bulk_rename_references(rename_mapping, anim_group_dir=None, anim_group_files=None,
+                           trigger_map_files=ANIM_TRIGGER_MAP_FILES, other_files=None,
+                           dry_run=False):
+    """
+    Applies a whole rename mapping (animation clip names and/or animation group
+    names) to all animation group .json files, the trigger map file(s) and any
+    other files that reference those names (eg. state machine data) as a single
+    transaction. Each file is read once and only whole names are replaced. In
+    the animation group files only the clip names ("Name" values) are renamed
+    and in the trigger map file(s) only the animation group names ("AnimName"
+    values) are renamed.
+
+    When dry_run is True, a diff of the pending updates is printed and nothing
+    is written. Returns the list of files that were (or would be) updated.
+    """
+    txn = RenameTransaction(rename_mapping)
+    if anim_group_dir:
+        txn.add_files(get_anim_groups(anim_group_dir, return_full_paths=True), value_key=NAME_ATTR)
+    if anim_group_files:
+        txn.add_files(anim_group_files, value_key=NAME_ATTR)
+    for trigger_map_file in trigger_map_files or []:
+        trigger_map_file = os.path.expandvars(trigger_map_file)
+        if os.path.isfile(trigger_map_file):
+            txn.add_file(trigger_map_file, value_key=ANIM_GROUP_NAME_KEY)
+        else:
+            print("WARNING: Trigger map file not found: %s" % trigger_map_file)
+    if other_files:
+        txn.add_files(other_files)
+    if dry_run:
+        print(txn.diff())
+    return txn.commit(dry_run)
+
+
 def alert_anim_group_updated(anim_group, file_path, file_ver, cc_emails=[], user_name_mapping={}):
     # When certain animation groups are updated an alert/notification should be sent.
     dir_name = os.path.basename(os.path.dirname(file_path))
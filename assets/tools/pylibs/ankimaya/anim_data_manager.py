@@ -6,12 +6,15 @@
 
 import maya.cmds as mc
 from ankimaya import ctrs_manager, robot_data
+from ankimaya.constants import FLOAT_EQUALITY_TOLERANCE
+from ankimaya.attr_sampler import get_sampler
+from ankimaya.interpolation_manager import merge_close_keyframes
+from ankimaya.keyed_curve_index import get_keyed_curve_index
 import copy
 
 # TODO: Move these constants into a constants.py file, from where they should
 #       be imported here and in any other files where they are used.
 HACK_TIMELINE_SCALE = 0.99
-FLOAT_EQUALITY_TOLERANCE = 0.05
 
 RED_MULTIPLIER = 1.0
 GREEN_MULTIPLIER = 1.0
@@ -31,10 +34,15 @@ ADDITIONAL_ATTRS_CTRS = {"LeftEyeLightness":"x:mech_eye_L_ctrl.Lightness",
 
 class AnimDataManager(object):
 
-    def __init__(self, data_node, start_frame, end_frame, check_muted=True, full_setup=True):
+    def __init__(self, data_node, start_frame, end_frame, check_muted=True, full_setup=True,
+                 sampler=None, curve_index=None):
         # TODO: have less functions being called in here, but rather use them when needed
 
         self.data_node = data_node
+        # Attribute values are sampled (and cached) through this for the whole export
+        self.sampler = sampler or get_sampler()
+        # Key times of controllers are looked up in this instead of querying every node
+        self.curve_index = curve_index or get_keyed_curve_index()
         self.messages_for_user = []
         self.movement_attrs = ["Radius", "Forward", "Turn"]
         self.event_ctrl = ctrs_manager.EVENT_CTR
@@ -126,7 +134,8 @@ class AnimDataManager(object):
         Get times where all ctrs have been keyed.
         @return: list of frames of keys of all ctrs
         """
-        dag_objects = mc.ls(dagObjects=True)
+        keyed_nodes = self.curve_index.get_keyed_nodes()
+        dag_objects = mc.ls(keyed_nodes, dagObjects=True) if keyed_nodes else []
         all_keyed_times = self.get_frames_on_ctrs(dag_objects, start_frame, end_frame)
         try:
             all_keyed_times.sort()
@@ -143,13 +152,9 @@ class AnimDataManager(object):
         for ctr in ctrs:
             if ctr in self.skip_objects:
                 continue
-            object_times = mc.keyframe(ctr, query=True, timeChange=True,
-                                       time=(start_frame, end_frame))
-            try:
-                if object_times.count(0.0) != len(object_times):
-                    keyed_times.extend(object_times)
-            except AttributeError:
-                pass
+            object_times = self.curve_index.get_node_times(ctr, start_frame, end_frame)
+            if object_times.count(0.0) != len(object_times):
+                keyed_times.extend(object_times)
         keyed_times.append(end_frame)
         all_keyed_times = list(set(keyed_times))
         return all_keyed_times
@@ -159,14 +164,17 @@ class AnimDataManager(object):
         Get values of a specific attribute.
         @return: {frame_num:value}
         """
-        frame_nums = mc.keyframe(ctrl_attr, query=True, timeChange=True,
-                                 time=(self.start_frame, self.end_frame))
+        frame_nums = self.curve_index.get_plug_times(ctrl_attr, self.start_frame, self.end_frame)
         if frame_nums is None:
+            # This attribute is not in the index under this name, so query it directly
+            frame_nums = mc.keyframe(ctrl_attr, query=True, timeChange=True,
+                                     time=(self.start_frame, self.end_frame))
+        if not frame_nums:
             return {}
         fq_attr = self.data_node + "." + data_attr
         data_times_values = {}
-        for frame_num in frame_nums:
-            value = mc.getAttr(fq_attr, time=frame_num)
+        values = self.sampler.get_values(fq_attr, frame_nums)
+        for frame_num, value in zip(frame_nums, values):
             if use_absolute_frames:
                 data_times_values[frame_num] = value
             else:
@@ -218,15 +226,8 @@ class AnimDataManager(object):
                 idx += 1
         return reduced_keyframes
 
-    def remove_multiple_close_keyframes(self, keyframes):
-        initial_keyframes = keyframes
-        reduced_keyframes = []
-        while True:
-            reduced_keyframes = self.remove_close_keyframes(initial_keyframes)
-            if reduced_keyframes == initial_keyframes:
-                break
-            initial_keyframes = reduced_keyframes
-        return reduced_keyframes
+    def remove_multiple_close_keyframes(self, keyframes, tolerance=FLOAT_EQUALITY_TOLERANCE):
+        return merge_close_keyframes(keyframes, tolerance)
 
     def get_mech_all_data(self, start_frame, end_frame):
         """
@@ -238,11 +239,10 @@ class AnimDataManager(object):
         mech_frames.sort()
         mech_frames = self.remove_close_keyframes(mech_frames)
         self.movement_frames += mech_frames
-        for frame_num in mech_frames:
-            attr_value = {}
-            for attr in self.movement_attrs:
-                attr_value[attr] = mc.getAttr(self.data_node + "." + attr, time=frame_num)
-            mech_data[frame_num] = attr_value
+        for attr in self.movement_attrs:
+            values = self.sampler.get_values(self.data_node + "." + attr, mech_frames)
+            for frame_num, value in zip(mech_frames, values):
+                mech_data.setdefault(frame_num, {})[attr] = value
         return mech_data
 
     def get_reset_keys(self, start_frame, end_frame):
@@ -271,12 +271,13 @@ class AnimDataManager(object):
             pass
         self.movement_frames = self.remove_close_keyframes(self.movement_frames)
         reset_frame_radius_values = {}
-        for frame_num in moac_times:
-            turn_value = mc.getAttr(self.data_node + ".Turn", time=frame_num)
-            fwd_value = mc.getAttr(self.data_node + ".Forward", time=frame_num)
-            if turn_value == 0 and fwd_value == 0:
-                reset_frame_radius_values[frame_num] = mc.getAttr(self.data_node + ".Radius",
-                                                                  time=frame_num)
+        turn_values = self.sampler.get_values(self.data_node + ".Turn", moac_times)
+        fwd_values = self.sampler.get_values(self.data_node + ".Forward", moac_times)
+        reset_frames = [frame_num for frame_num, turn_value, fwd_value
+                        in zip(moac_times, turn_values, fwd_values)
+                        if turn_value == 0 and fwd_value == 0]
+        radius_values = self.sampler.get_values(self.data_node + ".Radius", reset_frames)
+        reset_frame_radius_values.update(zip(reset_frames, radius_values))
         return reset_frame_radius_values
 
     def get_move_data(self):
@@ -346,13 +347,15 @@ class AnimDataManager(object):
         backpack_frame_nums = self.remove_multiple_close_keyframes(backpack_frame_nums)
 
         lights_attributes = self.get_lights_attributes()
+        lights_values = self.sampler.get_frame_values([self.data_node + "." + x for x in lights_attributes],
+                                                      backpack_frame_nums)
         for frame_num in backpack_frame_nums:
             current_frame_data = {}
             for attribute in lights_attributes:
                 attr_words = attribute.split("_")
                 color = attr_words[1]
                 side = attr_words[0]
-                value = mc.getAttr(self.data_node + "." + attribute, time=frame_num)
+                value = lights_values[frame_num][self.data_node + "." + attribute]
                 if value > 1.0:
                     value = 1.0
                 elif value < 0.0:
@@ -0,0 +1,331 @@
+"""
+Samples the values of Maya attributes at many frames for animation export.
+
+Every mc.getAttr(attr, time=frame) call goes through the MEL command layer,
+which dominates export time when dozens of data node attributes are queried
+at every one of their keyframes. An AttrSampler pulls all of the frames that
+are needed for one attribute in a single backend call and caches the values,
+so a value is never queried twice during one export.
+
+In Maya, attributes are sampled with the OpenMayaBackend by default, which
+looks up each attribute's plug once and evaluates it at every frame through an
+MDGContext, without going through the command layer, converting angles,
+distances and times to the UI units and returning bool/int/enum attributes as
+getAttr does. A CheckedBackend compares the first value it samples for each
+attribute with mc.getAttr() and keeps using mc.getAttr() for any attribute
+where the two disagree.
+
+The CmdsBackend uses mc.getAttr() and works with any object that provides that
+function, such as StandInCmds, which evaluates keyframed curves without Maya,
+so code that samples attributes can be tested and benchmarked headless:
+
+    cmds = StandInCmds({"x:data_node.HeadAngle": ([0, 10, 20], [0.0, 15.0, -5.0])})
+    sampler = AttrSampler(CmdsBackend(cmds))
+    values = sampler.get_values("x:data_node.HeadAngle", [0, 5, 10, 15, 20])
+
+An export shares one sampler between all of its clips and all of the parts of
+the exporter that sample attributes (see begin_export_sampling()).
+"""
+
+# How far (relative to the getAttr() value, for values larger than 1) a value
+# from a CheckedBackend may be from the getAttr() value for it to be trusted
+VALUE_CHECK_TOLERANCE = 1e-6
+
+
+import sys
+import time
+
+from ankimaya.interpolation_manager import interpolate_value
+
+try:
+    import maya.cmds as mc
+except ImportError:
+    mc = None
+
+try:
+    import maya.api.OpenMaya as om
+except ImportError:
+    om = None
+
+
+class CmdsBackend(object):
+    """
+    Samples attributes with the getAttr() function of maya.cmds (or of a
+    stand-in object that provides the same function).
+    """
+
+    def __init__(self, cmds=None):
+        self.cmds = cmds or mc
+
+    def sample(self, fq_attr, frames):
+        return [self.cmds.getAttr(fq_attr, time=frame_num) for frame_num in frames]
+
+
+def _get_plug_getter(plug):
+    """
+    Returns the function that gets the value of a plug the way mc.getAttr()
+    reports it (in UI units and as a bool or int for integral attributes),
+    called with an optional MDGContext, or None for other types of plugs.
+    """
+    attr = plug.attribute()
+    if attr.hasFn(om.MFn.kUnitAttribute):
+        unit_type = om.MFnUnitAttribute(attr).unitType()
+        if unit_type == om.MFnUnitAttribute.kAngle:
+            return lambda *context: plug.asMAngle(*context).asUnits(om.MAngle.uiUnit())
+        if unit_type == om.MFnUnitAttribute.kDistance:
+            return lambda *context: plug.asMDistance(*context).asUnits(om.MDistance.uiUnit())
+        if unit_type == om.MFnUnitAttribute.kTime:
+            return lambda *context: plug.asMTime(*context).asUnits(om.MTime.uiUnit())
+        return None
+    if attr.hasFn(om.MFn.kEnumAttribute):
+        return plug.asInt
+    if attr.hasFn(om.MFn.kNumericAttribute):
+        numeric_type = om.MFnNumericAttribute(attr).numericType()
+        if numeric_type == om.MFnNumericData.kBoolean:
+            return plug.asBool
+        if numeric_type in [om.MFnNumericData.kByte, om.MFnNumericData.kChar,
+                            om.MFnNumericData.kShort, om.MFnNumericData.kInt,
+                            om.MFnNumericData.kLong]:
+            return plug.asInt
+        if numeric_type in [om.MFnNumericData.kFloat, om.MFnNumericData.kDouble]:
+            return plug.asDouble
+    return None
+
+
+class OpenMayaBackend(object):
+    """
+    Samples attributes by evaluating their plugs in a DG context for each
+    frame with the OpenMaya API, which is much faster than mc.getAttr().
+    Attributes that are not numeric, unit or enum plugs are sampled with
+    mc.getAttr().
+    """
+
+    def __init__(self):
+        if om is None:
+            raise ValueError("OpenMaya is not available")
+        self._plugs = {}
+        self._contexts = {}
+        self._fallback = CmdsBackend()
+
+    def _get_plug_getter(self, fq_attr):
+        try:
+            return self._plugs[fq_attr]
+        except KeyError:
+            pass
+        selection = om.MSelectionList()
+        try:
+            selection.add(fq_attr)
+            plug = selection.getPlug(0)
+        except (RuntimeError, TypeError):
+            plug = None
+        getter = None
+        if plug is not None and not (plug.isArray or plug.isCompound):
+            getter = _get_plug_getter(plug)
+        self._plugs[fq_attr] = getter
+        return getter
+
+    def _get_context(self, frame_num):
+        try:
+            return self._contexts[frame_num]
+        except KeyError:
+            context = om.MDGContext(om.MTime(frame_num, om.MTime.uiUnit()))
+            self._contexts[frame_num] = context
+            return context
+
+    def _evaluate(self, getter, context):
+        # Maya 2019 and later make the context current instead of passing it to asDouble(), etc.
+        if hasattr(context, "makeCurrent"):
+            previous_context = context.makeCurrent()
+            try:
+                return getter()
+            finally:
+                previous_context.makeCurrent()
+        return getter(context)
+
+    def sample(self, fq_attr, frames):
+        getter = self._get_plug_getter(fq_attr)
+        if getter is None:
+            return self._fallback.sample(fq_attr, frames)
+        try:
+            return [self._evaluate(getter, self._get_context(frame_num)) for frame_num in frames]
+        except (RuntimeError, TypeError):
+            return self._fallback.sample(fq_attr, frames)
+
+
+class CheckedBackend(object):
+    """
+    Samples attributes with a (faster) backend, but checks the first value of
+    each attribute against a reference backend (mc.getAttr() by default) and
+    samples attributes whose values do not match with the reference backend.
+    """
+
+    def __init__(self, backend, reference=None, tolerance=VALUE_CHECK_TOLERANCE):
+        self.backend = backend
+        self.reference = reference or CmdsBackend()
+        self.tolerance = tolerance
+        self.mismatched_attrs = []
+        self._trusted = {}
+
+    def _matches(self, value, expected):
+        try:
+            return abs(value - expected) <= self.tolerance * max(1.0, abs(expected))
+        except TypeError:
+            return value == expected
+
+    def sample(self, fq_attr, frames):
+        if not frames:
+            return []
+        trusted = self._trusted.get(fq_attr)
+        if trusted is False:
+            return self.reference.sample(fq_attr, frames)
+        values = self.backend.sample(fq_attr, frames)
+        if trusted is None:
+            expected = self.reference.sample(fq_attr, frames[:1])[0]
+            trusted = self._matches(values[0], expected)
+            self._trusted[fq_attr] = trusted
+            if not trusted:
+                print("Sampling %s with getAttr, since it was %s at frame %s instead of %s"
+                      % (fq_attr, values[0], frames[0], expected))
+                self.mismatched_attrs.append(fq_attr)
+                return self.reference.sample(fq_attr, frames)
+        return values
+
+
+def get_default_backend():
+    """
+    Returns a CheckedBackend that uses the OpenMayaBackend, which is checked
+    against mc.getAttr() for each attribute, or a CmdsBackend without OpenMaya.
+    """
+    if om is None:
+        return CmdsBackend()
+    return CheckedBackend(OpenMayaBackend())
+
+
+class AttrSampler(object):
+    """
+    Caches the values of attributes at frames and queries the frames that
+    are not cached yet with one backend call per attribute. Create one
+    sampler per export, since cached values are not updated when the
+    scene changes.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or get_default_backend()
+        self._values = {}
+        self.num_queried = 0
+        self.num_cached = 0
+
+    def get_values(self, fq_attr, frames):
+        """
+        Returns the list of values of an attribute at the provided frames.
+        """
+        cached = self._values.setdefault(fq_attr, {})
+        missing = [x for x in set(frames) if x not in cached]
+        if missing:
+            missing.sort()
+            cached.update(zip(missing, self.backend.sample(fq_attr, missing)))
+        self.num_queried += len(missing)
+        self.num_cached += len(frames) - len(missing)
+        return [cached[x] for x in frames]
+
+    def get_value(self, fq_attr, frame_num):
+        return self.get_values(fq_attr, [frame_num])[0]
+
+    def get_frame_values(self, fq_attrs, frames):
+        """
+        Returns a dict of frame -> {attribute: value} for several attributes.
+        """
+        frame_values = dict((x, {}) for x in frames)
+        for fq_attr in fq_attrs:
+            for frame_num, value in zip(frames, self.get_values(fq_attr, frames)):
+                frame_values[frame_num][fq_attr] = value
+        return frame_values
+
+    def clear(self):
+        self._values.clear()
+
+
+# The sampler that is shared by everything that samples attributes during an export
+_export_sampler = None
+
+
+def begin_export_sampling(backend=None):
+    """
+    Starts sharing one AttrSampler (returned by get_sampler()) until
+    end_export_sampling() is called, which should be done when the export
+    is done, since cached values are not updated when the scene changes.
+    """
+    global _export_sampler
+    _export_sampler = AttrSampler(backend)
+    return _export_sampler
+
+
+def end_export_sampling():
+    global _export_sampler
+    _export_sampler = None
+
+
+def get_sampler():
+    """
+    Returns the AttrSampler of the export in progress or else a new one.
+    """
+    if _export_sampler is not None:
+        return _export_sampler
+    return AttrSampler()
+
+
+class StandInCmds(object):
+    """
+    A stand-in for the getAttr() and keyframe() functions of maya.cmds that
+    linearly interpolates curves provided as a dict of attribute -> (sorted
+    list of key frames, list of values). The number of calls is counted so
+    tests and benchmarks can check how often Maya would have been queried.
+    """
+
+    def __init__(self, curves):
+        self.curves = curves
+        self.num_calls = 0
+
+    def getAttr(self, fq_attr, time=None):
+        self.num_calls += 1
+        frames, values = self.curves[fq_attr]
+        if time is None:
+            return values[0]
+        return interpolate_value(time, frames, values)
+
+    def keyframe(self, fq_attr, query=False, timeChange=False, time=None):
+        self.num_calls += 1
+        frames = self.curves[fq_attr][0]
+        if time is not None:
+            frames = [x for x in frames if time[0] <= x <= time[1]]
+        return list(frames) or None
+
+
+def benchmark(num_attrs=60, num_keys=200, num_queries=3):
+    """
+    Samples stand-in curves the way an export does (every attribute at every
+    keyframe, several times) with and without an AttrSampler and prints the
+    number of getAttr() calls and the time taken for each.
+    """
+    frames = [float(x) for x in range(num_keys)]
+    curves = dict(("data_node.attr%s" % idx, (frames, [float(x * idx) for x in frames]))
+                  for idx in range(num_attrs))
+    cmds = StandInCmds(curves)
+    start_time = time.time()
+    for idx in range(num_queries):
+        for fq_attr in curves:
+            [cmds.getAttr(fq_attr, time=x) for x in frames]
+    print("Per-frame getAttr: %s calls in %.3f sec" % (cmds.num_calls, time.time() - start_time))
+
+    cmds = StandInCmds(curves)
+    sampler = AttrSampler(CmdsBackend(cmds))
+    start_time = time.time()
+    for idx in range(num_queries):
+        for fq_attr in curves:
+            sampler.get_values(fq_attr, frames)
+    print("AttrSampler: %s calls in %.3f sec (%s values cached)"
+          % (cmds.num_calls, time.time() - start_time, sampler.num_cached))
+
+
+if __name__ == "__main__":
+    benchmark(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Headless unit tests for attr_sampler.py, which count how often the StandInCmds
+(in place of maya.cmds) would have queried Maya, so they can be run without Maya:
+
+    python ankimaya/attr_sampler_unit_tests.py
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ankimaya import attr_sampler
+from ankimaya.attr_sampler import AttrSampler, CmdsBackend, CheckedBackend, StandInCmds
+
+
+HEAD_ANGLE_ATTR = "x:data_node.HeadAngle"
+LIFT_HEIGHT_ATTR = "x:data_node.LiftHeight"
+
+CURVES = {HEAD_ANGLE_ATTR: ([0, 10, 20], [0.0, 15.0, -5.0]),
+          LIFT_HEIGHT_ATTR: ([0, 20], [32.0, 92.0])}
+
+
+class AttrSamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cmds = StandInCmds(CURVES)
+        self.sampler = AttrSampler(CmdsBackend(self.cmds))
+
+    def test_values_match_get_attr(self):
+        frames = [0, 5, 10, 15, 20]
+        expected = [StandInCmds(CURVES).getAttr(HEAD_ANGLE_ATTR, time=x) for x in frames]
+        self.assertEqual(self.sampler.get_values(HEAD_ANGLE_ATTR, frames), expected)
+        self.assertEqual(self.sampler.get_values(HEAD_ANGLE_ATTR, frames[::-1]), expected[::-1])
+        self.assertEqual(self.sampler.get_value(HEAD_ANGLE_ATTR, 5), 7.5)
+
+    def test_each_value_is_queried_once(self):
+        self.sampler.get_values(HEAD_ANGLE_ATTR, [0, 5, 10, 5, 0])
+        self.assertEqual(self.cmds.num_calls, 3)
+        self.sampler.get_values(HEAD_ANGLE_ATTR, [5, 10, 15])
+        self.assertEqual(self.cmds.num_calls, 4)
+        self.assertEqual(self.sampler.num_queried, 4)
+        self.assertEqual(self.sampler.num_cached, 4)
+        self.sampler.clear()
+        self.sampler.get_values(HEAD_ANGLE_ATTR, [5])
+        self.assertEqual(self.cmds.num_calls, 5)
+
+    def test_frame_values(self):
+        frame_values = self.sampler.get_frame_values([HEAD_ANGLE_ATTR, LIFT_HEIGHT_ATTR], [0, 10])
+        self.assertEqual(frame_values, {0: {HEAD_ANGLE_ATTR: 0.0, LIFT_HEIGHT_ATTR: 32.0},
+                                        10: {HEAD_ANGLE_ATTR: 15.0, LIFT_HEIGHT_ATTR: 62.0}})
+        self.assertEqual(self.cmds.num_calls, 4)
+
+
+class CheckedBackendTest(unittest.TestCase):
+
+    def test_matching_backend_is_used(self):
+        fast_cmds = StandInCmds(CURVES)
+        reference_cmds = StandInCmds(CURVES)
+        backend = CheckedBackend(CmdsBackend(fast_cmds), CmdsBackend(reference_cmds))
+        self.assertEqual(backend.sample(HEAD_ANGLE_ATTR, [0, 5, 10]), [0.0, 7.5, 15.0])
+        self.assertEqual(backend.sample(HEAD_ANGLE_ATTR, [15, 20]), [5.0, -5.0])
+        # The reference is only queried once to check the attribute
+        self.assertEqual(reference_cmds.num_calls, 1)
+        self.assertEqual(fast_cmds.num_calls, 5)
+        self.assertEqual(backend.mismatched_attrs, [])
+
+    def test_mismatched_attrs_use_reference(self):
+        wrong_curves = dict(CURVES)
+        wrong_curves[LIFT_HEIGHT_ATTR] = ([0, 20], [0.32, 0.92])
+        fast_cmds = StandInCmds(wrong_curves)
+        reference_cmds = StandInCmds(CURVES)
+        backend = CheckedBackend(CmdsBackend(fast_cmds), CmdsBackend(reference_cmds))
+        self.assertEqual(backend.sample(LIFT_HEIGHT_ATTR, [0, 10]), [32.0, 62.0])
+        self.assertEqual(backend.mismatched_attrs, [LIFT_HEIGHT_ATTR])
+        fast_calls = fast_cmds.num_calls
+        self.assertEqual(backend.sample(LIFT_HEIGHT_ATTR, [20]), [92.0])
+        self.assertEqual(fast_cmds.num_calls, fast_calls)
+        self.assertEqual(backend.sample(HEAD_ANGLE_ATTR, [10]), [15.0])
+        self.assertEqual(backend.mismatched_attrs, [LIFT_HEIGHT_ATTR])
+
+
+class ExportSamplerTest(unittest.TestCase):
+
+    def tearDown(self):
+        attr_sampler.end_export_sampling()
+
+    def test_one_sampler_per_export(self):
+        cmds = StandInCmds(CURVES)
+        sampler = attr_sampler.begin_export_sampling(CmdsBackend(cmds))
+        self.assertTrue(attr_sampler.get_sampler() is sampler)
+        attr_sampler.get_sampler().get_values(HEAD_ANGLE_ATTR, [0, 10])
+        attr_sampler.get_sampler().get_values(HEAD_ANGLE_ATTR, [0, 10, 20])
+        self.assertEqual(cmds.num_calls, 3)
+        attr_sampler.end_export_sampling()
+        self.assertFalse(attr_sampler.get_sampler() is sampler)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -973,6 +973,42 @@ def getEventKeyframeTimes(nodeName=AUDIO_NODE_NAME, enumAttr=AUDIO_ENUM_ATTR):
     return keyframes
 
 
+def getEventsInFrameRange(startFrame, endFrame, nodeName=AUDIO_NODE_NAME, enumAttr=AUDIO_ENUM_ATTR):
+    """
+    Returns a sorted list of (frame, audio event name) tuples for the audio
+    event keyframes from startFrame to endFrame (inclusive). The event names
+    come from the enum attribute itself, so the audio groups and event data
+    files do not need to be loaded.
+    """
+    keyframes = getEventKeyframeTimes(nodeName, enumAttr)
+    if not keyframes or not cmds.attributeQuery(enumAttr, node=nodeName, exists=True):
+        return []
+    audioNames = cmds.attributeQuery(enumAttr, node=nodeName, listEnum=True)[0].split(':')
+    audioAttr = '.'.join((nodeName, enumAttr))
+    events = []
+    for frame in sorted(set(keyframes)):
+        if startFrame <= frame <= endFrame:
+            eventName = _getEventName(audioNames, audioAttr, frame)
+            if eventName and eventName != INVALID:
+                events.append((frame, eventName))
+    return events
+
+
+def scheduleAudioEvents(scheduler, startFrame, endFrame, frameTimeMs=None,
+                        nodeName=AUDIO_NODE_NAME, enumAttr=AUDIO_ENUM_ATTR):
+    """
+    Adds the audio events from startFrame to endFrame to a playback scheduler
+    (see ankiutils/playback_scheduler.py), so they are played in sync with the
+    frames that the scheduler shows. Returns the number of scheduled events.
+    """
+    if frameTimeMs is None:
+        frameTimeMs = scheduler.frame_time_ms
+    events = getEventsInFrameRange(startFrame, endFrame, nodeName, enumAttr)
+    for frame, eventName in events:
+        scheduler.add_event((frame - startFrame) * frameTimeMs, playAudioEvent, eventName)
+    return len(events)
+
+
 def getAudioKeyframeAtTime():
     raise NotImplementedError("You may need to call 'getEventKeyframeAtTime' instead of 'getAudioKeyframeAtTime'")
 
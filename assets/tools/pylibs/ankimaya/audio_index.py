@@ -0,0 +1,158 @@
+"""
+An index of the audio events, states, switches and parameters that can be
+used in audio keyframes, mapping their names to Wwise IDs and back.
+
+Loading the audio data means importing the generated audio type modules
+(and walking every state and switch group in them), so rather than having
+the exporter and audio tools each load it, this index is built once and
+shared. It is rebuilt the next time it is requested after any of the files
+it was loaded from (audio_event_info.json, the audio type modules or
+audioGroups.py) were updated, eg. by the "update audio" tools.
+"""
+
+import os
+
+from ankimaya.audio_core import loadAudioAttrsFromPy, getAudioEventJsonFile, getAudioToolsDir
+from ankimaya.audio_core import AUDIO_PARAMETER_TYPES, AUDIO_STATE_TYPES
+from ankimaya.audio_core import AUDIO_SWITCH_TYPES, AUDIO_GROUPS_FILE, AUDIO_INFO_CLASSES
+from ankimaya.audio_core import PARAMETERS_ATTR, PARAMETER_ID_ATTR, CURVE_ATTR, CURVE_TYPES
+from ankimaya.audio_core import SWITCHES_ATTR, SWITCH_GROUP_ID_ATTR, STATES_ATTR
+from ankimaya.audio_core import STATE_GROUP_ID_ATTR, STATE_ID_ATTR
+
+
+_index = None
+
+
+def _get_source_files():
+    source_files = [getAudioEventJsonFile()]
+    audio_tools_dir = getAudioToolsDir()
+    if audio_tools_dir:
+        for audio_file in [AUDIO_GROUPS_FILE] + sorted(AUDIO_INFO_CLASSES.keys()):
+            source_files.append(os.path.join(audio_tools_dir, audio_file + ".py"))
+    return source_files
+
+
+def _get_source_signature():
+    """
+    Returns a (path, modification time, size) tuple for each of the files
+    that the audio data is loaded from, so an index can tell if it is stale.
+    """
+    signature = []
+    for source_file in _get_source_files():
+        try:
+            stat = os.stat(source_file)
+        except (OSError, TypeError):
+            signature.append((source_file, None, None))
+        else:
+            signature.append((source_file, stat.st_mtime, stat.st_size))
+    return tuple(signature)
+
+
+class AudioIndex(object):
+    """
+    Maps audio event names to IDs (and IDs to names) and audio groups to
+    their members, along with the name -> ID mappings of the parameters,
+    states and switches (and the states/switches in each of those groups).
+    """
+
+    def __init__(self, event_names_sorted, event_ids, grouped_event_names,
+                 parameter_names_sorted, parameter_ids, grouped_parameter_names,
+                 state_names_sorted, state_ids, sub_state_ids,
+                 switch_names_sorted, switch_ids, sub_switch_ids, signature=None):
+        self.event_names_sorted = event_names_sorted
+        self.event_ids = event_ids
+        self.grouped_event_names = grouped_event_names
+        self.parameter_names_sorted = parameter_names_sorted
+        self.parameter_ids = parameter_ids
+        self.grouped_parameter_names = grouped_parameter_names
+        self.state_names_sorted = state_names_sorted
+        self.state_ids = state_ids
+        self.sub_state_ids = sub_state_ids
+        self.switch_names_sorted = switch_names_sorted
+        self.switch_ids = switch_ids
+        self.sub_switch_ids = sub_switch_ids
+        self.signature = signature
+
+        self.event_names = {}
+        for name in event_names_sorted:
+            # The first name (alphabetically) wins if two events share an ID
+            self.event_names.setdefault(int(event_ids[name]), name)
+
+        # The same {"action": {"attr": {"name": id}}} layout that the exporter uses
+        # to look up the IDs of parameter, state and switch keyframes
+        self.action_ids = {
+            PARAMETERS_ATTR: {PARAMETER_ID_ATTR: parameter_ids, CURVE_ATTR: CURVE_TYPES},
+            SWITCHES_ATTR: {SWITCH_GROUP_ID_ATTR: switch_ids, STATE_ID_ATTR: sub_switch_ids},
+            STATES_ATTR: {STATE_GROUP_ID_ATTR: state_ids, STATE_ID_ATTR: sub_state_ids}
+        }
+
+    def get_event_id(self, event_name):
+        """
+        Returns the Wwise ID of an audio event, or None if there is no such event.
+        """
+        try:
+            return int(self.event_ids[event_name])
+        except KeyError:
+            return None
+
+    def get_event_name(self, event_id):
+        """
+        Returns the name of the audio event with a Wwise ID, or None if there is no such event.
+        """
+        try:
+            return self.event_names[int(event_id)]
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def get_group_members(self, group):
+        return self.grouped_event_names.get(group, [])
+
+    def get_action_id(self, action, attr, name, group=None):
+        """
+        Returns the ID of a named parameter, state or switch (or curve type),
+        or None if it is unknown. Individual states and switches are looked
+        up within their state/switch group.
+        """
+        ids = self.action_ids[action][attr]
+        if group is not None:
+            ids = ids.get(group, {})
+        return ids.get(name)
+
+    def is_stale(self):
+        return self.signature != _get_source_signature()
+
+    @classmethod
+    def from_audio_files(cls):
+        """
+        Returns a new index loaded from the audio type modules.
+        """
+        signature = _get_source_signature()
+        event_names_sorted, event_ids, grouped_event_names = loadAudioAttrsFromPy()
+        state_names_sorted, state_ids, sub_state_ids = \
+            loadAudioAttrsFromPy(audioTypes=AUDIO_STATE_TYPES, audioGroups=[], recursive=True)
+        switch_names_sorted, switch_ids, sub_switch_ids = \
+            loadAudioAttrsFromPy(audioTypes=AUDIO_SWITCH_TYPES, audioGroups=[], recursive=True)
+        parameter_names_sorted, parameter_ids, grouped_parameter_names = \
+            loadAudioAttrsFromPy(audioTypes=AUDIO_PARAMETER_TYPES)
+        return cls(event_names_sorted, event_ids, grouped_event_names,
+                   parameter_names_sorted, parameter_ids, grouped_parameter_names,
+                   state_names_sorted, state_ids, sub_state_ids,
+                   switch_names_sorted, switch_ids, sub_switch_ids, signature=signature)
+
+
+def invalidate_audio_index(*args):
+    global _index
+    _index = None
+
+
+def get_audio_index():
+    """
+    Returns the shared audio index, which is loaded the first time it is
+    needed after the audio files that it is loaded from changed. The index
+    is shared, so callers should copy any of its lists or dictionaries
+    before modifying them.
+    """
+    global _index
+    if _index is None or _index.is_stale():
+        _index = AudioIndex.from_audio_files()
+    return _index
@@ -36,16 +36,18 @@ except ImportError:
     from PySide.QtUiTools import *
     from shiboken import wrapInstance
 
-from audio_core import CURVE_TYPES, STATE_ID_ATTR, STATE_GROUP_ID_ATTR, AUDIO_STATE_TYPES, \
-    AUDIO_SWITCH_TYPES, AUDIO_PARAMETER_TYPES, EVENT_NAME_ATTR, PARAMETER_NAME_ATTR, CURVE_ATTR, \
+from audio_core import CURVE_TYPES, STATE_ID_ATTR, STATE_GROUP_ID_ATTR, \
+    EVENT_NAME_ATTR, PARAMETER_NAME_ATTR, CURVE_ATTR, \
     NUMERICAL_ATTRS, INT_ATTRS, FLOAT_ATTRS, ALL_ATTRS, PROB_ATTR, VOLUME_ATTR, SWITCH_ID_ATTR, \
     NUMERICAL_EVENT_ATTR_VALUES, VALUE_ATTR, TIME_MS_ATTR, AUDIO_ENUM_ATTR, SWITCH_GROUP_ID_ATTR, \
     AUDIO_NODE_NAME, ALT_SOUNDS_ATTR
 
-from audio_core import audio_keyframe_updated, playAudioEvent, loadAudioAttrsFromPy, \
+from audio_core import audio_keyframe_updated, playAudioEvent, \
     setupAudioNode, setAudioEventKeyframe, setAudioParameterKeyframe, getEventKeyframe, \
     getAudioKeyframe, removeAudioKeys, refreshAttrAndVariants, syncWwisePlugin
 
+from audio_index import get_audio_index
+
 import timeline_callbacks
 
 
@@ -146,19 +148,27 @@ class SetAudioTrigger(QWidget):
         self.groupedParameterNames = {}
         self.goupedEventNames = {}
 
-        self.allAudioEvents, self.audioIds, self.groupedAudioEvents = loadAudioAttrsFromPy()
+        # The audio index is shared with the exporter, so its data is not modified here
+        audioIndex = get_audio_index()
+
+        self.allAudioEvents = audioIndex.event_names_sorted
+        self.audioIds = audioIndex.event_ids
+        self.groupedAudioEvents = audioIndex.grouped_event_names
         self.audioEventsByGroup = sortAudioEventsByGroup(self.allAudioEvents)
         for group in self.audioEventsByGroup.keys():
             self.audioEventsByGroup[group].sort()
 
-        self.allAudioStates, self.audioStateIds, self.subAudioStateIds = \
-            loadAudioAttrsFromPy(audioTypes=AUDIO_STATE_TYPES, audioGroups=[], recursive=True)
+        self.allAudioStates = audioIndex.state_names_sorted
+        self.audioStateIds = audioIndex.state_ids
+        self.subAudioStateIds = audioIndex.sub_state_ids
 
-        self.allAudioSwitches, self.audioSwitchIds, self.subAudioSwitchIds = \
-            loadAudioAttrsFromPy(audioTypes=AUDIO_SWITCH_TYPES, audioGroups=[], recursive=True)
+        self.allAudioSwitches = audioIndex.switch_names_sorted
+        self.audioSwitchIds = audioIndex.switch_ids
+        self.subAudioSwitchIds = audioIndex.sub_switch_ids
 
-        self.allAudioParameters, self.audioParameterIds, self.groupedParameterNames = \
-            loadAudioAttrsFromPy(audioTypes=AUDIO_PARAMETER_TYPES)
+        self.allAudioParameters = audioIndex.parameter_names_sorted
+        self.audioParameterIds = audioIndex.parameter_ids
+        self.groupedParameterNames = audioIndex.grouped_parameter_names
 
         self.allSubAudioStateIds = copy.deepcopy(self.getAllSubIds(self.subAudioStateIds))
         self.allSubAudioSwitchIds = copy.deepcopy(self.getAllSubIds(self.subAudioSwitchIds))
@@ -1,5 +1,7 @@
 DATA_NODE_NAME = "x:data_node"
 HACK_TIMELINE_SCALE = 0.99
+# Keyframes that are closer together than this (in frames) are merged into one
+FLOAT_EQUALITY_TOLERANCE = 0.05
 ANIM_FPS = 30.0
 
 EVENT_CTRL = "x:event_ctrl"
@@ -25,6 +25,10 @@ HIDE_USER_WARNINGS = "HIDE_USER_WARNINGS"
 EXPORT_TO_ROBOT_ENV_VAR = "EXPORT_TO_ROBOT"
 ROBOT_IP_ADDRESS_ENV_VAR = "ROBOT_IP_ADDRESS"
 
+# Set this to "true" to drop head, lift and procedural face keyframes that are not
+# needed to reproduce the motion within the default error budgets when exporting
+REDUCE_KEYFRAMES_ENV_VAR = "REDUCE_EXPORTED_KEYFRAMES"
+
 EVENT_CTRL = "x:event_ctrl"
 EVENT_ENUM_ATTR = "event_trigger"
 
@@ -51,6 +55,8 @@ from operator import itemgetter
 
 from ankimaya import ctrs_manager
 from ankimaya import exporter_config
+from ankimaya import export_profiler
+from ankimaya.attr_sampler import begin_export_sampling, end_export_sampling
 from ankimaya.anim_data_manager import AnimDataManager
 import ankimaya.json_exporter as je
 import ankimaya.wheel_movement
@@ -58,6 +64,7 @@ import ankimaya.recorded_angle_turn
 from ankimaya.curves_interpolation import CurvesInterpolation
 from ankimaya.game_exporter import get_clip_info, get_num_clips
 from ankimaya.robot_data import is_procedural_face_attr, add_procedural_face_keyframe, reset_children_cache
+from ankimaya.robot_data import get_interpolated_face_values
 from ankimaya.robot_data import TRIGGER_TIME_KEY, DURATION_TIME_KEY
 from ankimaya.audio_core import AUDIO_NODE_NAME, AUDIO_EVENT_ATTRS, AUDIO_EVENT_ATTRS_WITH_VARIATIONS
 from ankimaya.audio_core import VARIANT_ATTR_SUFFIX_START_INDEX
@@ -68,6 +75,7 @@ from ankimaya.head_angle_selector import getHeadAngleVariationExportSettings
 from ankiutils.head_angle_config import HeadAngleConfig, ANIM_VARIATION_SUFFIX
 from ankiutils.head_angle_config import MIN_HEAD_ANGLE_DEG, MAX_HEAD_ANGLE_DEG
 from ankiutils.check_anim_times import get_clip_length
+from ankiutils import keyframe_reduction
 from robot_config import LIFT_HEIGHT_MIN_ROBOT_MM, LIFT_HEIGHT_MAX_ROBOT_MM
 from ankimaya.constants import DATA_NODE_NAME, HACK_TIMELINE_SCALE, ANIM_FPS
 from ankimaya.export_error_check.error_checker_utils import add_json_node
@@ -208,6 +216,15 @@ class JsonAnimClip(object):
         procFaceKeyframes = {}
         head_angle_keyframes = []
         unscaled_start_frame = self.clip_start / TIME_SCALE_HACK
+
+        # Query the values of all procedural face attributes at every frame that
+        # any of them is keyed at once, rather than for each new face keyframe.
+        face_frame_numbers = []
+        for curr_attr, frame_data in self.anim_data.iteritems():
+            if is_procedural_face_attr(curr_attr):
+                face_frame_numbers.extend(unscaled_start_frame + x for x in frame_data)
+        interp_values = get_interpolated_face_values(self.dataNodeName, face_frame_numbers)
+
         for curr_attr, frame_data in self.anim_data.iteritems():
             isProceduralFaceAttr = is_procedural_face_attr(curr_attr)
             frame_nums = frame_data.keys()
@@ -221,7 +238,7 @@ class JsonAnimClip(object):
                                                  frame_data[frame_nums[idx]],
                                                  (unscaled_start_frame + frame_nums[idx]),
                                                  self.dataNodeName, procFaceKeyframes,
-                                                 frame_nums=frame_nums)
+                                                 interp_values=interp_values)
 
                 elif (curr_attr in ["HeadAngle", "ArmLift"]) and (idx < len(frame_nums) - 1):
                     if abs(frame_nums[idx] - frame_nums[idx+1]) <= FLOAT_EQUALITY_TOLERANCE:
@@ -414,7 +431,17 @@ class JsonAnimClip(object):
             if png_json:
                 self.json_arr.extend(png_json)
 
-    def export(self, export_path, show_json=False):
+    def reduce_keyframes(self, error_budgets=None):
+        """
+        Drops the head, lift and procedural face keyframes that are not needed
+        to reproduce the motion within the error budgets (see keyframe_reduction).
+        """
+        self.json_arr, stats = keyframe_reduction.reduce_keyframes(self.json_arr, error_budgets)
+        if stats:
+            print("Reduced keyframes of '%s' (%s)" % (self.clip_info[CLIP_NAME_KEY],
+                                                     keyframe_reduction.format_stats(stats)))
+
+    def export(self, export_path, show_json=False, reduce_keyframes=None, error_budgets=None):
         json_filename = None
         fileId = None
         clip_name = self.clip_info[CLIP_NAME_KEY]
@@ -431,27 +458,40 @@ class JsonAnimClip(object):
         if self.head_angle_offset and self.head_angle_which_keyframes:
             for keyframe_to_offset in self.head_angle_which_keyframes:
                 keyframe_offsets[keyframe_to_offset] = self.head_angle_offset
-        self.fill_face_head_lift_data(**keyframe_offsets)
+        with export_profiler.stage("fill_face_head_lift_data", clip=clip_name):
+            self.fill_face_head_lift_data(**keyframe_offsets)
 
         if cmds.objExists(AUDIO_NODE_NAME):
-            self.fill_audio_data(clip_name)
+            with export_profiler.stage("fill_audio_data", clip=clip_name):
+                self.fill_audio_data(clip_name)
         if cmds.objExists(EVENT_CTRL):
-            self.fill_event_data()
-        self.fill_lights_data()
-        self.fill_movement_data()
+            with export_profiler.stage("fill_event_data", clip=clip_name):
+                self.fill_event_data()
+        with export_profiler.stage("fill_lights_data", clip=clip_name):
+            self.fill_lights_data()
+        with export_profiler.stage("fill_movement_data", clip=clip_name):
+            self.fill_movement_data()
         #self.fill_sprite_box_data()
 
+        if reduce_keyframes is None:
+            reduce_keyframes_env_var = os.getenv(REDUCE_KEYFRAMES_ENV_VAR)
+            reduce_keyframes = reduce_keyframes_env_var and reduce_keyframes_env_var.lower() in ["true", "1"]
+        if reduce_keyframes:
+            with export_profiler.stage("reduce_keyframes", clip=clip_name):
+                self.reduce_keyframes(error_budgets)
+
         if not self.json_arr:
             return None
 
         if clip_name:
-            json_dict = {clip_name: self.json_arr}
-            output_json = json.dumps(json_dict, sort_keys=False, indent=2, separators=(',', ': '))
-            if not os.path.exists(export_path):
-                os.makedirs(export_path)
-            json_filename = os.path.join(export_path, clip_name + ".json")
-            with open(json_filename, 'w') as fh:
-                fh.write(output_json)
+            with export_profiler.stage("write_json", clip=clip_name):
+                json_dict = {clip_name: self.json_arr}
+                output_json = json.dumps(json_dict, sort_keys=False, indent=2, separators=(',', ': '))
+                if not os.path.exists(export_path):
+                    os.makedirs(export_path)
+                json_filename = os.path.join(export_path, clip_name + ".json")
+                with open(json_filename, 'w') as fh:
+                    fh.write(output_json)
             if show_json:
                 print(output_json)
             #print("The length of %s is %s ms" % (clip_name, get_clip_length(self.json_arr)))
@@ -553,8 +593,9 @@ def create_export_package(output_files, tar_file=DEFAULT_TAR_FILE,
         # that .mov file to the exported package.
         temp_dir = tempfile.mkdtemp()
         mov_file = os.path.join(temp_dir, 'playblast.mov')
-        cmds.playblast(format='movie', viewer=False, filename=mov_file,
-                       forceOverwrite=True)
+        with export_profiler.stage("playblast"):
+            cmds.playblast(format='movie', viewer=False, filename=mov_file,
+                           forceOverwrite=True)
         package_files.append(mov_file)
     # Exported package (tar file) is named after the Maya scene file.
     scene_file_name = os.path.basename(scene_file)
@@ -571,10 +612,11 @@ def create_export_package(output_files, tar_file=DEFAULT_TAR_FILE,
     if not os.path.exists(tar_file_dir):
         os.makedirs(tar_file_dir)
     tar_file = os.path.join(tar_file_dir, tar_file)
-    tar = tarfile.open(tar_file, 'w')
-    for output_file in package_files:
-        tar.add(output_file, arcname=os.path.basename(output_file))
-    tar.close()
+    with export_profiler.stage("write_tar_file", num_files=len(package_files)):
+        tar = tarfile.open(tar_file, 'w')
+        for output_file in package_files:
+            tar.add(output_file, arcname=os.path.basename(output_file))
+        tar.close()
     export_to_robot_env_var = os.getenv(EXPORT_TO_ROBOT_ENV_VAR)
     if export_to_robot or (export_to_robot_env_var and export_to_robot_env_var.lower() in ["true", "1"]):
         msg = convert_to_binary_and_send_to_robot(output_files, tar_file)
@@ -592,7 +634,8 @@ def convert_to_binary_and_send_to_robot(json_files, tar_file, ip_address=None):
     bin_name = os.path.splitext(os.path.basename(tar_file))[0] + binary_conversion.BIN_FILE_EXT
     bin_name = bin_name.lower()
     try:
-        bin_file = binary_conversion.main(json_files, bin_name)
+        with export_profiler.stage("binary_conversion", num_files=len(json_files)):
+            bin_file = binary_conversion.main(json_files, bin_name)
     except StandardError, e:
         print("%s: %s" % (type(e).__name__, e.message))
     else:
@@ -600,9 +643,10 @@ def convert_to_binary_and_send_to_robot(json_files, tar_file, ip_address=None):
             ip_address = os.getenv(ROBOT_IP_ADDRESS_ENV_VAR)
         if ip_address:
             try:
-                preview_selector.transfer_file(ip_address, bin_file)
-                preview_selector.update_animation(ip_address, bin_file)
-                preview_selector.update_animation(ip_address, bin_file, engine=True)
+                with export_profiler.stage("transfer_to_robot"):
+                    preview_selector.transfer_file(ip_address, bin_file)
+                    preview_selector.update_animation(ip_address, bin_file)
+                    preview_selector.update_animation(ip_address, bin_file, engine=True)
             except RuntimeError, e:
                 msg = str(e).split(os.linesep)[0]
             else:
@@ -638,9 +682,49 @@ def add_head_angle_variations(clip_info, head_angle_offsets=None, head_angle_whi
             clip_info.append(offset_clip)
 
 
+def _report_export_profile(profiler):
+    scene_file = cmds.file(query=True, sceneName=True)
+    try:
+        trace_file = profiler.write_trace(export_profiler.get_trace_file(scene_file))
+    except (IOError, OSError), e:
+        print("Failed to write the export trace file because: %s" % e)
+        trace_file = None
+    summary = profiler.get_summary(trace_file)
+    print(os.linesep.join(summary))
+    add_json_node(node_name="Export profile",
+                  fix_function="", status="pass",
+                  message=summary)
+
+
 def export_robot_anim(export_path=None, package_output=True, all_clips=False,
                       dataNodeName=DATA_NODE_NAME, time_scale=TIME_SCALE_HACK,
-                      save_maya_file=True, show_json=False, verbose=True):
+                      save_maya_file=True, show_json=False, verbose=True, profile=None):
+    """
+    If 'profile' is True (or if it is None and the PROFILE_EXPORT environment
+    variable is set to "true"), the stages of the export are timed and written
+    to a Chrome trace file, which is summarized in the export error checker.
+    """
+    if profile is None:
+        profile = export_profiler.is_profiling_enabled()
+    export_args = (export_path, package_output, all_clips, dataNodeName, time_scale,
+                   save_maya_file, show_json, verbose)
+    # Every AnimDataManager of the export (for each clip and for the lights
+    # and movement of each clip) samples attributes through the same sampler
+    begin_export_sampling()
+    try:
+        if not profile:
+            return _export_robot_anim(*export_args)
+        export_profiler.start_profiling()
+        try:
+            return _export_robot_anim(*export_args)
+        finally:
+            _report_export_profile(export_profiler.stop_profiling())
+    finally:
+        end_export_sampling()
+
+
+def _export_robot_anim(export_path, package_output, all_clips, dataNodeName, time_scale,
+                       save_maya_file, show_json, verbose):
     global _msgs_for_user
 
     output_files = []
@@ -653,9 +737,10 @@ def export_robot_anim(export_path=None, package_output=True, all_clips=False,
 
     # Reset the node's children cache in ankimaya.robot_data before calling get_clip_info()
     reset_children_cache()
-    export_subdir, clip_names_updated, clip_info = get_clip_info(time_scale=time_scale,
-                                                        default_name=DEFAULT_TAR_FILE.split('.')[0],
-                                                        include_all=all_clips)
+    with export_profiler.stage("get_clip_info"):
+        export_subdir, clip_names_updated, clip_info = get_clip_info(time_scale=time_scale,
+                                                            default_name=DEFAULT_TAR_FILE.split('.')[0],
+                                                            include_all=all_clips)
     num_orig_clips = len(clip_info)
     add_head_angle_variations(clip_info)
     pprint.pprint(clip_info, depth=2)
@@ -663,35 +748,41 @@ def export_robot_anim(export_path=None, package_output=True, all_clips=False,
     if export_subdir:
         export_path = os.path.join(export_path, export_subdir)
 
-    eventKeyframes = get_keyframe_lists(EVENT_CTRL, [EVENT_ENUM_ATTR], time_scale=time_scale,
-                                        msgs=_msgs_for_user)
+    with export_profiler.stage("get_keyframe_lists", keyframes="events"):
+        eventKeyframes = get_keyframe_lists(EVENT_CTRL, [EVENT_ENUM_ATTR], time_scale=time_scale,
+                                            msgs=_msgs_for_user)
 
     # Grab the wwise audio data before we lock only to one layer.
-    audioKeyframes = get_keyframe_lists(AUDIO_NODE_NAME, AUDIO_EVENT_ATTRS, time_scale=time_scale,
-                                        attrs_with_variants_names=AUDIO_EVENT_ATTRS_WITH_VARIATIONS,
-                                        variant_suffix_start=VARIANT_ATTR_SUFFIX_START_INDEX,
-                                        msgs=_msgs_for_user)
-    parameterKeyframes = get_keyframe_lists(AUDIO_NODE_NAME, [VALUE_ATTR, TIME_MS_ATTR],
+    with export_profiler.stage("get_keyframe_lists", keyframes="audio events"):
+        audioKeyframes = get_keyframe_lists(AUDIO_NODE_NAME, AUDIO_EVENT_ATTRS, time_scale=time_scale,
+                                            attrs_with_variants_names=AUDIO_EVENT_ATTRS_WITH_VARIATIONS,
+                                            variant_suffix_start=VARIANT_ATTR_SUFFIX_START_INDEX,
+                                            msgs=_msgs_for_user)
+    with export_profiler.stage("get_keyframe_lists", keyframes="audio parameters"):
+        parameterKeyframes = get_keyframe_lists(AUDIO_NODE_NAME, [VALUE_ATTR, TIME_MS_ATTR],
+                                                time_scale=time_scale,
+                                                attrs_with_variants_names=[VALUE_ATTR, TIME_MS_ATTR],
+                                                variant_suffix_start=VARIANT_ATTR_SUFFIX_START_INDEX,
+                                                enum_attrs=[CURVE_ATTR,PARAMETER_NAME_ATTR],
+                                                msgs=_msgs_for_user)
+    with export_profiler.stage("get_keyframe_lists", keyframes="audio states"):
+        stateKeyframes = get_keyframe_lists(AUDIO_NODE_NAME, [],
                                             time_scale=time_scale,
-                                            attrs_with_variants_names=[VALUE_ATTR, TIME_MS_ATTR],
+                                            attrs_with_variants_names=[],
                                             variant_suffix_start=VARIANT_ATTR_SUFFIX_START_INDEX,
-                                            enum_attrs=[CURVE_ATTR,PARAMETER_NAME_ATTR],
+                                            enum_attrs=[STATE_ID_ATTR, STATE_GROUP_ID_ATTR],
                                             msgs=_msgs_for_user)
-    stateKeyframes = get_keyframe_lists(AUDIO_NODE_NAME, [],
-                                        time_scale=time_scale,
-                                        attrs_with_variants_names=[],
-                                        variant_suffix_start=VARIANT_ATTR_SUFFIX_START_INDEX,
-                                        enum_attrs=[STATE_ID_ATTR, STATE_GROUP_ID_ATTR],
-                                        msgs=_msgs_for_user)
-    switchKeyframes = get_keyframe_lists(AUDIO_NODE_NAME, [],
-                                         time_scale=time_scale,
-                                         attrs_with_variants_names=[],
-                                         variant_suffix_start=VARIANT_ATTR_SUFFIX_START_INDEX,
-                                         enum_attrs=[SWITCH_ID_ATTR, SWITCH_GROUP_ID_ATTR],
-                                         msgs=_msgs_for_user)
+    with export_profiler.stage("get_keyframe_lists", keyframes="audio switches"):
+        switchKeyframes = get_keyframe_lists(AUDIO_NODE_NAME, [],
+                                             time_scale=time_scale,
+                                             attrs_with_variants_names=[],
+                                             variant_suffix_start=VARIANT_ATTR_SUFFIX_START_INDEX,
+                                             enum_attrs=[SWITCH_ID_ATTR, SWITCH_GROUP_ID_ATTR],
+                                             msgs=_msgs_for_user)
 
     if audioKeyframes:
-        je.load_audio_to_globals()
+        with export_profiler.stage("load_audio_to_globals"):
+            je.load_audio_to_globals()
 
     if len(cmds.ls(dataNodeName)) == 0:
         msg = "No '%s' available for export (check rig reference)" % dataNodeName
@@ -704,16 +795,19 @@ def export_robot_anim(export_path=None, package_output=True, all_clips=False,
 
     num_clips = len(clip_info)
     for idx in range(num_clips):
+        clip_name = clip_info[idx].get(CLIP_NAME_KEY)
         try:
-            json_anim_clip = JsonAnimClip(clip_info[idx], {EVENT_GROUPS_ATTR:audioKeyframes,
-                                                           PARAMETERS_ATTR:parameterKeyframes,
-                                                           STATES_ATTR:stateKeyframes,
-                                                           SWITCHES_ATTR:switchKeyframes},
-                                                           eventKeyframes,
-                                                           dataNodeName,
-                                                           time_scale,
-                                                           _msgs_for_user)
-            json_filename = json_anim_clip.export(export_path, show_json)
+            with export_profiler.stage("export_clip", clip=clip_name):
+                with export_profiler.stage("load_anim_data", clip=clip_name):
+                    json_anim_clip = JsonAnimClip(clip_info[idx], {EVENT_GROUPS_ATTR:audioKeyframes,
+                                                                   PARAMETERS_ATTR:parameterKeyframes,
+                                                                   STATES_ATTR:stateKeyframes,
+                                                                   SWITCHES_ATTR:switchKeyframes},
+                                                                   eventKeyframes,
+                                                                   dataNodeName,
+                                                                   time_scale,
+                                                                   _msgs_for_user)
+                json_filename = json_anim_clip.export(export_path, show_json)
         except:
             if idx < len(clip_info) and CLIP_NAME_KEY in clip_info[idx]:
                 clip_name = clip_info[idx][CLIP_NAME_KEY]
@@ -754,7 +848,8 @@ def export_robot_anim(export_path=None, package_output=True, all_clips=False,
         # the clip names were updated by get_clip_info().
         cmds.select(clear=True)
         try:
-            cmds.file(save=True, type='mayaAscii', prompt=False)
+            with export_profiler.stage("save_maya_file"):
+                cmds.file(save=True, type='mayaAscii', prompt=False)
         except (RuntimeError, OSError), e:
             msg = str(e).strip().split(os.linesep)
             add_json_node(node_name="File saving",
@@ -768,7 +863,8 @@ def export_robot_anim(export_path=None, package_output=True, all_clips=False,
     if package_output and output_files:
         # Create an export package (.tar file) that contains exported .json files
         # and potentially the .ma scene file and a playblast .mov file.
-        create_export_package(output_files)
+        with export_profiler.stage("create_export_package"):
+            create_export_package(output_files)
 
     if output_files:
         print(os.linesep + "The following files were exported:")
@@ -0,0 +1,280 @@
+"""
+Timing instrumentation for the robot animation exporter.
+
+When profiling is enabled (see PROFILE_EXPORT_ENV_VAR), each stage of an
+export is timed along with the number of Maya commands that it ran, and the
+results are written to a trace file in the Chrome trace event format, which
+can be opened in chrome://tracing (or https://ui.perfetto.dev) to see where
+the time of an export went, clip by clip.
+
+Code that should show up in the trace wraps itself in a stage:
+
+    with export_profiler.stage("fill_audio_data", clip=clip_name):
+        ...
+
+which does nothing unless a profiler was started with start_profiling().
+"""
+
+# Set this to "true" to time the stages of each export and write a trace file
+PROFILE_EXPORT_ENV_VAR = "PROFILE_EXPORT"
+
+TRACE_FILE_SUFFIX = "_export_trace.json"
+DEFAULT_TRACE_NAME = "untitled"
+
+TRACE_CATEGORY = "export"
+TRACE_PROCESS_NAME = "Maya robot anim export"
+
+MAYA_CMDS_ARG = "maya_cmds"
+
+SUMMARY_NUM_STAGES = 6
+SUMMARY_NUM_MAYA_CMDS = 5
+
+
+import os
+import json
+import time
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import maya.cmds as cmds
+except ImportError:
+    cmds = None
+
+
+_profiler = None
+
+
+def _to_microseconds(seconds):
+    return int(round(seconds * 1000000))
+
+
+class MayaCommandCounter(object):
+    """
+    Counts the calls to (and the time spent in) each maya.cmds command
+    by wrapping the commands in that module while it is installed.
+    """
+
+    def __init__(self, cmds_module=None):
+        self.cmds_module = cmds if cmds_module is None else cmds_module
+        self.total = 0
+        self.counts = {}
+        self.times = {}
+        self._originals = {}
+
+    def _wrap(self, name, func):
+        def counted_cmd(*args, **kwargs):
+            start_time = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.times[name] = self.times.get(name, 0.0) + time.time() - start_time
+                self.counts[name] = self.counts.get(name, 0) + 1
+                self.total += 1
+        counted_cmd.__name__ = name
+        counted_cmd.__doc__ = func.__doc__
+        return counted_cmd
+
+    def install(self):
+        if self.cmds_module is None or self._originals:
+            return
+        for name in dir(self.cmds_module):
+            if name.startswith("_"):
+                continue
+            func = getattr(self.cmds_module, name)
+            if callable(func) and not isinstance(func, type):
+                self._originals[name] = func
+                setattr(self.cmds_module, name, self._wrap(name, func))
+
+    def uninstall(self):
+        for name, func in self._originals.iteritems():
+            setattr(self.cmds_module, name, func)
+        self._originals = {}
+
+    def get_most_called(self, num_cmds=None):
+        """
+        Returns a list of (command name, number of calls, total seconds)
+        tuples, with the most frequently called commands first.
+        """
+        most_called = [(name, count, self.times.get(name, 0.0))
+                       for name, count in self.counts.iteritems()]
+        most_called.sort(key=lambda cmd: (-cmd[1], cmd[0]))
+        return most_called[:num_cmds]
+
+
+class ExportProfiler(object):
+    """
+    Records the start time and duration of each (possibly nested) export
+    stage, along with the number of Maya commands run during that stage.
+    """
+
+    def __init__(self, count_maya_cmds=True, cmds_module=None):
+        self.events = []
+        self.start_time = None
+        self.end_time = None
+        self._depth = 0
+        self._pid = os.getpid()
+        self._maya_cmds = MayaCommandCounter(cmds_module) if count_maya_cmds else None
+
+    def start(self):
+        self.start_time = time.time()
+        self.end_time = None
+        if self._maya_cmds:
+            self._maya_cmds.install()
+
+    def stop(self):
+        if self._maya_cmds:
+            self._maya_cmds.uninstall()
+        self.end_time = time.time()
+
+    def get_duration(self):
+        end_time = time.time() if self.end_time is None else self.end_time
+        return end_time - self.start_time
+
+    def get_maya_cmd_count(self):
+        return self._maya_cmds.total if self._maya_cmds else 0
+
+    @contextmanager
+    def stage(self, name, category=TRACE_CATEGORY, **args):
+        start_time = time.time()
+        start_cmd_count = self.get_maya_cmd_count()
+        depth = self._depth
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._maya_cmds:
+                args[MAYA_CMDS_ARG] = self.get_maya_cmd_count() - start_cmd_count
+            self.events.append({"name": name, "cat": category, "start": start_time,
+                                "dur": time.time() - start_time, "depth": depth, "args": args})
+
+    def get_trace(self):
+        """
+        Returns the recorded stages as a dictionary in the Chrome trace event format.
+        """
+        trace_events = [{"name": "process_name", "ph": "M", "pid": self._pid, "tid": 0,
+                         "args": {"name": TRACE_PROCESS_NAME}}]
+        for event in sorted(self.events, key=lambda event: (event["start"], event["depth"])):
+            trace_events.append({"name": event["name"], "cat": event["cat"], "ph": "X",
+                                 "ts": _to_microseconds(event["start"] - self.start_time),
+                                 "dur": _to_microseconds(event["dur"]),
+                                 "pid": self._pid, "tid": 0, "args": event["args"]})
+        trace = {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+        if self._maya_cmds:
+            trace["otherData"] = {MAYA_CMDS_ARG: dict((name, count) for name, count, seconds
+                                                      in self._maya_cmds.get_most_called())}
+        return trace
+
+    def write_trace(self, trace_file):
+        with open(trace_file, 'w') as fh:
+            json.dump(self.get_trace(), fh, indent=1, sort_keys=True)
+        return trace_file
+
+    def get_stage_totals(self, depth=None):
+        """
+        Returns a list of (stage name, total seconds, number of times run,
+        number of Maya commands) tuples, with the slowest stages first. If
+        'depth' is provided, only stages at that level of nesting are included.
+        """
+        totals = {}
+        for event in self.events:
+            if depth is not None and event["depth"] != depth:
+                continue
+            seconds, count, cmd_count = totals.get(event["name"], (0.0, 0, 0))
+            totals[event["name"]] = (seconds + event["dur"], count + 1,
+                                     cmd_count + event["args"].get(MAYA_CMDS_ARG, 0))
+        stage_totals = [(name,) + total for name, total in totals.iteritems()]
+        stage_totals.sort(key=lambda total: (-total[1], total[0]))
+        return stage_totals
+
+    def get_summary(self, trace_file=None, num_stages=SUMMARY_NUM_STAGES,
+                    num_maya_cmds=SUMMARY_NUM_MAYA_CMDS):
+        """
+        Returns a list of lines that summarize where the time of the export went.
+        """
+        duration = self.get_duration()
+        summary = ["Export took %.2f s" % duration]
+        if self._maya_cmds:
+            summary[0] += " and ran %s Maya commands" % self.get_maya_cmd_count()
+        for title, depth in [("Export stages", 0), ("Slowest sub-stages", 1)]:
+            stage_totals = self.get_stage_totals(depth)[:num_stages]
+            if stage_totals:
+                summary.append("%s:" % title)
+            for name, seconds, count, cmd_count in stage_totals:
+                line = "  %s: %.2f s (%d%%)" % (name, seconds, round(100.0 * seconds / (duration or 1.0)))
+                if count > 1:
+                    line += " over %s calls" % count
+                if self._maya_cmds:
+                    line += ", %s Maya commands" % cmd_count
+                summary.append(line)
+        if self._maya_cmds and self._maya_cmds.total:
+            summary.append("Most called Maya commands:")
+            for name, count, seconds in self._maya_cmds.get_most_called(num_maya_cmds):
+                summary.append("  %s: %s calls (%.2f s)" % (name, count, seconds))
+        if trace_file:
+            summary.append("Trace file (open in chrome://tracing): %s" % trace_file)
+        return summary
+
+
+def is_profiling_enabled(env_var=PROFILE_EXPORT_ENV_VAR):
+    profile_env_var = os.getenv(env_var)
+    return bool(profile_env_var) and profile_env_var.lower() in ["true", "1"]
+
+
+def get_trace_file(scene_file=None, trace_dir=None):
+    """
+    Returns the path of the trace file for a Maya scene, which is written
+    to the temp directory (rather than the export directory) by default.
+    """
+    name = os.path.splitext(os.path.basename(scene_file or ""))[0] or DEFAULT_TRACE_NAME
+    return os.path.join(trace_dir or tempfile.gettempdir(), name + TRACE_FILE_SUFFIX)
+
+
+def get_profiler():
+    return _profiler
+
+
+def start_profiling(count_maya_cmds=True):
+    global _profiler
+    _profiler = ExportProfiler(count_maya_cmds)
+    _profiler.start()
+    return _profiler
+
+
+def stop_profiling():
+    global _profiler
+    profiler = _profiler
+    _profiler = None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+@contextmanager
+def stage(name, category=TRACE_CATEGORY, **args):
+    """
+    Times the code in this context as an export stage if profiling was
+    started, or else does nothing.
+    """
+    if _profiler is None:
+        yield
+    else:
+        with _profiler.stage(name, category, **args):
+            yield
+
+
+if __name__ == "__main__":
+    # Show an example trace without Maya
+    profiler = start_profiling(count_maya_cmds=False)
+    with stage("get_keyframe_lists"):
+        time.sleep(0.02)
+    for clip_name in ["anim_example_01", "anim_example_02"]:
+        with stage("export_clip", clip=clip_name):
+            with stage("load_anim_data", clip=clip_name):
+                time.sleep(0.01)
+            with stage("fill_movement_data", clip=clip_name):
+                time.sleep(0.03)
+    stop_profiling()
+    trace_file = profiler.write_trace(get_trace_file())
+    print(os.linesep.join(profiler.get_summary(trace_file)))
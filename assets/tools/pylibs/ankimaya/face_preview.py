@@ -1,9 +1,11 @@
 
 
-# The following time to sleep between each displayed image is a rough
-# estimate to help achieve close to 30 frames-per-second.
-# TODO: Measure times to get more precise values for these times.
-SLEEP_TIME_BETWEEN_DISPLAY_SEC = 0.03
+# Memory limit for the face images that are kept for instant redisplay
+FRAME_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Number of frames that are drawn in the background ahead of playback
+# (or on either side of the displayed frame when stepping through frames)
+PREFETCH_FRAME_COUNT = 30
 
 INVALID_FRAME_RANGE_MSG = "Invalid frame range provided"
 
@@ -57,9 +59,19 @@ except ImportError:
 
 from ankimaya.constants import DATA_NODE_NAME
 from ankimaya.export_for_robot import FLOAT_EQUALITY_TOLERANCE
-from ankimaya import game_exporter, anim_data_manager, robot_data
-from ankibasestation import face_images
-from ankimaya.interpolation_manager import find_value_for_frame
+from ankimaya import game_exporter, anim_data_manager, robot_data, audio_core
+from ankimaya.scene_callbacks import addAnimCurveChangedCallback, removeAnimCurveChangedCallback
+from ankiutils.face_frame_cache import FaceFrameCache, FramePrefetcher
+
+from ankiutils import proc_face
+
+try:
+    from ankibasestation import face_images
+except ImportError:
+    # Without ankibasestation, saved faces are also drawn with proc_face
+    face_images = None
+from ankiutils.playback_scheduler import PlaybackScheduler
+from ankimaya.interpolation_manager import interpolate_values
 
 
 mayaMainWindowPtr = omui.MQtUtil.mainWindow()
@@ -181,6 +193,8 @@ class FacePreview(QWidget):
         self.setParent(mayaMainWindow)
         self.setWindowFlags(Qt.Window)
         self.resetCache()
+        self.resetClipCache()
+        self._callbackIds = addAnimCurveChangedCallback(self.resetClipCache)
         self.animWidgets = []
         self.settingsWidget = None
         self.displayWidget = None
@@ -210,6 +224,13 @@ class FacePreview(QWidget):
     def resetCache(self):
         self._keyframeCache = {}
 
+    def resetClipCache(self, *args):
+        """
+        Clears the procedural face keyframes that are kept for each animation
+        clip, which is done whenever keys are edited or a scene is opened.
+        """
+        self._clipCache = {}
+
     def eventFilter(self, obj, event):
         """
         Event filter to clear the cache of procedural face keyframes
@@ -224,7 +245,10 @@ class FacePreview(QWidget):
         Remove the event filter
         """
         self.removeEventFilter(self)
+        removeAnimCurveChangedCallback(self._callbackIds)
         self.resetCache()
+        self.resetClipCache()
+        self.displayWidget.stopPrefetching()
         return super(FacePreview, self).closeEvent(e)
 
     def initUI(self):
@@ -288,26 +312,34 @@ class FacePreview(QWidget):
         frameNums.sort()
 
         for currAttr, frameData in animData.iteritems():
-            if not robot_data.is_procedural_face_attr(currAttr):
+            if not robot_data.is_procedural_face_attr(currAttr) or not frameData:
                 continue
+            # If the current attribute is not keyed at some of the frames, then use the
+            # interpolated value of that attribute at those frames (from the keys that
+            # were already queried, so Maya is not queried again for every frame)...
+            keyedFrames = sorted(frameData.keys())
+            frameValues = interpolate_values(frameNums, keyedFrames, [frameData[x] for x in keyedFrames])
             for idx in range(len(frameNums)):
                 thisFrame = frameNums[idx]
                 if idx > 0 and abs(thisFrame - frameNums[idx-1]) <= FLOAT_EQUALITY_TOLERANCE:
                     continue
-                try:
-                    frameValue = frameData[thisFrame]
-                except KeyError:
-                    # If the current attribute is not keyed at the current frame number, then
-                    # get the interpolated value of that attribute at the current frame...
-                    frameValue = find_value_for_frame(thisFrame, frameNums, dataNodeName + '.' + currAttr)
+                frameValue = frameData.get(thisFrame, frameValues[idx])
                 robot_data.add_procedural_face_keyframe(currAttr, thisFrame, 0, frameValue,
                                                         (clipStart + thisFrame),
                                                         dataNodeName, procFaceKeyframes,
-                                                        fill_new_frame_with_interpolated_values=False,
-                                                        frame_nums=frameNums)
+                                                        fill_new_frame_with_interpolated_values=False)
         return procFaceKeyframes
 
-    def getProcFaceKeyframes(self, frameNum):
+    def getClipProcFaceKeyframes(self, frameNum):
+        """
+        Returns a tuple of (clip name, dict of all procedural face keyframes in
+        that clip) for the animation clip that this frame is a part of. Those
+        are kept for each clip until keys are edited, so scrubbing through a
+        clip does not query the clips and keyframes again for every frame.
+        """
+        for (clipStart, clipEnd), clipKeyframes in self._clipCache.iteritems():
+            if frameNum >= clipStart and frameNum <= clipEnd:
+                return clipKeyframes
         animClip = getAnimClip(frameNum)
         if not animClip:
             raise ValueError("Frame %s is not part of any existing animation clips" % frameNum)
@@ -316,20 +348,39 @@ class FacePreview(QWidget):
                                                              animClip[CLIP_END_KEY])
         except ValueError, e:
             cmds.warning("Failed to query the procedural face keyframes because: %s" % e)
+            return (animClip[CLIP_NAME_KEY], None)
+        clipKeyframes = (animClip[CLIP_NAME_KEY], procFaceKeyframes)
+        self._clipCache[(animClip[CLIP_START_KEY], animClip[CLIP_END_KEY])] = clipKeyframes
+        return clipKeyframes
+
+    def getClipFrameRange(self, frameNum):
+        """
+        Returns a tuple of (clip start, clip end) for the animation clip that
+        this frame is a part of, if getClipProcFaceKeyframes() already found
+        that clip, or else (None, None).
+        """
+        for clipStart, clipEnd in self._clipCache:
+            if frameNum >= clipStart and frameNum <= clipEnd:
+                return (clipStart, clipEnd)
+        return (None, None)
+
+    def getProcFaceKeyframes(self, frameNum):
+        clipName, procFaceKeyframes = self.getClipProcFaceKeyframes(frameNum)
+        if procFaceKeyframes is None:
             return (None, None, None)
         lastKeyframe = None
 
         for triggerTime, keyframe in sorted(procFaceKeyframes.iteritems()):
             if frameNum == triggerTime:
-                return (animClip[CLIP_NAME_KEY], keyframe, None)
+                return (clipName, keyframe, None)
             elif frameNum < triggerTime:
-                return (animClip[CLIP_NAME_KEY], lastKeyframe, keyframe)
+                return (clipName, lastKeyframe, keyframe)
             else:
                 # frameNum > triggerTime
                 lastKeyframe = keyframe
 
         #raise ValueError("Unable to locate keyframe at frame %s or two keyframes around that" % frameNum)
-        return (animClip[CLIP_NAME_KEY], lastKeyframe, None)
+        return (clipName, lastKeyframe, None)
 
     def addBottomButtons(self):
         self.bottomBtns = QGridLayout(self)
@@ -468,6 +519,10 @@ class FacePreviewDisplay(QWidget):
 
     updateTimeslider = True
 
+    # Set this to True to play the audio events in the frame range along with the
+    # face (off by default, so previewing a face does not unexpectedly play sound)
+    playAudio = False
+
     def __init__(self, parent, settingsWidget, *args, **kwargs):
         super(FacePreviewDisplay,self).__init__(*args, **kwargs)
         self.setParent(parent)
@@ -475,10 +530,38 @@ class FacePreviewDisplay(QWidget):
         self.currentFrame = None
         self.isPlaying = False
         self.abortPlaying = False
+        # Frames are drawn in memory with proc_face (the background thread only
+        # draws NumPy arrays, which showImage() converts to QImages)
+        self.frameCache = FaceFrameCache(FRAME_CACHE_MAX_BYTES)
+        self.prefetcher = FramePrefetcher(self.frameCache)
         currentDir = os.path.dirname(__file__)
         self.preview_ui_file = QFile(os.path.join(currentDir, DISPLAY_UI_FILE))
         self.initUI()
 
+    def stopPrefetching(self):
+        self.prefetcher.stop()
+
+    def prefetch(self, clipName, keyframes, frameNums, clipStart, clipEnd):
+        """
+        Draws the provided frames in the background, skipping any that are
+        outside of the clip's frame range.
+        """
+        frameNums = [x for x in frameNums if x >= clipStart and x <= clipEnd]
+        self.prefetcher.request(clipName, keyframes, frameNums)
+
+    def showImage(self, image):
+        """
+        Displays a face image (a QImage or a height x width x 3 RGB array).
+        """
+        if not isinstance(image, QImage):
+            height, width = image.shape[:2]
+            image = QImage(image.tobytes(), width, height, width * 3, QImage.Format_RGB888)
+        pixmap = QPixmap.fromImage(image)
+        label = self.ui.displayLabel
+        label.setPixmap(pixmap.scaled(label.width(), label.height(), Qt.KeepAspectRatio,
+                                      Qt.SmoothTransformation))
+        label.repaint()
+
     def setCurrentFrame(self, frameNum):
         try:
             self.currentFrame = int(frameNum)
@@ -538,20 +621,30 @@ class FacePreviewDisplay(QWidget):
             button.setDefault(True)
 
     def reset(self):
+        self.parent().resetClipCache()
         frameNum = cmds.currentTime(query=True)
         self.draw(frameNum)
         self._focusOnButton(self.ui.reset)
 
     def draw(self, frameNum):
         try:
-            animName, keyframeBefore, keyframeAfter = self.parent().getProcFaceKeyframes(frameNum)
+            clipName, keyframes = self.parent().getClipProcFaceKeyframes(frameNum)
         except ValueError, e:
             cmds.warning(str(e))
             return None
-        if keyframeBefore is None and keyframeAfter is None:
+        if not keyframes:
             return None
-        keyframes = selectKeyframesUsingFrameNum(frameNum, keyframeBefore, keyframeAfter)
-        self._displayImages(keyframes, frameNum, frameNum)
+        self.showImage(self.frameCache.get_frame(clipName, keyframes, frameNum))
+
+        # Draw the frames on either side of this one in the background,
+        # so stepping or scrubbing through them is instant.
+        clipStart, clipEnd = self.parent().getClipFrameRange(frameNum)
+        if clipStart is None:
+            return None
+        nearbyFrames = []
+        for offset in range(1, PREFETCH_FRAME_COUNT + 1):
+            nearbyFrames.extend([frameNum + offset, frameNum - offset])
+        self.prefetch(clipName, keyframes, nearbyFrames, clipStart, clipEnd)
 
     def play(self):
         # This function may only PLAY the frames indicated in the UI, but it
@@ -584,34 +677,41 @@ class FacePreviewDisplay(QWidget):
 
         # Toggle the local playback settings before/after displaying the images.
         self.isPlaying = True
-        self._displayImages(keyframes, target, endFrame, self.abortPlay)
+        self._displayImages(clipName, keyframes, target, endFrame, clipStart, clipEnd,
+                            self.abortPlay)
         self.isPlaying = False
         self.abortPlaying = False
 
     def abortPlay(self):
         return self.abortPlaying
 
-    def _displayImages(self, keyframes, startFrame, endFrame, abortCallback=None):
-        startTime = time.time()
+    def _displayImages(self, clipName, keyframes, startFrame, endFrame, clipStart, clipEnd,
+                       abortCallback=None):
+        frameNums = [startFrame + x for x in range(int(math.floor(endFrame - startFrame)) + 1)]
 
-        frameRange = face_images.process_face_images(keyframes, startFrame, endFrame,
-                                        allow_non_integer_frames=True,
-                                        face_image_callback=face_images.draw_images,
-                                        abort_callback=abortCallback,
-                                        callback_args={"display_label":self.ui.displayLabel,
-                                                       "q_app":qApp,
-                                                       "sleep_at_end":SLEEP_TIME_BETWEEN_DISPLAY_SEC,
-                                                       "frame_time_callback":self.setCurrentFrame})
+        def drawFrame(idx):
+            # Keep the background thread drawing the frames that are coming up
+            self.prefetch(clipName, keyframes, frameNums[idx+1:idx+1+PREFETCH_FRAME_COUNT],
+                          clipStart, clipEnd)
+            self.showImage(self.frameCache.get_frame(clipName, keyframes, frameNums[idx]))
+            self.setCurrentFrame(frameNums[idx])
 
-        endTime = time.time()
-        try:
-            numImages = frameRange.index(self.currentFrame) - frameRange.index(startFrame) + 1
-        except ValueError:
-            return None
-        if numImages > 1:
-            frameRate = numImages / (endTime-startTime)
-            print("The %s images were played at an approximate frame rate of %0.2f fps"
-                  % (numImages, frameRate))
+        self.playFrames(frameNums, drawFrame, abortCallback)
+        self.prefetcher.cancel()
+
+    def playFrames(self, frameNums, drawCallback, abortCallback=None):
+        """
+        Calls drawCallback(index into frameNums) for each frame on the robot's
+        frame clock, dropping frames if drawing falls behind, and plays the
+        audio events in that frame range in sync with them.
+        """
+        scheduler = PlaybackScheduler()
+        if self.playAudio and len(frameNums) > 1:
+            audio_core.scheduleAudioEvents(scheduler, frameNums[0], frameNums[-1])
+        stats = scheduler.play(len(frameNums), drawCallback, abortCallback, qApp.processEvents)
+        if stats.frames_shown > 1:
+            print(stats.summary())
+        return stats
 
     def _updateCurrentFrame(self, target, wall, startFrame, endFrame):
         if startFrame is None or endFrame is None:
@@ -759,30 +859,34 @@ class FacePreviewSave(QWidget):
         subDir = tempfile.mkdtemp(prefix="%s_" % animName, dir=subDir)
         print("Saving face image files in: %s" % subDir)
 
-        face_images.process_face_images(keyframes, startFrame, endFrame,
-                                        allow_non_integer_frames=True,
-                                        face_image_callback=face_images.save_images,
-                                        callback_args={"dir":subDir})
+        frameNums = [startFrame + x for x in range(int(math.floor(endFrame - startFrame)) + 1)]
+        if face_images:
+            face_images.process_face_images(keyframes, startFrame, endFrame,
+                                            allow_non_integer_frames=True,
+                                            face_image_callback=face_images.save_images,
+                                            callback_args={"dir":subDir})
+            imageFiles = sorted(glob.glob(os.path.join(subDir, '*')))
+            images = [QImage(x) for x in imageFiles]
+            frameNames = [os.path.splitext(os.path.basename(x))[0] for x in imageFiles]
+            frameNums = [startFrame + x for x in range(len(images))]
+        else:
+            images = self.displayWidget.frameCache.get_frames(animName, keyframes, frameNums)
+            for frameNum, image in zip(frameNums, images):
+                if float(frameNum).is_integer():
+                    frameName = "%05d" % frameNum
+                else:
+                    frameName = str(frameNum)
+                proc_face.write_png(os.path.join(subDir, "%s_%s.png" % (animName, frameName)), image)
+            frameNames = frameNums
 
         self.ui.result.setText(subDir)
 
-        imageFiles = glob.glob(os.path.join(subDir, '*'))
-        imageFiles.sort()
-        startTime = time.time()
-        for imageFile in imageFiles:
-            #print("Showing %s" % imageFile)
-            self.displayWidget.ui.displayLabel.setPixmap(QPixmap(imageFile))
-            self.displayWidget.ui.displayLabel.repaint()
-            qApp.processEvents()
-            fileName = os.path.splitext(os.path.basename(imageFile))[0]
-            self.displayWidget.setCurrentFrame(fileName)
-            time.sleep(SLEEP_TIME_BETWEEN_DISPLAY_SEC)
-        endTime = time.time()
-        numImages = len(imageFiles)
-        if numImages > 1:
-            frameRate = numImages / (endTime-startTime)
-            print("The %s images saved to disk were played at an approximate frame rate of %0.2f fps"
-                  % (numImages, frameRate))
+        # Show the saved images from memory rather than reloading each file as it is shown
+        def drawFrame(idx):
+            self.displayWidget.showImage(images[idx])
+            self.displayWidget.setCurrentFrame(frameNames[idx])
+
+        self.displayWidget.playFrames(frameNums, drawFrame)
 
     def openFolder(self):
         dirPath = self.ui.result.text()
@@ -1,56 +1,176 @@
-import maya.cmds as mc
+"""
+Keyframe interpolation on sorted lists of frame numbers (or times) and values.
 
+Neighbouring keys are found with bisect (or numpy, which samples a whole range
+of frames in one call when it is available), so sampling is O(log keys) per
+sample instead of scanning the whole list. Only the functions that take a
+Maya attribute query Maya, and those query each curve once, so everything else
+can be used and tested without Maya.
+"""
 
-def find_value_for_frame(current_frame, all_frames, ctr_attr):
-    """
-    Finds what value should be assigned to a frame based on
-    linear interpolation. This function assumes that the
-    provided list of frame numbers is sorted.
-    """
-    # In case there is no last or first frame, the frame is the same as first or last
-    if current_frame >= max(all_frames):
-        return mc.getAttr(ctr_attr, time=max(all_frames))
-    elif current_frame <= min(all_frames):
-        return mc.getAttr(ctr_attr, time=min(all_frames))
-    else:
-        prev_frame = get_closest_prev_frame(current_frame, all_frames)
-        next_frame = get_closest_next_frame(current_frame, all_frames)
-        frame_delta = next_frame - prev_frame
-        prev_value = mc.getAttr(ctr_attr, time=prev_frame)
-        next_value = mc.getAttr(ctr_attr, time=next_frame)
-        value_delta = next_value - prev_value
-        current_value = prev_value + (current_frame - prev_frame) * (value_delta / frame_delta)
-        return current_value
+# The robot linearly interpolates between keyframes, but some tracks (eg. events)
+# hold the value of the previous keyframe until the next one
+LINEAR_MODE = "linear"
+STEP_MODE = "step"
+INTERPOLATION_MODES = [LINEAR_MODE, STEP_MODE]
+
+
+import bisect
+
+from ankimaya.constants import FLOAT_EQUALITY_TOLERANCE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import maya.cmds as mc
+except ImportError:
+    mc = None
+
+
+def _check_mode(mode):
+    if mode not in INTERPOLATION_MODES:
+        raise ValueError("Unsupported interpolation mode '%s' (use one of %s)"
+                         % (mode, INTERPOLATION_MODES))
 
 
 def get_closest_prev_frame(current_frame, frames_list):
     """
     Returns the frame that's closest to the frame provided in
-    the list of frames (favor previous)
+    the sorted list of frames (favor previous). Frames before
+    the first frame return the first frame.
     """
-    for i, frame_num in enumerate(frames_list):
-        if frame_num == current_frame:
-            return current_frame
-        elif frame_num > current_frame:
-            if i == 0:
-                return frames_list[i]
-            else:
-                return frames_list[i-1]
-    return min(frames_list)
+    idx = bisect.bisect_right(frames_list, current_frame) - 1
+    return frames_list[max(idx, 0)]
 
 
 def get_closest_next_frame(current_frame, frames_list):
     """
     Returns the frame that's closest to the frame provided in
-    the list of frames (favor next)
-    """
-    for i in range(len(frames_list) - 1, -1, -1):
-        frame_num = frames_list[i]
-        if frame_num == current_frame:
-            return current_frame
-        elif frame_num < current_frame:
-            if i == (len(frames_list) - 1):
-                return frames_list[i]
-            else:
-                return frames_list[i+1]
-    return max(frames_list)
\ No newline at end of file
+    the sorted list of frames (favor next). Frames after the
+    last frame return the last frame.
+    """
+    idx = bisect.bisect_left(frames_list, current_frame)
+    return frames_list[min(idx, len(frames_list) - 1)]
+
+
+def interpolate_value(current_frame, frames, values, mode=LINEAR_MODE):
+    """
+    Returns the value at a frame given the sorted list of keyed frames and
+    their values. Frames before the first key or after the last key get the
+    value of that key.
+    """
+    _check_mode(mode)
+    if not frames:
+        raise ValueError("Unable to interpolate without any keyframes")
+    if current_frame <= frames[0]:
+        return values[0]
+    if current_frame >= frames[-1]:
+        return values[-1]
+    idx = bisect.bisect_right(frames, current_frame) - 1
+    if mode == STEP_MODE or frames[idx] == current_frame:
+        return values[idx]
+    prev_frame, next_frame = frames[idx], frames[idx+1]
+    prev_value, next_value = values[idx], values[idx+1]
+    return prev_value + (current_frame - prev_frame) * (next_value - prev_value) / float(next_frame - prev_frame)
+
+
+def interpolate_values(sample_frames, frames, values, mode=LINEAR_MODE):
+    """
+    Returns the list of values at all of the provided sample frames given
+    the sorted list of keyed frames and their values (see interpolate_value).
+    """
+    _check_mode(mode)
+    if not frames:
+        raise ValueError("Unable to interpolate without any keyframes")
+    if np is None:
+        return [interpolate_value(x, frames, values, mode) for x in sample_frames]
+    samples = np.asarray(sample_frames, dtype=np.float64)
+    frames = np.asarray(frames, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if mode == STEP_MODE:
+        indices = np.searchsorted(frames, samples, side="right") - 1
+        return values[np.clip(indices, 0, len(values) - 1)].tolist()
+    return np.interp(samples, frames, values).tolist()
+
+
+def _collapse_close_run(run, tolerance):
+    """
+    Returns what is left of a sorted run of keyframes, where each keyframe is
+    closer than the tolerance to the one before it, after pairwise passes.
+    """
+    if len(run) < 3:
+        return run[:1]
+    # A pass over the run merges each pair of neighbours into its first keyframe,
+    # which leaves every other keyframe, and the rest of the passes only change
+    # the parts of that which are still runs of close keyframes.
+    return _merge_sorted_keyframes(run[::2], tolerance)
+
+
+def _merge_sorted_keyframes(keyframes, tolerance):
+    reduced_keyframes = []
+    run = [keyframes[0]]
+    for keyframe in keyframes[1:]:
+        if (keyframe - run[-1]) < tolerance:
+            run.append(keyframe)
+        else:
+            reduced_keyframes.extend(_collapse_close_run(run, tolerance))
+            run = [keyframe]
+    reduced_keyframes.extend(_collapse_close_run(run, tolerance))
+    return reduced_keyframes
+
+
+def merge_close_keyframes(keyframes, tolerance=FLOAT_EQUALITY_TOLERANCE):
+    """
+    Returns the sorted list of keyframes without close keyframes, the same as
+    making pairwise passes over them (where the second of two neighbours that
+    are closer than the tolerance is removed) until no two neighbours are that
+    close, as AnimDataManager.remove_close_keyframes() was used. Instead of
+    passing over the whole list each time, the keyframes are split into runs of
+    close keyframes in one pass and each run is collapsed on its own, halving
+    it with each pass, so the work is linear in the number of keyframes.
+    """
+    if not keyframes:
+        return []
+    return _merge_sorted_keyframes(sorted(keyframes), tolerance)
+
+
+def get_attr_values(ctr_attr, frames):
+    """
+    Returns the list of values of a Maya attribute at the provided frames.
+    """
+    return [mc.getAttr(ctr_attr, time=frame_num) for frame_num in frames]
+
+
+def sample_curve(ctr_attr, key_frames, sample_frames, mode=LINEAR_MODE):
+    """
+    Returns the list of values of a Maya attribute at every sample frame,
+    where Maya is only queried at the (sorted) key frames of that attribute
+    and the values in between are interpolated.
+    """
+    if not key_frames:
+        return []
+    return interpolate_values(sample_frames, key_frames, get_attr_values(ctr_attr, key_frames), mode)
+
+
+def find_value_for_frame(current_frame, all_frames, ctr_attr, mode=LINEAR_MODE):
+    """
+    Finds what value should be assigned to a frame based on
+    linear interpolation. This function assumes that the
+    provided list of frame numbers is sorted. Use sample_curve()
+    to get the values of many frames of the same attribute.
+    """
+    _check_mode(mode)
+    # In case there is no last or first frame, the frame is the same as first or last
+    if current_frame >= all_frames[-1]:
+        return mc.getAttr(ctr_attr, time=all_frames[-1])
+    elif current_frame <= all_frames[0]:
+        return mc.getAttr(ctr_attr, time=all_frames[0])
+    prev_frame = get_closest_prev_frame(current_frame, all_frames)
+    if prev_frame == current_frame or mode == STEP_MODE:
+        return mc.getAttr(ctr_attr, time=prev_frame)
+    next_frame = get_closest_next_frame(current_frame, all_frames)
+    return interpolate_value(current_frame, [prev_frame, next_frame],
+                             get_attr_values(ctr_attr, [prev_frame, next_frame]))
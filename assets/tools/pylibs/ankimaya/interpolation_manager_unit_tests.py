@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Headless unit tests for merge_close_keyframes() in interpolation_manager.py,
+which replaced calling AnimDataManager.remove_close_keyframes() until the list
+of keyframes stopped changing. Those tests compare the two on randomized lists
+of keyframes (including runs of close keyframes that span several times the
+tolerance), so they can be run without Maya:
+
+    python ankimaya/interpolation_manager_unit_tests.py
+"""
+
+NUM_RANDOM_CASES = 5000
+MAX_NUM_FRAMES = 40
+MAX_SUB_FRAME_KEYS = 6
+MAX_OFFSET_TOLERANCES = 6
+RANDOM_SEED = 1234
+
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ankimaya.constants import FLOAT_EQUALITY_TOLERANCE
+from ankimaya.interpolation_manager import merge_close_keyframes
+
+
+def remove_close_keyframes(keyframes, tolerance=FLOAT_EQUALITY_TOLERANCE):
+    """
+    One pass of the old pairwise merge (AnimDataManager.remove_close_keyframes())
+    """
+    reduced_keyframes = []
+    idx = 0
+    while idx < len(keyframes):
+        first = keyframes[idx]
+        try:
+            second = keyframes[idx + 1]
+        except IndexError:
+            reduced_keyframes.append(first)
+            break
+        reduced_keyframes.append(first)
+        if (second - first) < tolerance:
+            idx += 2
+        else:
+            idx += 1
+    return reduced_keyframes
+
+
+def remove_multiple_close_keyframes(keyframes, tolerance=FLOAT_EQUALITY_TOLERANCE):
+    """
+    The old fixpoint that merge_close_keyframes() replaced
+    """
+    initial_keyframes = keyframes
+    while True:
+        reduced_keyframes = remove_close_keyframes(initial_keyframes, tolerance)
+        if reduced_keyframes == initial_keyframes:
+            return reduced_keyframes
+        initial_keyframes = reduced_keyframes
+
+
+def get_random_keyframes(rng, max_offset):
+    """
+    Returns a sorted list of whole frames, each of which may be followed by
+    a few sub-frame keys that are less than max_offset after that frame.
+    """
+    keyframes = set()
+    for frame_num in rng.sample(range(MAX_NUM_FRAMES), rng.randint(0, MAX_NUM_FRAMES)):
+        keyframes.add(float(frame_num))
+        for idx in range(rng.randint(0, MAX_SUB_FRAME_KEYS)):
+            keyframes.add(frame_num + rng.uniform(0, max_offset))
+    return sorted(keyframes)
+
+
+class MergeCloseKeyframesTest(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(merge_close_keyframes([]), [])
+        self.assertEqual(merge_close_keyframes(None), [])
+
+    def test_unsorted(self):
+        self.assertEqual(merge_close_keyframes([3.0, 1.0, 1.01, 2.0]), [1.0, 2.0, 3.0])
+
+    def test_long_runs(self):
+        # Pairwise passes collapse these runs into their first keyframe, even
+        # though the last keyframe is farther than the tolerance from it.
+        self.assertEqual(merge_close_keyframes([0, 0.01, 0.04, 0.08]), [0])
+        self.assertEqual(merge_close_keyframes([0, 0.04, 0.045, 0.09]), [0])
+        self.assertEqual(merge_close_keyframes([0, 0.04, 0.08, 0.12, 0.16]), [0, 0.08, 0.16])
+
+    def test_matches_old_fixpoint(self):
+        rng = random.Random(RANDOM_SEED)
+        for num_tolerances in range(1, MAX_OFFSET_TOLERANCES + 1):
+            for idx in range(NUM_RANDOM_CASES // MAX_OFFSET_TOLERANCES):
+                keyframes = get_random_keyframes(rng, num_tolerances * FLOAT_EQUALITY_TOLERANCE)
+                self.assertEqual(merge_close_keyframes(keyframes),
+                                 remove_multiple_close_keyframes(keyframes), keyframes)
+
+    def test_matches_old_fixpoint_for_chains(self):
+        # Evenly spaced chains of close keyframes, which take the most passes
+        rng = random.Random(RANDOM_SEED)
+        for idx in range(NUM_RANDOM_CASES // 10):
+            step = rng.uniform(0.001, FLOAT_EQUALITY_TOLERANCE)
+            keyframes = [x * step for x in range(rng.randint(1, 200))]
+            self.assertEqual(merge_close_keyframes(keyframes),
+                             remove_multiple_close_keyframes(keyframes), keyframes)
+
+    def test_no_close_keyframes_left(self):
+        rng = random.Random(RANDOM_SEED)
+        for idx in range(NUM_RANDOM_CASES):
+            keyframes = get_random_keyframes(rng, MAX_OFFSET_TOLERANCES * FLOAT_EQUALITY_TOLERANCE)
+            merged = merge_close_keyframes(keyframes)
+            if keyframes:
+                self.assertEqual(merged[0], keyframes[0])
+            self.assertTrue(set(merged).issubset(keyframes))
+            for prev_keyframe, keyframe in zip(merged, merged[1:]):
+                self.assertTrue(keyframe - prev_keyframe >= FLOAT_EQUALITY_TOLERANCE, merged)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,16 +10,15 @@ import re
 import maya.cmds as cmds
 from ankimaya import ctrs_manager
 from ankimaya.anim_data_manager import AnimDataManager, FLOAT_EQUALITY_TOLERANCE
-from ankimaya.audio_core import loadAudioAttrsFromPy, getDefaultAudioJson, balanceLoopingEvents
+from ankimaya.audio_core import getDefaultAudioJson, balanceLoopingEvents
 from ankimaya.audio_core import DEFAULT_PARAMS_DICT, DEFAULT_EMPTY_AUDIO_JSON
 from ankimaya.audio_core import AUDIO_NODE_NAME, AUDIO_ENUM_ATTR, EVENT_NAME_ATTR, EVENT_IDS_ATTR
-from ankimaya.audio_core import AUDIO_PARAMETER_TYPES, AUDIO_STATE_TYPES, AUDIO_SWITCH_TYPES
-from ankimaya.audio_core import TRIGGER_TIME_ATTR, VOLUME_ATTR, PROB_ATTR, CURVE_TYPES, TIME_MS_ATTR
-from ankimaya.audio_core import DEFAULT_AUDIO_EVENT, AUDIO_ATTR_CONVERSION, STATES_ATTR, EVENT_GROUPS_ATTR
-from ankimaya.audio_core import PARAMETERS_ATTR, PARAMETER_ID_ATTR, CURVE_ATTR, SWITCHES_ATTR, INT_ATTRS
-from ankimaya.audio_core import SWITCH_GROUP_ID_ATTR, STATE_ID_ATTR, STATE_GROUP_ID_ATTR, STATE_ID_ATTR
+from ankimaya.audio_core import TRIGGER_TIME_ATTR, VOLUME_ATTR, PROB_ATTR, TIME_MS_ATTR
+from ankimaya.audio_core import DEFAULT_AUDIO_EVENT, AUDIO_ATTR_CONVERSION, EVENT_GROUPS_ATTR
+from ankimaya.audio_core import PARAMETERS_ATTR, INT_ATTRS
 from ankimaya.audio_core import VOLUMES_ATTR, PROBABILITIES_ATTR, TOP_LEVEL_ENUM_ATTRS, SUB_LEVEL_ENUM_ATTRS
 from ankimaya.audio_core import AUDIO_ACTION_TO_GROUP_DICT, DEFAULT_VOLUME, DEFAULT_PROBABILITY
+from ankimaya.audio_index import get_audio_index
 from robot_config import MAX_WHEEL_SPEED_MMPS, MAX_BODY_ROTATION_SPEED_DEG_PER_SEC, MIN_RADIUS_MM, MAX_RADIUS_MM
 from ankimaya import exporter_config
 from ankimaya.constants import DATA_NODE_NAME, HACK_TIMELINE_SCALE, ANIM_FPS, EVENT_CTRL, EVENT_ENUM_ATTR
@@ -337,20 +336,10 @@ def load_audio_to_globals():
     global g_AudioIDs
     global g_allAudioActionIds
 
-    g_AudioEventNamesSorted, g_AudioIDs, groupedAudioNames = loadAudioAttrsFromPy()
-
-    allAudioStates, audioStateIds, subAudioStateIds = \
-        loadAudioAttrsFromPy(audioTypes=AUDIO_STATE_TYPES, audioGroups=[], recursive=True)
-
-    allAudioSwitches, audioSwitchIds, subAudioSwitchIds = \
-        loadAudioAttrsFromPy(audioTypes=AUDIO_SWITCH_TYPES, audioGroups=[], recursive=True)
-
-    allAudioParameters, audioParameterIds, groupedParameterNames = \
-        loadAudioAttrsFromPy(audioTypes=AUDIO_PARAMETER_TYPES)
-
-    g_allAudioActionIds[PARAMETERS_ATTR] = {PARAMETER_ID_ATTR:audioParameterIds, CURVE_ATTR:CURVE_TYPES}
-    g_allAudioActionIds[SWITCHES_ATTR] = {SWITCH_GROUP_ID_ATTR:audioSwitchIds,STATE_ID_ATTR:subAudioSwitchIds}
-    g_allAudioActionIds[STATES_ATTR] = {STATE_GROUP_ID_ATTR:audioStateIds, STATE_ID_ATTR:subAudioStateIds}
+    audio_index = get_audio_index()
+    g_AudioEventNamesSorted = audio_index.event_names_sorted
+    g_AudioIDs = audio_index.event_ids
+    g_allAudioActionIds = audio_index.action_ids
 
 
 def _get_audio_event_id_from_name(audio_string_name, error_msgs,
@@ -379,21 +368,19 @@ def _val_in_range(val, min, max):
 
 
 def group_audio_by_frame_num(groupedAudioKeyframes):
-    all_frames = []
     actions_by_frame = {}
     for action, keyframes in groupedAudioKeyframes.iteritems():
         for attr, values in keyframes.iteritems():
-            if values[1]:
-                all_frames.extend(values[1])
-    all_frames = list(set(all_frames))
-    for frame in all_frames:
-        actions_by_frame[frame] = {}
-        for action, keyframes in groupedAudioKeyframes.iteritems():
-            actions_by_frame[frame][action] = {}
-            for attr, values in keyframes.iteritems():
-                if values[1] and frame in values[1]:
-                    frame_idx = values[1].index(frame)
-                    actions_by_frame[frame][action][attr] = values[0][frame_idx]
+            if not values[1]:
+                continue
+            for frame_idx, frame in enumerate(values[1]):
+                attr_values = actions_by_frame.setdefault(frame, {}).setdefault(action, {})
+                # Keep the value of the first keyframe if a frame is listed more than once
+                if attr not in attr_values:
+                    attr_values[attr] = values[0][frame_idx]
+    for frame_actions in actions_by_frame.itervalues():
+        for action in groupedAudioKeyframes:
+            frame_actions.setdefault(action, {})
     return actions_by_frame
 
 
@@ -521,15 +508,15 @@ def get_non_event_actions_json(audio_json, action, action_values, param_frame_nu
         for i in range(len(values)):
             json_attr = AUDIO_ATTR_TO_JSON_ATTR[attr]
             if attr in TOP_LEVEL_ENUM_ATTRS:
-                if attr in g_allAudioActionIds[action][json_attr].keys():
-                    error_msg = "%s is not in the list of ids" % (attr)
+                if values[i] not in g_allAudioActionIds[action][json_attr]:
+                    error_msg = "%s is not in the list of ids" % (values[i])
                     error_msgs.append(error_msg)
                 else:
                     id = g_allAudioActionIds[action][json_attr][values[i]]
                     audio_json[action][i][json_attr] = id
             elif attr in SUB_LEVEL_ENUM_ATTRS:
                 group_name = all_sorted_values[AUDIO_ACTION_TO_GROUP_DICT[action]][i]
-                if AUDIO_ACTION_TO_GROUP_DICT[action] not in g_allAudioActionIds[action].keys():
+                if AUDIO_ACTION_TO_GROUP_DICT[action] not in g_allAudioActionIds[action]:
                     error_msg = "%s needs to have %s" % (action, AUDIO_ACTION_TO_GROUP_DICT[action])
                     error_msgs.append(error_msg)
                 else:
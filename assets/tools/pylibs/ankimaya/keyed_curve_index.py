@@ -0,0 +1,184 @@
+"""
+An index of which nodes and attributes in the scene are keyed and at which
+times, built from the time-based animation curves in the scene.
+
+Finding keyed frames by running mc.keyframe() on every DAG object in the scene
+takes one Maya command per node, including the hundreds of rig nodes that are
+never keyed. Instead, this index walks the animation curves once through the
+OpenMaya API and maps the nodes and plugs that each curve drives to that
+curve's sorted key times, so looking up the keys of a node in a frame range
+is a bisect of an in-memory list.
+
+The index is shared by the export and preview tools. It is rebuilt the next
+time it is requested after keys are edited, animation curves are added or
+deleted, nodes are renamed, connections are made or broken, or a scene is
+opened (see scene_callbacks.addAnimCurveChangedCallback and
+scene_callbacks.addNameOrConnectionChangedCallback).
+"""
+
+# Animation curves that are driven by time (rather than set driven keys)
+TIME_CURVE_NODE_TYPES = ["animCurveTA", "animCurveTL", "animCurveTT", "animCurveTU"]
+
+# Nodes between an animation curve and the attribute it drives
+PASS_THROUGH_NODE_TYPES = ["unitConversion", "pairBlend"]
+PASS_THROUGH_NODE_TYPE_PREFIX = "animBlendNode"
+MAX_PASS_THROUGH_DEPTH = 4
+
+
+import bisect
+
+try:
+    import maya.api.OpenMaya as om
+    import maya.api.OpenMayaAnim as oma
+except ImportError:
+    om = None
+    oma = None
+
+
+_index = None
+_callbackIds = None
+
+
+def _get_times_in_range(times, start_frame=None, end_frame=None):
+    start_idx = 0 if start_frame is None else bisect.bisect_left(times, start_frame)
+    end_idx = len(times) if end_frame is None else bisect.bisect_right(times, end_frame)
+    return times[start_idx:end_idx]
+
+
+class KeyedCurveIndex(object):
+    """
+    Maps node names and fully qualified attribute names ("node.attr") to
+    the sorted key times of the animation curves that drive them.
+    """
+
+    def __init__(self, curves=None):
+        """
+        curves is an optional list of (list of driven "node.attr" plugs,
+        list of key times) tuples, one per animation curve.
+        """
+        self._plug_times = {}
+        self._node_times = {}
+        for plugs, times in (curves or []):
+            self.add_curve(plugs, times)
+
+    def add_curve(self, plugs, times):
+        for plug in plugs:
+            node = plug.split(".", 1)[0]
+            for times_dict, key in ((self._plug_times, plug), (self._node_times, node)):
+                if key in times_dict:
+                    times_dict[key] = sorted(set(times_dict[key]).union(times))
+                else:
+                    times_dict[key] = sorted(set(times))
+
+    def get_keyed_nodes(self):
+        return sorted(self._node_times.keys())
+
+    def is_keyed(self, node):
+        return node in self._node_times
+
+    def get_node_times(self, node, start_frame=None, end_frame=None):
+        """
+        Returns the sorted list of key times on any attribute of a node
+        (within the frame range, inclusive, if one is provided).
+        """
+        return _get_times_in_range(self._node_times.get(node, []), start_frame, end_frame)
+
+    def get_plug_times(self, plug, start_frame=None, end_frame=None):
+        """
+        Returns the sorted list of key times of a "node.attr" plug (within
+        the frame range, inclusive, if one is provided), or None if that
+        plug is not in the index, eg. because it is not keyed or because
+        it was named differently (short vs. long attribute name).
+        """
+        try:
+            times = self._plug_times[plug]
+        except KeyError:
+            return None
+        return _get_times_in_range(times, start_frame, end_frame)
+
+    @classmethod
+    def from_scene(cls):
+        """
+        Returns a new index of all time-based animation curves in the scene.
+        """
+        if om is None:
+            raise ValueError("Building the keyed curve index requires OpenMaya")
+        index = cls()
+        time_unit = om.MTime.uiUnit()
+        iterator = om.MItDependencyNodes(om.MFn.kAnimCurve)
+        while not iterator.isDone():
+            curve = iterator.thisNode()
+            iterator.next()
+            if om.MFnDependencyNode(curve).typeName not in TIME_CURVE_NODE_TYPES:
+                continue
+            curve_fn = oma.MFnAnimCurve(curve)
+            times = [curve_fn.input(idx).asUnits(time_unit) for idx in range(curve_fn.numKeys)]
+            if not times:
+                continue
+            plugs = _get_driven_plugs(curve_fn.findPlug("output", False))
+            if plugs:
+                index.add_curve(plugs, times)
+        return index
+
+
+def _get_node_name(node):
+    if node.hasFn(om.MFn.kDagNode):
+        return om.MFnDagNode(node).partialPathName()
+    return om.MFnDependencyNode(node).name()
+
+
+def _get_driven_plugs(plug, depth=0):
+    """
+    Returns the list of "node.attr" names of the plugs that a plug drives,
+    following connections through conversion and blend nodes.
+    """
+    plugs = []
+    for dest_plug in plug.destinations():
+        node = dest_plug.node()
+        node_type = om.MFnDependencyNode(node).typeName
+        if depth < MAX_PASS_THROUGH_DEPTH and (node_type in PASS_THROUGH_NODE_TYPES or
+                                               node_type.startswith(PASS_THROUGH_NODE_TYPE_PREFIX)):
+            for out_plug in om.MFnDependencyNode(node).getConnections():
+                if out_plug.isSource:
+                    plugs.extend(_get_driven_plugs(out_plug, depth + 1))
+        else:
+            attr_name = dest_plug.partialName(useLongNames=True)
+            plugs.append("%s.%s" % (_get_node_name(node), attr_name))
+    return plugs
+
+
+def invalidate_keyed_curve_index(*args):
+    global _index
+    _index = None
+
+
+def _register_callbacks():
+    global _callbackIds
+    if _callbackIds is not None:
+        return
+    try:
+        from ankimaya.scene_callbacks import addAnimCurveChangedCallback
+        from ankimaya.scene_callbacks import addNameOrConnectionChangedCallback
+    except ImportError:
+        return
+    # The index maps node and attribute names to key times, so it is stale once a
+    # node is renamed or a curve is connected to another attribute, not only when
+    # the keys themselves change.
+    _callbackIds = (addAnimCurveChangedCallback(invalidate_keyed_curve_index) +
+                    addNameOrConnectionChangedCallback(invalidate_keyed_curve_index))
+
+
+def get_keyed_curve_index():
+    """
+    Returns the index for the current scene, which is built the first
+    time it is needed after the animation curves in the scene changed.
+    """
+    global _index
+    if _index is None:
+        _register_callbacks()
+        index = KeyedCurveIndex.from_scene()
+        if _callbackIds is None:
+            # Without callbacks to invalidate it, the index can not be reused
+            return index
+        _index = index
+    return _index
@@ -16,14 +16,17 @@ FILE_BROWSER_WIN_TITLE  = "Select the PNG files for this sprite sequence..."
 PREVIEW_IMAGE_SEQUENCE_FRAME_BUFFER_BTWN_LOOPS = 5
 PREVIEW_IMAGE_SEQUENCE_MIN_ANIM_LENGTH_MS = 3000
 
+# Pixel-identical frames are packaged once and referenced from definition.json
+DEDUP_IDENTICAL_FRAMES = True
+
+DEFINITION_FILE = "definition.json"
+
 
 import os
 import sys
-import re
 import tarfile
 import subprocess
 import tempfile
-import shutil
 
 from maya import cmds
 from maya import OpenMayaUI as omui
@@ -42,7 +45,10 @@ except ImportError:
     from shiboken import wrapInstance
 
 from ankiutils import image_files
+from ankiutils import check_image_sequences
+from ankiutils.bulk_rename import TokenMatcher
 import facial_animation
+import generateSpriteSequence
 from ankiutils import anim_files
 from ankimaya import preview_selector
 
@@ -116,23 +122,20 @@ class SelectPngFilesUI(QWidget):
         self.initUI()
 
     def checkPngFiles(self, pngFiles):
-        numericVals = []
-        setName = None
-        for pngFile in pngFiles:
-            baseName = os.path.basename(pngFile)
-            matchObj = re.match(r'(.*)_(\d*).png', baseName)
-            if not matchObj:
-                raise ValueError("The '%s' file does not fit the expected naming convention "
-                                 "of '<text>_<5-digit number>.png'" % baseName)
-            numericVals.append(int(matchObj.group(2)))
-            if setName is None:
-                setName = matchObj.group(1)
-            elif setName != matchObj.group(1):
-                raise ValueError("All PNG files must be named with the same prefix and should only "
-                                 "contain different numerical values. '%s' does not match the "
-                                 "expected '%s' prefix." % (baseName, setName))
-        numericVals.sort()
-        if numericVals[0] != 0:
+        setName, frames, problems = check_image_sequences.parse_sequence_names(pngFiles)
+        for pngFile in sorted(frames.values()):
+            with open(pngFile, 'rb') as fh:
+                header, problem = check_image_sequences.check_png_data(fh.read())
+            if problem:
+                problems.append("'%s' is corrupt: %s" % (os.path.basename(pngFile), problem))
+        missingFrames = check_image_sequences.find_missing_frames(frames.keys())
+        if missingFrames:
+            problems.append("'%s' PNG file(s) missing for %s"
+                            % (setName, check_image_sequences.format_frame_ranges(missingFrames)))
+        if problems:
+            raise ValueError("Problems found with the selected PNG files:%s%s"
+                             % (os.linesep, os.linesep.join(problems)))
+        if min(frames) != 0:
             msg = "Sequence of PNG files should begin with 00000"
             cmds.warning(msg)
             proceed = cmds.confirmDialog(message=msg, icon="critical", title="PNG packaging error",
@@ -140,12 +143,9 @@ class SelectPngFilesUI(QWidget):
                                          dismissString="Abort")
             if proceed != "Proceed":
                 raise ValueError(msg)
-        for num in range(numericVals[0], numericVals[-1]):
-            if num not in numericVals:
-                raise ValueError("'%s' PNG file missing for %s" % (setName, num))
         return setName
 
-    def makeTarFile(self, dataFiles, optimizeImages=True):
+    def makeTarFile(self, dataFiles, optimizeImages=True, dedupFrames=DEDUP_IDENTICAL_FRAMES):
         if not dataFiles:
             print("No sprite data files selected for .tar file")
             return None
@@ -167,14 +167,10 @@ class SelectPngFilesUI(QWidget):
             tarFile = os.path.join(self.faceAnimDir, tarFile)
         if not self.confirmWithUser(tarFile):
             return None
+        if dedupFrames:
+            pngFiles, otherFiles = self.dedupPngFiles(pngFiles, otherFiles)
         if optimizeImages:
-            tmpDir = tempfile.mkdtemp()
-            for pngFile in pngFiles:
-                baseName = os.path.basename(pngFile)
-                tmpFile = os.path.join(tmpDir, baseName)
-                shutil.copyfile(pngFile, tmpFile)
-                image_files.optimize_image_file(tmpFile)
-                allFiles.append(tmpFile)
+            allFiles = self.optimizePngFiles(pngFiles)
         else:
             allFiles = pngFiles
         allFiles += otherFiles
@@ -191,6 +187,60 @@ class SelectPngFilesUI(QWidget):
         tar.close()
         return tarFile
 
+    def dedupPngFiles(self, pngFiles, otherFiles):
+        """
+        Drop PNG files that are pixel-identical to an earlier frame and write a
+        definition.json that references the earlier frame in their place. Returns
+        the updated (pngFiles, otherFiles) lists.
+        """
+        frameList, uniqueFiles = generateSpriteSequence.dedupFrames(pngFiles)
+        numDuplicates = len(pngFiles) - len(uniqueFiles)
+        if not numDuplicates:
+            return (pngFiles, otherFiles)
+        print("Packaging %s of %s frames (%s are duplicates of earlier frames)"
+              % (len(uniqueFiles), len(pngFiles), numDuplicates))
+        definitions = [x for x in otherFiles if os.path.basename(x) == DEFINITION_FILE]
+        if definitions:
+            # Keep the selected definition (loop settings, segments, etc.) and just
+            # point the duplicate frames at the earlier identical files
+            renameMapping = {}
+            for pngFile, frameFile in zip(pngFiles, frameList):
+                if pngFile != frameFile:
+                    renameMapping[os.path.basename(pngFile)] = os.path.basename(frameFile)
+            with open(definitions[0], 'r') as fh:
+                definition = fh.read()
+            definition, numReplaced = TokenMatcher(renameMapping).replace(definition)
+        else:
+            definition = generateSpriteSequence.makeDefinition(frameList)
+        definitionFile = os.path.join(tempfile.mkdtemp(), DEFINITION_FILE)
+        generateSpriteSequence.writeJsonFile(definitionFile, definition)
+        otherFiles = [x for x in otherFiles if x not in definitions]
+        otherFiles.append(definitionFile)
+        return (uniqueFiles, otherFiles)
+
+    def optimizePngFiles(self, pngFiles):
+        """
+        Optimize copies of the PNG files in a temp directory using a pool of
+        workers while keeping Maya responsive with a progress dialog
+        """
+        tmpDir = tempfile.mkdtemp()
+        progress = QProgressDialog("Optimizing PNG files...", None, 0, len(pngFiles), self)
+        progress.setWindowTitle("PNG packaging")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+
+        def updateProgress(numDone, numTotal):
+            progress.setValue(numDone)
+            QApplication.processEvents()
+
+        try:
+            optimizedFiles, stats = image_files.optimize_image_files(pngFiles, tmpDir,
+                                        progress_callback=updateProgress)
+        finally:
+            progress.close()
+        print(image_files.format_optimize_stats(stats))
+        return optimizedFiles
+
     def confirmWithUser(self, tarFile):
         """
         Use a message box to confirm creation of new tar file
@@ -131,6 +131,7 @@ def main(args=None):
     svn_workspace = get_svn_workspace()
     rename_mapping, anim_files, anim_group_files = process_rename_results(rename_results, svn_workspace)
     if anim_files:
+        renamed_group_files = []
         for anim_file in anim_files:
             if anim_file.endswith(".ma"):
                 # This is a Maya scene file, so rename the animation clips in there
@@ -140,19 +141,23 @@ def main(args=None):
                     print("Failed to rename anim clips in %s because: %s" % (anim_file, e))
             elif anim_file.endswith(".json"):
                 # This is an animation group .json file, so rename this file
-                anim_groups.rename_anim_group(rename_mapping, anim_file, files_to_commit)
+                renamed_group_files.append(anim_file)
+        if renamed_group_files:
+            anim_groups.rename_anim_groups(rename_mapping, renamed_group_files)
     else:
         print("No animation file(s) specified for renaming animation clips or groups")
 
-    for anim_group_file in anim_group_files:
-        print(os.linesep + "Checking animation group file: %s" % anim_group_file)
+    if anim_group_files:
+        # Rename the anim clips in all of the animation group files in one pass
+        print(os.linesep + "Checking %s animation group files" % len(anim_group_files))
         try:
-            num_clips_renamed = anim_groups.rename_anim_clips(rename_mapping, anim_group_file)
+            updated_files = anim_groups.bulk_rename_references(rename_mapping,
+                                                               anim_group_files=anim_group_files,
+                                                               trigger_map_files=None)
         except StandardError, e:
-            print("Failed to rename anim clips in %s because: %s" % (anim_group_file, e))
-            num_clips_renamed = 0
-        if num_clips_renamed > 0:
-            files_to_commit.append(os.path.realpath(anim_group_file))
+            print("Failed to rename anim clips in animation group files because: %s" % e)
+        else:
+            files_to_commit.extend([os.path.realpath(x) for x in updated_files])
 
     if files_to_commit:
         print(os.linesep + ("-" * 80) + os.linesep)
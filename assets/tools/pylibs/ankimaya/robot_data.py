@@ -120,7 +120,8 @@ PROC_FACE_ATTRS = PROC_FACE_DATA.keys()
 
 import copy
 import maya.cmds as cmds
-from interpolation_manager import find_value_for_frame
+from interpolation_manager import sample_curve
+from keyed_curve_index import get_keyed_curve_index
 
 _node_children_cache = {}
 
@@ -167,10 +168,60 @@ def get_default_procedural_face_keyframe():
     return keyframe
 
 
+def _get_driving_curve_times(fq_key):
+    """
+    Returns the key times of the anim curve that drives an attribute of the data
+    node (through any number of conversion nodes) or None if it is not driven.
+    """
+    connection = cmds.listConnections(fq_key, d=False, s=True, p=True)[0]
+    while connection and connection.endswith(".output"):
+        connection = connection.split('.')[0]
+        connection = cmds.listConnections(connection, d=False, s=True, p=True)[0]
+    if not connection:
+        return None
+    ctr = connection.split(".")[0]
+    attr_name = connection.split(".")[1]
+    return cmds.keyframe(ctr, attribute=attr_name, query=True, timeChange=True)
+
+
+def get_interpolated_face_values(data_node_name, frame_numbers):
+    """
+    Returns a dict of procedural face attribute -> {frame number: value} with
+    what Maya thinks each attribute is at the provided frame numbers. Each
+    attribute is only queried at its own keyframes, once for all of those
+    frames (see sample_curve()).
+    """
+    frame_numbers = sorted(set(frame_numbers))
+    interp_values = {}
+    if not frame_numbers:
+        return interp_values
+    for key in PROC_FACE_DATA:
+        fq_key = data_node_name + '.' + key
+        key_frames = _get_driving_curve_times(fq_key)
+        if key_frames is None:
+            # Nothing drives this attribute, so it has the same value at every frame
+            key_frames = frame_numbers[:1]
+        # Previously used to check for keyframe on the data node first, but that is
+        # unnecessary, since animator would never need to place a key on it.
+        if key_frames:
+            # Query and use the value of this attribute IF it has at least one
+            # keyframe set. If not, stick with the default value that comes
+            # from the get_default_procedural_face_keyframe() function.
+            values = sample_curve(fq_key, sorted(key_frames), frame_numbers)
+            interp_values[key] = dict(zip(frame_numbers, values))
+    return interp_values
+
+
 # function that adds (creates new or modifies existing keyframe)
 def add_procedural_face_keyframe(curr_attr, trigger_time_ms, duration_time_ms, value,
                                  frame_number, data_node_name, proc_face_keyframes,
-                                 fill_new_frame_with_interpolated_values=True, frame_nums=None):
+                                 fill_new_frame_with_interpolated_values=True, interp_values=None):
+    """
+    When fill_new_frame_with_interpolated_values is True, the other attributes of
+    a new keyframe are set to their values in Maya at frame_number. Callers that
+    add many keyframes should get those values for all of their frame numbers at
+    once with get_interpolated_face_values() and provide them as interp_values.
+    """
     # search and see if we have something at that time
     # if exists just modify curr_attr value else insert a blank one.
     try:
@@ -186,31 +237,13 @@ def add_procedural_face_keyframe(curr_attr, trigger_time_ms, duration_time_ms, v
         if fill_new_frame_with_interpolated_values:
             # Add the interpolated values for what maya thinks it is at,
             # that way not every attribute needs to be keyed in maya.
+            if interp_values is None:
+                interp_values = get_interpolated_face_values(data_node_name, [frame_number])
             for key, val in PROC_FACE_DATA.iteritems():
-                if key == curr_attr:
-                    # this attribute will be updated below
+                if key == curr_attr or key not in interp_values:
+                    # this attribute will be updated below (or keeps its default value)
                     continue
-                fq_key = data_node_name + '.' + key
-                connection = cmds.listConnections(fq_key, d=False, s=True, p=True)[0]
-                while connection and connection.endswith(".output"):
-                    connection = connection.split('.')[0]
-                    connection = cmds.listConnections(connection, d=False, s=True, p=True)[0]
-                if connection:
-                    ctr = connection.split(".")[0]
-                    attr_name = connection.split(".")[1]
-                    frame_nums = cmds.keyframe(ctr, attribute=attr_name, query=True, timeChange=True)
-
-                # Previously used to check for keyframe on the data node first, but that is
-                # unnecessary, since animator would never need to place a key on it.
-                if frame_nums:
-                    # Query and use the value of this attribute IF it has at least one
-                    # keyframe set. If not, stick with the default value that comes
-                    # from the get_default_procedural_face_keyframe() function.
-                    if frame_number in frame_nums:
-                        interp_value = cmds.getAttr(fq_key, time=frame_number)
-                    else:
-                        interp_value = find_value_for_frame(frame_number, frame_nums, fq_key)
-                    _update_proc_face_keyframe(frame, val, interp_value)
+                _update_proc_face_keyframe(frame, val, interp_values[key][frame_number])
 
         proc_face_keyframes[trigger_time_ms] = frame
 
@@ -229,10 +262,12 @@ def get_facial_keyframes(clip_start, clip_end, timeline_scale=1.0, node=EYES_CTR
     face_keyframes = []
     children = _get_children(node, recursive=True)
     if children:
-        ts = cmds.keyframe(children, query=True, timeChange=True, time=(clip_start, clip_end))
+        curve_index = get_keyed_curve_index()
+        ts = set()
+        for child in children:
+            ts.update(curve_index.get_node_times(child, clip_start, clip_end))
         if ts:
-            ts = list(set(ts))
-            ts.sort()
+            ts = sorted(ts)
             face_keyframes = [(x - clip_start) * timeline_scale for x in ts]
     return face_keyframes
 
@@ -1,15 +1,22 @@
 
 SCENE_OPENED_EVENT_NAME = "SceneOpened"
 
+ANIM_CURVE_NODE_TYPE = "animCurve"
+
 
 from maya import cmds
 from maya import OpenMaya
+from maya import OpenMayaAnim
 
 
 BEFORE_SCENE_OPENED_EVENT = OpenMaya.MSceneMessage.kBeforeOpen
 
+AFTER_SCENE_CHANGED_EVENTS = [OpenMaya.MSceneMessage.kAfterOpen,
+                              OpenMaya.MSceneMessage.kAfterNew]
+
 
 _sceneOpenedJobs = []
+_animCurveCallbacks = []
 
 
 def _addCallback(func, eventName, trackingList):
@@ -82,6 +89,45 @@ def removeSceneOpenedScriptJob(scriptJobId):
         _removeScriptJob(scriptJobId, _sceneOpenedJobs)
 
 
+def addAnimCurveChangedCallback(func):
+    """
+    Given a function/method, this function will setup the callbacks so
+    that function/method is called whenever keys are edited, animation
+    curves are added or deleted, or a new or existing scene is opened.
+    The function is called with the arguments of whichever callback
+    fired, so it should accept any arguments. This function will return
+    the list of IDs for those callbacks so they can be later removed.
+    """
+    callbackIds = [OpenMayaAnim.MAnimMessage.addAnimCurveEditedCallback(func),
+                   OpenMaya.MDGMessage.addNodeAddedCallback(func, ANIM_CURVE_NODE_TYPE),
+                   OpenMaya.MDGMessage.addNodeRemovedCallback(func, ANIM_CURVE_NODE_TYPE)]
+    for callbackEvent in AFTER_SCENE_CHANGED_EVENTS:
+        callbackIds.append(OpenMaya.MSceneMessage.addCallback(callbackEvent, func))
+    _animCurveCallbacks.extend(callbackIds)
+    return callbackIds
+
+
+def removeAnimCurveChangedCallback(callbackIds):
+    for callbackId in callbackIds:
+        _removeCallback(callbackId, _animCurveCallbacks)
+
+
+def addNameOrConnectionChangedCallback(func):
+    """
+    Given a function/method, this function will setup the callbacks so
+    that function/method is called whenever any node is renamed or any
+    connection is made or broken, eg. when an animation curve is connected
+    to a different attribute. The function is called with the arguments of
+    whichever callback fired, so it should accept any arguments. This
+    function will return the list of IDs for those callbacks so they can
+    be later removed (with removeAnimCurveChangedCallback).
+    """
+    callbackIds = [OpenMaya.MNodeMessage.addNameChangedCallback(OpenMaya.MObject(), func),
+                   OpenMaya.MDGMessage.addConnectionCallback(func)]
+    _animCurveCallbacks.extend(callbackIds)
+    return callbackIds
+
+
 def showSceneFile(arg=None):
     currentTime = cmds.currentTime(query=True)
     print("Current time = %s and input argument = %s" % (currentTime, arg))
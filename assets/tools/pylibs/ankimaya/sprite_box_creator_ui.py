@@ -314,10 +314,10 @@ class MainWindow(QWidget):
         if self.asset_name in self.asset_names_and_paths:
             file_path = self.asset_names_and_paths[self.asset_name]
             if (file_path) and os.path.isfile(file_path):
-                frame_count = image_files.get_image_file_count(file_path)
-                self.set_width(image_files.get_pixel_width(file_path))
-                self.set_height(image_files.get_pixel_height(file_path))
-                self.set_frame_count(frame_count)
+                image_info = image_files.get_image_sequence_info(file_path)
+                self.set_width(image_info["width"])
+                self.set_height(image_info["height"])
+                self.set_frame_count(image_info["frame_count"])
             else:
                 # This becomes important if we switch from asset with non-default params to clear
                 self.set_width(SPRITE_DEFAULT_WIDTH)
@@ -31,9 +31,13 @@ from ankimaya.constants import ANIM_FPS, HACK_TIMELINE_SCALE, DATA_NODE_NAME
 from json_exporter import convert_time, get_movement_json
 from ankimaya import exporter_config
 from ankimaya import ctrs_manager
-from interpolation_manager import find_value_for_frame
+from interpolation_manager import sample_curve
+from ankimaya import wheel_solver
+from ankimaya.wheel_solver import EQUALITY_THRESHHOLD, STRAIGHT_RADIUS, TURN_IN_PLACE_RADIUS
+from ankimaya.wheel_solver import FULL_ROT_DEG, FULL_ROT_RAD, SPEED_MSG_THRESHOLD
+from ankimaya.wheel_solver import MIN_WHEEL_RATIO, MAX_WHEEL_RATIO
 from robot_config import MAX_WHEEL_SPEED_MMPS, MAX_BODY_ROTATION_SPEED_DEG_PER_SEC
-from robot_config import MIN_RADIUS_MM, MAX_RADIUS_MM, WHEEL_DIAMETER_MM, WHEEL_DIST_MM
+from robot_config import WHEEL_DIAMETER_MM, WHEEL_DIST_MM
 
 from ankimaya.export_error_check.error_checker_utils import add_json_node
 
@@ -48,8 +52,6 @@ DEFAULT_WHEEL_DIVIDE_VALUE = 1 / DEFAULT_WHEEL_MULTIPLY_VALUE
 DEFAULT_PLUS_STR = "default_plus"
 DEFAULT_MINUS_STR = "default_minus"
 
-EQUALITY_THRESHHOLD = 0.000001
-
 DEFAULT_WHEEL_STR_VALUE = {DEFAULT_PLUS_STR: [DEFAULT_WHEEL_ADD_VALUE,
                                               DEFAULT_WHEEL_MULTIPLY_VALUE,
                                               DEFAULT_WHEEL_VALUE],
@@ -79,51 +81,12 @@ WHEELS_CTR = "x:wheels_ctrl"
 BOTH_WHEEL_ROT_ATTR = "wheel_rotation"
 BOTH_WHEEL_RATIO_ATTR = "wheel_ratio"
 
-STRAIGHT_RADIUS = "STRAIGHT"
-TURN_IN_PLACE_RADIUS = "TURN_IN_PLACE"
-
-HALF_ROT_DEG = math.degrees(math.pi)
-FULL_ROT_DEG = 2 * HALF_ROT_DEG
-FULL_ROT_RAD = 2 * math.pi
-
-MIN_RADIUS_THRESHOLD = 0.1 # if radius is less than that count movement as
-                           # turn in place
-SPEED_MSG_THRESHOLD = 0.1  # min difference between clamped and non-clamped
-                           # speed for clamping msg
-
 ROUND_WHEEL_VALUE = 3
-ROUND_SPEED_VALUE = 5
 
 MOVEMENT_BUTTON_BORDER_COLOR_HI = "rgb(206, 206, 206)"
 
 MODIFY_KEYS_WARNING = "Cannot modify keys following the current one becuase the wheels are not in sync"
 
-# if the ratio between wheels is between these values it will export as turn
-# and the values of both wheels will be averaged
-MIN_WHEEL_RATIO = -1.0444444444444445  # ratio between left & right speeds in
-                                       # case of a radius of 0.5
-MAX_WHEEL_RATIO = -0.9574468085106383  # ratio between left & right speeds in
-                                       # case of a radius of -0.5
-
-
-# The way ratio values were found:
-#
-# original formula:
-# 1) radius = WHEEL_DIST_MM / 2.0 * ((l_wheel_speed + r_wheel_speed) /
-#             (r_wheel_speed - l_wheel_speed))
-# finding l_wheel_speed/r_wheel_speed from that
-# 2) radius*(r_wheel_speed - l_wheel_speed) = WHEEL_DIST_MM / 2.0 *
-#                                             (l_wheel_speed + r_wheel_speed)
-# 3) (radius - WHEEL_DIST_MM / 2.0) * r_wheel_speed =
-#    (radius + WHEEL_DIST_MM / 2.0) * l_wheel_speed
-# 4) l_wheel_speed/r_wheel_speed =
-#.   (radius + WHEEL_DIST_MM / 2.0) / (radius - WHEEL_DIST_MM / 2.0)
-
-# Testing ratio values:
-#
-# WHEEL_DIST_MM / 2.0 * ((1 + (-0.9574468085106383)) / ((-0.9574468085106383) - 1)) = -0.5
-# WHEEL_DIST_MM / 2.0 * ((1 + (-1.0444444444444445)) / ((-1.0444444444444445) - 1)) = 0.5
-
 
 class WheelMovement(object):
     def __init__(self):
@@ -178,26 +141,16 @@ class WheelMovement(object):
             wheel_times_fr = list(set(wheel_times_fr))
             wheel_times_fr.sort()
 
-        for frame_num in wheel_times_fr:
-            # In case there is no frame set on a wheel find what the value
-            # should be based on linear interpolation (for right & left wheel)
-            l_wheel_value = 0
-            r_wheel_value = 0
-            if not (l_wheel_times is None or r_wheel_times is None):
-                if l_wheel_times is None or frame_num not in l_wheel_times:
-                    r_wheel_value = mc.getAttr(R_WHEEL_ROT_ATTR, time=frame_num)
-                    l_wheel_value = find_value_for_frame(frame_num, l_wheel_times,
-                                                         L_WHEEL_ROT_ATTR)
-                elif r_wheel_times is None or frame_num not in r_wheel_times:
-                    l_wheel_value = mc.getAttr(L_WHEEL_ROT_ATTR, time=frame_num)
-                    r_wheel_value = find_value_for_frame(frame_num, r_wheel_times,
-                                                         R_WHEEL_ROT_ATTR)
-                # In case there are keyframes on both wheels, get values for both of them
-                else:
-                    l_wheel_value = mc.getAttr(L_WHEEL_ROT_ATTR, time=frame_num)
-                    r_wheel_value = mc.getAttr(R_WHEEL_ROT_ATTR, time=frame_num)
-
+        # In case there is no frame set on a wheel find what the value
+        # should be based on linear interpolation (for right & left wheel),
+        # querying each wheel's values only at its own keyframes
+        if l_wheel_times and r_wheel_times:
+            l_wheel_samples = sample_curve(L_WHEEL_ROT_ATTR, l_wheel_times, wheel_times_fr)
+            r_wheel_samples = sample_curve(R_WHEEL_ROT_ATTR, r_wheel_times, wheel_times_fr)
+        else:
+            l_wheel_samples = r_wheel_samples = [0] * len(wheel_times_fr)
 
+        for l_wheel_value, r_wheel_value in zip(l_wheel_samples, r_wheel_samples):
             rounded_l_wheel_value = round(l_wheel_value, ROUND_WHEEL_VALUE)
 
             rounded_r_wheel_value = round(r_wheel_value, ROUND_WHEEL_VALUE)
@@ -221,50 +174,30 @@ class WheelMovement(object):
 
     def get_speeds_from_values(self, l_wheel_values, r_wheel_values, wheel_times_fr, all_frames,
                                ignore_mech_all=False):
-        all_wheel_speeds = []
-        if all_frames:
-            mech_all_times = mc.keyframe(MECH_ALL_CTR, query=True, timeChange=True)
-            mech_all_values = mc.keyframe(MECH_ALL_CTR, query=True, valueChange=True)
-        else:
-            mech_all_times = mc.keyframe(MECH_ALL_CTR, query=True, timeChange=True,
-                                         time=(self.clip_start, self.clip_end))
-            mech_all_values = mc.keyframe(MECH_ALL_CTR, query=True, valueChange=True,
-                                          time=(self.clip_start, self.clip_end))
-
-        for i in range(len(wheel_times_fr) - 1):
-            # todo: this can maybe be done cleaner without checking every wheel frame
-            if (not ignore_mech_all) and mech_all_times and mech_all_values:
-                if not all(i == 0 for i in mech_all_values):
-                    if are_mech_keys_between_wheel_keys(wheel_times_fr[i], wheel_times_fr[i + 1]):
-                        msg = "Wheels need to be keyed before or after any other body movement"
-                        add_json_node(node_name="Separate wheels and body animation",
-                                      fix_function="", status="error",
-                                      message=msg)
-                        raise ValueError(msg)
-                        return [], []
-
-            time_sec = (wheel_times_fr[i + 1] - wheel_times_fr[i]) / ANIM_FPS
-            time_sec *= HACK_TIMELINE_SCALE
-
-            if self.is_radians:
-                l_rot_num = (l_wheel_values[i + 1] - l_wheel_values[i]) / FULL_ROT_RAD
-                r_rot_num = (r_wheel_values[i + 1] - r_wheel_values[i]) / FULL_ROT_RAD
+        if (not ignore_mech_all) and len(wheel_times_fr) > 1:
+            if all_frames:
+                mech_all_values = mc.keyframe(MECH_ALL_CTR, query=True, valueChange=True)
             else:
-                l_rot_num = (l_wheel_values[i + 1] - l_wheel_values[i]) / FULL_ROT_DEG
-                r_rot_num = (r_wheel_values[i + 1] - r_wheel_values[i]) / FULL_ROT_DEG
-            l_wheel_speed = self.get_single_wheel_speed(time_sec, l_rot_num)
-            r_wheel_speed = self.get_single_wheel_speed(time_sec, r_rot_num)
-            if exporter_config.get_round_turn_under_point_five():
-                # rounding values because otherwise radius math gets off sometimes
-                l_wheel_speed, r_wheel_speed = self.average_small_speeds(
-                    round(l_wheel_speed, ROUND_SPEED_VALUE),
-                    round(r_wheel_speed, ROUND_SPEED_VALUE))
-            else:
-                l_wheel_speed = round(l_wheel_speed, ROUND_SPEED_VALUE)
-                r_wheel_speed = round(r_wheel_speed, ROUND_SPEED_VALUE)
-            all_wheel_speeds.append([l_wheel_speed, r_wheel_speed])
-
-        return all_wheel_speeds
+                mech_all_values = mc.keyframe(MECH_ALL_CTR, query=True, valueChange=True,
+                                              time=(self.clip_start, self.clip_end))
+            if mech_all_values and not all(i == 0 for i in mech_all_values):
+                mech_all_times = mc.keyframe(MECH_ALL_CTR, query=True, timeChange=True)
+                segments_with_keys = wheel_solver.get_segments_with_keys(wheel_times_fr,
+                                                                         mech_all_times)
+                if segments_with_keys.any():
+                    i = segments_with_keys.argmax()
+                    print("Mech keys are after %s and before %s"
+                          % (wheel_times_fr[i], wheel_times_fr[i + 1]))
+                    msg = "Wheels need to be keyed before or after any other body movement"
+                    add_json_node(node_name="Separate wheels and body animation",
+                                  fix_function="", status="error",
+                                  message=msg)
+                    raise ValueError(msg)
+
+        l_wheel_speeds, r_wheel_speeds = wheel_solver.get_wheel_speeds(
+            l_wheel_values, r_wheel_values, wheel_times_fr, self.is_radians,
+            exporter_config.get_round_turn_under_point_five())
+        return [list(x) for x in zip(l_wheel_speeds.tolist(), r_wheel_speeds.tolist())]
 
     def get_speeds_from_values_and_ratio(self, l_wheel_values, ratios, wheel_times_fr):
         all_wheel_speeds = []
@@ -311,10 +244,23 @@ class WheelMovement(object):
         wheel_speed = rot_num * WHEEL_DIAMETER_MM * math.pi / time_sec
         return wheel_speed
 
-    def set_move_data_for_frame(self, l_wheel_speed, r_wheel_speed, frame_num, next_frame,
-                                clip_start, trigger_times):
+    def solve(self, all_wheel_speeds):
+        """
+        Returns the wheel_solver.WheelSolution for a list of
+        [left wheel speed, right wheel speed] segments
+        """
+        return wheel_solver.WheelSolution(
+            [x[0] for x in all_wheel_speeds], [x[1] for x in all_wheel_speeds],
+            round_turn_under_point_five=exporter_config.get_round_turn_under_point_five(),
+            turn_wrong_direction=exporter_config.get_turn_wrong_direction(),
+            max_wheel_speed=self.max_wheel_speed_mmps,
+            max_rotation_speed=self.max_rotation_speed)
+
+    def set_move_data_for_frame(self, solution, idx, frame_num, next_frame, clip_start,
+                                trigger_times):
         """
-        Sets movement data using the same structure as the usual wheel movement
+        Sets movement data of a segment of the solution using the same
+        structure as the usual wheel movement
         """
         trigger_time_ms = convert_time(frame_num,
                                        offset=clip_start / HACK_TIMELINE_SCALE) * HACK_TIMELINE_SCALE
@@ -328,14 +274,8 @@ class WheelMovement(object):
         else:
             trigger_times.append(trigger_time_ms)
 
-        unrounded_radius, rounded_radius = find_radius(l_wheel_speed, r_wheel_speed)
-        rounded_radius = check_radius(rounded_radius, frame_num, problem_list=self.problem_list)
-        if unrounded_radius:
-            unrounded_radius = check_radius(unrounded_radius, frame_num,
-                                            problem_list=self.problem_list)
-
-        speed = find_speed(l_wheel_speed, r_wheel_speed, rounded_radius, unrounded_radius)
-        speed = check_speed(rounded_radius, speed, frame_num, problem_list=self.problem_list)
+        self.problem_list.extend(solution.get_problems(idx, frame_num))
+        speed = float(solution.clamped_speeds[idx])
         if -EQUALITY_THRESHHOLD < speed < EQUALITY_THRESHHOLD:
             # if the speed is zero, then don't bother returning a keyframe
             return None
@@ -343,7 +283,7 @@ class WheelMovement(object):
         curr = {"triggerTime_ms": trigger_time_ms,
                 "durationTime_ms": duration_time_ms,
                 "Name": "BodyMotionKeyFrame",
-                "radius_mm": rounded_radius,
+                "radius_mm": solution.get_radius(idx),
                 "speed": int(round(speed))}
         return curr
 
@@ -356,14 +296,13 @@ class WheelMovement(object):
         all_wheel_speeds, wheel_times_fr = self.get_wheel_speed()
         if not all_wheel_speeds or all_wheel_speeds == ([], []):
             return []
+        solution = self.solve(all_wheel_speeds)
         json_arr = []
         trigger_times = []
         for idx in range(1, len(wheel_times_fr)):
-            l_wheel_speed = all_wheel_speeds[idx - 1][0]
-            r_wheel_speed = all_wheel_speeds[idx - 1][1]
-            if l_wheel_speed == 0 and r_wheel_speed == 0:
+            if not solution.is_moving(idx - 1):
                 continue
-            curr = self.set_move_data_for_frame(l_wheel_speed, r_wheel_speed,
+            curr = self.set_move_data_for_frame(solution, idx - 1,
                                                 wheel_times_fr[idx - 1], wheel_times_fr[idx],
                                                 clip_start, trigger_times)
             if curr:
@@ -409,95 +348,44 @@ class WheelMovement(object):
         all_wheel_speeds, wheel_times_fr = self.get_wheel_speed(True, True)
         if not all_wheel_speeds:
             return []
-        if all_wheel_speeds == []:
-            return []
-        mc.undoInfo(openChunk=True, undoName=CLAMP_WHEEL_VAL_UNDO_NAME)
+        solution = self.solve(all_wheel_speeds)
         for i in range(1, len(wheel_times_fr)):
-            unrounded_radius, rounded_radius = find_radius(all_wheel_speeds[i - 1][0],
-                                                           all_wheel_speeds[i - 1][1])
-            rounded_radius = check_radius(rounded_radius, wheel_times_fr[i],
-                                          problem_list=self.problem_list)
-            if unrounded_radius:
-                unrounded_radius = check_radius(unrounded_radius, wheel_times_fr[i],
-                                                problem_list=self.problem_list)
-            speed = find_speed(all_wheel_speeds[i - 1][0], all_wheel_speeds[i - 1][1],
-                               rounded_radius, unrounded_radius)
-            new_speed = check_speed(rounded_radius, speed, wheel_times_fr[i],
-                                    max_wheel_speed=self.max_wheel_speed_mmps,
-                                    max_rotation_speed=self.max_rotation_speed,
-                                    problem_list=self.problem_list)
-            if (speed != new_speed) and (abs(new_speed - speed) >= SPEED_MSG_THRESHOLD):
-                if rounded_radius == STRAIGHT_RADIUS:
-                    l_wheel_speed = new_speed
-                    r_wheel_speed = l_wheel_speed
-                elif rounded_radius == TURN_IN_PLACE_RADIUS:
-                    r_wheel_speed = (math.radians(new_speed) * WHEEL_DIST_MM) / 2.0
-                    l_wheel_speed = -r_wheel_speed
-                else:
-                    # Calculating wheel values for ARC TURNS:
-                    # speed = (l_wheel_speed + r_wheel_speed) / 2.0
-                    # radius = WHEEL_DIST_MM / 2.0 * ((l_wheel_speed + r_wheel_speed) /
-                    #          (r_wheel_speed - l_wheel_speed))
-                    #
-                    # l = 2*s - r
-                    # l = -(r(d-2w)/(d+2w))
-                    # 2*s - r = -(r(d-2w)/(d+2w))
-                    #
-                    # r = sd/2w + s
-                    # l = 2s - (sd/2w + s)
-
-                    r_wheel_speed = (new_speed * WHEEL_DIST_MM) / (
-                        2 * float(rounded_radius)) + new_speed
-                    l_wheel_speed = 2 * new_speed - r_wheel_speed
-
-                l_wheel_value = speed_2_wheel_value(l_wheel_speed,
-                                                    wheel_times_fr[i - 1],
-                                                    wheel_times_fr[i])
-                r_wheel_value = speed_2_wheel_value(r_wheel_speed,
-                                                    wheel_times_fr[i - 1],
-                                                    wheel_times_fr[i])
-
-                l_wheel_value = round(l_wheel_value, ROUND_WHEEL_VALUE)
-                r_wheel_value = round(r_wheel_value, ROUND_WHEEL_VALUE)
-
-                l_move_value = clamp_wheel_value(L_WHEEL_CTR, l_wheel_value,
-                                                 wheel_times_fr[i - 1], wheel_times_fr[i])
-                r_move_value = clamp_wheel_value(R_WHEEL_CTR, r_wheel_value,
-                                                 wheel_times_fr[i - 1], wheel_times_fr[i])
-
-                move_keys_by(L_WHEEL_ROT_ATTR,
-                             wheel_times_fr[(i + 1):(len(wheel_times_fr))],
-                             l_move_value)
-                move_keys_by(R_WHEEL_ROT_ATTR,
-                             wheel_times_fr[(i + 1):(len(wheel_times_fr))],
-                             r_move_value)
+            self.problem_list.extend(solution.get_problems(i - 1, wheel_times_fr[i]))
+        exceeded_indices = solution.get_exceeded_indices()
+        if not exceeded_indices:
+            return frame_nums, new_wheel_values
+
+        l_wheel_speeds, r_wheel_speeds = solution.get_clamped_wheel_speeds()
+        l_wheel_deltas = wheel_solver.speeds_to_wheel_values(l_wheel_speeds, wheel_times_fr)
+        r_wheel_deltas = wheel_solver.speeds_to_wheel_values(r_wheel_speeds, wheel_times_fr)
+        mc.undoInfo(openChunk=True, undoName=CLAMP_WHEEL_VAL_UNDO_NAME)
+        for idx in exceeded_indices:
+            i = idx + 1
+            l_wheel_value = round(float(l_wheel_deltas[idx]), ROUND_WHEEL_VALUE)
+            r_wheel_value = round(float(r_wheel_deltas[idx]), ROUND_WHEEL_VALUE)
+
+            l_move_value = clamp_wheel_value(L_WHEEL_CTR, l_wheel_value,
+                                             wheel_times_fr[i - 1], wheel_times_fr[i])
+            r_move_value = clamp_wheel_value(R_WHEEL_CTR, r_wheel_value,
+                                             wheel_times_fr[i - 1], wheel_times_fr[i])
+
+            move_keys_by(L_WHEEL_ROT_ATTR,
+                         wheel_times_fr[(i + 1):(len(wheel_times_fr))],
+                         l_move_value)
+            move_keys_by(R_WHEEL_ROT_ATTR,
+                         wheel_times_fr[(i + 1):(len(wheel_times_fr))],
+                         r_move_value)
         mc.undoInfo(closeChunk=True, undoName=CLAMP_WHEEL_VAL_UNDO_NAME)
         return frame_nums, new_wheel_values
 
     def do_speeds_exceed_limits(self):
-        frame_nums = []
         all_wheel_speeds, wheel_times_fr = self.get_wheel_speed(True, True)
         if not all_wheel_speeds or all_wheel_speeds == []:
             return None
-        mc.undoInfo(openChunk=True, undoName=CLAMP_WHEEL_VAL_UNDO_NAME)
+        solution = self.solve(all_wheel_speeds)
         for i in range(1, len(wheel_times_fr)):
-            unrounded_radius, rounded_radius = find_radius(all_wheel_speeds[i - 1][0],
-                                                           all_wheel_speeds[i - 1][1])
-            rounded_radius = check_radius(rounded_radius, wheel_times_fr[i],
-                                          problem_list=self.problem_list)
-            if unrounded_radius:
-                unrounded_radius = check_radius(unrounded_radius, wheel_times_fr[i],
-                                                problem_list=self.problem_list)
-            speed = find_speed(all_wheel_speeds[i - 1][0], all_wheel_speeds[i - 1][1],
-                               rounded_radius, unrounded_radius)
-            new_speed = check_speed(rounded_radius, speed, wheel_times_fr[i],
-                                    max_wheel_speed=self.max_wheel_speed_mmps,
-                                    max_rotation_speed=self.max_rotation_speed,
-                                    problem_list=self.problem_list)
-            if (speed != new_speed) and (abs(new_speed - speed) >= SPEED_MSG_THRESHOLD):
-
-                frame_nums.append(wheel_times_fr[i])
-        return frame_nums
+            self.problem_list.extend(solution.get_problems(i - 1, wheel_times_fr[i]))
+        return [wheel_times_fr[idx + 1] for idx in solution.get_exceeded_indices()]
 
 
 def check_rad_or_deg_in_prefs():
@@ -541,23 +429,6 @@ def check_speed(radius_type, speed, frame_num, max_wheel_speed=MAX_WHEEL_SPEED_M
     return new_speed
 
 
-def check_radius(radius, frame_num, problem_list):
-    if isinstance(radius, str) or radius is None:
-        return radius
-    msg = "The radius at frame %s has been clamped from %s mm to %s"
-    new_msg = None
-    if (radius > MAX_RADIUS_MM) or (radius < MIN_RADIUS_MM):
-        new_msg = msg % (frame_num, radius, STRAIGHT_RADIUS)
-        radius = STRAIGHT_RADIUS
-    if exporter_config.get_round_turn_under_point_five():
-        if -MIN_RADIUS_THRESHOLD < radius < MIN_RADIUS_THRESHOLD:
-            new_msg = msg % (frame_num, radius, TURN_IN_PLACE_RADIUS)
-            radius = TURN_IN_PLACE_RADIUS
-    if new_msg:
-        problem_list.append(new_msg)
-    return radius
-
-
 def clamp_wheel_value(ctr, clamped_value, prev_fr, next_fr):
     attr = ctr + "." + WHEEL_ROT_ATTR
     mc.currentTime(next_fr)
@@ -606,75 +477,6 @@ def move_keys_by(ctr, keyed_frames, move_by):
         mc.setKeyframe(ctr, time=frame, value=result_value)
 
 
-def find_radius(l_wheel_speed, r_wheel_speed):
-    """
-    Finds type of movement (fwd, turn or arc turn) and radius in case of arc
-    turn
-    """
-    if l_wheel_speed == r_wheel_speed:
-        return None, STRAIGHT_RADIUS
-    elif l_wheel_speed == -r_wheel_speed:
-        return None, TURN_IN_PLACE_RADIUS
-
-    radius = (WHEEL_DIST_MM / 2.0) * (
-    (l_wheel_speed + r_wheel_speed) / (r_wheel_speed - l_wheel_speed))
-
-    if -EQUALITY_THRESHHOLD < radius < EQUALITY_THRESHHOLD:
-        # a radius of 0 becomes turn in place
-        return None, TURN_IN_PLACE_RADIUS
-
-    # The engine handles radius as an int16, so we round the radius here and
-    # then return it as an integer.
-    # We need to explicitly round() the value first since int() always rounds
-    # down.
-    rounded_radius = round(radius)
-
-    if not exporter_config.get_round_turn_under_point_five():
-        if 0.0 < radius < 0.5:
-            rounded_radius = 1
-        elif -0.5 < radius < 0.0:
-            rounded_radius = -1
-    else:
-        if -EQUALITY_THRESHHOLD < rounded_radius < EQUALITY_THRESHHOLD:
-            # a rounded radius of 0 becomes turn in place
-            return None, TURN_IN_PLACE_RADIUS
-
-    return radius, int(rounded_radius)
-
-
-def find_speed(l_wheel_speed, r_wheel_speed, rounded_radius, unrounded_radius):
-    """
-    Finds the speed that should be exported (the same as wheel speed in
-    case of fwd movement, average of the two wheels during point turn)
-    """
-    if rounded_radius == TURN_IN_PLACE_RADIUS:
-        if exporter_config.get_turn_wrong_direction():
-            # Turn robot in the WRONG DIRECTION for backwards compatibility
-            # (see COZMO-12816 for some related info)
-            speed = math.degrees((l_wheel_speed - r_wheel_speed) / WHEEL_DIST_MM)
-        else:
-            # Turn robot in the correct direction
-            speed = math.degrees((r_wheel_speed - l_wheel_speed) / WHEEL_DIST_MM)
-
-    # straight and arc turns
-    else:
-        speed = (l_wheel_speed + r_wheel_speed) / 2.0
-        if rounded_radius != STRAIGHT_RADIUS and unrounded_radius != STRAIGHT_RADIUS:
-            speed = adjust_arc_speed_to_radius(speed, unrounded_radius, rounded_radius)
-
-    return speed
-
-
-def adjust_arc_speed_to_radius(speed, old_radius, rounded_radius):
-    try:
-        new_speed = speed / old_radius * rounded_radius
-    except TypeError:
-        print("Failed to calculate new speed from speed = %s, old_radius = %s, rounded_radius = %s"
-              % (speed, old_radius, rounded_radius))
-        return speed
-    return new_speed
-
-
 def place_missing_frames():
     if not are_wheels_keyed():
         # To be run separately from exporter, so don't need to add to error
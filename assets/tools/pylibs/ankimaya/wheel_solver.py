@@ -0,0 +1,346 @@
+"""
+Differential drive math for the wheel ctrs, computed for all keyframe
+segments of a clip at once with numpy.
+
+Given the left and right wheel rotation values at the wheel key times, the
+solver finds the speed of each wheel in every segment between two keys, the
+type of movement (straight, turn in place or arc turn) and radius that the
+robot would be sent, the exported speed and whether that speed has to be
+clamped to the limits of the robot. WheelMovement is the Maya-facing adapter
+that queries the wheel ctrs, so this module does not need Maya and can be
+tested and benchmarked on its own:
+
+    solution = solve([0, 90, 450], [0, 180, 90], [0, 10, 20])
+    solution.get_radius(0), solution.clamped_speeds[0]
+"""
+
+import math
+import sys
+import time
+
+import numpy as np
+
+from ankimaya.constants import ANIM_FPS, HACK_TIMELINE_SCALE
+from robot_config import MAX_WHEEL_SPEED_MMPS, MAX_BODY_ROTATION_SPEED_DEG_PER_SEC
+from robot_config import MIN_RADIUS_MM, MAX_RADIUS_MM, WHEEL_DIAMETER_MM, WHEEL_DIST_MM
+
+
+EQUALITY_THRESHHOLD = 0.000001
+
+STRAIGHT_RADIUS = "STRAIGHT"
+TURN_IN_PLACE_RADIUS = "TURN_IN_PLACE"
+
+# Movement types of the segments in a solution
+ARC_TURN = 0
+STRAIGHT = 1
+TURN_IN_PLACE = 2
+
+HALF_ROT_DEG = math.degrees(math.pi)
+FULL_ROT_DEG = 2 * HALF_ROT_DEG
+FULL_ROT_RAD = 2 * math.pi
+
+MIN_RADIUS_THRESHOLD = 0.1 # if radius is less than that count movement as
+                           # turn in place
+SPEED_MSG_THRESHOLD = 0.1  # min difference between clamped and non-clamped
+                           # speed for clamping msg
+
+ROUND_SPEED_VALUE = 5
+
+# if the ratio between wheels is between these values it will export as turn
+# and the values of both wheels will be averaged
+MIN_WHEEL_RATIO = -1.0444444444444445  # ratio between left & right speeds in
+                                       # case of a radius of 0.5
+MAX_WHEEL_RATIO = -0.9574468085106383  # ratio between left & right speeds in
+                                       # case of a radius of -0.5
+
+
+# The way ratio values were found:
+#
+# original formula:
+# 1) radius = WHEEL_DIST_MM / 2.0 * ((l_wheel_speed + r_wheel_speed) /
+#             (r_wheel_speed - l_wheel_speed))
+# finding l_wheel_speed/r_wheel_speed from that
+# 2) radius*(r_wheel_speed - l_wheel_speed) = WHEEL_DIST_MM / 2.0 *
+#                                             (l_wheel_speed + r_wheel_speed)
+# 3) (radius - WHEEL_DIST_MM / 2.0) * r_wheel_speed =
+#    (radius + WHEEL_DIST_MM / 2.0) * l_wheel_speed
+# 4) l_wheel_speed/r_wheel_speed =
+#.   (radius + WHEEL_DIST_MM / 2.0) / (radius - WHEEL_DIST_MM / 2.0)
+
+# Testing ratio values:
+#
+# WHEEL_DIST_MM / 2.0 * ((1 + (-0.9574468085106383)) / ((-0.9574468085106383) - 1)) = -0.5
+# WHEEL_DIST_MM / 2.0 * ((1 + (-1.0444444444444445)) / ((-1.0444444444444445) - 1)) = 0.5
+
+
+def _round_half_away_from_zero(values):
+    # Same as the built-in round() of Python 2 (numpy rounds halves to even)
+    magnitudes = np.abs(values)
+    floors = np.floor(magnitudes)
+    return np.sign(values) * (floors + (magnitudes - floors >= 0.5))
+
+
+def _get_segment_times(times):
+    return (np.diff(np.asarray(times, dtype=np.float64)) / ANIM_FPS) * HACK_TIMELINE_SCALE
+
+
+def average_small_speeds(l_wheel_speeds, r_wheel_speeds):
+    """
+    Averages the speeds of segments where the wheels turn in opposite
+    directions at almost the same speed, so they export as turns in place.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = l_wheel_speeds / r_wheel_speeds
+        is_small = (r_wheel_speeds != 0) & (MIN_WHEEL_RATIO < ratios) & (ratios < MAX_WHEEL_RATIO)
+    # - instead of + because values are opposite
+    average_values = (l_wheel_speeds - r_wheel_speeds) / 2.0
+    return (np.where(is_small, average_values, l_wheel_speeds),
+            np.where(is_small, -average_values, r_wheel_speeds))
+
+
+def get_wheel_speeds(l_wheel_values, r_wheel_values, times, is_radians=False,
+                     round_turn_under_point_five=False):
+    """
+    Returns arrays of the left and right wheel speeds (mm/s) in the segments
+    between consecutive key times, given the wheel rotation values at those
+    times.
+    """
+    time_sec = _get_segment_times(times)
+    full_rot = FULL_ROT_RAD if is_radians else FULL_ROT_DEG
+    l_rot_nums = np.diff(np.asarray(l_wheel_values, dtype=np.float64)) / full_rot
+    r_rot_nums = np.diff(np.asarray(r_wheel_values, dtype=np.float64)) / full_rot
+    # rounding values because otherwise radius math gets off sometimes
+    l_wheel_speeds = np.round(l_rot_nums * WHEEL_DIAMETER_MM * math.pi / time_sec, ROUND_SPEED_VALUE)
+    r_wheel_speeds = np.round(r_rot_nums * WHEEL_DIAMETER_MM * math.pi / time_sec, ROUND_SPEED_VALUE)
+    if round_turn_under_point_five:
+        l_wheel_speeds, r_wheel_speeds = average_small_speeds(l_wheel_speeds, r_wheel_speeds)
+    return l_wheel_speeds, r_wheel_speeds
+
+
+def find_radii(l_wheel_speeds, r_wheel_speeds, round_turn_under_point_five=False):
+    """
+    Finds the type of movement of every segment and the radius of arc turns.
+    Returns arrays of the movement types, the unrounded radii (NaN if the
+    segment is not an arc turn) and the radii rounded to the integers that
+    the engine uses (0 if the segment is not an arc turn).
+    """
+    is_straight = l_wheel_speeds == r_wheel_speeds
+    is_turn = ~is_straight & (l_wheel_speeds == -r_wheel_speeds)
+    # The radius of straight movement divides by zero, so skip those warnings
+    with np.errstate(divide="ignore", invalid="ignore"):
+        radii = (WHEEL_DIST_MM / 2.0) * (
+            (l_wheel_speeds + r_wheel_speeds) / (r_wheel_speeds - l_wheel_speeds))
+        # a radius of 0 becomes turn in place
+        is_turn |= ~is_straight & (np.abs(radii) < EQUALITY_THRESHHOLD)
+
+        # The engine handles radius as an int16, so the radius is rounded here
+        # and exported as an integer
+        rounded_radii = _round_half_away_from_zero(radii)
+        if not round_turn_under_point_five:
+            rounded_radii[(0.0 < radii) & (radii < 0.5)] = 1
+            rounded_radii[(-0.5 < radii) & (radii < 0.0)] = -1
+        else:
+            # a rounded radius of 0 becomes turn in place
+            is_turn |= ~is_straight & (np.abs(rounded_radii) < EQUALITY_THRESHHOLD)
+
+    radius_types = np.full(len(radii), ARC_TURN, dtype=np.int8)
+    radius_types[is_straight] = STRAIGHT
+    radius_types[is_turn] = TURN_IN_PLACE
+    is_arc = radius_types == ARC_TURN
+    radii = np.where(is_arc, radii, np.nan)
+    rounded_radii = np.where(is_arc, rounded_radii, 0).astype(np.int64)
+    return radius_types, radii, rounded_radii
+
+
+def find_speeds(l_wheel_speeds, r_wheel_speeds, radius_types, radii, rounded_radii,
+                turn_wrong_direction=False):
+    """
+    Returns the array of speeds that should be exported, which is the same
+    as the wheel speed for straight movement, the average of the two wheels
+    (adjusted to the rounded radius) for arc turns and the rotation speed
+    (deg/s) for turns in place. Arc turns whose rounded radius is out of
+    range should already have been changed to straight movement.
+    """
+    if turn_wrong_direction:
+        # Turn robot in the WRONG DIRECTION for backwards compatibility
+        # (see COZMO-12816 for some related info)
+        turn_speeds = np.degrees((l_wheel_speeds - r_wheel_speeds) / WHEEL_DIST_MM)
+    else:
+        turn_speeds = np.degrees((r_wheel_speeds - l_wheel_speeds) / WHEEL_DIST_MM)
+    speeds = (l_wheel_speeds + r_wheel_speeds) / 2.0
+    is_arc = (radius_types == ARC_TURN) & ~is_radius_out_of_range(radii)
+    with np.errstate(invalid="ignore"):
+        speeds = np.where(is_arc, speeds / radii * rounded_radii, speeds)
+    return np.where(radius_types == TURN_IN_PLACE, turn_speeds, speeds)
+
+
+def is_radius_out_of_range(radii):
+    with np.errstate(invalid="ignore"):
+        return (radii > MAX_RADIUS_MM) | (radii < MIN_RADIUS_MM)
+
+
+def clamp_speeds(radius_types, speeds, max_wheel_speed=MAX_WHEEL_SPEED_MMPS,
+                 max_rotation_speed=MAX_BODY_ROTATION_SPEED_DEG_PER_SEC):
+    """
+    Clamps the speeds to the max wheel speed (mm/s) for straight movement
+    and arc turns or to the max rotation speed (deg/s) for turns in place.
+    Returns the clamped speeds and the array of speed limits.
+    """
+    limits = np.where(radius_types == TURN_IN_PLACE, max_rotation_speed, max_wheel_speed)
+    return np.clip(speeds, -limits, limits), limits
+
+
+def speeds_to_wheel_speeds(radius_types, speeds, rounded_radii):
+    """
+    Returns arrays of the left and right wheel speeds that move the robot
+    at the provided speeds, the inverse of find_speeds().
+    """
+    # Calculating wheel values for ARC TURNS:
+    # speed = (l_wheel_speed + r_wheel_speed) / 2.0
+    # radius = WHEEL_DIST_MM / 2.0 * ((l_wheel_speed + r_wheel_speed) /
+    #          (r_wheel_speed - l_wheel_speed))
+    #
+    # r = sd/2w + s
+    # l = 2s - (sd/2w + s)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        arc_r_wheel_speeds = (speeds * WHEEL_DIST_MM) / (2.0 * rounded_radii) + speeds
+    turn_r_wheel_speeds = (np.radians(speeds) * WHEEL_DIST_MM) / 2.0
+    r_wheel_speeds = np.where(radius_types == STRAIGHT, speeds,
+                              np.where(radius_types == TURN_IN_PLACE, turn_r_wheel_speeds,
+                                       arc_r_wheel_speeds))
+    l_wheel_speeds = np.where(radius_types == STRAIGHT, speeds,
+                              np.where(radius_types == TURN_IN_PLACE, -turn_r_wheel_speeds,
+                                       2 * speeds - arc_r_wheel_speeds))
+    return l_wheel_speeds, r_wheel_speeds
+
+
+def speeds_to_wheel_values(wheel_speeds, times):
+    """
+    Returns the array of how much a wheel rotates (deg) in the segments between
+    consecutive key times at the provided speeds.
+    """
+    time_sec = _get_segment_times(times)
+    rot_nums = (wheel_speeds * time_sec / math.pi) / WHEEL_DIAMETER_MM
+    return rot_nums * FULL_ROT_DEG
+
+
+def get_segments_with_keys(times, key_times):
+    """
+    Returns a boolean array of which segments between consecutive (sorted)
+    times contain any of the provided key times (inclusive).
+    """
+    times = np.asarray(times, dtype=np.float64)
+    key_times = np.sort(np.asarray(key_times or [], dtype=np.float64))
+    num_before_end = np.searchsorted(key_times, times[1:], side="right")
+    num_before_start = np.searchsorted(key_times, times[:-1], side="left")
+    return num_before_end > num_before_start
+
+
+class WheelSolution(object):
+    """
+    The movement of every segment between two wheel keys, as numpy arrays
+    with one entry per segment.
+    """
+
+    def __init__(self, l_wheel_speeds, r_wheel_speeds, round_turn_under_point_five=False,
+                 turn_wrong_direction=False, max_wheel_speed=MAX_WHEEL_SPEED_MMPS,
+                 max_rotation_speed=MAX_BODY_ROTATION_SPEED_DEG_PER_SEC):
+        self.l_wheel_speeds = np.asarray(l_wheel_speeds, dtype=np.float64)
+        self.r_wheel_speeds = np.asarray(r_wheel_speeds, dtype=np.float64)
+        self.radius_types, self.radii, self.rounded_radii = find_radii(
+            self.l_wheel_speeds, self.r_wheel_speeds, round_turn_under_point_five)
+
+        # The engine reads the radius as an int16, so arc turns with a larger
+        # radius are sent as straight movement
+        is_arc = self.radius_types == ARC_TURN
+        self.rounded_radius_clamped = is_arc & is_radius_out_of_range(self.rounded_radii)
+        self.unrounded_radius_clamped = is_arc & is_radius_out_of_range(self.radii)
+        self.radius_types[self.rounded_radius_clamped] = STRAIGHT
+        # With round_turn_under_point_five, radii under MIN_RADIUS_THRESHOLD
+        # are already turns in place since their rounded radius is 0
+
+        self.speeds = find_speeds(self.l_wheel_speeds, self.r_wheel_speeds, self.radius_types,
+                                  self.radii, self.rounded_radii, turn_wrong_direction)
+        self.clamped_speeds, self.speed_limits = clamp_speeds(
+            self.radius_types, self.speeds, max_wheel_speed, max_rotation_speed)
+        self.limits_exceeded = np.abs(self.clamped_speeds - self.speeds) >= SPEED_MSG_THRESHOLD
+        self._max_speeds = {ARC_TURN: max_wheel_speed, STRAIGHT: max_wheel_speed,
+                            TURN_IN_PLACE: max_rotation_speed}
+
+    def __len__(self):
+        return len(self.speeds)
+
+    def get_radius(self, idx):
+        """
+        Returns the radius of a segment the way it is exported, which is
+        STRAIGHT_RADIUS, TURN_IN_PLACE_RADIUS or the rounded radius (int).
+        """
+        radius_type = self.radius_types[idx]
+        if radius_type == STRAIGHT:
+            return STRAIGHT_RADIUS
+        elif radius_type == TURN_IN_PLACE:
+            return TURN_IN_PLACE_RADIUS
+        return int(self.rounded_radii[idx])
+
+    def is_moving(self, idx):
+        return not (self.l_wheel_speeds[idx] == 0 and self.r_wheel_speeds[idx] == 0)
+
+    def get_exceeded_indices(self):
+        return np.flatnonzero(self.limits_exceeded).tolist()
+
+    def get_problems(self, idx, frame_num):
+        """
+        Returns the list of messages about the radius and speed of a segment
+        that had to be clamped, reported at the provided frame.
+        """
+        problems = []
+        msg = "The radius at frame %s has been clamped from %s mm to %s"
+        if self.rounded_radius_clamped[idx]:
+            problems.append(msg % (frame_num, int(self.rounded_radii[idx]), STRAIGHT_RADIUS))
+        if self.unrounded_radius_clamped[idx]:
+            problems.append(msg % (frame_num, float(self.radii[idx]), STRAIGHT_RADIUS))
+        if self.limits_exceeded[idx]:
+            radius_type = self.radius_types[idx]
+            speed = float(self.speeds[idx])
+            max_speed = self._max_speeds[radius_type]
+            speed_units = "deg/s" if radius_type == TURN_IN_PLACE else "mm/s"
+            problems.append("The %s movement at frame %s has been clamped from %s to %s %s"
+                            % (self.get_radius(idx), frame_num, speed,
+                               max_speed if speed > 0 else -max_speed, speed_units))
+        return problems
+
+    def get_clamped_wheel_speeds(self):
+        """
+        Returns arrays of the left and right wheel speeds that move the
+        robot at the clamped speed of every segment.
+        """
+        return speeds_to_wheel_speeds(self.radius_types, self.clamped_speeds, self.rounded_radii)
+
+
+def solve(l_wheel_values, r_wheel_values, times, is_radians=False, **kwargs):
+    """
+    Returns the WheelSolution for the wheel rotation values at the sorted
+    key times. Keyword arguments are passed on to WheelSolution.
+    """
+    l_wheel_speeds, r_wheel_speeds = get_wheel_speeds(
+        l_wheel_values, r_wheel_values, times, is_radians,
+        kwargs.get("round_turn_under_point_five", False))
+    return WheelSolution(l_wheel_speeds, r_wheel_speeds, **kwargs)
+
+
+def benchmark(num_keys=100000):
+    """
+    Solves random wheel keys and prints the time taken.
+    """
+    rand = np.random.RandomState(0)
+    times = np.cumsum(rand.randint(1, 30, num_keys)).astype(np.float64)
+    l_wheel_values = np.cumsum(rand.uniform(-720, 720, num_keys))
+    r_wheel_values = np.cumsum(rand.uniform(-720, 720, num_keys))
+    start_time = time.time()
+    solution = solve(l_wheel_values, r_wheel_values, times)
+    print("Solved %s segments in %.3f sec (%s exceed the speed limits)"
+          % (len(solution), time.time() - start_time, len(solution.get_exceeded_indices())))
+
+
+if __name__ == "__main__":
+    benchmark(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Headless unit tests for wheel_solver.py, which compare the WheelSolution of
+a few wheel speeds with the radius and speed computed by hand for straight
+movement, turns in place, arc turns and movement that has to be clamped:
+
+    python ankimaya/wheel_solver_unit_tests.py
+"""
+
+import os
+import sys
+import math
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from ankimaya import wheel_solver
+from ankimaya.wheel_solver import WheelSolution, ARC_TURN, STRAIGHT, TURN_IN_PLACE
+from ankimaya.wheel_solver import STRAIGHT_RADIUS, TURN_IN_PLACE_RADIUS
+from robot_config import WHEEL_DIST_MM, MAX_WHEEL_SPEED_MMPS, MAX_BODY_ROTATION_SPEED_DEG_PER_SEC
+
+
+class WheelSolutionTest(unittest.TestCase):
+
+    def test_straight(self):
+        solution = WheelSolution([100.0, -50.0], [100.0, -50.0])
+        self.assertEqual(solution.radius_types.tolist(), [STRAIGHT, STRAIGHT])
+        self.assertEqual(solution.get_radius(0), STRAIGHT_RADIUS)
+        self.assertEqual(solution.clamped_speeds.tolist(), [100.0, -50.0])
+        self.assertEqual(solution.get_exceeded_indices(), [])
+        self.assertFalse(WheelSolution([0.0], [0.0]).is_moving(0))
+
+    def test_turn_in_place(self):
+        # The wheels are WHEEL_DIST_MM apart, so 23 mm/s in opposite directions
+        # turns the robot at 46 / 46 = 1 rad/s
+        solution = WheelSolution([-23.0, 23.0], [23.0, -23.0])
+        self.assertEqual(solution.radius_types.tolist(), [TURN_IN_PLACE, TURN_IN_PLACE])
+        self.assertEqual(solution.get_radius(0), TURN_IN_PLACE_RADIUS)
+        self.assertAlmostEqual(solution.speeds[0], 57.29577951308232)
+        self.assertAlmostEqual(solution.speeds[1], -57.29577951308232)
+        solution = WheelSolution([-23.0], [23.0], turn_wrong_direction=True)
+        self.assertAlmostEqual(solution.speeds[0], -57.29577951308232)
+
+    def test_arc_turn(self):
+        # radius = 23 * (50 + 150) / (150 - 50) = 46 mm at the average speed of 100 mm/s
+        # radius = 23 * (40 + 160) / (160 - 40) = 38.33 mm, which is sent as 38 mm, so
+        # the speed is scaled by 38 / 38.33 to 100 * 114 / 115 mm/s
+        solution = WheelSolution([50.0, 40.0], [150.0, 160.0])
+        self.assertEqual(solution.radius_types.tolist(), [ARC_TURN, ARC_TURN])
+        self.assertEqual(solution.get_radius(0), 46)
+        self.assertEqual(solution.get_radius(1), 38)
+        self.assertAlmostEqual(solution.radii[1], 115 / 3.0)
+        self.assertAlmostEqual(solution.speeds[0], 100.0)
+        self.assertAlmostEqual(solution.speeds[1], 100 * 114 / 115.0)
+        # radius = 23 * (-150 + -50) / (-50 + 150) = -46 mm
+        self.assertEqual(WheelSolution([-150.0], [-50.0]).get_radius(0), -46)
+
+    def test_small_radius(self):
+        # radius = 23 * (-10 + 10.5) / (10.5 + 10) = 0.56 mm, which rounds to 1 mm, and
+        # radius = 23 * (-10 + 10.3) / (10.3 + 10) = 0.34 mm, which is sent as 1 mm
+        # unless radii under 0.5 mm are rounded to 0 (a turn in place)
+        solution = WheelSolution([-10.0, -10.0], [10.5, 10.3])
+        self.assertEqual(solution.rounded_radii.tolist(), [1, 1])
+        solution = WheelSolution([-10.0, -10.0], [10.5, 10.3], round_turn_under_point_five=True)
+        self.assertEqual(solution.get_radius(0), 1)
+        self.assertEqual(solution.get_radius(1), TURN_IN_PLACE_RADIUS)
+
+    def test_clamped_speeds(self):
+        turn_speed = math.radians(400) * WHEEL_DIST_MM / 2.0
+        solution = WheelSolution([300.0, -turn_speed], [300.0, turn_speed])
+        self.assertAlmostEqual(solution.speeds[1], 400.0)
+        self.assertEqual(solution.clamped_speeds.tolist(),
+                         [MAX_WHEEL_SPEED_MMPS, MAX_BODY_ROTATION_SPEED_DEG_PER_SEC])
+        self.assertEqual(solution.get_exceeded_indices(), [0, 1])
+        self.assertEqual(solution.get_problems(0, 12),
+                         ["The STRAIGHT movement at frame 12 has been clamped from 300.0 to 220 mm/s"])
+        l_wheel_speeds, r_wheel_speeds = solution.get_clamped_wheel_speeds()
+        self.assertEqual(l_wheel_speeds[0], MAX_WHEEL_SPEED_MMPS)
+        self.assertEqual(r_wheel_speeds[0], MAX_WHEEL_SPEED_MMPS)
+        self.assertAlmostEqual(r_wheel_speeds[1], math.radians(300) * WHEEL_DIST_MM / 2.0)
+        self.assertAlmostEqual(l_wheel_speeds[1], -r_wheel_speeds[1])
+
+    def test_clamped_radius(self):
+        # radius = 23 * 200.01 / 0.01 = 460023 mm, which does not fit in an int16
+        solution = WheelSolution([100.0], [100.01])
+        self.assertEqual(solution.get_radius(0), STRAIGHT_RADIUS)
+        self.assertAlmostEqual(solution.speeds[0], 100.005)
+        self.assertEqual(len(solution.get_problems(0, 5)), 2)
+
+
+class SolveTest(unittest.TestCase):
+
+    def test_wheel_speeds(self):
+        # One full turn of a 29 mm wheel in 30 frames (0.99 sec, because of the
+        # timeline scale) moves the robot 29 * pi mm
+        solution = wheel_solver.solve([0, 360, 360], [0, 360, 720], [0, 30, 60])
+        self.assertEqual(len(solution), 2)
+        self.assertAlmostEqual(solution.l_wheel_speeds[0], 29 * math.pi / 0.99, places=4)
+        self.assertEqual(solution.get_radius(0), STRAIGHT_RADIUS)
+        # Only the right wheel turns, so the robot turns around the left wheel
+        self.assertEqual(solution.get_radius(1), WHEEL_DIST_MM / 2)
+
+    def test_average_small_speeds(self):
+        # -100 / 98 is close enough to -1 to be sent as a turn in place
+        l_wheel_speeds, r_wheel_speeds = wheel_solver.average_small_speeds(
+            np.array([-100.0, -100.0]), np.array([98.0, 50.0]))
+        self.assertEqual(l_wheel_speeds.tolist(), [-99.0, -100.0])
+        self.assertEqual(r_wheel_speeds.tolist(), [99.0, 50.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+"""
+This module emulates how the robot streams an exported animation clip, so the
+timing of all of its tracks can be checked without a robot and much faster
+than real time. A simulated clock advances one tick (33 ms) at a time, and
+for every tick the emulator reports the state of each track:
+
+ - head angle and lift height, which move linearly from where they are to the
+   value of a HeadAngleKeyFrame/LiftHeightKeyFrame over its duration
+ - procedural face parameters, interpolated between ProceduralFaceKeyFrames
+   (see ankiutils/proc_face.py)
+ - which frame of a FaceAnimationKeyFrame sprite sequence is shown
+ - the audio events of RobotAudioKeyFrames and any other keyframes (eg. events)
+   that trigger during the tick
+ - backpack lights, and the body motion and pose of the robot (see
+   ankiutils/simulate_body_motion.py)
+
+A keyframe starts at the first tick at or after its trigger time. Without the
+number of frames of each sprite sequence (see get_sprite_lengths), a sprite
+sequence is shown until the next one starts or the clip ends.
+
+Example usage:
+
+    for tick in AnimEmulator(keyframes):
+        print(tick.time_ms, tick.head_angle_deg, tick.sprite, tick.audio_events)
+
+Usage as a script, which prints how fast each clip was emulated and writes
+the state of every tick to a <clip name>.json file in the output directory:
+
+    anim_emulator.py [-output <dir>] [-sprites <sprite_dir>] <anim_json_tar_or_dir> ...
+"""
+
+import sys
+import os
+import json
+import time
+
+from robot_config import LIFT_HEIGHT_MIN_ROBOT_MM
+from ankiutils import anim_files, image_files, proc_face
+from ankiutils import simulate_body_motion as sbm
+
+
+OUTPUT_DIR_FLAG = "-output"
+SPRITE_DIR_FLAG = "-sprites"
+
+TICK_MS = sbm.TICK_MS
+
+KEYFRAME_TYPE_KEY = "Name"
+TRIGGER_TIME_KEY = "triggerTime_ms"
+DURATION_TIME_KEY = "durationTime_ms"
+
+HEAD_ANGLE_KEYFRAME = "HeadAngleKeyFrame"
+LIFT_HEIGHT_KEYFRAME = "LiftHeightKeyFrame"
+SPRITE_KEYFRAME = "FaceAnimationKeyFrame"
+AUDIO_KEYFRAME = "RobotAudioKeyFrame"
+BACKPACK_LIGHTS_KEYFRAME = "BackpackLightsKeyFrame"
+
+HEAD_ANGLE_KEY = "angle_deg"
+LIFT_HEIGHT_KEY = "height_mm"
+SPRITE_NAME_KEY = "animName"
+AUDIO_EVENT_GROUPS_KEY = "eventGroups"
+AUDIO_NAME_KEY = "audioName"
+BACKPACK_LIGHT_KEYS = ["Front", "Middle", "Back", "Left", "Right"]
+
+# Keyframes that are reported as state of their own rather than as events
+TRACK_KEYFRAMES = [HEAD_ANGLE_KEYFRAME, LIFT_HEIGHT_KEYFRAME, proc_face.PROC_FACE_KEYFRAME,
+                   SPRITE_KEYFRAME, AUDIO_KEYFRAME, BACKPACK_LIGHTS_KEYFRAME] + sbm.BODY_TRACK_KEYFRAMES
+
+DEFAULT_HEAD_ANGLE_DEG = 0.0
+DEFAULT_LIFT_HEIGHT_MM = LIFT_HEIGHT_MIN_ROBOT_MM
+
+
+def _get_start_tick(keyframe, tick_ms=TICK_MS):
+    """
+    Returns the index of the first tick at or after a keyframe's trigger time.
+    """
+    return -(-int(keyframe[TRIGGER_TIME_KEY]) // tick_ms)
+
+
+def get_audio_names(keyframe):
+    """
+    Returns the list of audio event names of a RobotAudioKeyFrame.
+    """
+    names = []
+    for event_group in keyframe.get(AUDIO_EVENT_GROUPS_KEY, []):
+        audio_names = event_group.get(AUDIO_NAME_KEY, [])
+        if not isinstance(audio_names, list):
+            audio_names = [audio_names]
+        names.extend(audio_names)
+    return names
+
+
+def get_sprite_lengths(sprite_dir, sprite_names):
+    """
+    Returns a dict of sprite sequence name -> number of frames for the sprite
+    sequences in sprite_dir, which is the length of the fileList in their
+    definition.json file (or the number of PNG files without one). Only the
+    image headers are read (see image_files.get_image_sequence_info).
+    """
+    from ankiutils.render_anim_clips import get_sprite_source
+    sprite_lengths = {}
+    for sprite_name in set(sprite_names):
+        source = get_sprite_source(sprite_dir, sprite_name)
+        if source is None:
+            raise ValueError("Unable to locate the '%s' sprite sequence in %s" % (sprite_name, sprite_dir))
+        info = image_files.get_image_sequence_info(source, [image_files.DEFAULT_IMAGE_TYPE])
+        sprite_lengths[sprite_name] = info["frame_count"]
+    return sprite_lengths
+
+
+class _MotionTrack(object):
+    """
+    The value of a head or lift track, which moves linearly from where it is
+    when a keyframe starts to the value of that keyframe over its duration.
+    """
+
+    def __init__(self, keyframes, value_key, value, tick_ms=TICK_MS):
+        self.keyframes = keyframes
+        self.tick_ms = tick_ms
+        self.value_key = value_key
+        self.value = value
+        self._idx = 0
+        self._move = None
+
+    def step(self, tick_idx, time_ms):
+        while self._idx < len(self.keyframes):
+            keyframe = self.keyframes[self._idx]
+            if _get_start_tick(keyframe, self.tick_ms) > tick_idx:
+                break
+            self._idx += 1
+            self._move = (self.value, keyframe[self.value_key], time_ms,
+                          keyframe.get(DURATION_TIME_KEY, 0))
+        if self._move is not None:
+            start_value, end_value, start_time, duration = self._move
+            if duration <= 0 or time_ms >= start_time + duration:
+                self.value = end_value
+                self._move = None
+            else:
+                self.value = start_value + (end_value - start_value) * (time_ms - start_time) / float(duration)
+        return self.value
+
+
+class TickState(object):
+    """
+    The state of every track of a clip at one tick.
+    """
+
+    def __init__(self, time_ms):
+        self.time_ms = time_ms
+        self.head_angle_deg = None
+        self.lift_height_mm = None
+        self.face = None
+        self.left_eye = None
+        self.right_eye = None
+        self.sprite = None
+        self.audio_events = []
+        self.events = []
+        self.backpack_lights = None
+        self.body_motion = None
+        self.pose = None
+
+    def to_dict(self):
+        return {"time_ms": self.time_ms,
+                "head_angle_deg": self.head_angle_deg,
+                "lift_height_mm": self.lift_height_mm,
+                "face": self.face,
+                "left_eye": self.left_eye,
+                "right_eye": self.right_eye,
+                "sprite": self.sprite,
+                "audio_events": self.audio_events,
+                "events": self.events,
+                "backpack_lights": self.backpack_lights,
+                "body_motion": self.body_motion,
+                "pose": self.pose.to_list() if self.pose else None}
+
+
+class AnimEmulator(object):
+    """
+    Streams the keyframes of a clip tick by tick. Iterate over the emulator
+    (or call run()) to get the TickState of every tick from time 0 until all
+    tracks of the clip have finished.
+    """
+
+    def __init__(self, keyframes, sprite_lengths=None, tick_ms=TICK_MS,
+                 head_angle_deg=DEFAULT_HEAD_ANGLE_DEG, lift_height_mm=DEFAULT_LIFT_HEIGHT_MM):
+        self.tick_ms = tick_ms
+        self.head_angle_deg = head_angle_deg
+        self.lift_height_mm = lift_height_mm
+        self.sprite_lengths = sprite_lengths or {}
+        self.tracks = {}
+        for keyframe in sorted(keyframes, key=lambda x: x[TRIGGER_TIME_KEY]):
+            self.tracks.setdefault(keyframe.get(KEYFRAME_TYPE_KEY), []).append(keyframe)
+        self.body_result = sbm.BodyMotionSimulator(tick_ms).simulate(keyframes)
+        self.num_ticks = self._get_num_ticks()
+
+    def _get_num_ticks(self):
+        end_tick = len(self.body_result.poses) - 1
+        for keyframe_type, keyframes in self.tracks.items():
+            for keyframe in keyframes:
+                last_tick = _get_start_tick(keyframe, self.tick_ms)
+                last_tick += -(-int(keyframe.get(DURATION_TIME_KEY, 0)) // self.tick_ms)
+                if keyframe_type == SPRITE_KEYFRAME:
+                    last_tick += self.sprite_lengths.get(keyframe[SPRITE_NAME_KEY], 1) - 1
+                end_tick = max(end_tick, last_tick)
+        return end_tick + 1
+
+    def get_problems(self):
+        """
+        Returns the list of problems found when simulating the body motion.
+        """
+        return self.body_result.problems
+
+    def _get_face_params(self, times):
+        proc_keyframes = self.tracks.get(proc_face.PROC_FACE_KEYFRAME)
+        if not proc_keyframes:
+            return None, None, None
+        return [x.tolist() for x in proc_face.interpolate_params(proc_keyframes, times)]
+
+    def _get_interval_keyframes(self, keyframe_type):
+        """
+        Returns a dict of tick index -> keyframe for a track whose keyframes
+        last from their trigger time for their duration (or until the next
+        keyframe of that track starts).
+        """
+        intervals = {}
+        for keyframe in self.tracks.get(keyframe_type, []):
+            start_tick = _get_start_tick(keyframe, self.tick_ms)
+            if keyframe_type == SPRITE_KEYFRAME:
+                num_ticks = self.sprite_lengths.get(keyframe[SPRITE_NAME_KEY], self.num_ticks)
+            else:
+                num_ticks = -(-int(keyframe.get(DURATION_TIME_KEY, 0)) // self.tick_ms)
+            for tick_idx in range(start_tick, min(start_tick + max(num_ticks, 1), self.num_ticks)):
+                intervals[tick_idx] = keyframe
+        return intervals
+
+    def _get_events(self):
+        """
+        Returns a dict of tick index -> list of keyframes that trigger at that
+        tick, for audio and the keyframes that are not a track of their own.
+        """
+        events = {}
+        for keyframe_type, keyframes in self.tracks.items():
+            if keyframe_type in TRACK_KEYFRAMES and keyframe_type != AUDIO_KEYFRAME:
+                continue
+            for keyframe in keyframes:
+                events.setdefault(_get_start_tick(keyframe, self.tick_ms), []).append(keyframe)
+        return events
+
+    def __iter__(self):
+        times = [x * self.tick_ms for x in range(self.num_ticks)]
+        face, left_eye, right_eye = self._get_face_params(times)
+        head = _MotionTrack(self.tracks.get(HEAD_ANGLE_KEYFRAME, []), HEAD_ANGLE_KEY,
+                            self.head_angle_deg, self.tick_ms)
+        lift = _MotionTrack(self.tracks.get(LIFT_HEIGHT_KEYFRAME, []), LIFT_HEIGHT_KEY,
+                            self.lift_height_mm, self.tick_ms)
+        sprites = self._get_interval_keyframes(SPRITE_KEYFRAME)
+        lights = self._get_interval_keyframes(BACKPACK_LIGHTS_KEYFRAME)
+        body_motions = self._get_interval_keyframes(sbm.BODY_MOTION_KEYFRAME)
+        events = self._get_events()
+        poses = self.body_result.poses
+        for tick_idx, time_ms in enumerate(times):
+            tick = TickState(time_ms)
+            tick.head_angle_deg = head.step(tick_idx, time_ms)
+            tick.lift_height_mm = lift.step(tick_idx, time_ms)
+            if face is not None:
+                tick.face, tick.left_eye, tick.right_eye = face[tick_idx], left_eye[tick_idx], right_eye[tick_idx]
+            if tick_idx in sprites:
+                keyframe = sprites[tick_idx]
+                tick.sprite = [keyframe[SPRITE_NAME_KEY], tick_idx - _get_start_tick(keyframe, self.tick_ms)]
+            if tick_idx in lights:
+                tick.backpack_lights = dict((x, lights[tick_idx].get(x)) for x in BACKPACK_LIGHT_KEYS)
+            if tick_idx in body_motions:
+                keyframe = body_motions[tick_idx]
+                tick.body_motion = [keyframe.get(sbm.SPEED_KEY), keyframe.get(sbm.RADIUS_KEY)]
+            for keyframe in events.get(tick_idx, []):
+                if keyframe[KEYFRAME_TYPE_KEY] == AUDIO_KEYFRAME:
+                    tick.audio_events.extend(get_audio_names(keyframe))
+                else:
+                    tick.events.append(keyframe[KEYFRAME_TYPE_KEY])
+            tick.pose = poses[min(tick_idx, len(poses) - 1)]
+            yield tick
+
+    def run(self):
+        return list(self)
+
+
+def emulate_clips(paths, output_dir=None, sprite_dir=None):
+    """
+    Emulates every clip in the provided .json/.tar files and directories,
+    prints how much faster than real time each one was emulated and writes
+    the state of every tick to output_dir (if provided). Returns a dict of
+    clip name -> list of ticks.
+    """
+    if output_dir and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    clips = anim_files.get_clips(paths)
+    all_ticks = {}
+    for clip_name in sorted(clips):
+        keyframes = clips[clip_name]
+        sprite_lengths = None
+        if sprite_dir:
+            sprite_lengths = get_sprite_lengths(sprite_dir, [x[SPRITE_NAME_KEY] for x in keyframes
+                                                             if x.get(KEYFRAME_TYPE_KEY) == SPRITE_KEYFRAME])
+        start_time = time.time()
+        emulator = AnimEmulator(keyframes, sprite_lengths)
+        ticks = emulator.run()
+        elapsed_sec = max(time.time() - start_time, 1e-6)
+        clip_sec = len(ticks) * TICK_MS / 1000.0
+        print("%s: %s ticks (%.2f sec) emulated in %.3f sec (%.0fx real time)"
+              % (clip_name, len(ticks), clip_sec, elapsed_sec, clip_sec / elapsed_sec))
+        for problem in emulator.get_problems():
+            print("    %s" % problem)
+        if output_dir:
+            with open(os.path.join(output_dir, "%s.json" % clip_name), 'w') as fh:
+                json.dump([x.to_dict() for x in ticks], fh)
+        all_ticks[clip_name] = ticks
+    return all_ticks
+
+
+def main(args):
+    flags = { OUTPUT_DIR_FLAG : None, SPRITE_DIR_FLAG : None }
+    paths = []
+    idx = 0
+    while idx < len(args):
+        if args[idx] in flags:
+            flags[args[idx]] = args[idx + 1]
+            idx += 2
+        else:
+            paths.append(args[idx])
+            idx += 1
+    if not paths:
+        print("Usage: %s [%s <dir>] [%s <sprite_dir>] <anim_json_tar_or_dir> ..."
+              % (os.path.basename(__file__), OUTPUT_DIR_FLAG, SPRITE_DIR_FLAG))
+        return 1
+    emulate_clips(paths, flags[OUTPUT_DIR_FLAG], flags[SPRITE_DIR_FLAG])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -5,9 +5,15 @@ MAYA_FILE_EXT = ".ma"
 
 OUTPUT_PACKAGE_EXT = ".tar"
 
+ANIM_FILE_EXT = ".json"
+
+KEYFRAME_TYPE_KEY = "Name"
+
 
 import sys
 import os
+import json
+import tarfile
 import subprocess
 import time
 import pprint
@@ -79,3 +85,54 @@ def get_all_maya_files(maya_files_dir):
     return maya_files
 
 
+def iter_anim_files(paths):
+    """
+    Yields a (source name, file contents) tuple for every .json file in the
+    provided files, .tar files and directories (searched recursively).
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            sub_paths = []
+            for dir_path, dir_names, file_names in os.walk(path):
+                dir_names.sort()
+                sub_paths.extend(os.path.join(dir_path, x) for x in sorted(file_names)
+                                 if x.endswith(ANIM_FILE_EXT) or x.endswith(OUTPUT_PACKAGE_EXT))
+            for item in iter_anim_files(sub_paths):
+                yield item
+        elif path.endswith(OUTPUT_PACKAGE_EXT):
+            tar = tarfile.open(path, 'r|*')
+            try:
+                for member in tar:
+                    if member.isfile() and member.name.endswith(ANIM_FILE_EXT):
+                        yield ("%s:%s" % (path, member.name), tar.extractfile(member).read())
+            finally:
+                tar.close()
+        else:
+            with open(path, 'rb') as fh:
+                yield (path, fh.read())
+
+
+def get_clips(paths, keyframe_types=None):
+    """
+    Returns a dict of clip name -> list of keyframes of the provided types
+    (or of all keyframes if keyframe_types is None) for every clip that has
+    any of those keyframes in the provided .json files, .tar files and
+    directories.
+    """
+    clips = {}
+    for source, contents in iter_anim_files(paths):
+        try:
+            anim_data = json.loads(contents.decode("utf-8"))
+        except ValueError as e:
+            print("Skipping %s because: %s" % (source, e))
+            continue
+        if not isinstance(anim_data, dict):
+            continue
+        for clip_name, keyframes in anim_data.items():
+            if not isinstance(keyframes, list):
+                continue
+            keyframes = [x for x in keyframes if isinstance(x, dict) and
+                         (keyframe_types is None or x.get(KEYFRAME_TYPE_KEY) in keyframe_types)]
+            if keyframes:
+                clips[clip_name] = keyframes
+    return clips
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+"""
+Tools to apply a whole mapping of renames (eg. {"anim_foo_01" : "anim_bar_01"})
+to any number of text files (animation group .json files, AnimationTriggerMap.json,
+state machine data, etc.) in a single pass over each file.
+
+The old names are compiled into a trie so every file is scanned once regardless
+of how many names are being renamed, and only whole tokens are replaced, so
+renaming "ag_foo" will not touch "ag_foo_bar". In .json files, the renames can
+also be limited to the string values of one key (eg. "Name"), so other strings
+that happen to match an old name are left alone.
+"""
+
+import sys
+import os
+import re
+import stat
+import difflib
+import tempfile
+
+
+# Characters that may appear in an animation clip or animation group name. A match
+# is only accepted if it is NOT immediately preceded or followed by one of these.
+TOKEN_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_")
+
+# Key used in the trie nodes to store the full name that ends at that node
+_END_KEY = None
+
+# Matches a "key": "value" pair in a .json file (for a key that is filled in)
+JSON_VALUE_PATTERN = r'("%s"\s*:\s*")([^"\\]*)(")'
+
+
+class TokenMatcher(object):
+    """
+    A trie of old names that can find and replace whole-token occurrences of
+    all of those names in a string with one left-to-right scan.
+    """
+
+    def __init__(self, rename_mapping, token_chars=TOKEN_CHARS):
+        self.rename_mapping = dict((k, v) for k, v in rename_mapping.items() if k and k != v)
+        self.token_chars = token_chars
+        self._root = {}
+        for old_name in self.rename_mapping:
+            node = self._root
+            for char in old_name:
+                node = node.setdefault(char, {})
+            node[_END_KEY] = old_name
+
+    def __len__(self):
+        return len(self.rename_mapping)
+
+    def _match_at(self, text, start):
+        """
+        Returns the longest old name that starts at text[start] and ends at a
+        token boundary, or None if there is no such name.
+        """
+        node = self._root
+        best = None
+        idx = start
+        text_len = len(text)
+        while idx < text_len:
+            node = node.get(text[idx])
+            if node is None:
+                break
+            idx += 1
+            if _END_KEY in node and (idx == text_len or text[idx] not in self.token_chars):
+                best = node[_END_KEY]
+        return best
+
+    def find_all(self, text):
+        """
+        Returns a list of (index, old_name) tuples for every whole-token
+        occurrence of an old name in the provided text.
+        """
+        matches = []
+        if not self._root:
+            return matches
+        token_chars = self.token_chars
+        idx = 0
+        text_len = len(text)
+        prev_char = None
+        while idx < text_len:
+            char = text[idx]
+            if char in self._root and (prev_char is None or prev_char not in token_chars):
+                old_name = self._match_at(text, idx)
+                if old_name:
+                    matches.append((idx, old_name))
+                    idx += len(old_name)
+                    prev_char = old_name[-1]
+                    continue
+            prev_char = char
+            idx += 1
+        return matches
+
+    def replace(self, text):
+        """
+        Returns a (new_text, num_replacements) tuple for the provided text.
+        """
+        matches = self.find_all(text)
+        if not matches:
+            return (text, 0)
+        pieces = []
+        last_idx = 0
+        for idx, old_name in matches:
+            pieces.append(text[last_idx:idx])
+            pieces.append(self.rename_mapping[old_name])
+            last_idx = idx + len(old_name)
+        pieces.append(text[last_idx:])
+        return ("".join(pieces), len(matches))
+
+    def replace_values(self, text, value_key):
+        """
+        Returns a (new_text, num_replacements) tuple for the provided .json
+        text, where only string values of value_key that are an old name
+        (the whole value) are renamed.
+        """
+        count = [0]
+        def replace_value(match):
+            new_name = self.rename_mapping.get(match.group(2))
+            if new_name is None:
+                return match.group(0)
+            count[0] += 1
+            return match.group(1) + new_name + match.group(3)
+        new_text = re.sub(JSON_VALUE_PATTERN % re.escape(value_key), replace_value, text)
+        return (new_text, count[0])
+
+
+def atomic_write(file_path, contents):
+    """
+    Writes contents to a temporary file in the same directory as file_path and
+    then moves that over file_path, so a failure part way through never leaves
+    a truncated file behind. The permissions of the original file are kept
+    (plus user-write, since files checked out with locks may be read-only).
+    """
+    dir_path = os.path.dirname(os.path.abspath(file_path))
+    try:
+        file_mode = stat.S_IMODE(os.stat(file_path).st_mode) | stat.S_IWUSR
+    except OSError:
+        file_mode = None
+    fd, temp_file = tempfile.mkstemp(dir=dir_path, prefix=".tmp_rename_")
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(contents)
+        if file_mode is not None:
+            os.chmod(temp_file, file_mode)
+            os.chmod(file_path, file_mode)
+            if sys.platform.startswith("win"):
+                # os.rename() will not replace an existing file on Windows
+                os.remove(file_path)
+        os.rename(temp_file, file_path)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+
+class RenameTransaction(object):
+    """
+    Collects files to be updated with a rename mapping, computes all of the
+    updates in memory and then either reports them (dry run) or writes them.
+    If writing any of the files fails, the files that were already written
+    are restored, so the files are either all updated or all left as they were.
+
+    Typical usage:
+        txn = RenameTransaction(rename_mapping)
+        txn.add_files(anim_group_files, value_key="Name")
+        txn.add_file(trigger_map_file, value_key="AnimName")
+        print(txn.diff())
+        updated_files = txn.commit()
+    """
+
+    def __init__(self, rename_mapping, line_filter=None):
+        """
+        If line_filter is provided (eg. "AnimName"), then only lines that
+        contain that string will be updated in the files that are added with
+        use_line_filter=True.
+        """
+        self.matcher = TokenMatcher(rename_mapping)
+        self.line_filter = line_filter
+        self._files = []
+        self._filtered = set()
+        self._value_keys = {}
+        self._results = None
+
+    def add_file(self, file_path, use_line_filter=False, value_key=None):
+        """
+        If value_key is provided (eg. "Name"), then only the string values
+        of that key in this .json file will be renamed.
+        """
+        file_path = os.path.abspath(file_path)
+        if file_path not in self._files:
+            self._files.append(file_path)
+        if use_line_filter:
+            self._filtered.add(file_path)
+        if value_key:
+            self._value_keys[file_path] = value_key
+        self._results = None
+
+    def add_files(self, file_paths, use_line_filter=False, value_key=None):
+        for file_path in file_paths:
+            self.add_file(file_path, use_line_filter, value_key)
+
+    def _rename_contents(self, contents, use_line_filter, value_key=None):
+        if value_key:
+            return self.matcher.replace_values(contents, value_key)
+        if not use_line_filter or not self.line_filter:
+            return self.matcher.replace(contents)
+        total = 0
+        new_lines = []
+        for one_line in contents.splitlines(True):
+            if self.line_filter in one_line:
+                one_line, count = self.matcher.replace(one_line)
+                total += count
+            new_lines.append(one_line)
+        return ("".join(new_lines), total)
+
+    def prepare(self):
+        """
+        Reads every file once and computes the updated contents. Returns a
+        list of (file_path, orig_contents, new_contents, num_replacements)
+        tuples for only the files that would change.
+        """
+        if self._results is not None:
+            return self._results
+        results = []
+        for file_path in self._files:
+            with open(file_path, 'rb') as fh:
+                orig_contents = fh.read()
+            use_line_filter = file_path in self._filtered
+            new_contents, count = self._rename_contents(orig_contents, use_line_filter,
+                                                        self._value_keys.get(file_path))
+            if count and new_contents != orig_contents:
+                results.append((file_path, orig_contents, new_contents, count))
+        self._results = results
+        return results
+
+    def diff(self, context_lines=1):
+        """
+        Returns a unified diff (as a single string) of all pending updates.
+        """
+        diff_lines = []
+        for file_path, orig_contents, new_contents, count in self.prepare():
+            diff_lines.extend(difflib.unified_diff(orig_contents.splitlines(True),
+                                                   new_contents.splitlines(True),
+                                                   fromfile=file_path, tofile=file_path,
+                                                   n=context_lines))
+        return "".join(diff_lines)
+
+    def commit(self, dry_run=False):
+        """
+        Writes all of the pending updates (unless dry_run is True) and returns
+        the list of files that were (or would be) updated. If any file can not
+        be written, the files that were already updated are restored and the
+        error is raised.
+        """
+        updated_files = []
+        written = []
+        try:
+            for file_path, orig_contents, new_contents, count in self.prepare():
+                if not dry_run:
+                    atomic_write(file_path, new_contents)
+                    written.append((file_path, orig_contents))
+                    print("Updated %s (%s replacements)" % (file_path, count))
+                updated_files.append(file_path)
+        except BaseException:
+            self.rollback(written)
+            raise
+        finally:
+            self._results = None
+        return updated_files
+
+    def rollback(self, written):
+        """
+        Restores the original contents of a list of (file_path, orig_contents)
+        tuples for the files that were already written.
+        """
+        for file_path, orig_contents in reversed(written):
+            try:
+                atomic_write(file_path, orig_contents)
+            except (OSError, IOError) as e:
+                print("ERROR: Failed to restore %s because: %s" % (file_path, e))
+            else:
+                print("Restored %s" % file_path)
+
+
+def bulk_rename(rename_mapping, file_paths, dry_run=False, line_filter=None):
+    """
+    Given a rename mapping and a list of files, this function will
+    rename every whole-token occurrence of the old names in those files.
+    When dry_run is True, the diff is printed and no files are written.
+    Returns the list of files that were (or would be) updated.
+    """
+    txn = RenameTransaction(rename_mapping, line_filter)
+    txn.add_files(file_paths, use_line_filter=bool(line_filter))
+    if dry_run:
+        print(txn.diff())
+    return txn.commit(dry_run)
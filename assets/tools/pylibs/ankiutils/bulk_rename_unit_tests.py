@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Unit tests for the TokenMatcher and RenameTransaction in bulk_rename.py,
+which only touch files in a temporary directory:
+
+    python ankiutils/bulk_rename_unit_tests.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ankiutils import bulk_rename
+from ankiutils.bulk_rename import TokenMatcher, RenameTransaction
+
+
+RENAME_MAPPING = {"anim_foo_01": "anim_bar_01", "ag_foo": "ag_baz", "anim_foo": "anim_qux"}
+
+ANIM_GROUP_CONTENTS = '''{
+  "Animations": [
+    {
+      "Name": "anim_foo_01",
+      "Weight": 1.0
+    },
+    {
+      "Name" : "anim_foo_01_extra",
+      "Comment": "anim_foo_01"
+    }
+  ]
+}
+'''
+
+
+class TokenMatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = TokenMatcher(RENAME_MAPPING)
+
+    def test_whole_tokens_only(self):
+        self.assertEqual(self.matcher.replace("ag_foo ag_foo_bar xag_foo"), ("ag_baz ag_foo_bar xag_foo", 1))
+
+    def test_longest_name_wins(self):
+        self.assertEqual(self.matcher.find_all("anim_foo_01 anim_foo"),
+                         [(0, "anim_foo_01"), (12, "anim_foo")])
+        self.assertEqual(self.matcher.replace('"anim_foo_01","anim_foo"'),
+                         ('"anim_bar_01","anim_qux"', 2))
+
+    def test_no_matches(self):
+        self.assertEqual(self.matcher.replace("anim_other"), ("anim_other", 0))
+        self.assertEqual(TokenMatcher({"same": "same"}).replace("same"), ("same", 0))
+
+    def test_replace_values(self):
+        new_text, count = self.matcher.replace_values(ANIM_GROUP_CONTENTS, "Name")
+        self.assertEqual(count, 1)
+        self.assertTrue('"Name": "anim_bar_01"' in new_text)
+        # Other keys and names that only start with an old name are left alone
+        self.assertTrue('"Comment": "anim_foo_01"' in new_text)
+        self.assertTrue('"Name" : "anim_foo_01_extra"' in new_text)
+
+
+class RenameTransactionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.files = []
+        for idx in range(3):
+            file_path = os.path.join(self.temp_dir, "ag_test_%s.json" % idx)
+            with open(file_path, 'wb') as fh:
+                fh.write(ANIM_GROUP_CONTENTS)
+            self.files.append(file_path)
+        self.atomic_write = bulk_rename.atomic_write
+
+    def tearDown(self):
+        bulk_rename.atomic_write = self.atomic_write
+        shutil.rmtree(self.temp_dir)
+
+    def read(self, file_path):
+        with open(file_path, 'rb') as fh:
+            return fh.read()
+
+    def test_commit(self):
+        txn = RenameTransaction(RENAME_MAPPING)
+        txn.add_files(self.files, value_key="Name")
+        self.assertEqual(txn.commit(dry_run=True), self.files)
+        self.assertEqual(self.read(self.files[0]), ANIM_GROUP_CONTENTS)
+        self.assertEqual(txn.commit(), self.files)
+        for file_path in self.files:
+            self.assertEqual(self.read(file_path),
+                             ANIM_GROUP_CONTENTS.replace('"Name": "anim_foo_01"', '"Name": "anim_bar_01"'))
+        # Nothing is left to rename
+        self.assertEqual(txn.commit(), [])
+
+    def test_rollback(self):
+        def failing_write(file_path, contents):
+            if file_path == self.files[-1]:
+                raise IOError("Disk full")
+            self.atomic_write(file_path, contents)
+        bulk_rename.atomic_write = failing_write
+        txn = RenameTransaction(RENAME_MAPPING)
+        txn.add_files(self.files, value_key="Name")
+        self.assertRaises(IOError, txn.commit)
+        for file_path in self.files:
+            self.assertEqual(self.read(file_path), ANIM_GROUP_CONTENTS)
+        self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                         sorted(os.path.basename(x) for x in self.files))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+"""
+Checks image sequences (directories or tar files of numbered PNG files) for
+problems that would break sprite packaging or face playback on the robot:
+
+  - files that do not follow the '<prefix>_<number>.png' naming convention
+    or use a different prefix from the rest of the sequence
+  - missing or duplicated frame numbers, or (for sequences whose
+    definition.json lists every frame, eg. because duplicate frames were
+    packaged once) frames that reference a file that is not in the sequence
+  - frames that are not the 184 x 96 face resolution or whose dimensions,
+    bit depth or color type differ from the first frame
+  - truncated or corrupt files (bad signature, chunk CRC or missing IEND)
+
+Every file is read once (tar files are streamed, so nothing is extracted)
+and all problems are reported together, rather than stopping at the first.
+
+Example usage:
+
+    check_image_sequences.py ~/workspace/vector-animations-raw/scenes/anim
+"""
+
+EXPECTED_WIDTH = 184
+EXPECTED_HEIGHT = 96
+
+IMAGE_FILE_TYPE = ".png"
+TAR_FILE_TYPE = ".tar"
+
+SEQUENCE_NAME_RE = r'(.*)_(\d+)\.png$'
+
+NO_SIZE_CHECK_FLAG = "-no_size_check"
+
+PNG_END_CHUNK = b"IEND"
+
+
+import sys
+import os
+import re
+import struct
+import tarfile
+import zlib
+import time
+
+from ankiutils.image_files import PNG_SIGNATURE, PNG_COLOR_TYPES, _parse_png_header
+from ankiutils.image_files import SEQUENCE_DEFINITION_FILE, parse_sequence_file_list
+
+
+_SEQUENCE_NAME_MATCH = re.compile(SEQUENCE_NAME_RE).match
+
+
+def parse_sequence_names(file_names):
+    """
+    Given a list of image file names, this function returns a tuple of
+    (sequence prefix, dict of frame number -> file name, list of problems)
+    where the problems are any names that do not fit the naming convention,
+    use a different prefix or duplicate another frame number.
+    """
+    set_name = None
+    frames = {}
+    problems = []
+    for file_name in file_names:
+        base_name = os.path.basename(file_name)
+        match_obj = _SEQUENCE_NAME_MATCH(base_name)
+        if not match_obj:
+            problems.append("'%s' does not fit the expected naming convention of "
+                            "'<text>_<5-digit number>.png'" % base_name)
+            continue
+        if set_name is None:
+            set_name = match_obj.group(1)
+        elif set_name != match_obj.group(1):
+            problems.append("'%s' does not match the expected '%s' prefix" % (base_name, set_name))
+            continue
+        num = int(match_obj.group(2))
+        if num in frames:
+            problems.append("'%s' and '%s' are both frame %s" % (os.path.basename(frames[num]),
+                                                                 base_name, num))
+            continue
+        frames[num] = file_name
+    return (set_name, frames, problems)
+
+
+def find_missing_frames(frame_numbers):
+    """
+    Returns a sorted list of the numbers between the lowest and highest
+    frame numbers that are not in frame_numbers.
+    """
+    frame_numbers = set(frame_numbers)
+    if not frame_numbers:
+        return []
+    return sorted(set(range(min(frame_numbers), max(frame_numbers) + 1)) - frame_numbers)
+
+
+def format_frame_ranges(frame_numbers):
+    """
+    Returns a compact string for a sorted list of frame numbers,
+    eg. [3, 4, 5, 9] -> "3-5, 9"
+    """
+    ranges = []
+    for num in frame_numbers:
+        if ranges and num == ranges[-1][1] + 1:
+            ranges[-1][1] = num
+        else:
+            ranges.append([num, num])
+    return ", ".join(str(x) if x == y else "%s-%s" % (x, y) for x, y in ranges)
+
+
+def check_png_data(data):
+    """
+    Given the full contents of a PNG file, this function walks every chunk,
+    verifies its CRC and returns a tuple of (header, problem) where header is
+    (width, height, bit depth, color type) or None and problem is a
+    description of the first corruption found or None.
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        return (None, "not a PNG file")
+    try:
+        header = _parse_png_header(data[:33])
+    except (ValueError, struct.error):
+        return (None, "missing IHDR chunk")
+    pos = len(PNG_SIGNATURE)
+    data_len = len(data)
+    while pos + 8 <= data_len:
+        chunk_len, chunk_type = struct.unpack(">I4s", data[pos:pos+8])
+        chunk_end = pos + 8 + chunk_len
+        if chunk_end + 4 > data_len:
+            return (header, "truncated in the '%s' chunk" % chunk_type.decode("latin-1"))
+        crc = struct.unpack(">I", data[chunk_end:chunk_end+4])[0]
+        if zlib.crc32(data[pos+4:chunk_end]) & 0xffffffff != crc:
+            return (header, "bad CRC in the '%s' chunk" % chunk_type.decode("latin-1"))
+        if chunk_type == PNG_END_CHUNK:
+            return (header, None)
+        pos = chunk_end + 4
+    return (header, "truncated (no IEND chunk)")
+
+
+def _iter_sequence_files(sequence_path, file_lists=None):
+    """
+    Yields a (file name, contents) tuple for every PNG file in a directory
+    or tar file. If a list is provided for 'file_lists', the frame file list
+    from the sequence's definition.json (if any) is appended to it.
+    """
+    if os.path.isdir(sequence_path):
+        for file_name in sorted(os.listdir(sequence_path)):
+            if file_name.lower().endswith(IMAGE_FILE_TYPE):
+                with open(os.path.join(sequence_path, file_name), 'rb') as fh:
+                    yield (file_name, fh.read())
+            elif file_lists is not None and file_name == SEQUENCE_DEFINITION_FILE:
+                with open(os.path.join(sequence_path, file_name), 'r') as fh:
+                    file_lists.append(parse_sequence_file_list(fh.read()))
+    else:
+        tar = tarfile.open(sequence_path, 'r|*')
+        try:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                if member.name.lower().endswith(IMAGE_FILE_TYPE):
+                    yield (member.name, tar.extractfile(member).read())
+                elif file_lists is not None and \
+                        os.path.basename(member.name) == SEQUENCE_DEFINITION_FILE:
+                    file_lists.append(parse_sequence_file_list(tar.extractfile(member).read()))
+        finally:
+            tar.close()
+
+
+def check_sequence(sequence_path, expected_size=(EXPECTED_WIDTH, EXPECTED_HEIGHT)):
+    """
+    Checks one image sequence (a directory or tar file of PNG files) and
+    returns a tuple of (number of frames, list of problems). If expected_size
+    is None, then frames are only checked to be consistent with each other.
+
+    If the sequence has a definition.json that lists every frame, the number
+    of frames is the length of that list, and the list is checked instead of
+    the frame numbering (which has gaps where duplicate frames were dropped).
+    """
+    problems = []
+    file_names = []
+    file_lists = []
+    headers = {}
+    try:
+        for file_name, data in _iter_sequence_files(sequence_path, file_lists):
+            file_names.append(file_name)
+            header, problem = check_png_data(data)
+            if problem:
+                problems.append("'%s' is corrupt: %s" % (file_name, problem))
+            if header:
+                headers[file_name] = header
+    except (tarfile.TarError, IOError, OSError, EOFError, zlib.error), e:
+        problems.append("Failed to read %s: %s" % (sequence_path, e))
+
+    set_name, frames, name_problems = parse_sequence_names(file_names)
+    problems.extend(name_problems)
+    file_list = ([x for x in file_lists if x] or [None])[0]
+    if file_list:
+        base_names = set(os.path.basename(x) for x in file_names)
+        missing_files = sorted(set(x for x in file_list if x not in base_names))
+        if missing_files:
+            problems.append("%s references missing file(s) %s"
+                            % (SEQUENCE_DEFINITION_FILE, ", ".join(missing_files)))
+    else:
+        missing_frames = find_missing_frames(frames.keys())
+        if missing_frames:
+            problems.append("'%s' is missing frame(s) %s" % (set_name, format_frame_ranges(missing_frames)))
+
+    first_header = None
+    first_file = None
+    for file_name in sorted(headers):
+        width, height, bit_depth, color_type = headers[file_name]
+        if expected_size and (width, height) != tuple(expected_size):
+            problems.append("'%s' is %s x %s pixels instead of %s x %s"
+                            % (file_name, width, height, expected_size[0], expected_size[1]))
+        if first_header is None:
+            first_header = headers[file_name]
+            first_file = file_name
+        elif headers[file_name] != first_header:
+            problems.append("'%s' is %s x %s %s-bit %s, but '%s' is %s x %s %s-bit %s"
+                            % (file_name, width, height, bit_depth,
+                               PNG_COLOR_TYPES.get(color_type, color_type), first_file,
+                               first_header[0], first_header[1], first_header[2],
+                               PNG_COLOR_TYPES.get(first_header[3], first_header[3])))
+    if file_list:
+        return (len(file_list), problems)
+    return (len(file_names), problems)
+
+
+def find_sequences(paths):
+    """
+    Given a list of directories and/or tar files, this function returns a
+    sorted list of every tar file and every directory that directly
+    contains PNG files at or below those paths.
+    """
+    sequences = set()
+    for path in paths:
+        path = os.path.abspath(os.path.expanduser(path))
+        if os.path.isfile(path):
+            sequences.add(path)
+            continue
+        for dir_path, dir_names, file_names in os.walk(path):
+            has_images = False
+            for file_name in file_names:
+                lower_name = file_name.lower()
+                if lower_name.endswith(TAR_FILE_TYPE):
+                    sequences.add(os.path.join(dir_path, file_name))
+                elif lower_name.endswith(IMAGE_FILE_TYPE):
+                    has_images = True
+            if has_images:
+                sequences.add(dir_path)
+    return sorted(sequences)
+
+
+def check_sequences(paths, expected_size=(EXPECTED_WIDTH, EXPECTED_HEIGHT)):
+    """
+    Checks every image sequence found at or below the provided paths and
+    returns a tuple of (total number of frames, dict of sequence path ->
+    list of problems), where only sequences with problems are included.
+    """
+    total_frames = 0
+    all_problems = {}
+    for sequence_path in find_sequences(paths):
+        num_frames, problems = check_sequence(sequence_path, expected_size)
+        total_frames += num_frames
+        if problems:
+            all_problems[sequence_path] = problems
+    return (total_frames, all_problems)
+
+
+def main(args):
+    expected_size = (EXPECTED_WIDTH, EXPECTED_HEIGHT)
+    if NO_SIZE_CHECK_FLAG in args:
+        args.remove(NO_SIZE_CHECK_FLAG)
+        expected_size = None
+    if not args:
+        print("Usage: %s [%s] <dir_or_tar_file> ..." % (os.path.basename(__file__), NO_SIZE_CHECK_FLAG))
+        return 1
+    start_time = time.time()
+    sequences = find_sequences(args)
+    total_frames, all_problems = check_sequences(sequences, expected_size)
+    for sequence_path in sorted(all_problems):
+        print(sequence_path)
+        for problem in all_problems[sequence_path]:
+            print("    %s" % problem)
+    print("Checked %s frames in %s sequences in %.1f seconds: %s sequences have problems"
+          % (total_frames, len(sequences), time.time() - start_time, len(all_problems)))
+    if all_problems:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,217 @@
+"""
+This module keeps rendered face images in a memory-bounded, least-recently-used
+cache and can draw upcoming frames in a background thread, so stepping back and
+forth through frames that were already shown is instant and playback does not
+wait on drawing.
+
+By default, frames are drawn with ankiutils/proc_face.py and cached by clip name
+plus a hash of the interpolated face parameters for that frame, so frames whose
+parameters did not change are reused after the keyframes are edited (and frames
+that hold the same face share an entry), while edited frames are simply drawn
+again. Another renderer can be provided as a render_func(clip_name, keyframes,
+frame_nums) that returns a list of images, in which case frames are cached by
+clip name, frame number and the keyframes on either side of that frame.
+
+Example usage:
+
+    cache = FaceFrameCache()
+    prefetcher = FramePrefetcher(cache)
+    prefetcher.request(clip_name, keyframes, frame_nums[1:])
+    for image in cache.get_frames(clip_name, keyframes, frame_nums):
+        show(image)
+    prefetcher.stop()
+"""
+
+# Default memory limit for cached images (each 184 x 96 RGB image is 53 KB)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Number of frames that the prefetcher draws at a time
+PREFETCH_BATCH_SIZE = 8
+
+TRIGGER_TIME_KEY = "triggerTime_ms"
+
+
+import bisect
+import collections
+import hashlib
+import json
+import threading
+
+try:
+    from ankiutils import proc_face
+except ImportError:
+    # NumPy is not available, so a render_func must be provided
+    proc_face = None
+
+
+def get_image_num_bytes(image):
+    """
+    Returns the size of a NumPy image array or a QImage.
+    """
+    try:
+        return image.nbytes
+    except AttributeError:
+        return image.byteCount()
+
+
+class FaceFrameCache(object):
+    """
+    A thread-safe LRU cache of face images that is bounded by the total
+    number of bytes in the cached images.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, hue=None, time_key=TRIGGER_TIME_KEY,
+                 render_func=None):
+        if render_func is None and proc_face is None:
+            raise ImportError("A render function is needed to cache face images without NumPy")
+        if hue is None and proc_face is not None:
+            hue = proc_face.DEFAULT_HUE
+        self.max_bytes = max_bytes
+        self.hue = hue
+        self.time_key = time_key
+        self.render_func = render_func
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._images)
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.pop(key, None)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images[key] = image
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        with self._lock:
+            old_image = self._images.pop(key, None)
+            if old_image is not None:
+                self.num_bytes -= get_image_num_bytes(old_image)
+            self._images[key] = image
+            self.num_bytes += get_image_num_bytes(image)
+            while self.num_bytes > self.max_bytes and len(self._images) > 1:
+                old_key, old_image = self._images.popitem(last=False)
+                self.num_bytes -= get_image_num_bytes(old_image)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.num_bytes = 0
+
+    def get_keys(self, clip_name, keyframes, frame_nums):
+        """
+        Returns a tuple of (list of cache keys, face params, left eye params,
+        right eye params) for the frames of a clip. The params are None when
+        a render_func is used.
+        """
+        if self.render_func is not None:
+            return (self._get_render_func_keys(clip_name, keyframes, frame_nums), None, None, None)
+        face, left_eye, right_eye = proc_face.interpolate_params(keyframes, frame_nums, self.time_key)
+        keys = []
+        for idx in range(len(frame_nums)):
+            params_hash = hashlib.sha1(face[idx].tobytes() + left_eye[idx].tobytes() +
+                                       right_eye[idx].tobytes()).hexdigest()
+            keys.append((clip_name, params_hash))
+        return (keys, face, left_eye, right_eye)
+
+    def _get_render_func_keys(self, clip_name, keyframes, frame_nums):
+        # A frame is drawn from the keyframes on either side of it, so the frame
+        # only needs to be drawn again if one of those keyframes was edited.
+        keyframes = sorted(keyframes, key=lambda keyframe: keyframe[self.time_key])
+        times = [keyframe[self.time_key] for keyframe in keyframes]
+        keyframe_hashes = [hashlib.sha1(json.dumps(keyframe, sort_keys=True)).hexdigest()
+                           for keyframe in keyframes]
+        keys = []
+        for frame_num in frame_nums:
+            idx = bisect.bisect_right(times, frame_num)
+            before = keyframe_hashes[idx-1] if idx > 0 else None
+            after = keyframe_hashes[idx] if idx < len(keyframes) else None
+            keys.append((clip_name, frame_num, before, after))
+        return keys
+
+    def get_frames(self, clip_name, keyframes, frame_nums):
+        """
+        Returns the list of images for the provided frames of a clip, where
+        keyframes is a list or dict (by time) of ProceduralFaceKeyFrame dicts.
+        Frames that are not cached are drawn together and then cached.
+        """
+        keyframe_list = list(keyframes.values()) if isinstance(keyframes, dict) else keyframes
+        keys, face, left_eye, right_eye = self.get_keys(clip_name, keyframe_list, frame_nums)
+        images = [self.get(key) for key in keys]
+        missing = [idx for idx, image in enumerate(images) if image is None]
+        if missing:
+            if self.render_func is not None:
+                # The render_func is given the keyframes as they were provided
+                rendered = self.render_func(clip_name, keyframes, [frame_nums[idx] for idx in missing])
+            else:
+                rendered = proc_face.render_frames(face[missing], left_eye[missing],
+                                                   right_eye[missing], self.hue)
+            for idx, image in zip(missing, rendered):
+                self.put(keys[idx], image)
+                images[idx] = image
+        return images
+
+    def get_frame(self, clip_name, keyframes, frame_num):
+        return self.get_frames(clip_name, keyframes, [frame_num])[0]
+
+
+class FramePrefetcher(object):
+    """
+    Draws requested frames into a FaceFrameCache in a background thread.
+    A new request replaces any frames that have not been drawn yet.
+    """
+
+    def __init__(self, cache, batch_size=PREFETCH_BATCH_SIZE):
+        self.cache = cache
+        self.batch_size = batch_size
+        self._request = None
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="FramePrefetcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def request(self, clip_name, keyframes, frame_nums):
+        with self._condition:
+            self._request = (clip_name, keyframes, list(frame_nums))
+            self._condition.notify()
+
+    def cancel(self):
+        with self._condition:
+            self._request = None
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._request = None
+            self._condition.notify()
+        self._thread.join()
+
+    def _next_batch(self):
+        with self._condition:
+            while self._request is None and not self._stopped:
+                self._condition.wait()
+            if self._stopped:
+                return None
+            clip_name, keyframes, frame_nums = self._request
+            batch = frame_nums[:self.batch_size]
+            remaining = frame_nums[self.batch_size:]
+            self._request = (clip_name, keyframes, remaining) if remaining else None
+            return (clip_name, keyframes, batch)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self.cache.get_frames(*batch)
+            except Exception, e:
+                print("Failed to prefetch face frames because: %s" % e)
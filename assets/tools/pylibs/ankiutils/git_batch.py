@@ -0,0 +1,336 @@
+"""
+This module keeps long-lived 'git cat-file --batch' and '--batch-check' processes
+open for a Git repo and answers object queries (rev-parse, blob existence, object
+type and size, object contents) over their pipes. This avoids launching a new
+shell and git process for every query, as the functions in ankiutils/git_tools.py
+otherwise do.
+
+Answers that are expensive to compute for the whole repo, eg. the output of
+'git status --porcelain' and the current branch, are cached. Those caches are
+dropped whenever the repo's .git/index, .git/HEAD or current branch ref
+changes and can also be dropped explicitly with invalidate() (which git_tools
+does after any command that changes the index, HEAD or the working tree).
+
+Example usage:
+
+    batch = get_git_batch("~/workspace/vector-animations-raw")
+    if batch.is_tracked("assets/scenes/anim/foo.ma"):
+        print(batch.rev_parse("HEAD:assets/scenes/anim/foo.ma"))
+"""
+
+import os
+import atexit
+import subprocess
+import threading
+
+
+GIT_CAT_FILE_BATCH_CMD = ["git", "cat-file", "--batch"]
+GIT_CAT_FILE_BATCH_CHECK_CMD = ["git", "cat-file", "--batch-check"]
+GIT_STATUS_CMD = ["git", "status", "--porcelain", "-z"]
+GIT_GET_ROOT_DIR_CMD = ["git", "rev-parse", "--show-toplevel", "--git-dir"]
+
+HEAD_REF_PREFIX = "ref:"
+PACKED_REFS_FILE = "packed-refs"
+GIT_GET_CURRENT_BRANCH_CMD = ["git", "rev-parse", "--abbrev-ref", "HEAD"]
+
+MISSING_OBJECT = "missing"
+
+
+def _run_git(args, cwd):
+    p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd)
+    (stdout, stderr) = p.communicate()
+    status = p.poll()
+    if status != 0:
+        raise ValueError("Failed to run '%s' because: %s" % (' '.join(args), stderr or stdout))
+    return stdout
+
+
+class _CatFileProcess(object):
+    """
+    A single 'git cat-file --batch' or '--batch-check' process that is
+    (re)started on demand.
+    """
+
+    def __init__(self, args, cwd):
+        self.args = args
+        self.cwd = cwd
+        self.proc = None
+
+    def _get_proc(self):
+        if self.proc is None or self.proc.poll() is not None:
+            self.proc = subprocess.Popen(self.args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE, cwd=self.cwd)
+        return self.proc
+
+    def query(self, object_name):
+        """
+        Sends one object name and returns the header line fields, eg.
+        [sha, type, size] or [object_name, "missing"].
+        """
+        proc = self._get_proc()
+        try:
+            proc.stdin.write(object_name + "\n")
+            proc.stdin.flush()
+            header = proc.stdout.readline()
+        except (IOError, OSError) as e:
+            self.close()
+            raise ValueError("Lost connection to '%s' because: %s" % (' '.join(self.args), e))
+        if not header:
+            self.close()
+            raise ValueError("'%s' exited unexpectedly" % ' '.join(self.args))
+        return header.rstrip("\n").rsplit(" ", 2)
+
+    def read(self, size):
+        """
+        Reads the contents that follow a --batch header (plus the trailing newline).
+        """
+        data = self.proc.stdout.read(size)
+        self.proc.stdout.read(1)
+        return data
+
+    def close(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        try:
+            self.proc.wait()
+        except OSError:
+            pass
+        self.proc = None
+
+
+class GitBatch(object):
+    """
+    Answers object and status queries for one Git repo using persistent
+    git processes and caches.
+    """
+
+    def __init__(self, repo_path=None):
+        if repo_path is None:
+            repo_path = os.getcwd()
+        repo_path = os.path.abspath(os.path.expanduser(repo_path))
+        if not os.path.isdir(repo_path):
+            repo_path = os.path.dirname(repo_path)
+        stdout = _run_git(GIT_GET_ROOT_DIR_CMD, repo_path)
+        root_dir, git_dir = stdout.strip().splitlines()[:2]
+        self.root_dir = os.path.realpath(root_dir)
+        self.git_dir = os.path.normpath(os.path.join(repo_path, git_dir))
+        self._lock = threading.RLock()
+        self._check = _CatFileProcess(GIT_CAT_FILE_BATCH_CHECK_CMD, self.root_dir)
+        self._batch = _CatFileProcess(GIT_CAT_FILE_BATCH_CMD, self.root_dir)
+        self._cache = {}
+        self._cache_key = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._check.close()
+            self._batch.close()
+
+    def _get_head_ref(self):
+        """
+        Returns the ref that HEAD points at (eg. "refs/heads/master") or None
+        if HEAD is detached or can not be read.
+        """
+        try:
+            with open(os.path.join(self.git_dir, "HEAD")) as fh:
+                head = fh.read().strip()
+        except (IOError, OSError):
+            return None
+        if head.startswith(HEAD_REF_PREFIX):
+            return head[len(HEAD_REF_PREFIX):].strip()
+        return None
+
+    def _get_cache_key(self):
+        """
+        Returns the modification times of the files that change whenever the
+        index or HEAD change, which is used to drop stale cached answers. A
+        commit or pull moves the current branch ref rather than HEAD itself,
+        so the ref file (and packed-refs, where refs can also live) are included.
+        """
+        file_names = ["index", "HEAD", PACKED_REFS_FILE]
+        head_ref = self._get_head_ref()
+        if head_ref:
+            file_names.append(head_ref)
+        key = []
+        for file_name in file_names:
+            try:
+                key.append(os.stat(os.path.join(self.git_dir, file_name)).st_mtime)
+            except OSError:
+                key.append(None)
+        return tuple(key)
+
+    def _get_cache(self):
+        cache_key = self._get_cache_key()
+        if cache_key != self._cache_key:
+            self._cache = {}
+            self._cache_key = cache_key
+        return self._cache
+
+    def invalidate(self):
+        """
+        Drops all cached answers (status, branch, rev-parse results).
+        """
+        with self._lock:
+            self._cache = {}
+            self._cache_key = None
+
+    def to_repo_path(self, file_path):
+        """
+        Converts a local file system path to the '/' separated path relative
+        to the repo root that Git uses in object names.
+        """
+        file_path = os.path.realpath(os.path.abspath(os.path.expanduser(file_path)))
+        rel_path = os.path.relpath(file_path, os.path.realpath(self.root_dir))
+        return rel_path.replace(os.sep, "/")
+
+    def check_object(self, object_name):
+        """
+        Returns a (sha, type, size) tuple for an object name (anything that
+        'git rev-parse' accepts, eg. "HEAD", "HEAD:path/to/file" or ":path" for
+        the staged version) or None if that object does not exist.
+        """
+        with self._lock:
+            cache = self._get_cache()
+            cache_key = ("check", object_name)
+            if cache_key not in cache:
+                fields = self._check.query(object_name)
+                if len(fields) < 3 or fields[-1] == MISSING_OBJECT:
+                    cache[cache_key] = None
+                else:
+                    cache[cache_key] = (fields[0], fields[1], int(fields[2]))
+            return cache[cache_key]
+
+    def rev_parse(self, object_name):
+        """
+        Returns the full hash for an object name or None if it does not exist.
+        """
+        info = self.check_object(object_name)
+        if info is None:
+            return None
+        return info[0]
+
+    def object_exists(self, object_name):
+        return self.check_object(object_name) is not None
+
+    def object_size(self, object_name):
+        info = self.check_object(object_name)
+        if info is None:
+            return None
+        return info[2]
+
+    def read_object(self, object_name):
+        """
+        Returns a (type, contents) tuple for an object name or None if it
+        does not exist. Contents are not cached.
+        """
+        with self._lock:
+            fields = self._batch.query(object_name)
+            if len(fields) < 3 or fields[-1] == MISSING_OBJECT:
+                return None
+            return (fields[1], self._batch.read(int(fields[2])))
+
+    def is_tracked(self, file_path, ref="HEAD"):
+        """
+        Returns True if file_path exists in the tree of the ref commit.
+        """
+        return self.object_exists("%s:%s" % (ref, self.to_repo_path(file_path)))
+
+    def is_in_index(self, file_path):
+        """
+        Returns True if file_path is in the index, which includes files that
+        were added with 'git add' but have not been committed yet.
+        """
+        return self.object_exists(":%s" % self.to_repo_path(file_path))
+
+    def get_status(self):
+        """
+        Returns a dict of repo path -> (index status, worktree status) for
+        every file that 'git status --porcelain' reports. The result is
+        cached until the index or HEAD change or invalidate() is called.
+        """
+        with self._lock:
+            cache = self._get_cache()
+            if "status" not in cache:
+                stdout = _run_git(GIT_STATUS_CMD, self.root_dir)
+                statuses = {}
+                entries = stdout.split("\0")
+                idx = 0
+                while idx < len(entries):
+                    entry = entries[idx]
+                    idx += 1
+                    if len(entry) < 4:
+                        continue
+                    index = entry[0].strip() or None
+                    worktree = entry[1].strip() or None
+                    statuses[entry[3:]] = (index, worktree)
+                    if entry[0] in "RC":
+                        # Renames and copies are followed by the original path
+                        idx += 1
+                cache["status"] = statuses
+                # 'git status' may refresh (rewrite) the index itself, which
+                # should not invalidate the answer it just gave us
+                self._cache_key = self._get_cache_key()
+            return cache["status"]
+
+    def get_status_of_file(self, file_path):
+        """
+        Returns the (index status, worktree status) tuple for a file, where
+        (None, None) means that the file is unmodified.
+        """
+        return self.get_status().get(self.to_repo_path(file_path), (None, None))
+
+    def get_current_branch(self):
+        with self._lock:
+            cache = self._get_cache()
+            if "branch" not in cache:
+                cache["branch"] = _run_git(GIT_GET_CURRENT_BRANCH_CMD, self.root_dir).strip()
+            return cache["branch"]
+
+
+_GIT_BATCHES = {}
+_GIT_BATCHES_LOCK = threading.Lock()
+
+
+def get_git_batch(repo_path=None):
+    """
+    Returns the shared GitBatch for the repo that contains repo_path.
+    """
+    if repo_path is None:
+        repo_path = os.getcwd()
+    # Git reports the root dir with symlinks resolved, so do the same here
+    repo_path = os.path.realpath(os.path.expanduser(repo_path))
+    with _GIT_BATCHES_LOCK:
+        for root_dir, batch in _GIT_BATCHES.items():
+            if repo_path == root_dir or repo_path.startswith(root_dir + os.sep):
+                return batch
+        batch = GitBatch(repo_path)
+        _GIT_BATCHES[batch.root_dir] = batch
+        return batch
+
+
+def invalidate_all():
+    """
+    Drops the cached answers of every shared GitBatch.
+    """
+    with _GIT_BATCHES_LOCK:
+        for batch in _GIT_BATCHES.values():
+            batch.invalidate()
+
+
+def close_all():
+    with _GIT_BATCHES_LOCK:
+        for batch in _GIT_BATCHES.values():
+            batch.close()
+        _GIT_BATCHES.clear()
+
+
+atexit.register(close_all)
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+"""
+This module builds an index of the Git history of every file in a repo using a
+single 'git log --name-status' pass, rather than running one or more 'git'
+processes per file (as ankiutils/git_tools.get_commit_info() and
+get_git_file_rev() do).
+
+For every path that currently exists in the history, the index stores the last
+commit (hash, author, email, date and subject), the commit that created it and
+the chain of names it had before it was renamed.
+
+The index is cached on disk along with the HEAD commit that it was built from,
+so later runs only need to process the commits that were added since then.
+
+Example usage:
+
+    index = GitHistoryIndex("~/workspace/vector-animations-raw")
+    index.update()
+    for path, entry in index.get_files_older_than(CUTOFF_DAY, "assets/scenes"):
+        print("%s was last touched by %s" % (path, entry[LAST_AUTHOR_KEY]))
+"""
+
+import sys
+import os
+import json
+import time
+import subprocess
+import tempfile
+
+
+CACHE_FILE_NAME = "anki_history_index.json"
+
+CACHE_VERSION = 1
+
+COMMIT_MARKER = "--COMMIT--"
+
+# Fields are separated by tabs, which cannot appear in hashes or dates and are
+# very unlikely in author names or commit subjects (the subject is the last field).
+GIT_LOG_FORMAT = COMMIT_MARKER + "%H%x09%an%x09%ae%x09%at%x09%s"
+
+GIT_LOG_CMD = ["git", "-c", "core.quotepath=off", "log", "--reverse", "--name-status",
+               "-M", "--no-color", "--format=" + GIT_LOG_FORMAT]
+GIT_HEAD_CMD = ["git", "rev-parse", "HEAD"]
+GIT_ROOT_CMD = ["git", "rev-parse", "--show-toplevel"]
+GIT_IS_ANCESTOR_CMD = ["git", "merge-base", "--is-ancestor"]
+
+LAST_COMMIT_KEY = "last_commit"
+LAST_AUTHOR_KEY = "last_author"
+LAST_EMAIL_KEY = "last_email"
+LAST_DATE_KEY = "last_date"
+LAST_SUBJECT_KEY = "last_subject"
+CREATED_COMMIT_KEY = "created_commit"
+CREATED_DATE_KEY = "created_date"
+RENAMED_FROM_KEY = "renamed_from"
+
+SECONDS_PER_DAY = 86400.0
+
+
+def _run_git(args, cwd):
+    """
+    Runs a git command (provided as a list of arguments) in the cwd directory
+    and returns a (status, stdout, stderr) tuple.
+    """
+    try:
+        p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd)
+    except OSError as err:
+        print("%s: Failed to execute '%s' because: '%s'" % (type(err).__name__, ' '.join(args), err))
+        return (None, None, None)
+    (stdout, stderr) = p.communicate()
+    status = p.poll()
+    return (status, stdout, stderr)
+
+
+class GitHistoryIndex(object):
+    """
+    A path -> history entry map for a Git repo, built with a single
+    'git log' pass and cached on disk keyed by HEAD.
+    """
+
+    def __init__(self, repo_path=None, cache_file=None):
+        """
+        :param
+            repo_path: Any path inside of the Git repo (defaults to the
+                       current working directory).
+            cache_file: Where the index is stored on disk. Defaults to a file
+                        in the repo's .git directory (or the temp directory if
+                        that is not available). Use False to disable caching.
+        """
+        if repo_path is None:
+            repo_path = os.getcwd()
+        repo_path = os.path.abspath(os.path.expanduser(repo_path))
+        if not os.path.isdir(repo_path):
+            repo_path = os.path.dirname(repo_path)
+        (status, stdout, stderr) = _run_git(GIT_ROOT_CMD, repo_path)
+        if status != 0:
+            raise ValueError("Failed to find the Git root directory of %s because: %s"
+                             % (repo_path, stderr or stdout))
+        self.root_dir = os.path.normpath(stdout.strip())
+        if cache_file is None:
+            git_dir = os.path.join(self.root_dir, ".git")
+            if not os.path.isdir(git_dir):
+                git_dir = tempfile.gettempdir()
+            cache_file = os.path.join(git_dir, CACHE_FILE_NAME)
+        self.cache_file = cache_file
+        self.head = None
+        self.entries = {}
+        self.num_commits_processed = 0
+
+    def update(self):
+        """
+        Brings the index up to date with HEAD, processing only the commits
+        that are not already in the cached index. Returns the number of
+        commits that were processed.
+        """
+        (status, stdout, stderr) = _run_git(GIT_HEAD_CMD, self.root_dir)
+        if status != 0:
+            raise ValueError("Failed to get the HEAD commit of %s because: %s"
+                             % (self.root_dir, stderr or stdout))
+        head = stdout.strip()
+
+        if self.head is None:
+            self._load_cache()
+        if self.head == head:
+            return 0
+
+        revision_range = [head]
+        if self.head:
+            (status, stdout, stderr) = _run_git(GIT_IS_ANCESTOR_CMD + [self.head, head], self.root_dir)
+            if status == 0:
+                revision_range = ["%s..%s" % (self.head, head)]
+            else:
+                # History was rewritten (or a different branch checked out), so start over
+                self.entries = {}
+
+        (status, stdout, stderr) = _run_git(GIT_LOG_CMD + revision_range + ["--"], self.root_dir)
+        if status != 0:
+            raise ValueError("Failed to get the Git history of %s because: %s"
+                             % (self.root_dir, stderr or stdout))
+        num_commits = self._process_log(stdout)
+        self.num_commits_processed += num_commits
+        self.head = head
+        self._save_cache()
+        return num_commits
+
+    def _process_log(self, log_output):
+        """
+        Applies the output of GIT_LOG_CMD (oldest commit first) to the index.
+        """
+        num_commits = 0
+        commit = None
+        for one_line in log_output.splitlines():
+            if not one_line:
+                continue
+            if one_line.startswith(COMMIT_MARKER):
+                fields = one_line[len(COMMIT_MARKER):].split("\t", 4)
+                fields += [""] * (5 - len(fields))
+                commit = {
+                    LAST_COMMIT_KEY : fields[0],
+                    LAST_AUTHOR_KEY : fields[1],
+                    LAST_EMAIL_KEY : fields[2],
+                    LAST_DATE_KEY : int(fields[3] or 0),
+                    LAST_SUBJECT_KEY : fields[4]
+                }
+                num_commits += 1
+                continue
+            if commit is None:
+                continue
+            fields = one_line.split("\t")
+            change_type = fields[0][:1]
+            if change_type == "D":
+                self.entries.pop(fields[1], None)
+            elif change_type == "R" and len(fields) >= 3:
+                old_path, new_path = fields[1], fields[2]
+                entry = self.entries.pop(old_path, None) or self._new_entry(commit)
+                entry[RENAMED_FROM_KEY] = [old_path] + entry[RENAMED_FROM_KEY]
+                entry.update(commit)
+                self.entries[new_path] = entry
+            elif change_type == "C" and len(fields) >= 3:
+                self.entries[fields[2]] = self._new_entry(commit)
+            elif len(fields) >= 2:
+                entry = self.entries.get(fields[-1])
+                if entry is None:
+                    entry = self.entries[fields[-1]] = self._new_entry(commit)
+                entry.update(commit)
+        return num_commits
+
+    def _new_entry(self, commit):
+        entry = dict(commit)
+        entry[CREATED_COMMIT_KEY] = commit[LAST_COMMIT_KEY]
+        entry[CREATED_DATE_KEY] = commit[LAST_DATE_KEY]
+        entry[RENAMED_FROM_KEY] = []
+        return entry
+
+    def _load_cache(self):
+        if not self.cache_file or not os.path.isfile(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as fh:
+                cache = json.load(fh)
+        except (IOError, OSError, ValueError) as e:
+            print("Ignoring unreadable Git history cache %s because: %s" % (self.cache_file, e))
+            return
+        if cache.get("version") != CACHE_VERSION or cache.get("root_dir") != self.root_dir:
+            return
+        self.head = cache.get("head")
+        self.entries = cache.get("entries", {})
+
+    def _save_cache(self):
+        if not self.cache_file:
+            return
+        cache = { "version" : CACHE_VERSION, "root_dir" : self.root_dir,
+                  "head" : self.head, "entries" : self.entries }
+        temp_file = self.cache_file + ".tmp"
+        try:
+            with open(temp_file, 'w') as fh:
+                json.dump(cache, fh)
+            if os.path.exists(self.cache_file):
+                os.remove(self.cache_file)
+            os.rename(temp_file, self.cache_file)
+        except (IOError, OSError) as e:
+            print("Failed to write Git history cache %s because: %s" % (self.cache_file, e))
+
+    def _to_repo_path(self, file_path):
+        """
+        Converts an absolute path (or a path relative to the current working
+        directory) to the '/' separated path relative to the repo root that
+        Git uses.
+        """
+        if file_path in self.entries:
+            return file_path
+        abs_path = os.path.abspath(os.path.expanduser(file_path))
+        rel_path = os.path.relpath(abs_path, self.root_dir)
+        return rel_path.replace(os.sep, "/")
+
+    def get_entry(self, file_path):
+        """
+        Returns the history entry (a dict) for a file or None if that file
+        is not in the Git history.
+        """
+        return self.entries.get(self._to_repo_path(file_path))
+
+    def get_last_commit(self, file_path):
+        entry = self.get_entry(file_path)
+        if entry is None:
+            return None
+        return entry[LAST_COMMIT_KEY]
+
+    def get_age_days(self, file_path, now=None):
+        """
+        Returns the number of days since a file was last committed or None
+        if that file is not in the Git history.
+        """
+        entry = self.get_entry(file_path)
+        if entry is None:
+            return None
+        if now is None:
+            now = time.time()
+        return (now - entry[LAST_DATE_KEY]) / SECONDS_PER_DAY
+
+    def get_files_older_than(self, days, sub_dir=None, now=None):
+        """
+        Returns a sorted list of (path, entry) tuples for all files (optionally
+        limited to those under sub_dir) that were last committed more than the
+        given number of days ago.
+        """
+        if now is None:
+            now = time.time()
+        cutoff = now - (days * SECONDS_PER_DAY)
+        prefix = None
+        if sub_dir:
+            prefix = self._to_repo_path(sub_dir).rstrip("/") + "/"
+        old_files = []
+        for path, entry in self.entries.items():
+            if prefix and not path.startswith(prefix):
+                continue
+            if entry[LAST_DATE_KEY] < cutoff:
+                old_files.append((path, entry))
+        old_files.sort()
+        return old_files
+
+    def get_files_by_author(self, sub_dir=None):
+        """
+        Returns a dict of author name -> sorted list of the paths that were
+        last committed by that author.
+        """
+        prefix = None
+        if sub_dir:
+            prefix = self._to_repo_path(sub_dir).rstrip("/") + "/"
+        owners = {}
+        for path, entry in self.entries.items():
+            if prefix and not path.startswith(prefix):
+                continue
+            owners.setdefault(entry[LAST_AUTHOR_KEY], []).append(path)
+        for paths in owners.values():
+            paths.sort()
+        return owners
+
+
+_INDEXES = {}
+
+
+def get_history_index(repo_path=None):
+    """
+    Returns an up-to-date GitHistoryIndex for the repo that contains
+    repo_path, reusing the same index for repeated calls in one session.
+    """
+    index = GitHistoryIndex(repo_path)
+    index = _INDEXES.setdefault(index.root_dir, index)
+    index.update()
+    return index
+
+
+def main(args):
+    if not args:
+        print("Usage: %s <days> [<dir_in_git_repo>]" % os.path.basename(__file__))
+        return 1
+    days = float(args[0])
+    sub_dir = os.path.abspath(args[1]) if len(args) > 1 else os.getcwd()
+    index = get_history_index(sub_dir)
+    if index.root_dir == sub_dir:
+        sub_dir = None
+    old_files = index.get_files_older_than(days, sub_dir)
+    for path, entry in old_files:
+        last_date = time.strftime("%Y-%m-%d", time.localtime(entry[LAST_DATE_KEY]))
+        print("%s  %-20s  %s" % (last_date, entry[LAST_AUTHOR_KEY], path))
+    print("%s files were last committed more than %s days ago" % (len(old_files), days))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
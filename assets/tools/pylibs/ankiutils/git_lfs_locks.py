@@ -0,0 +1,213 @@
+"""
+This module provides a table of all of the Git LFS locks in a repo. The locks are
+fetched with a single 'git lfs locks --json' call (which is a round trip to the
+LFS server), indexed by path and then served from memory until they are older
+than a time-to-live or the table is invalidated, eg. after a lock or unlock.
+
+The source of the locks can be replaced with a LocalLockSource, which keeps
+locks in memory, so tools that check locks can be tested without a server.
+
+Example usage:
+
+    lock_table = get_lock_table(file_in_git)
+    owner = lock_table.get_owner(file_in_git)
+    owners = lock_table.get_owners(files_to_commit)
+"""
+
+import os
+import json
+import subprocess
+import threading
+import time
+
+from ankiutils import git_batch
+
+
+GIT_GET_LOCKS_JSON_CMD = ["git", "lfs", "locks", "--json"]
+
+# How long fetched locks are trusted before they are fetched again
+DEFAULT_TTL_SECS = 30.0
+
+PATH_KEY = "path"
+OWNER_KEY = "owner"
+OWNER_NAME_KEY = "name"
+LOCK_ID_KEY = "id"
+LOCKED_AT_KEY = "locked_at"
+
+
+class GitLockSource(object):
+    """
+    Fetches the locks for a repo from the Git LFS server.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def fetch(self):
+        """
+        Returns the list of lock dicts reported by 'git lfs locks --json'.
+        """
+        try:
+            p = subprocess.Popen(GIT_GET_LOCKS_JSON_CMD, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE, cwd=self.root_dir)
+        except OSError as err:
+            raise ValueError("Failed to execute '%s' because: %s"
+                             % (' '.join(GIT_GET_LOCKS_JSON_CMD), err))
+        (stdout, stderr) = p.communicate()
+        if p.poll() != 0:
+            raise ValueError("Failed to get lock list because: %s" % (stderr or stdout))
+        try:
+            return json.loads(stdout or "[]")
+        except ValueError as e:
+            raise ValueError("Failed to parse lock list because: %s" % e)
+
+
+class LocalLockSource(object):
+    """
+    An in-memory stand-in for GitLockSource, eg. for tests. Locks are
+    added and removed with lock() and unlock().
+    """
+
+    def __init__(self, locks=None):
+        self.locks = {}
+        self.num_fetches = 0
+        for path, owner in (locks or {}).items():
+            self.lock(path, owner)
+
+    def lock(self, path, owner):
+        self.locks[path] = { LOCK_ID_KEY : str(len(self.locks) + 1), PATH_KEY : path,
+                             OWNER_KEY : { OWNER_NAME_KEY : owner },
+                             LOCKED_AT_KEY : time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()) }
+
+    def unlock(self, path):
+        self.locks.pop(path, None)
+
+    def fetch(self):
+        self.num_fetches += 1
+        return list(self.locks.values())
+
+
+class LockTable(object):
+    """
+    All of the Git LFS locks for one repo indexed by repo path.
+    """
+
+    def __init__(self, root_dir, source=None, ttl_secs=DEFAULT_TTL_SECS, to_repo_path=None):
+        """
+        :param
+            root_dir: The root directory of the Git repo.
+            source: Where locks are fetched from (defaults to GitLockSource).
+            ttl_secs: How long fetched locks are used before fetching again.
+            to_repo_path: Function to convert a local file path to the path
+                          relative to the repo root that Git LFS reports.
+        """
+        self.root_dir = root_dir
+        self.source = source or GitLockSource(root_dir)
+        self.ttl_secs = ttl_secs
+        self._to_repo_path = to_repo_path
+        self._locks = {}
+        self._fetch_time = None
+        self._lock = threading.Lock()
+
+    def to_repo_path(self, file_path):
+        if self._to_repo_path:
+            return self._to_repo_path(file_path)
+        if not os.path.isabs(file_path):
+            return file_path.replace(os.sep, "/")
+        return os.path.relpath(file_path, self.root_dir).replace(os.sep, "/")
+
+    def invalidate(self):
+        """
+        Forces the locks to be fetched again on the next lookup.
+        """
+        with self._lock:
+            self._fetch_time = None
+
+    def refresh(self):
+        """
+        Fetches all locks now and rebuilds the path index.
+        """
+        locks = self.source.fetch()
+        locks_by_path = {}
+        for lock_info in locks:
+            locks_by_path[lock_info[PATH_KEY]] = lock_info
+        with self._lock:
+            self._locks = locks_by_path
+            self._fetch_time = time.time()
+
+    def _get_locks(self):
+        with self._lock:
+            is_stale = (self._fetch_time is None or
+                        (time.time() - self._fetch_time) > self.ttl_secs)
+        if is_stale:
+            self.refresh()
+        return self._locks
+
+    def get_lock(self, file_path):
+        """
+        Returns the lock dict for a file or None if it is not locked.
+        """
+        return self._get_locks().get(self.to_repo_path(file_path))
+
+    def get_owner(self, file_path):
+        """
+        Returns the name of the user who has a file locked or None.
+        """
+        lock_info = self.get_lock(file_path)
+        if lock_info is None:
+            return None
+        return str(lock_info[OWNER_KEY][OWNER_NAME_KEY])
+
+    def get_owners(self, file_paths):
+        """
+        Returns a dict of file path -> lock owner for the files in file_paths
+        that are locked (using a single fetch at most).
+        """
+        locks = self._get_locks()
+        owners = {}
+        for file_path in file_paths:
+            lock_info = locks.get(self.to_repo_path(file_path))
+            if lock_info is not None:
+                owners[file_path] = str(lock_info[OWNER_KEY][OWNER_NAME_KEY])
+        return owners
+
+    def get_all_locks(self):
+        return dict(self._get_locks())
+
+
+_LOCK_TABLES = {}
+_LOCK_TABLES_LOCK = threading.Lock()
+
+
+def get_lock_table(file_in_git=None, ttl_secs=DEFAULT_TTL_SECS):
+    """
+    Returns the shared LockTable for the repo that contains file_in_git.
+    """
+    batch = git_batch.get_git_batch(file_in_git)
+    with _LOCK_TABLES_LOCK:
+        lock_table = _LOCK_TABLES.get(batch.root_dir)
+        if lock_table is None:
+            lock_table = LockTable(batch.root_dir, ttl_secs=ttl_secs,
+                                   to_repo_path=batch.to_repo_path)
+            _LOCK_TABLES[batch.root_dir] = lock_table
+        return lock_table
+
+
+def set_lock_source(root_dir, source, ttl_secs=DEFAULT_TTL_SECS):
+    """
+    Replaces the shared LockTable for root_dir with one that uses the
+    provided source, eg. a LocalLockSource for tests.
+    """
+    # Use the same (symlink resolved) root dir that get_lock_table() looks up
+    batch = git_batch.get_git_batch(root_dir)
+    lock_table = LockTable(batch.root_dir, source=source, ttl_secs=ttl_secs,
+                           to_repo_path=batch.to_repo_path)
+    with _LOCK_TABLES_LOCK:
+        _LOCK_TABLES[batch.root_dir] = lock_table
+    return lock_table
+
+
+def invalidate_all():
+    with _LOCK_TABLES_LOCK:
+        for lock_table in _LOCK_TABLES.values():
+            lock_table.invalidate()
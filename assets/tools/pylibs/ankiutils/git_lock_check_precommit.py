@@ -75,9 +75,10 @@ def _run_command(cmd, stdout_pipe=subprocess.PIPE, stderr_pipe=subprocess.PIPE,
 def check_list_to_be_commited():
     """
     This gathers the git files that are to be committed in this git repo
-    (where this hook is installed). It then makes a list of all the
-    locked files in this repo and compares the two lists. When it finds
-    a locked file that is to be committed, it checks the GitHub username
+    (where this hook is installed). It then indexes all the locked files
+    in this repo by path and looks up each file to be committed in that
+    index. When it finds a locked file that is to be committed, it checks
+    the GitHub username
     of the lock owner with the current users GitHub username. If there
     is one file that does not match, an error message is printed and
     non-zero(1) will be returned to abort the commit.
@@ -98,7 +99,7 @@ def check_list_to_be_commited():
             printDebug(path, indent=True)
             files_to_commit.append(path)
 
-    files_that_are_locked = []
+    locked_files_by_path = {}
     status, stdout, stderr = _run_command(LIST_LOCKED_FILES)
     if status != 0:
         msg = "Failed to get list of files currently locked (status={0}) because:".format(status)
@@ -107,20 +108,24 @@ def check_list_to_be_commited():
     printDebug("files that are locked:")
     for f in json.loads(stdout):
         printDebug(f['path'], indent=True)
-        files_that_are_locked.append(f)
+        locked_files_by_path[f['path']] = f
 
     to_commit_but_locked_by_other = []
-    this_username = get_github_username()
-    for locked in files_that_are_locked:
-        for to_commit in files_to_commit:
-            if locked['path'] == to_commit:
-                locked_username = str(locked['owner']['name'])
-                msg = "{0} is locked by {1}".format(to_commit, locked_username)
-                if locked_username == this_username:
-                    printDebug(msg)
-                else:
-                    to_commit_but_locked_by_other.append(to_commit)
-                    print("ERROR: " + msg)
+    this_username = None
+    for to_commit in files_to_commit:
+        locked = locked_files_by_path.get(to_commit)
+        if locked is None:
+            continue
+        if this_username is None:
+            # Only look up the username when needed since it is a network round trip
+            this_username = get_github_username()
+        locked_username = str(locked['owner']['name'])
+        msg = "{0} is locked by {1}".format(to_commit, locked_username)
+        if locked_username == this_username:
+            printDebug(msg)
+        else:
+            to_commit_but_locked_by_other.append(to_commit)
+            print("ERROR: " + msg)
     if to_commit_but_locked_by_other:
         msg = "The following files are locked by another user:"
         msg += os.linesep + os.linesep.join(to_commit_but_locked_by_other)
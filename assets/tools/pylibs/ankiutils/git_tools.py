@@ -38,6 +38,7 @@ import shutil
 import subprocess
 import re
 import time
+from ankiutils import git_batch, git_lfs_locks
 
 
 DEFAULT_REMOTE = "origin"
@@ -243,6 +244,7 @@ def rename_git_file(src, dst):
         if not stderr:
             stderr = stdout
         raise RuntimeError("Failed to move %s to %s because: %s" % (src, dst, stderr))
+    invalidate_git_caches()
 
 
 # DONE
@@ -323,7 +325,7 @@ def get_git_commit_message(git_file, rev_hash):
 
 # DONE
 # was check_svn_file_modified()
-def check_git_file_modified(git_file):
+def check_git_file_modified(git_file, use_cache=False):
     """
     This function can be used to determine if the local version
     of a file is modified or not.
@@ -332,17 +334,18 @@ def check_git_file_modified(git_file):
 
     :param
         git_file: The file to check if it is modified or not.
+        use_cache: See get_git_status_of_file()
 
     :return
         'True': The file is modified locally.
         'False': The file is not modified locally.
     """
-    (index, worktree) = get_git_status_of_file(git_file)
+    (index, worktree) = get_git_status_of_file(git_file, use_cache)
     return index == 'M' or worktree == 'M'
 
 
 # DONE
-def get_git_status_of_file(git_file):
+def get_git_status_of_file(git_file, use_cache=False):
     """
     Please read: https://git-scm.com/docs/git-status#_short_format
     Returns the index status and worktree status of git_file.
@@ -358,11 +361,17 @@ def get_git_status_of_file(git_file):
 
     :param
         git_file: The file to check the status of.
+        use_cache: If 'True', the status of the whole repo is looked up once
+                   and reused for later calls until the index or HEAD changes
+                   or invalidate_git_caches() is called. Only use this when
+                   checking many files that are not being edited meanwhile.
 
     :return
         A tuple that contains 2 single-character statuses of
         both the Index and the Worktree of the file.
     """
+    if use_cache:
+        return git_batch.get_git_batch(git_file).get_status_of_file(git_file)
     cmd = _chdir_cmd_prefix(git_file)
     cmd += GIT_STATUS_CMD % os.path.basename(git_file)
     (status, stdout, stderr) = _run_command(cmd, shell=True)
@@ -705,6 +714,14 @@ def is_file_tracked_in_git(file_to_check, check_remote=False):
         'True': If the file is tracked in Git.
         'False': If the file is not tracked in Git.
     """
+    if not check_remote:
+        try:
+            batch = git_batch.get_git_batch(file_to_check)
+        except ValueError:
+            # Not in a Git repo
+            return False
+        # Files that are staged for removal are still in HEAD
+        return batch.is_in_index(file_to_check) or batch.is_tracked(file_to_check)
     if get_git_file_rev(file_to_check, from_remote=check_remote):
         return True
     else:
@@ -712,19 +729,20 @@ def is_file_tracked_in_git(file_to_check, check_remote=False):
 
 
 # NEW
-def is_file_staged_in_git(git_file):
+def is_file_staged_in_git(git_file, use_cache=False):
     """
     Checks to see if git_file is staged or not.
     A file is staged if a status exists for the Index, but not for the Worktree.
 
     :param
         git_file: The local filesystem path in the Git directory.
+        use_cache: See get_git_status_of_file()
 
     :return
         'True': The file is staged.
         'False': The file is not staged.
     """
-    (index, worktree) = get_git_status_of_file(git_file)
+    (index, worktree) = get_git_status_of_file(git_file, use_cache)
     return bool(index and not worktree)
 
 
@@ -738,32 +756,31 @@ def is_file_staged_in_git(git_file):
 # DONE
 # was check_svn_file_lock()
 # Use this function in place of check_git_file_lock_local()
-def check_git_file_lock(file_in_git):
+def check_git_file_lock(file_in_git, use_cache=True):
     """
     Returns the lock owner for file_in_git.
     If lock for file_in_git doesn't exist, return None.
 
+    All locks in the repo are fetched with a single 'git lfs locks --json'
+    call and kept in a table (see ankiutils/git_lfs_locks.py), so checking
+    many files only needs one round trip to the server.
+
     :param
         file_in_git: The local file system path in the Git directory.
+        use_cache: If 'False', fetch the locks again even if the table was
+                   fetched recently.
 
     :return
         The username that locked file_in_git.
         'None' if no one has the file locked.
     """
-    cmd = _chdir_cmd_prefix(file_in_git)
-    cmd += GIT_GET_LOCKS_CMD
-    (status, stdout, stderr) = _run_command(cmd, shell=True)
-    if status == 0:
-        all_locked_files = stdout.splitlines()
-        for line in all_locked_files:
-            locked_file = line.split("\t")
-            if locked_file[0].strip() == os.path.basename(file_in_git):
-                return locked_file[1].strip()
-        return None
-    else:
-        if not stderr:
-            stderr = stdout
-        msg = "Failed to get lock list for '%s' file because: %s" % (file_in_git, stderr)
+    lock_table = git_lfs_locks.get_lock_table(file_in_git)
+    if not use_cache:
+        lock_table.invalidate()
+    try:
+        return lock_table.get_owner(file_in_git)
+    except ValueError as e:
+        msg = "Failed to get lock list for '%s' file because: %s" % (file_in_git, e)
         raise ValueError(msg)
 
 
@@ -779,6 +796,7 @@ def lock_git_file(file_in_git):
     cmd = _chdir_cmd_prefix(file_in_git)
     cmd += GIT_LOCK_CMD % os.path.basename(file_in_git)
     (status, stdout, stderr) = _run_command(cmd, shell=True)
+    git_lfs_locks.invalidate_all()
     if status == 0:
         print("Locked '%s' file in Git." % file_in_git)
     else:
@@ -804,6 +822,7 @@ def unlock_git_file(file_in_git):
     cmd = _chdir_cmd_prefix(file_in_git)
     cmd += GIT_UNLOCK_CMD % os.path.basename(file_in_git)
     (status, stdout, stderr) = _run_command(cmd, shell=True)
+    git_lfs_locks.invalidate_all()
     if status == 0:
         print("Unlocked '%s' file in Git." % (file_in_git))
     else:
@@ -829,6 +848,7 @@ def stage_git_file(file_in_git):
     cmd = _chdir_cmd_prefix(file_in_git)
     cmd += GIT_STAGE_FILE_CMD % os.path.basename(file_in_git)
     (status, stdout, stderr) = _run_command(cmd, shell=True)
+    invalidate_git_caches()
     if status == 0:
         print("'%s' is staged for commit" % file_in_git)
     else:
@@ -849,6 +869,7 @@ def unstage_git_file(file_in_git):
     cmd = _chdir_cmd_prefix(file_in_git)
     cmd += GIT_UNSTAGE_FILE_CMD % os.path.basename(file_in_git)
     (status, stdout, stderr) = _run_command(cmd, shell=True)
+    invalidate_git_caches()
     if status == 0:
         print("'%s' is unstaged from commit" % file_in_git)
     else:
@@ -921,6 +942,7 @@ def update_git_file(file_in_git):
     cmd = _chdir_cmd_prefix(file_in_git)
     cmd += GIT_CHECKOUT_FILE_FETCH_HEAD_CMD % os.path.basename(file_in_git)
     (status, stdout, stderr) = _run_command(cmd, shell=True)
+    invalidate_git_caches()
     if status == 0:
         print("Updated '{0}' file from version ({1}) to ({2})".format(file_in_git, prev_rev_hash, rev_hash))
     else:
@@ -970,6 +992,7 @@ def commit_git_file(file_in_git, comment, branch=DEFAULT_BRANCH, create_new_bran
     cmd = _chdir_cmd_prefix(file_in_git)
     cmd += GIT_COMMIT_CMD % (comment, os.path.basename(file_in_git))
     (status, stdout, stderr) = _run_command(cmd, shell=True)
+    invalidate_git_caches()
     if status == 0:
         # Look up and return the rev number if file was successfully committed
         rev_number = get_git_file_rev(file_in_git)
@@ -1059,6 +1082,7 @@ def git_checkout_branch(branch, git_repo_path=None, create_new_branch=False):
     else:
         cmd += GIT_CHECKOUT_BRANCH_CMD % branch
     (status, stdout, stderr) = _run_command(cmd, shell=True)
+    invalidate_git_caches()
     if status != 0:
         if not stderr:
             stderr = stdout
@@ -1080,12 +1104,7 @@ def get_current_git_branch(git_repo_path=None):
     """
     Returns the name of the current branch that is checked out.
     """
-    cmd = ""
-    if git_repo_path:
-        cmd = _chdir_cmd_prefix(git_repo_path)
-    cmd += GIT_GET_CURRENT_BRANCH
-    stdout = _run_command_wrapper(cmd)
-    return stdout.strip()
+    return git_batch.get_git_batch(git_repo_path).get_current_branch()
 
 
 # NEW
@@ -1105,7 +1124,10 @@ def git_stash_push():
     Doesn't push newly added, untracked files at the moment.
     """
     cmd = GIT_STASH_PUSH_CMD
-    stdout = _run_command_wrapper(cmd)
+    try:
+        stdout = _run_command_wrapper(cmd)
+    finally:
+        invalidate_git_caches()
 
 
 # NEW
@@ -1114,7 +1136,10 @@ def git_stash_pop():
     Performs 'git stash pop --index'
     """
     cmd = GIT_STASH_POP_CMD
-    stdout = _run_command_wrapper(cmd)
+    try:
+        stdout = _run_command_wrapper(cmd)
+    finally:
+        invalidate_git_caches()
 
 
 # NEW
@@ -1150,6 +1175,7 @@ def git_reset_fetch_head(git_repo_path=None):
         cmd = _chdir_cmd_prefix(git_repo_path)
     cmd += GIT_RESET_FETCH_HEAD_CMD
     (status, stdout, stderr) = _run_command(cmd, shell=True)
+    invalidate_git_caches()
     if status != 0:
         if not stderr:
             stderr = stdout
@@ -1174,6 +1200,8 @@ def git_pull(remote=DEFAULT_REMOTE, branch=DEFAULT_BRANCH, git_repo_path=None):
         raise ValueError(msg)
     else:
         print("Git pull was successful")
+    finally:
+        invalidate_git_caches()
 
 
 # NEW
@@ -1198,6 +1226,18 @@ def git_push(remote=DEFAULT_REMOTE, branch=DEFAULT_BRANCH, git_repo_path=None):
         print("Push to GitHub was successful")
 
 
+# NEW
+def invalidate_git_caches():
+    """
+    Drops the cached answers (status, current branch, tracked files) that are
+    kept by the persistent git processes in ankiutils/git_batch.py. This is
+    called after every command in this module that changes the index, HEAD
+    or the working tree and should be called by any tool that runs such
+    git commands itself.
+    """
+    git_batch.invalidate_all()
+
+
 def get_github_username():
     """
     This function returns the current user's GitHub username.
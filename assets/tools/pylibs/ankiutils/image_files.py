@@ -3,13 +3,33 @@
 import os
 import sys
 import copy
+import errno
+import hashlib
+import io
+import json
+import math
+import re
+import struct
+import shutil
 import subprocess
 import tarfile
 import tempfile
+import time
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+try:
+    from PIL import Image, ImageChops, ImageStat
+except ImportError:
+    Image = None
 
 
 DEFAULT_IMAGE_TYPE = ".png"
 
+# Sprite sequences that reference the same (deduplicated) frame file more than
+# once list every frame, in playback order, in the fileList of this file
+SEQUENCE_DEFINITION_FILE = "definition.json"
+
 TOOLS_DIR_ENV_VAR = "ANKI_TOOLS"
 
 PNGQUANT = os.path.join("other", "pngquant")
@@ -22,6 +42,33 @@ IMAGE_MAGICK_DIR = os.path.join("other", "ImageMagick-7.0.8")
 
 SIPS = "/usr/bin/sips"
 
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SIGNATURE = b"\xff\xd8"
+JPEG_FILE_TYPES = [".jpg", ".jpeg"]
+
+# Bytes that are read from each image to parse its header. A PNG's IHDR chunk is
+# always within the first 33 bytes, but a JPEG's SOF segment comes after any
+# EXIF/ICC data, so for JPEGs more is read in blocks until the SOF is found.
+IMAGE_HEADER_READ_SIZE = 64
+JPEG_HEADER_BLOCK_SIZE = 4096
+
+PNG_COLOR_TYPES = { 0 : "grayscale", 2 : "RGB", 3 : "palette", 4 : "grayscale+alpha", 6 : "RGBA" }
+
+# The "subprocess" backend uses the external pngquant, optipng, ImageMagick and
+# sips tools. The "pillow" backend does the same work in-process with Pillow
+# (which also works on Linux machines that do not have sips).
+SUBPROCESS_BACKEND = "subprocess"
+PILLOW_BACKEND = "pillow"
+IMAGE_BACKENDS = [SUBPROCESS_BACKEND, PILLOW_BACKEND]
+IMAGE_BACKEND_ENV_VAR = "ANKI_IMAGE_BACKEND"
+DEFAULT_IMAGE_BACKEND = SUBPROCESS_BACKEND
+
+# Optimized copies of PNG files are kept here keyed by a hash of the original
+# file contents (and the optimization settings), so unchanged frames do not need
+# to be optimized again when a sequence is repackaged.
+OPTIMIZED_CACHE_DIR_ENV_VAR = "ANKI_PNG_CACHE_DIR"
+OPTIMIZED_CACHE_DIR = os.path.join(tempfile.gettempdir(), "anki_optimized_png_cache")
+
 
 def _run_command(cmd, settings=None, shell=False, verbose=False):
     env_vars = copy.copy(os.environ)
@@ -45,10 +92,55 @@ def _run_command(cmd, settings=None, shell=False, verbose=False):
     return (status, stdout, stderr)
 
 
-def optimize_image_file(png_file, number_of_colors=NUMBER_COLORS, quality=OPTIPNG_QUALITY):
+def get_image_backend(backend=None):
+    """
+    Returns the image backend to use: the provided one, else the one set
+    with the ANKI_IMAGE_BACKEND environment variable, else the default.
+    """
+    if not backend:
+        backend = os.getenv(IMAGE_BACKEND_ENV_VAR, DEFAULT_IMAGE_BACKEND)
+    backend = backend.lower()
+    if backend not in IMAGE_BACKENDS:
+        raise ValueError("Unknown image backend '%s' (should be one of %s)" % (backend, IMAGE_BACKENDS))
+    if backend == PILLOW_BACKEND and Image is None:
+        raise ValueError("The '%s' image backend requires Pillow to be installed" % backend)
+    return backend
+
+
+def optimize_image_data(png_data, number_of_colors=NUMBER_COLORS):
     """
-    This function uses 'pngquant' and 'optipng' to optimize a PNG image file.
+    This function uses Pillow to palette-quantize PNG image data (a string of
+    bytes) to number_of_colors colors and returns the optimized PNG data.
+    The pixel density (DPI) of the original image is kept.
     """
+    image = Image.open(io.BytesIO(png_data))
+    dpi = image.info.get("dpi")
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    # Fast octree is the only built-in quantizer that supports an alpha channel
+    image = image.quantize(colors=number_of_colors, method=2)
+    output = io.BytesIO()
+    save_args = { "optimize" : True }
+    if dpi:
+        save_args["dpi"] = dpi
+    image.save(output, "PNG", **save_args)
+    return output.getvalue()
+
+
+def optimize_image_file(png_file, number_of_colors=NUMBER_COLORS, quality=OPTIPNG_QUALITY,
+                        backend=None):
+    """
+    This function uses 'pngquant' and 'optipng' (or Pillow, depending on the
+    image backend) to optimize a PNG image file.
+    """
+    if get_image_backend(backend) == PILLOW_BACKEND:
+        with open(png_file, 'rb') as fh:
+            png_data = fh.read()
+        png_data = optimize_image_data(png_data, number_of_colors)
+        with open(png_file, 'wb') as fh:
+            fh.write(png_data)
+        return
+
     st = os.stat(png_file)
     #print("Optimizing image file: %s (size = %s)" % (png_file, st.st_size))
 
@@ -76,13 +168,136 @@ def optimize_image_file(png_file, number_of_colors=NUMBER_COLORS, quality=OPTIPN
     #print("Optimized image file: %s (size = %s)" % (png_file, st.st_size))
 
 
-def change_pixel_density(image_file, density):
+def _get_optimized_cache_file(png_file, number_of_colors, quality, backend, cache_dir):
+    hasher = hashlib.sha1()
+    hasher.update(("%s:%s:%s:" % (number_of_colors, quality, backend)).encode("utf-8"))
+    with open(png_file, 'rb') as fh:
+        hasher.update(fh.read())
+    return os.path.join(cache_dir, hasher.hexdigest() + DEFAULT_IMAGE_TYPE)
+
+
+def _optimize_one_image_file(args):
+    """
+    Worker for optimize_image_files(). Copies png_file to dest_file and optimizes
+    it (or copies an already optimized version from the cache). Returns a tuple
+    of (dest_file, original size, optimized size, used_cache)
     """
-    This function uses https://imagemagick.org/script/convert.php to
-    update the image's pixel density.
+    png_file, dest_file, number_of_colors, quality, backend, cache_dir = args
+    orig_size = os.path.getsize(png_file)
+    cache_file = None
+    if cache_dir:
+        cache_file = _get_optimized_cache_file(png_file, number_of_colors, quality, backend,
+                                               cache_dir)
+        if os.path.isfile(cache_file):
+            shutil.copyfile(cache_file, dest_file)
+            return (dest_file, orig_size, os.path.getsize(dest_file), True)
+    shutil.copyfile(png_file, dest_file)
+    optimize_image_file(dest_file, number_of_colors, quality, backend)
+    if cache_file:
+        # Copy to a unique temp file first so other workers (threads of the same
+        # process, which may be caching an identical frame) never see a partial file
+        fd, tmp_cache_file = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+        os.close(fd)
+        try:
+            shutil.copyfile(dest_file, tmp_cache_file)
+            try:
+                os.rename(tmp_cache_file, cache_file)
+            except OSError:
+                # On Windows the rename fails if another worker already cached
+                # this frame, in which case that cached copy is just as good
+                if not os.path.isfile(cache_file):
+                    raise
+        finally:
+            try:
+                os.remove(tmp_cache_file)
+            except OSError, e:
+                # The temp file is normally gone once it was renamed into place
+                if e.errno != errno.ENOENT:
+                    raise
+    return (dest_file, orig_size, os.path.getsize(dest_file), False)
+
+
+def optimize_image_files(png_files, dest_dir, number_of_colors=NUMBER_COLORS,
+                         quality=OPTIPNG_QUALITY, num_workers=None, use_cache=True,
+                         progress_callback=None, backend=None):
+    """
+    This function optimizes a sequence of PNG image files (see optimize_image_file())
+    in parallel, writing the optimized copies to dest_dir and leaving the originals
+    untouched. The work itself is done by the 'pngquant' and 'optipng' processes,
+    so a pool of threads is used to keep num_workers (default = number of CPUs)
+    of those processes running at once.
+
+    Optimized files are cached by content hash (see OPTIMIZED_CACHE_DIR), so frames
+    that have not changed since the last time they were optimized are just copied.
+
+    If provided, progress_callback(num_done, num_total) is called as each file
+    completes (from the calling thread), eg. to update a progress bar.
+
+    This function returns (optimized_files, stats) where optimized_files is in
+    the same order as png_files and stats is a dict with the number of files,
+    number of cache hits, total bytes before and after and elapsed seconds.
+    """
+    start_time = time.time()
+    backend = get_image_backend(backend)
+    cache_dir = None
+    if use_cache:
+        cache_dir = os.getenv(OPTIMIZED_CACHE_DIR_ENV_VAR, OPTIMIZED_CACHE_DIR)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+    if not num_workers:
+        num_workers = cpu_count()
+    jobs = []
+    for png_file in png_files:
+        dest_file = os.path.join(dest_dir, os.path.basename(png_file))
+        jobs.append((png_file, dest_file, number_of_colors, quality, backend, cache_dir))
+
+    results = []
+    pool = ThreadPool(max(1, min(num_workers, len(jobs))))
+    try:
+        for result in pool.imap_unordered(_optimize_one_image_file, jobs):
+            results.append(result)
+            if progress_callback:
+                progress_callback(len(results), len(jobs))
+    finally:
+        pool.close()
+        pool.join()
+
+    stats = { "num_files" : len(results),
+              "num_cached" : len([x for x in results if x[3]]),
+              "bytes_before" : sum([x[1] for x in results]),
+              "bytes_after" : sum([x[2] for x in results]),
+              "elapsed_secs" : time.time() - start_time }
+    optimized_files = [job[1] for job in jobs]
+    return (optimized_files, stats)
+
+
+def format_optimize_stats(stats):
+    """
+    Returns a one line summary of the stats returned by optimize_image_files()
+    """
+    saved = stats["bytes_before"] - stats["bytes_after"]
+    pct = 0.0
+    if stats["bytes_before"]:
+        pct = 100.0 * saved / stats["bytes_before"]
+    return ("Optimized %s PNG files (%s from cache) in %.1f sec: %s -> %s bytes (saved %s bytes, %.1f%%)"
+            % (stats["num_files"], stats["num_cached"], stats["elapsed_secs"],
+               stats["bytes_before"], stats["bytes_after"], saved, pct))
+
+
+def change_pixel_density(image_file, density, backend=None):
+    """
+    This function uses https://imagemagick.org/script/convert.php (or Pillow,
+    depending on the image backend) to update the image's pixel density.
     """
     os.stat(image_file)
 
+    if get_image_backend(backend) == PILLOW_BACKEND:
+        with open(image_file, 'rb') as fh:
+            image = Image.open(io.BytesIO(fh.read()))
+            image.load()
+        image.save(image_file, "PNG", dpi=(density, density), optimize=True)
+        return
+
     tools_dir = os.environ[TOOLS_DIR_ENV_VAR]
     image_magick_dir = os.path.join(tools_dir, IMAGE_MAGICK_DIR)
     if not os.path.isdir(image_magick_dir):
@@ -95,6 +310,201 @@ def change_pixel_density(image_file, density):
     status, stdout, stderr = _run_command(cmd, settings)
 
 
+def _parse_png_header(header):
+    """
+    Returns (width, height, bit depth, color type) from the IHDR chunk at
+    the start of PNG data.
+    """
+    if len(header) < 29 or header[12:16] != b"IHDR":
+        raise ValueError("Missing PNG IHDR chunk")
+    width, height, bit_depth, color_type = struct.unpack(">IIBB", header[16:26])
+    return (width, height, bit_depth, color_type)
+
+
+def _parse_jpeg_header(data, fh):
+    """
+    Returns (width, height, bit depth, number of components) from the first
+    SOF segment of JPEG data, reading more from the file object (in blocks)
+    only until that segment is found.
+    """
+    pos = 2
+    while True:
+        while len(data) < pos + 9:
+            more = fh.read(JPEG_HEADER_BLOCK_SIZE)
+            if not more:
+                raise ValueError("Missing JPEG SOF segment")
+            data += more
+        if data[pos:pos+1] != b"\xff":
+            raise ValueError("Invalid JPEG marker")
+        marker = ord(data[pos+1:pos+2])
+        if marker == 0xff:
+            # Fill byte
+            pos += 1
+            continue
+        segment_len = struct.unpack(">H", data[pos+2:pos+4])[0]
+        # SOF0-SOF15, except DHT (0xc4), JPG (0xc8) and DAC (0xcc)
+        if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+            bit_depth, height, width, components = struct.unpack(">BHHB", data[pos+4:pos+10])
+            return (width, height, bit_depth, components)
+        pos += 2 + segment_len
+
+
+def read_image_header(fh, name=""):
+    """
+    Given a file object (positioned at the start of a PNG or JPEG image),
+    this function parses only the image header and returns a dict with
+    the image's format, width, height, bit depth and color type (for
+    JPEGs, the color type is the number of color components).
+    """
+    header = fh.read(IMAGE_HEADER_READ_SIZE)
+    if header.startswith(PNG_SIGNATURE):
+        width, height, bit_depth, color_type = _parse_png_header(header)
+        image_format = "png"
+    elif header.startswith(JPEG_SIGNATURE):
+        width, height, bit_depth, color_type = _parse_jpeg_header(header, fh)
+        image_format = "jpeg"
+    else:
+        raise ValueError("Unsupported image format: %s" % (name or fh))
+    return { "name" : name, "format" : image_format, "width" : width, "height" : height,
+             "bit_depth" : bit_depth, "color_type" : color_type }
+
+
+def parse_sequence_file_list(definition_data):
+    """
+    Given the contents of a sprite sequence's definition.json file, this
+    function returns the list of frame file names from the fileList of its
+    segments (in playback order, so a deduplicated frame is listed every time
+    it is shown) or None if the definition does not list every frame.
+    """
+    definition_data = re.sub(r'//.*\n', os.linesep, definition_data) # remove C-style comments
+    try:
+        definition = json.loads(definition_data)
+    except ValueError:
+        return None
+    file_list = []
+    for segment in definition.get("sequence", []):
+        if "fileList" not in segment:
+            return None
+        file_list.extend(segment["fileList"])
+    return file_list or None
+
+
+def _read_dir_file_list(dir_path):
+    definition_file = os.path.join(dir_path, SEQUENCE_DEFINITION_FILE)
+    if not os.path.isfile(definition_file):
+        return None
+    with open(definition_file, 'r') as fh:
+        return parse_sequence_file_list(fh.read())
+
+
+def _iter_image_headers(file_path, file_types, file_lists=None):
+    """
+    Yields the header dict (see read_image_header()) for every image in a tar
+    file, a directory or a single image file. Tar members are streamed, so
+    nothing is extracted to disk. If a list is provided for 'file_lists', the
+    frame file list from the sequence's definition.json (if any) is appended
+    to it.
+    """
+    if os.path.isdir(file_path):
+        if file_lists is not None:
+            file_lists.append(_read_dir_file_list(file_path))
+        for name in sorted(os.listdir(file_path)):
+            if os.path.splitext(name)[1].lower() in file_types:
+                with open(os.path.join(file_path, name), 'rb') as fh:
+                    yield read_image_header(fh, name)
+    elif os.path.splitext(file_path)[1].lower() in file_types:
+        with open(file_path, 'rb') as fh:
+            yield read_image_header(fh, os.path.basename(file_path))
+    elif not tarfile.is_tarfile(file_path):
+        raise ValueError("Unsupported image format: %s" % file_path)
+    else:
+        try:
+            tar = tarfile.open(file_path, 'r|*')
+        except tarfile.ReadError, e:
+            raise RuntimeError("%s: %s" % (e, file_path))
+        try:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                if os.path.splitext(member.name)[1].lower() in file_types:
+                    yield read_image_header(tar.extractfile(member), member.name)
+                elif file_lists is not None and \
+                        os.path.basename(member.name) == SEQUENCE_DEFINITION_FILE:
+                    file_lists.append(parse_sequence_file_list(tar.extractfile(member).read()))
+        finally:
+            tar.close()
+
+
+def get_image_sequence_info(file_path, file_types=[DEFAULT_IMAGE_TYPE] + JPEG_FILE_TYPES):
+    """
+    Given a tar file (or directory) of images or a single image file, this
+    function reads only the image headers and returns a dict with:
+        frame_count: the number of frames, which is the length of the
+                     fileList in definition.json if there is one (since
+                     duplicate frames are packaged once), or else the
+                     number of images
+        image_count: the number of images
+        width, height, bit_depth, color_type: from the first image (by name)
+        consistent: False if any image's dimensions, bit depth or color
+                    type differ from the first image's
+        frames: the list of header dicts for each image (sorted by name)
+    """
+    os.stat(file_path)
+
+    file_lists = []
+    frames = sorted(_iter_image_headers(file_path, file_types, file_lists), key=lambda x: x["name"])
+    file_list = ([x for x in file_lists if x] or [None])[0]
+    frame_count = len(file_list) if file_list else len(frames)
+    info = { "frame_count" : frame_count, "image_count" : len(frames),
+             "width" : None, "height" : None,
+             "bit_depth" : None, "color_type" : None, "consistent" : True,
+             "frames" : frames }
+    if frames:
+        keys = ["width", "height", "bit_depth", "color_type"]
+        for key in keys:
+            info[key] = frames[0][key]
+        for frame in frames[1:]:
+            if [frame[key] for key in keys] != [info[key] for key in keys]:
+                info["consistent"] = False
+                break
+    return info
+
+
+def get_first_image_header(file_path, file_types=[DEFAULT_IMAGE_TYPE] + JPEG_FILE_TYPES):
+    """
+    Returns the header dict (see read_image_header()) of an image file or of
+    the first image (by name) in a tar file or directory, or None if there
+    are no images. Only that one image's header is read; tar files are
+    opened for random access so the other members' data is skipped.
+    Raises ValueError for files that are neither a supported image nor a tar file.
+    """
+    if os.path.isdir(file_path):
+        names = sorted(x for x in os.listdir(file_path)
+                       if os.path.splitext(x)[1].lower() in file_types)
+        if not names:
+            return None
+        with open(os.path.join(file_path, names[0]), 'rb') as fh:
+            return read_image_header(fh, names[0])
+    if os.path.splitext(file_path)[1].lower() in file_types:
+        with open(file_path, 'rb') as fh:
+            return read_image_header(fh, os.path.basename(file_path))
+    if not tarfile.is_tarfile(file_path):
+        raise ValueError("Unsupported image format: %s" % file_path)
+    try:
+        tar = tarfile.open(file_path)
+    except tarfile.ReadError, e:
+        raise RuntimeError("%s: %s" % (e, file_path))
+    try:
+        members = [x for x in tar.getmembers()
+                   if x.isfile() and os.path.splitext(x.name)[1].lower() in file_types]
+        if not members:
+            return None
+        first_member = min(members, key=lambda x: x.name)
+        return read_image_header(tar.extractfile(first_member), first_member.name)
+    finally:
+        tar.close()
+
+
 def _get_first_file_in_tarball(tar_file, file_type=DEFAULT_IMAGE_TYPE, dest_dir=None):
     try:
         tar = tarfile.open(tar_file)
@@ -117,22 +527,31 @@ def _get_first_file_in_tarball(tar_file, file_type=DEFAULT_IMAGE_TYPE, dest_dir=
 
 def get_image_file_count(tar_file, image_file_type=DEFAULT_IMAGE_TYPE):
     """
-    Given a tar file, this function will return the count
-    of PNG image files that it contains.
+    Given a tar file, this function will return the number of frames
+    in the image sequence that it contains. That is the length of the
+    fileList in its definition.json, if it has one (since duplicate
+    frames are packaged once), or else the count of PNG image files.
     """
     os.stat(tar_file)
 
     if tar_file.endswith(image_file_type):
         return 1
     try:
-        tar = tarfile.open(tar_file)
+        tar = tarfile.open(tar_file, 'r|*')
     except tarfile.ReadError, e:
         raise RuntimeError("%s: %s" % (e, tar_file))
-    members = tar.getmembers()
-    tar.close()
-    members = [x.name for x in members]
-    members = [x for x in members if x.endswith(image_file_type)]
-    file_count = len(members)
+    file_count = 0
+    file_list = None
+    try:
+        for member in tar:
+            if member.name.endswith(image_file_type):
+                file_count += 1
+            elif member.isfile() and os.path.basename(member.name) == SEQUENCE_DEFINITION_FILE:
+                file_list = parse_sequence_file_list(tar.extractfile(member).read())
+    finally:
+        tar.close()
+    if file_list:
+        return len(file_list)
     return file_count
 
 
@@ -153,29 +572,144 @@ def _get_sips_info(image_file, property, sips=SIPS):
     return value
 
 
-def get_pixel_height(image_file):
+def _get_pillow_size(image_file, file_type=DEFAULT_IMAGE_TYPE):
+    """
+    Returns the (width, height) of an image file, or of the first image in a
+    tar file, without extracting anything to disk. Pillow only parses the
+    image header to get the size.
+    """
+    os.stat(image_file)
+
+    if not image_file.endswith('.tar'):
+        return Image.open(image_file).size
+    try:
+        tar = tarfile.open(image_file)
+    except tarfile.ReadError, e:
+        raise RuntimeError("%s: %s" % (e, image_file))
+    try:
+        members = [x for x in tar.getmembers() if x.name.endswith(file_type)]
+        if not members:
+            raise ValueError("No image files found in: %s" % image_file)
+        members.sort(key=lambda x: x.name)
+        image_data = tar.extractfile(members[0]).read()
+    finally:
+        tar.close()
+    return Image.open(io.BytesIO(image_data)).size
+
+
+def get_pixel_height(image_file, backend=None):
     """
     Given an image file (or a tar file that contains image files),
     this function will return the height of the image (or the first
     image in the tar file) in pixels.
     """
+    try:
+        header = get_first_image_header(image_file)
+    except (ValueError, RuntimeError):
+        # Not a PNG or JPEG image (or a tar file of them), so fall back to the image backend
+        pass
+    else:
+        return header["height"] if header else None
+    if get_image_backend(backend) == PILLOW_BACKEND:
+        return _get_pillow_size(image_file)[1]
     height = _get_sips_info(image_file, "pixelHeight")
     return height
 
 
-def get_pixel_width(image_file):
+def get_pixel_width(image_file, backend=None):
     """
     Given an image file (or a tar file that contains image files),
     this function will return the width of the image (or the first 
     image in the tar file) in pixels.
     """
+    try:
+        header = get_first_image_header(image_file)
+    except (ValueError, RuntimeError):
+        # Not a PNG or JPEG image (or a tar file of them), so fall back to the image backend
+        pass
+    else:
+        return header["width"] if header else None
+    if get_image_backend(backend) == PILLOW_BACKEND:
+        return _get_pillow_size(image_file)[0]
     width = _get_sips_info(image_file, "pixelWidth")
     return width
 
 
+def get_pixel_hash(image_file=None, image_data=None):
+    """
+    Returns a hash of the decoded pixels (plus the size and color mode) of an
+    image file or of image data, so frames that look identical get the same
+    hash even if their files differ, eg. in compression or metadata. Without
+    Pillow, the hash of the file contents is returned instead.
+    """
+    if image_data is None:
+        with open(image_file, 'rb') as fh:
+            image_data = fh.read()
+    hasher = hashlib.sha1()
+    if Image is None:
+        hasher.update(image_data)
+        return hasher.hexdigest()
+    image = Image.open(io.BytesIO(image_data))
+    if image.mode not in ["RGB", "RGBA", "L", "LA"]:
+        image = image.convert("RGBA")
+    hasher.update(("%s:%sx%s:" % (image.mode, image.size[0], image.size[1])).encode("utf-8"))
+    hasher.update(image.tobytes())
+    return hasher.hexdigest()
+
+
+def _get_psnr(orig_file, optimized_file):
+    """
+    Returns the peak signal-to-noise ratio (in dB) of an optimized image
+    compared to the original (higher is better, None means identical).
+    """
+    orig = Image.open(orig_file).convert("RGBA")
+    optimized = Image.open(optimized_file).convert("RGBA")
+    rms_per_band = ImageStat.Stat(ImageChops.difference(orig, optimized)).rms
+    rms = math.sqrt(sum([x * x for x in rms_per_band]) / len(rms_per_band))
+    if rms == 0:
+        return None
+    return 20.0 * math.log10(255.0 / rms)
+
+
+def compare_backends(png_files, number_of_colors=NUMBER_COLORS, backends=IMAGE_BACKENDS):
+    """
+    Optimizes copies of the provided PNG files with each image backend and
+    prints a table of the resulting file size, time taken and quality (PSNR
+    compared to the original) per file and in total. The original files are
+    not modified. Returns a dict of backend -> (total bytes, total secs).
+    """
+    totals = {}
+    tmp_dir = tempfile.mkdtemp()
+    print("%-40s %-10s %10s %10s %8s %8s" % ("file", "backend", "orig", "optimized", "secs", "PSNR"))
+    try:
+        for png_file in png_files:
+            orig_size = os.path.getsize(png_file)
+            for backend in backends:
+                tmp_file = os.path.join(tmp_dir, backend + "_" + os.path.basename(png_file))
+                shutil.copyfile(png_file, tmp_file)
+                start_time = time.time()
+                optimize_image_file(tmp_file, number_of_colors, backend=backend)
+                elapsed = time.time() - start_time
+                size = os.path.getsize(tmp_file)
+                psnr = _get_psnr(png_file, tmp_file)
+                psnr = "exact" if psnr is None else "%.1f" % psnr
+                print("%-40s %-10s %10s %10s %8.3f %8s" % (os.path.basename(png_file), backend,
+                                                           orig_size, size, elapsed, psnr))
+                total_size, total_secs = totals.get(backend, (0, 0.0))
+                totals[backend] = (total_size + size, total_secs + elapsed)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    for backend, (total_size, total_secs) in sorted(totals.items()):
+        print("%s backend total: %s bytes in %.2f sec" % (backend, total_size, total_secs))
+    return totals
+
+
 if __name__ == "__main__":
     image_files = sys.argv[1:]
-    for image_file in image_files:
-        optimize_image_file(image_file)
+    if image_files and image_files[0] == "-compare":
+        compare_backends(image_files[1:])
+    else:
+        for image_file in image_files:
+            optimize_image_file(image_file)
 
 
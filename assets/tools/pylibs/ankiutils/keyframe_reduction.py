@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+"""
+This module removes keyframes from exported animation tracks that the robot
+does not need to reproduce the motion within an error budget, using the
+Ramer-Douglas-Peucker algorithm on each track's time/value curve.
+
+The exporter emits a keyframe wherever any controller is keyed, so the head,
+lift and procedural face tracks are often denser than their motion. Fewer
+keyframes mean smaller animation files and less streaming work on the robot.
+
+ - HeadAngleKeyFrame and LiftHeightKeyFrame tracks move to a value over a
+   duration, so their curves are the value at the end of each keyframe. Kept
+   keyframes are stretched to start where the previous kept keyframe ended.
+   Gaps between keyframes (where the head or lift holds still) are kept as is.
+ - ProceduralFaceKeyFrame tracks are reduced jointly over all face and eye
+   parameters, so a keyframe is only removed if every parameter (each with its
+   own budget) can be linearly interpolated from the remaining keyframes.
+
+Error budgets are in degrees for the head, mm for the lift and eye-parameter
+units for the procedural face (parameters that are in pixels or degrees use
+a proportionally larger budget, see FACE_PARAM_SCALES).
+
+Usage as an offline pass over exported animation files:
+
+    keyframe_reduction.py [-output <dir>] [-head <deg>] [-lift <mm>] [-face <units>] <json_file_or_dir> ...
+"""
+
+import sys
+import os
+import json
+import copy
+from collections import OrderedDict
+
+
+OUTPUT_DIR_FLAG = "-output"
+HEAD_ERROR_FLAG = "-head"
+LIFT_ERROR_FLAG = "-lift"
+FACE_ERROR_FLAG = "-face"
+
+KEYFRAME_TYPE_KEY = "Name"
+TRIGGER_TIME_KEY = "triggerTime_ms"
+DURATION_TIME_KEY = "durationTime_ms"
+
+HEAD_ANGLE_KEYFRAME = "HeadAngleKeyFrame"
+LIFT_HEIGHT_KEYFRAME = "LiftHeightKeyFrame"
+PROC_FACE_KEYFRAME = "ProceduralFaceKeyFrame"
+
+HEAD_ANGLE_KEY = "angle_deg"
+LIFT_HEIGHT_KEY = "height_mm"
+
+FACE_PARAM_KEYS = ["faceAngle", "faceCenterX", "faceCenterY", "faceScaleX", "faceScaleY",
+                   "scanlineOpacity"]
+EYE_PARAM_KEYS = ["leftEye", "rightEye"]
+
+DEFAULT_ERROR_BUDGETS = { HEAD_ANGLE_KEYFRAME : 1.0,
+                          LIFT_HEIGHT_KEYFRAME : 1.0,
+                          PROC_FACE_KEYFRAME : 0.02 }
+
+# How many eye-parameter units each procedural face parameter allows, relative to
+# the budget. Most eye parameters are fractions (0-1), but some are in pixels or
+# degrees, and those get a proportionally larger budget (eg. 0.02 -> 0.5 pixels).
+PIXEL_PARAM_SCALE = 25.0
+DEGREE_PARAM_SCALE = 50.0
+FACE_PARAM_SCALES = { "faceAngle" : DEGREE_PARAM_SCALE,
+                      "faceCenterX" : PIXEL_PARAM_SCALE,
+                      "faceCenterY" : PIXEL_PARAM_SCALE }
+EYE_PARAM_SCALES = { 0 : PIXEL_PARAM_SCALE,    # eye center X
+                     1 : PIXEL_PARAM_SCALE,    # eye center Y
+                     4 : DEGREE_PARAM_SCALE,   # eye angle
+                     14 : DEGREE_PARAM_SCALE,  # upper lid angle
+                     17 : DEGREE_PARAM_SCALE } # lower lid angle
+
+# Consecutive head/lift keyframes whose start and end times are this close
+# are treated as one continuous motion (times are rounded to whole ms)
+CONTIGUOUS_TOLERANCE_MS = 2
+
+
+def simplify_curve(times, values, budgets):
+    """
+    Returns the sorted list of indices of the points to keep so that linear
+    interpolation between the kept points is within budget of every point.
+    values is a list of value vectors (one per time) and budgets is the
+    list of allowed errors for each element of those vectors. The first and
+    last points are always kept.
+    """
+    num_points = len(times)
+    if num_points <= 2:
+        return list(range(num_points))
+    keep = [False] * num_points
+    keep[0] = keep[-1] = True
+    stack = [(0, num_points - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        time_span = float(times[last] - times[first])
+        max_error = 1.0
+        split_idx = None
+        for idx in range(first + 1, last):
+            fraction = (times[idx] - times[first]) / time_span if time_span else 0.0
+            error = 0.0
+            for first_value, last_value, value, budget in zip(values[first], values[last],
+                                                              values[idx], budgets):
+                expected = first_value + (last_value - first_value) * fraction
+                if budget > 0:
+                    error = max(error, abs(value - expected) / budget)
+                elif value != expected:
+                    error = float("inf")
+            if error > max_error:
+                max_error = error
+                split_idx = idx
+        if split_idx is not None:
+            keep[split_idx] = True
+            stack.append((first, split_idx))
+            stack.append((split_idx, last))
+    return [idx for idx in range(num_points) if keep[idx]]
+
+
+def _get_face_values(keyframe):
+    values = [keyframe.get(key, 0.0) for key in FACE_PARAM_KEYS]
+    for key in EYE_PARAM_KEYS:
+        values.extend(keyframe.get(key, []))
+    return values
+
+
+def _get_face_budgets(keyframe, budget):
+    budgets = [budget * FACE_PARAM_SCALES.get(key, 1.0) for key in FACE_PARAM_KEYS]
+    for key in EYE_PARAM_KEYS:
+        budgets.extend(budget * EYE_PARAM_SCALES.get(idx, 1.0) for idx in range(len(keyframe.get(key, []))))
+    return budgets
+
+
+def reduce_proc_face_track(keyframes, budget=DEFAULT_ERROR_BUDGETS[PROC_FACE_KEYFRAME]):
+    """
+    Returns the list of procedural face keyframes (sorted by trigger time)
+    that are needed to keep every face and eye parameter within budget.
+    """
+    keyframes = sorted(keyframes, key=lambda x: x[TRIGGER_TIME_KEY])
+    if len(keyframes) <= 2 or budget is None:
+        return keyframes
+    values = [_get_face_values(x) for x in keyframes]
+    if len(set(len(x) for x in values)) != 1:
+        # The eye parameters do not line up (eg. old and new eye formats mixed)
+        return keyframes
+    times = [x[TRIGGER_TIME_KEY] for x in keyframes]
+    keep = simplify_curve(times, values, _get_face_budgets(keyframes[0], budget))
+    return [keyframes[idx] for idx in keep]
+
+
+def reduce_motion_track(keyframes, value_key, budget):
+    """
+    Returns the list of head angle or lift height keyframes (sorted by trigger
+    time) that are needed to keep the motion within budget. Each of those
+    keyframes starts where the previous one ended, so a kept keyframe can be a
+    modified copy of the original keyframe with a longer duration.
+    """
+    keyframes = sorted(keyframes, key=lambda x: x[TRIGGER_TIME_KEY])
+    if len(keyframes) <= 1 or budget is None:
+        return keyframes
+
+    # Split the track into continuous motions
+    segments = [[keyframes[0]]]
+    for keyframe in keyframes[1:]:
+        prev_keyframe = segments[-1][-1]
+        prev_end_time = prev_keyframe[TRIGGER_TIME_KEY] + prev_keyframe[DURATION_TIME_KEY]
+        if abs(keyframe[TRIGGER_TIME_KEY] - prev_end_time) <= CONTIGUOUS_TOLERANCE_MS:
+            segments[-1].append(keyframe)
+        else:
+            segments.append([keyframe])
+
+    reduced_keyframes = []
+    for segment_idx, segment in enumerate(segments):
+        start_time = segment[0][TRIGGER_TIME_KEY]
+        times = [x[TRIGGER_TIME_KEY] + x[DURATION_TIME_KEY] for x in segment]
+        values = [[x[value_key]] for x in segment]
+        if segment_idx > 0:
+            # The motion starts from where the previous motion ended
+            times.insert(0, start_time)
+            values.insert(0, [segments[segment_idx-1][-1][value_key]])
+            keep = [idx - 1 for idx in simplify_curve(times, values, [budget]) if idx > 0]
+        else:
+            # The value before the first keyframe is unknown, so that keyframe is always
+            # kept (simplify_curve() always keeps the first point) and the rest of the
+            # segment is simplified from where it ends
+            keep = simplify_curve(times, values, [budget])
+        trigger_time = start_time
+        for idx in keep:
+            keyframe = segment[idx]
+            end_time = keyframe[TRIGGER_TIME_KEY] + keyframe[DURATION_TIME_KEY]
+            if keyframe[TRIGGER_TIME_KEY] != trigger_time:
+                keyframe = copy.copy(keyframe)
+                keyframe[TRIGGER_TIME_KEY] = trigger_time
+                keyframe[DURATION_TIME_KEY] = end_time - trigger_time
+            reduced_keyframes.append(keyframe)
+            trigger_time = end_time
+    return reduced_keyframes
+
+
+def reduce_keyframes(keyframes, error_budgets=None):
+    """
+    Returns a tuple of (reduced list of keyframes, dict of keyframe type ->
+    (number of keyframes before, number after)) for the keyframes of one
+    animation clip. error_budgets is a dict of keyframe type -> budget (see
+    DEFAULT_ERROR_BUDGETS), where a budget of None leaves that track as is.
+    Keyframes of other types are not changed and the order is preserved.
+    """
+    budgets = dict(DEFAULT_ERROR_BUDGETS)
+    budgets.update(error_budgets or {})
+    tracks = {}
+    for keyframe in keyframes:
+        keyframe_type = keyframe.get(KEYFRAME_TYPE_KEY)
+        if keyframe_type in budgets:
+            tracks.setdefault(keyframe_type, []).append(keyframe)
+
+    replacements = {}
+    stats = {}
+    for keyframe_type, track in tracks.items():
+        if keyframe_type == PROC_FACE_KEYFRAME:
+            reduced_track = reduce_proc_face_track(track, budgets[keyframe_type])
+        elif keyframe_type == HEAD_ANGLE_KEYFRAME:
+            reduced_track = reduce_motion_track(track, HEAD_ANGLE_KEY, budgets[keyframe_type])
+        else:
+            reduced_track = reduce_motion_track(track, LIFT_HEIGHT_KEY, budgets[keyframe_type])
+        stats[keyframe_type] = (len(track), len(reduced_track))
+        # Kept keyframes take the place of the original keyframe with the same end time
+        for keyframe in reduced_track:
+            end_time = keyframe[TRIGGER_TIME_KEY] + keyframe.get(DURATION_TIME_KEY, 0)
+            replacements[(keyframe_type, end_time)] = keyframe
+
+    reduced_keyframes = []
+    for keyframe in keyframes:
+        keyframe_type = keyframe.get(KEYFRAME_TYPE_KEY)
+        if keyframe_type not in tracks:
+            reduced_keyframes.append(keyframe)
+            continue
+        end_time = keyframe[TRIGGER_TIME_KEY] + keyframe.get(DURATION_TIME_KEY, 0)
+        replacement = replacements.pop((keyframe_type, end_time), None)
+        if replacement is not None:
+            reduced_keyframes.append(replacement)
+    return (reduced_keyframes, stats)
+
+
+def format_stats(stats):
+    return ", ".join("%s: %s -> %s" % (keyframe_type, before, after)
+                     for keyframe_type, (before, after) in sorted(stats.items()))
+
+
+def _find_json_files(paths):
+    json_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dir_path, dir_names, file_names in os.walk(path):
+                dir_names.sort()
+                json_files.extend(os.path.join(dir_path, x) for x in sorted(file_names)
+                                  if x.endswith(".json"))
+        else:
+            json_files.append(path)
+    return json_files
+
+
+def reduce_anim_files(paths, output_dir=None, error_budgets=None):
+    """
+    Reduces the keyframes of every clip in the provided animation .json files
+    (or directories of those) and writes them to output_dir (or back to the
+    same files if no output directory is provided). Returns a dict of keyframe
+    type -> (total number of keyframes before, total number after).
+    """
+    total_stats = {}
+    for json_file in _find_json_files(paths):
+        with open(json_file, 'r') as fh:
+            try:
+                anim_data = json.load(fh, object_pairs_hook=OrderedDict)
+            except ValueError as e:
+                print("Skipping %s because: %s" % (json_file, e))
+                continue
+        file_stats = {}
+        for clip_name, keyframes in anim_data.items():
+            anim_data[clip_name], clip_stats = reduce_keyframes(keyframes, error_budgets)
+            for keyframe_type, (before, after) in clip_stats.items():
+                old_before, old_after = file_stats.get(keyframe_type, (0, 0))
+                file_stats[keyframe_type] = (old_before + before, old_after + after)
+        if output_dir:
+            if not os.path.isdir(output_dir):
+                os.makedirs(output_dir)
+            output_file = os.path.join(output_dir, os.path.basename(json_file))
+        else:
+            output_file = json_file
+        with open(output_file, 'w') as fh:
+            fh.write(json.dumps(anim_data, sort_keys=False, indent=2, separators=(',', ': ')))
+        print("%s (%s)" % (output_file, format_stats(file_stats)))
+        for keyframe_type, (before, after) in file_stats.items():
+            old_before, old_after = total_stats.get(keyframe_type, (0, 0))
+            total_stats[keyframe_type] = (old_before + before, old_after + after)
+    return total_stats
+
+
+def main(args):
+    flags = { OUTPUT_DIR_FLAG : None, HEAD_ERROR_FLAG : None, LIFT_ERROR_FLAG : None,
+              FACE_ERROR_FLAG : None }
+    paths = []
+    idx = 0
+    while idx < len(args):
+        if args[idx] in flags:
+            flags[args[idx]] = args[idx + 1]
+            idx += 2
+        else:
+            paths.append(args[idx])
+            idx += 1
+    if not paths:
+        print("Usage: %s [%s <dir>] [%s <deg>] [%s <mm>] [%s <units>] <json_file_or_dir> ..."
+              % (os.path.basename(__file__), OUTPUT_DIR_FLAG, HEAD_ERROR_FLAG, LIFT_ERROR_FLAG,
+                 FACE_ERROR_FLAG))
+        return 1
+    error_budgets = {}
+    for flag, keyframe_type in ((HEAD_ERROR_FLAG, HEAD_ANGLE_KEYFRAME), (LIFT_ERROR_FLAG, LIFT_HEIGHT_KEYFRAME),
+                                (FACE_ERROR_FLAG, PROC_FACE_KEYFRAME)):
+        if flags[flag] is not None:
+            error_budgets[keyframe_type] = float(flags[flag])
+    total_stats = reduce_anim_files(paths, flags[OUTPUT_DIR_FLAG], error_budgets)
+    print("Total: %s" % format_stats(total_stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,193 @@
+"""
+This module plays frames (and any timed events, eg. audio events) against the
+robot's 33 ms frame clock. Every frame has a deadline measured on a monotonic
+clock from the start of playback. When drawing falls behind, frames whose
+deadlines have passed are dropped so playback stays in real time rather
+than drifting slower, and events are triggered at their time (or as soon as
+possible after it), so the face and audio stay in sync.
+
+After playback, the returned PlaybackStats reports how many frames were
+shown and dropped and the percentiles of how late frames and events were.
+
+Example usage:
+
+    scheduler = PlaybackScheduler()
+    scheduler.add_event(330, play_audio_event, "Play__Robot_Vo__Placeholder")
+    stats = scheduler.play(len(images), lambda idx: show(images[idx]),
+                           idle_callback=qApp.processEvents)
+    print(stats.summary())
+"""
+
+# The robot displays one frame every 33 ms
+FRAME_TIME_MS = 33.0
+
+# Never sleep for less than this (shorter sleeps are not accurate)
+MIN_SLEEP_SEC = 0.001
+
+LATENCY_PERCENTILES = [50, 90, 99]
+
+
+import sys
+import time
+import ctypes
+import ctypes.util
+
+
+def _get_monotonic_clock():
+    """
+    Returns a function that returns the seconds on a monotonic clock. Python 2
+    does not have time.monotonic(), so clock_gettime() is called through ctypes
+    where that is available, falling back to time.time().
+    """
+    if hasattr(time, "monotonic"):
+        return time.monotonic
+    if not sys.platform.startswith("win"):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            clock_gettime = libc.clock_gettime
+        except (OSError, AttributeError):
+            clock_gettime = None
+        if clock_gettime is not None:
+            class timespec(ctypes.Structure):
+                _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+            # CLOCK_MONOTONIC is 1 on Linux and 6 on macOS
+            clock_id = 6 if sys.platform == "darwin" else 1
+            def monotonic():
+                value = timespec()
+                if clock_gettime(clock_id, ctypes.byref(value)) != 0:
+                    return time.time()
+                return value.tv_sec + value.tv_nsec * 1e-9
+            return monotonic
+    return time.time
+
+
+monotonic = _get_monotonic_clock()
+
+
+def percentile(values, pct):
+    """
+    Returns the pct percentile (0-100) of a list of numbers using linear
+    interpolation between the closest ranks, or None for an empty list.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+class PlaybackStats(object):
+    """
+    The results of one playback. Latencies are in milliseconds after the
+    deadline of each shown frame or triggered event.
+    """
+
+    def __init__(self, frame_time_ms=FRAME_TIME_MS):
+        self.frame_time_ms = frame_time_ms
+        self.frames_shown = 0
+        self.frames_dropped = 0
+        self.dropped_frames = []
+        self.frame_latencies_ms = []
+        self.event_latencies_ms = []
+        self.duration_sec = 0.0
+        self.aborted = False
+
+    def get_frame_rate(self):
+        if self.duration_sec <= 0:
+            return None
+        return self.frames_shown / self.duration_sec
+
+    def get_latency_percentiles(self, latencies=None, percentiles=LATENCY_PERCENTILES):
+        if latencies is None:
+            latencies = self.frame_latencies_ms
+        return [(pct, percentile(latencies, pct)) for pct in percentiles]
+
+    def summary(self):
+        lines = ["Showed %s frames and dropped %s frames in %.2f seconds"
+                 % (self.frames_shown, self.frames_dropped, self.duration_sec)]
+        frame_rate = self.get_frame_rate()
+        if frame_rate:
+            lines[0] += " (%.2f fps, target is %.2f fps)" % (frame_rate, 1000.0 / self.frame_time_ms)
+        for name, latencies in (("Frame", self.frame_latencies_ms), ("Event", self.event_latencies_ms)):
+            if latencies:
+                lines.append("%s latency: %s, max = %.1f ms" % (name,
+                             ", ".join("p%s = %.1f ms" % x for x in self.get_latency_percentiles(latencies)),
+                             max(latencies)))
+        return "\n".join(lines)
+
+
+class PlaybackScheduler(object):
+    """
+    Shows frames at their deadlines on the robot's frame clock, dropping
+    late frames, and triggers timed events along the way.
+    """
+
+    def __init__(self, frame_time_ms=FRAME_TIME_MS, clock=None, sleep=None):
+        self.frame_time_ms = frame_time_ms
+        self.clock = clock or monotonic
+        self.sleep = sleep or time.sleep
+        self._events = []
+
+    def add_event(self, time_ms, callback, *args):
+        """
+        Adds a callback to call (with args) once playback reaches time_ms,
+        which is relative to the first played frame. Events are never
+        dropped, but they are triggered late if drawing is behind.
+        """
+        self._events.append((time_ms, len(self._events), callback, args))
+
+    def clear_events(self):
+        self._events = []
+
+    def play(self, num_frames, draw_callback, abort_callback=None, idle_callback=None):
+        """
+        Calls draw_callback(frame index) for the frames 0 to num_frames-1 at
+        their deadlines (frame index * frame time). If a frame's deadline has
+        passed by the time the previous frame is done, frames are skipped to
+        the frame that is due now. abort_callback is checked before every
+        frame and idle_callback (eg. to process UI events) is called after
+        every frame. Returns a PlaybackStats.
+        """
+        stats = PlaybackStats(self.frame_time_ms)
+        frame_time_sec = self.frame_time_ms / 1000.0
+        events = sorted(self._events)
+        next_event = 0
+        start_time = self.clock()
+        next_frame = 0
+        while next_frame < num_frames:
+            if abort_callback and abort_callback():
+                stats.aborted = True
+                break
+            now = self.clock()
+            due_frame = int((now - start_time) / frame_time_sec)
+            if due_frame > next_frame:
+                # Drawing fell behind, so skip to the frame that is due now
+                due_frame = min(due_frame, num_frames - 1)
+                stats.frames_dropped += due_frame - next_frame
+                stats.dropped_frames.extend(range(next_frame, due_frame))
+                next_frame = due_frame
+
+            # Trigger every event that is due by this frame
+            due_ms = max((now - start_time) * 1000.0, next_frame * self.frame_time_ms)
+            while next_event < len(events) and events[next_event][0] <= due_ms:
+                time_ms, order, callback, args = events[next_event]
+                callback(*args)
+                stats.event_latencies_ms.append(max((self.clock() - start_time) * 1000.0 - time_ms, 0.0))
+                next_event += 1
+
+            draw_callback(next_frame)
+            deadline = start_time + next_frame * frame_time_sec
+            stats.frame_latencies_ms.append(max((self.clock() - deadline) * 1000.0, 0.0))
+            stats.frames_shown += 1
+            if idle_callback:
+                idle_callback()
+            next_frame += 1
+
+            # Wait until the next frame's deadline
+            remaining = start_time + next_frame * frame_time_sec - self.clock()
+            if remaining >= MIN_SLEEP_SEC and next_frame < num_frames:
+                self.sleep(remaining)
+        stats.duration_sec = self.clock() - start_time
+        return stats
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+"""
+This module draws procedural face images (the ProceduralFaceKeyFrame data that
+is exported for the robot) with NumPy, so face images can be made without Maya
+or the ankibasestation package. It runs with Python 2 or 3.
+
+Every parameter is converted to an array with one value per frame and every
+frame is drawn at once (in chunks to bound memory), so rendering all frames
+of all animations, eg. for visual regression checks, is practical on a CPU.
+
+The drawing approximates the robot's procedural face renderer: each eye is a
+rectangle with four elliptical corners (the eight corner radius parameters),
+cut by an upper and a lower lid (with their own height, angle and bend),
+colored by the face hue and each eye's saturation and lightness, with an
+optional hot spot and glow. The images are 184 x 96 RGB, like the face.
+
+Example usage:
+
+    keyframes = [x for x in anim_data if x["Name"] == PROC_FACE_KEYFRAME]
+    times_ms = get_frame_times(keyframes)
+    images = render_keyframes(keyframes, times_ms)
+    write_png("face_00000.png", images[0])
+"""
+
+PROC_FACE_KEYFRAME = "ProceduralFaceKeyFrame"
+
+FACE_WIDTH = 184
+FACE_HEIGHT = 96
+
+# The robot displays one frame every 33 ms
+ANIM_TIME_STEP_MS = 33
+
+# The face hue is a robot setting (it is not part of the animation data)
+DEFAULT_HUE = 0.45
+
+KEYFRAME_TYPE_KEY = "Name"
+FACE_ANGLE_KEY = "faceAngle"
+FACE_CENTER_X_KEY = "faceCenterX"
+FACE_CENTER_Y_KEY = "faceCenterY"
+FACE_SCALE_X_KEY = "faceScaleX"
+FACE_SCALE_Y_KEY = "faceScaleY"
+SCANLINE_OPACITY_KEY = "scanlineOpacity"
+LEFT_EYE_KEY = "leftEye"
+RIGHT_EYE_KEY = "rightEye"
+TRIGGER_TIME_KEY = "triggerTime_ms"
+
+# The order of the per-face values in the arrays returned by get_face_params()
+FACE_KEYS = [FACE_CENTER_X_KEY, FACE_CENTER_Y_KEY, FACE_SCALE_X_KEY, FACE_SCALE_Y_KEY,
+             FACE_ANGLE_KEY, SCANLINE_OPACITY_KEY]
+FACE_DEFAULTS = [0.0, 0.0, 1.0, 1.0, 0.0, 1.0]
+
+# Indexes into the 25 per-eye values (see PROC_FACE_DATA in ankimaya/robot_data.py)
+EYE_CENTER_X_IDX = 0
+EYE_CENTER_Y_IDX = 1
+EYE_SCALE_X_IDX = 2
+EYE_SCALE_Y_IDX = 3
+EYE_ANGLE_IDX = 4
+LOWER_INNER_RADIUS_X_IDX = 5
+LOWER_INNER_RADIUS_Y_IDX = 6
+UPPER_INNER_RADIUS_X_IDX = 7
+UPPER_INNER_RADIUS_Y_IDX = 8
+UPPER_OUTER_RADIUS_X_IDX = 9
+UPPER_OUTER_RADIUS_Y_IDX = 10
+LOWER_OUTER_RADIUS_X_IDX = 11
+LOWER_OUTER_RADIUS_Y_IDX = 12
+UPPER_LID_Y_IDX = 13
+UPPER_LID_ANGLE_IDX = 14
+UPPER_LID_BEND_IDX = 15
+LOWER_LID_Y_IDX = 16
+LOWER_LID_ANGLE_IDX = 17
+LOWER_LID_BEND_IDX = 18
+SATURATION_IDX = 19
+LIGHTNESS_IDX = 20
+GLOW_SIZE_IDX = 21
+HOT_SPOT_CENTER_X_IDX = 22
+HOT_SPOT_CENTER_Y_IDX = 23
+GLOW_LIGHTNESS_IDX = 24
+
+NUM_EYE_PARAMS = 25
+
+# Older animations were exported with fewer per-eye values, so any missing
+# values at the end of an eye list are filled in with these defaults.
+EYE_DEFAULTS = [0.0, 0.0, 1.0, 1.0, 0.0] + [0.5] * 8 + [0.0] * 6 + [1.0, 1.0, 0.0, 0.0, 0.0, 0.0]
+
+# Size (in pixels) of an eye with a scale of 1.0 and the distance between
+# the nominal centers of the two eyes
+NOMINAL_EYE_WIDTH = 28.0
+NOMINAL_EYE_HEIGHT = 40.0
+NOMINAL_EYE_SPACING = 64.0
+
+# How much darker the edge of the eye is than its hot spot
+HOT_SPOT_FALLOFF = 0.25
+
+# Number of frames that are drawn together (each frame uses ~0.5 MB while drawing)
+DEFAULT_CHUNK_SIZE = 16
+
+
+import sys
+import os
+import json
+import struct
+import zlib
+
+import numpy as np
+
+
+def get_face_params(keyframe):
+    """
+    Given one ProceduralFaceKeyFrame dict, this function returns a tuple of
+    (face values, left eye values, right eye values) as lists of floats, where
+    the face values are in the FACE_KEYS order and missing values are
+    filled in with their defaults.
+    """
+    face = [float(keyframe.get(key, default)) for key, default in zip(FACE_KEYS, FACE_DEFAULTS)]
+    eyes = []
+    for eye_key in (LEFT_EYE_KEY, RIGHT_EYE_KEY):
+        eye = [float(x) for x in keyframe.get(eye_key, [])[:NUM_EYE_PARAMS]]
+        eyes.append(eye + EYE_DEFAULTS[len(eye):])
+    return (face, eyes[0], eyes[1])
+
+
+def get_frame_times(keyframes, time_step_ms=ANIM_TIME_STEP_MS, time_key=TRIGGER_TIME_KEY):
+    """
+    Returns an array of the times (one per displayed frame) from the first
+    keyframe to the last keyframe of an animation.
+    """
+    trigger_times = [x[time_key] for x in keyframes]
+    if not trigger_times:
+        return np.zeros(0)
+    return np.arange(min(trigger_times), max(trigger_times) + 1, time_step_ms, dtype=np.float64)
+
+
+def interpolate_params(keyframes, times, time_key=TRIGGER_TIME_KEY):
+    """
+    Given a list of ProceduralFaceKeyFrame dicts and an array of times, this
+    function returns a tuple of (face, left eye, right eye) arrays with shapes
+    (num_times, 6), (num_times, 25) and (num_times, 25) where the values at
+    each time are linearly interpolated between the keyframes around it (and
+    held before the first and after the last keyframe).
+    """
+    keyframes = sorted(keyframes, key=lambda x: x[time_key])
+    times = np.asarray(times, dtype=np.float64)
+    if not keyframes:
+        raise ValueError("No procedural face keyframes to interpolate")
+    key_times = np.array([x[time_key] for x in keyframes], dtype=np.float64)
+    params = [get_face_params(x) for x in keyframes]
+    results = []
+    for idx in range(3):
+        values = np.array([x[idx] for x in params], dtype=np.float64)
+        if len(keyframes) == 1:
+            results.append(np.repeat(values, len(times), axis=0))
+            continue
+        # Index of the keyframe at or before each time, and how far each
+        # time is between that keyframe and the next one
+        before = np.clip(np.searchsorted(key_times, times, side="right") - 1, 0, len(key_times) - 2)
+        span = key_times[before + 1] - key_times[before]
+        frac = np.where(span > 0, (times - key_times[before]) / np.where(span > 0, span, 1.0), 0.0)
+        frac = np.clip(frac, 0.0, 1.0)[:, np.newaxis]
+        results.append(values[before] * (1.0 - frac) + values[before + 1] * frac)
+    return tuple(results)
+
+
+def _hue_to_rgb(hue):
+    """
+    Returns the fully saturated, full value RGB color (an array of 3
+    floats between 0 and 1) for a hue between 0 and 1.
+    """
+    return np.clip(np.abs(((hue * 6.0 + np.array([0.0, 4.0, 2.0])) % 6.0) - 3.0) - 1.0, 0.0, 1.0)
+
+
+def _draw_eyes(face, eye, nominal_x, mirror, px, py):
+    """
+    Returns a tuple of (eye value, glow value) arrays with shape
+    (num_frames, FACE_HEIGHT, FACE_WIDTH) for one eye of every frame. The
+    eye value includes the lightness, hot spot and lid/edge coverage.
+    """
+    col = lambda values: values[:, np.newaxis, np.newaxis]
+
+    # Undo the face transform (scale and rotate around the face center)
+    face_angle = np.radians(col(face[:, 4]))
+    dx = px - col(face[:, 0])
+    dy = py - col(face[:, 1])
+    cos_a = np.cos(face_angle)
+    sin_a = np.sin(face_angle)
+    fx = (dx * cos_a + dy * sin_a) / np.maximum(np.abs(col(face[:, 2])), 1e-3)
+    fy = (dy * cos_a - dx * sin_a) / np.maximum(np.abs(col(face[:, 3])), 1e-3)
+
+    # Undo the eye transform, giving coordinates where the eye is -1 to 1
+    # in both directions. The right eye is mirrored, so "inner" is always +u.
+    half_width = np.maximum(np.abs(col(eye[:, EYE_SCALE_X_IDX])) * NOMINAL_EYE_WIDTH / 2.0, 1e-3)
+    half_height = np.maximum(np.abs(col(eye[:, EYE_SCALE_Y_IDX])) * NOMINAL_EYE_HEIGHT / 2.0, 1e-3)
+    eye_angle = np.radians(col(eye[:, EYE_ANGLE_IDX])) * mirror
+    ex = fx - (nominal_x + col(eye[:, EYE_CENTER_X_IDX]))
+    ey = fy - col(eye[:, EYE_CENTER_Y_IDX])
+    cos_a = np.cos(eye_angle)
+    sin_a = np.sin(eye_angle)
+    u = (ex * cos_a + ey * sin_a) / half_width * mirror
+    v = (ey * cos_a - ex * sin_a) / half_height
+
+    # Pick the corner radii for the quadrant of each pixel
+    upper = v < 0
+    inner = u > 0
+    radius_x = np.where(upper, np.where(inner, col(eye[:, UPPER_INNER_RADIUS_X_IDX]), col(eye[:, UPPER_OUTER_RADIUS_X_IDX])),
+                        np.where(inner, col(eye[:, LOWER_INNER_RADIUS_X_IDX]), col(eye[:, LOWER_OUTER_RADIUS_X_IDX])))
+    radius_y = np.where(upper, np.where(inner, col(eye[:, UPPER_INNER_RADIUS_Y_IDX]), col(eye[:, UPPER_OUTER_RADIUS_Y_IDX])),
+                        np.where(inner, col(eye[:, LOWER_INNER_RADIUS_Y_IDX]), col(eye[:, LOWER_OUTER_RADIUS_Y_IDX])))
+    radius_x = np.clip(radius_x, 1e-3, 1.0)
+    radius_y = np.clip(radius_y, 1e-3, 1.0)
+
+    # A "distance" that is <= 1 inside of the rounded rectangle
+    abs_u = np.abs(u)
+    abs_v = np.abs(v)
+    corner_u = np.maximum(abs_u - (1.0 - radius_x), 0.0) / radius_x
+    corner_v = np.maximum(abs_v - (1.0 - radius_y), 0.0) / radius_y
+    dist = np.maximum(np.maximum(abs_u, abs_v), np.sqrt(corner_u * corner_u + corner_v * corner_v))
+
+    # Convert that to pixels for an anti-aliased edge and the glow
+    edge_pixels = np.minimum(half_width, half_height)
+    coverage = np.clip((1.0 - dist) * edge_pixels + 0.5, 0.0, 1.0)
+
+    # The lids are lines (with an angle and a bend) that hide the top and
+    # bottom of the eye. A lid Y value of 1 closes the whole eye.
+    upper_lid = (-1.0 + 2.0 * col(eye[:, UPPER_LID_Y_IDX])
+                 - np.tan(np.radians(col(eye[:, UPPER_LID_ANGLE_IDX]))) * u
+                 + col(eye[:, UPPER_LID_BEND_IDX]) * (1.0 - u * u))
+    lower_lid = (1.0 - 2.0 * col(eye[:, LOWER_LID_Y_IDX])
+                 + np.tan(np.radians(col(eye[:, LOWER_LID_ANGLE_IDX]))) * u
+                 - col(eye[:, LOWER_LID_BEND_IDX]) * (1.0 - u * u))
+    lids = (np.clip((v - upper_lid) * half_height + 0.5, 0.0, 1.0) *
+            np.clip((lower_lid - v) * half_height + 0.5, 0.0, 1.0))
+
+    hot_u = u - col(eye[:, HOT_SPOT_CENTER_X_IDX])
+    hot_v = v - col(eye[:, HOT_SPOT_CENTER_Y_IDX])
+    hot_spot = np.clip(1.0 - HOT_SPOT_FALLOFF * (hot_u * hot_u + hot_v * hot_v), 0.0, 1.0)
+
+    value = np.clip(col(eye[:, LIGHTNESS_IDX]), 0.0, 1.0) * hot_spot * coverage * lids
+
+    glow_pixels = np.maximum(col(eye[:, GLOW_SIZE_IDX]) * edge_pixels, 1e-3)
+    outside = np.maximum(dist - 1.0, 0.0) * edge_pixels / glow_pixels
+    glow = np.where(col(eye[:, GLOW_SIZE_IDX]) > 0, np.exp(-outside * outside), 0.0)
+    glow = np.clip(col(eye[:, GLOW_LIGHTNESS_IDX]), 0.0, 1.0) * glow * (1.0 - coverage) * lids
+    return (value, glow)
+
+
+def render_frames(face, left_eye, right_eye, hue=DEFAULT_HUE, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Given (num_frames, 6) face and (num_frames, 25) eye parameter arrays (see
+    interpolate_params()), this function returns a uint8 array of RGB images
+    with shape (num_frames, FACE_HEIGHT, FACE_WIDTH, 3).
+    """
+    # Single precision is plenty for 8-bit images and is much faster
+    face = np.atleast_2d(np.asarray(face, dtype=np.float32))
+    left_eye = np.atleast_2d(np.asarray(left_eye, dtype=np.float32))
+    right_eye = np.atleast_2d(np.asarray(right_eye, dtype=np.float32))
+    num_frames = face.shape[0]
+    images = np.zeros((num_frames, FACE_HEIGHT, FACE_WIDTH, 3), dtype=np.uint8)
+
+    # Pixel centers relative to the center of the screen
+    py, px = np.mgrid[0:FACE_HEIGHT, 0:FACE_WIDTH].astype(np.float32)
+    px = (px + 0.5 - FACE_WIDTH / 2.0)[np.newaxis]
+    py = (py + 0.5 - FACE_HEIGHT / 2.0)[np.newaxis]
+    odd_rows = (np.arange(FACE_HEIGHT) % 2 == 1)[np.newaxis, :, np.newaxis]
+    hue_rgb = _hue_to_rgb(hue).astype(np.float32)
+
+    for start in range(0, num_frames, chunk_size):
+        stop = min(start + chunk_size, num_frames)
+        chunk_face = face[start:stop]
+        rgb = np.zeros((stop - start, FACE_HEIGHT, FACE_WIDTH, 3), dtype=np.float32)
+        for eye, nominal_x, mirror in ((left_eye[start:stop], -NOMINAL_EYE_SPACING / 2.0, 1.0),
+                                       (right_eye[start:stop], NOMINAL_EYE_SPACING / 2.0, -1.0)):
+            value, glow = _draw_eyes(chunk_face, eye, nominal_x, mirror, px, py)
+            saturation = np.clip(eye[:, SATURATION_IDX], 0.0, 1.0)[:, np.newaxis, np.newaxis, np.newaxis]
+            color = 1.0 - saturation * (1.0 - hue_rgb)
+            rgb = np.maximum(rgb, (value + glow)[..., np.newaxis] * color)
+        scanlines = np.where(odd_rows, np.clip(chunk_face[:, 5], 0.0, 1.0)[:, np.newaxis, np.newaxis], 1.0)
+        rgb *= scanlines[..., np.newaxis]
+        images[start:stop] = np.round(np.clip(rgb, 0.0, 1.0) * 255.0).astype(np.uint8)
+    return images
+
+
+def render_keyframes(keyframes, times=None, hue=DEFAULT_HUE, time_key=TRIGGER_TIME_KEY):
+    """
+    Given a list of ProceduralFaceKeyFrame dicts, this function returns the
+    RGB images (see render_frames()) at the provided times, which default to
+    every displayed frame from the first to the last keyframe.
+    """
+    if times is None:
+        times = get_frame_times(keyframes, time_key=time_key)
+    face, left_eye, right_eye = interpolate_params(keyframes, times, time_key)
+    return render_frames(face, left_eye, right_eye, hue)
+
+
+def encode_png(image):
+    """
+    Returns the PNG file contents for a (height, width, 3) uint8 RGB array.
+    """
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape[:2]
+    # Each row starts with a filter type byte of 0 (none)
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, width * 3)
+
+    def chunk(chunk_type, data):
+        crc = zlib.crc32(chunk_type + data) & 0xffffffff
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) +
+            chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)) + chunk(b"IEND", b""))
+
+
+def write_png(image_file, image):
+    with open(image_file, 'wb') as fh:
+        fh.write(encode_png(image))
+
+
+def get_proc_face_keyframes(anim_file):
+    """
+    Returns a dict of animation name -> list of ProceduralFaceKeyFrame dicts
+    for every animation (that has any) in an exported .json file.
+    """
+    with open(anim_file, 'r') as fh:
+        anim_data = json.load(fh)
+    keyframes_by_anim = {}
+    for anim_name, keyframes in anim_data.items():
+        keyframes = [x for x in keyframes if x.get(KEYFRAME_TYPE_KEY) == PROC_FACE_KEYFRAME]
+        if keyframes:
+            keyframes_by_anim[anim_name] = keyframes
+    return keyframes_by_anim
+
+
+def main(args):
+    if len(args) < 2:
+        print("Usage: %s <anim_json_file> ... <output_dir>" % os.path.basename(__file__))
+        return 1
+    output_dir = args[-1]
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    for anim_file in args[:-1]:
+        for anim_name, keyframes in sorted(get_proc_face_keyframes(anim_file).items()):
+            images = render_keyframes(keyframes)
+            for idx, image in enumerate(images):
+                write_png(os.path.join(output_dir, "%s_%05d.png" % (anim_name, idx)), image)
+            print("Wrote %s face images for %s" % (len(images), anim_name))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
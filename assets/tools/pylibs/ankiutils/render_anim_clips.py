@@ -0,0 +1,445 @@
+#!/usr/bin/env python
+"""
+This script renders the face of exported animation clips without Maya, so every
+changed animation can be reviewed from a nightly batch job. For each clip, the
+ProceduralFaceKeyFrame track is drawn with ankiutils/proc_face.py and any
+FaceAnimationKeyFrame (sprite sequence) track is drawn on top of that, one
+frame every 33 ms, and written as a contact sheet PNG, an animated GIF and/or
+an MP4 movie.
+
+Input can be exported .json files, .tar files of .json files or directories
+that contain those. Clips are rendered in parallel by a pool of processes.
+Rendered frames are cached on disk by a hash of their content (the face
+parameters and sprite pixels), and a manifest in the output directory records
+a hash of each clip's keyframes, so clips that did not change since the last
+run are skipped altogether.
+
+GIF output and sprite sequence tracks require Pillow and MP4 output requires
+ffmpeg to be installed.
+
+Usage:
+
+    render_anim_clips.py [-format png,gif,mp4] [-sprites <sprite_dir>] [-workers <n>]
+                         [-force] <anim_json_tar_or_dir> ... <output_dir>
+"""
+
+import sys
+import os
+import io
+import json
+import hashlib
+import tarfile
+import tempfile
+import subprocess
+import multiprocessing
+import zlib
+
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from ankiutils import anim_files, proc_face
+
+
+FORMAT_FLAG = "-format"
+SPRITE_DIR_FLAG = "-sprites"
+NUM_WORKERS_FLAG = "-workers"
+FORCE_FLAG = "-force"
+
+CONTACT_SHEET_FORMAT = "png"
+GIF_FORMAT = "gif"
+MP4_FORMAT = "mp4"
+ALL_FORMATS = [CONTACT_SHEET_FORMAT, GIF_FORMAT, MP4_FORMAT]
+DEFAULT_FORMATS = [CONTACT_SHEET_FORMAT]
+
+SPRITE_KEYFRAME = "FaceAnimationKeyFrame"
+SPRITE_NAME_KEY = "animName"
+
+SPRITE_DEFINITION_FILE = "definition.json"
+SPRITE_FILE_LIST_KEY = "fileList"
+SEQUENCE_KEY = "sequence"
+
+# Contact sheets show at most this many frames (evenly spaced) in rows
+CONTACT_SHEET_MAX_FRAMES = 60
+CONTACT_SHEET_COLUMNS = 6
+CONTACT_SHEET_SPACING = 4
+CONTACT_SHEET_BACKGROUND = 64
+
+# Movies and GIFs are scaled up so the face is easier to see
+MOVIE_SCALE = 2
+
+FFMPEG = "ffmpeg"
+
+FRAME_CACHE_DIR_ENV_VAR = "ANKI_FACE_FRAME_CACHE_DIR"
+FRAME_CACHE_DIR = os.path.join(tempfile.gettempdir(), "anki_face_frame_cache")
+
+MANIFEST_FILE = "render_manifest.json"
+
+# Change this whenever the rendered output changes for the same input
+RENDER_VERSION = 1
+
+
+def get_clips(paths):
+    """
+    Returns a dict of clip name -> list of keyframes for every clip that has a
+    procedural face or sprite sequence track in the provided paths.
+    """
+    return anim_files.get_clips(paths, keyframe_types=[proc_face.PROC_FACE_KEYFRAME, SPRITE_KEYFRAME])
+
+
+def get_sprite_source(sprite_dir, sprite_name):
+    for source in (os.path.join(sprite_dir, sprite_name),
+                   os.path.join(sprite_dir, sprite_name + ".tar")):
+        if os.path.exists(source):
+            return source
+    return None
+
+
+def load_sprite_sequence(sprite_dir, sprite_name):
+    """
+    Returns the list of (height, width, 4) RGBA frames for a sprite sequence
+    (a directory or .tar file named after the sequence in sprite_dir) in the
+    order of its definition.json file (or file name order without one).
+    """
+    if Image is None:
+        raise ValueError("Rendering sprite sequences requires Pillow to be installed")
+    source = get_sprite_source(sprite_dir, sprite_name)
+    if source is None:
+        raise ValueError("Unable to locate the '%s' sprite sequence in %s" % (sprite_name, sprite_dir))
+    files = {}
+    if os.path.isdir(source):
+        for file_name in os.listdir(source):
+            with open(os.path.join(source, file_name), 'rb') as fh:
+                files[file_name] = fh.read()
+    else:
+        tar = tarfile.open(source, 'r|*')
+        try:
+            for member in tar:
+                if member.isfile():
+                    files[os.path.basename(member.name)] = tar.extractfile(member).read()
+        finally:
+            tar.close()
+    file_list = sorted(x for x in files if x.lower().endswith(".png"))
+    if SPRITE_DEFINITION_FILE in files:
+        try:
+            definition = json.loads(files[SPRITE_DEFINITION_FILE].decode("utf-8"))
+            file_list = []
+            for segment in definition[SEQUENCE_KEY]:
+                file_list.extend(segment.get(SPRITE_FILE_LIST_KEY, []))
+        except (ValueError, KeyError, TypeError) as e:
+            print("Using file name order for '%s' because its %s could not be used: %s"
+                  % (sprite_name, SPRITE_DEFINITION_FILE, e))
+    frames = []
+    for file_name in file_list:
+        image = Image.open(io.BytesIO(files[file_name])).convert("RGBA")
+        frames.append(np.asarray(image, dtype=np.uint8))
+    return frames
+
+
+class FrameCache(object):
+    """
+    Rendered frames stored on disk (zlib compressed) by content hash.
+    """
+
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            cache_dir = os.getenv(FRAME_CACHE_DIR_ENV_VAR, FRAME_CACHE_DIR)
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def _get_file(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".rgb.z")
+
+    def get(self, key):
+        try:
+            with open(self._get_file(key), 'rb') as fh:
+                data = zlib.decompress(fh.read())
+        except (IOError, OSError, zlib.error):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return np.frombuffer(data, dtype=np.uint8).reshape(proc_face.FACE_HEIGHT, proc_face.FACE_WIDTH, 3)
+
+    def put(self, key, image):
+        cache_file = self._get_file(key)
+        try:
+            if not os.path.isdir(os.path.dirname(cache_file)):
+                os.makedirs(os.path.dirname(cache_file))
+            # Write to a temporary file first so other processes never read a partial file
+            temp_file = "%s.%s.tmp" % (cache_file, os.getpid())
+            with open(temp_file, 'wb') as fh:
+                fh.write(zlib.compress(image.tobytes(), 6))
+            if os.path.exists(cache_file):
+                os.remove(temp_file)
+            else:
+                os.rename(temp_file, cache_file)
+        except (IOError, OSError) as e:
+            print("Failed to cache a rendered frame in %s because: %s" % (self.cache_dir, e))
+
+
+def render_clip(keyframes, sprite_dir=None, hue=proc_face.DEFAULT_HUE, frame_cache=None):
+    """
+    Returns a (num_frames, FACE_HEIGHT, FACE_WIDTH, 3) uint8 array with the
+    face of a clip at every 33 ms frame from time 0 to its last keyframe (or
+    the end of its last sprite sequence).
+    """
+    time_key = proc_face.TRIGGER_TIME_KEY
+    time_step = proc_face.ANIM_TIME_STEP_MS
+    proc_keyframes = [x for x in keyframes if x[proc_face.KEYFRAME_TYPE_KEY] == proc_face.PROC_FACE_KEYFRAME]
+    sprite_keyframes = sorted([x for x in keyframes if x[proc_face.KEYFRAME_TYPE_KEY] == SPRITE_KEYFRAME],
+                              key=lambda x: x[time_key])
+
+    # Which sprite frame (if any) is shown at each frame
+    sprites = {}
+    sprite_frames = {}
+    end_time = max([x[time_key] for x in keyframes] + [0])
+    for keyframe in sprite_keyframes:
+        sprite_name = keyframe[SPRITE_NAME_KEY]
+        if sprite_dir is None:
+            print("Skipping the '%s' sprite sequence since no sprite directory was provided" % sprite_name)
+            continue
+        if sprite_name not in sprites:
+            sprites[sprite_name] = load_sprite_sequence(sprite_dir, sprite_name)
+        first_frame = int(keyframe[time_key] // time_step)
+        for idx in range(len(sprites[sprite_name])):
+            sprite_frames[first_frame + idx] = (sprite_name, idx)
+        end_time = max(end_time, (first_frame + len(sprites[sprite_name]) - 1) * time_step)
+    times = np.arange(0, end_time + 1, time_step, dtype=np.float64)
+
+    if proc_keyframes:
+        face, left_eye, right_eye = proc_face.interpolate_params(proc_keyframes, times)
+    else:
+        face = np.tile(proc_face.FACE_DEFAULTS, (len(times), 1))
+        left_eye = np.tile(proc_face.EYE_DEFAULTS, (len(times), 1))
+        right_eye = np.tile(proc_face.EYE_DEFAULTS, (len(times), 1))
+        # Without a procedural face track, only the sprites are shown
+        left_eye[:, proc_face.LIGHTNESS_IDX] = right_eye[:, proc_face.LIGHTNESS_IDX] = 0.0
+
+    sprite_hashes = {}
+    keys = []
+    for idx in range(len(times)):
+        digest = hashlib.sha1(("%s:%s:" % (RENDER_VERSION, hue)).encode("utf-8"))
+        digest.update(face[idx].tobytes() + left_eye[idx].tobytes() + right_eye[idx].tobytes())
+        if idx in sprite_frames:
+            if sprite_frames[idx] not in sprite_hashes:
+                sprite_name, sprite_idx = sprite_frames[idx]
+                sprite_hashes[sprite_frames[idx]] = hashlib.sha1(sprites[sprite_name][sprite_idx].tobytes()).digest()
+            digest.update(sprite_hashes[sprite_frames[idx]])
+        keys.append(digest.hexdigest())
+
+    images = np.zeros((len(times), proc_face.FACE_HEIGHT, proc_face.FACE_WIDTH, 3), dtype=np.uint8)
+    missing = []
+    for idx, key in enumerate(keys):
+        image = frame_cache.get(key) if frame_cache else None
+        if image is None:
+            missing.append(idx)
+        else:
+            images[idx] = image
+    if missing:
+        images[missing] = proc_face.render_frames(face[missing], left_eye[missing], right_eye[missing], hue)
+        for idx in missing:
+            if idx in sprite_frames:
+                sprite_name, sprite_idx = sprite_frames[idx]
+                images[idx] = _composite(images[idx], sprites[sprite_name][sprite_idx])
+            if frame_cache:
+                frame_cache.put(keys[idx], images[idx])
+    return images
+
+
+def _composite(image, sprite):
+    """
+    Returns the RGB image with an RGBA sprite frame drawn over it (the
+    sprite is clipped or padded to the image size).
+    """
+    height = min(image.shape[0], sprite.shape[0])
+    width = min(image.shape[1], sprite.shape[1])
+    result = image.astype(np.float32)
+    alpha = sprite[:height, :width, 3:4].astype(np.float32) / 255.0
+    result[:height, :width] = (sprite[:height, :width, :3] * alpha +
+                               result[:height, :width] * (1.0 - alpha))
+    return np.round(result).astype(np.uint8)
+
+
+def make_contact_sheet(images, max_frames=CONTACT_SHEET_MAX_FRAMES, columns=CONTACT_SHEET_COLUMNS,
+                       spacing=CONTACT_SHEET_SPACING, background=CONTACT_SHEET_BACKGROUND):
+    """
+    Returns one RGB image with (up to max_frames evenly spaced) frames in
+    rows of the given number of columns.
+    """
+    if len(images) > max_frames:
+        images = images[np.linspace(0, len(images) - 1, max_frames).round().astype(int)]
+    rows = (len(images) + columns - 1) // columns
+    columns = min(columns, len(images))
+    height, width = images.shape[1:3]
+    sheet = np.full((rows * (height + spacing) + spacing, columns * (width + spacing) + spacing, 3),
+                    background, dtype=np.uint8)
+    for idx, image in enumerate(images):
+        top = spacing + (idx // columns) * (height + spacing)
+        left = spacing + (idx % columns) * (width + spacing)
+        sheet[top:top+height, left:left+width] = image
+    return sheet
+
+
+def write_gif(gif_file, images, scale=MOVIE_SCALE):
+    if Image is None:
+        raise ValueError("Writing GIF files requires Pillow to be installed")
+    frames = [Image.fromarray(x.repeat(scale, 0).repeat(scale, 1)) for x in images]
+    frames[0].save(gif_file, save_all=True, append_images=frames[1:], loop=0,
+                   duration=proc_face.ANIM_TIME_STEP_MS)
+
+
+def write_mp4(mp4_file, images, scale=MOVIE_SCALE, ffmpeg=FFMPEG):
+    height, width = images.shape[1:3]
+    cmd = [ffmpeg, "-loglevel", "error", "-y", "-f", "rawvideo", "-pix_fmt", "rgb24",
+           "-s", "%sx%s" % (width, height), "-r", "%.4f" % (1000.0 / proc_face.ANIM_TIME_STEP_MS),
+           "-i", "-", "-vf", "scale=iw*%s:ih*%s:flags=neighbor" % (scale, scale),
+           "-pix_fmt", "yuv420p", mp4_file]
+    try:
+        p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise ValueError("Failed to execute '%s' because: %s" % (ffmpeg, e))
+    (stdout, stderr) = p.communicate(np.ascontiguousarray(images).tobytes())
+    if p.poll() != 0:
+        raise ValueError("Failed to write %s because: %s" % (mp4_file, stderr or stdout))
+
+
+def get_clip_hash(keyframes, sprite_dir, formats, hue):
+    """
+    Returns a hash of everything that a clip's rendered output depends on.
+    """
+    digest = hashlib.sha1(json.dumps([RENDER_VERSION, keyframes, sorted(formats), hue],
+                                     sort_keys=True).encode("utf-8"))
+    for keyframe in keyframes:
+        if keyframe.get(SPRITE_NAME_KEY) and sprite_dir:
+            source = get_sprite_source(sprite_dir, keyframe[SPRITE_NAME_KEY])
+            if source:
+                if os.path.isdir(source):
+                    mtimes = [os.path.getmtime(os.path.join(source, x)) for x in sorted(os.listdir(source))]
+                else:
+                    mtimes = [os.path.getmtime(source)]
+                digest.update(json.dumps([source, mtimes]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _render_one_clip(args):
+    """
+    Renders and writes all output formats of one clip (run by the process pool).
+    Returns a (clip name, list of output files, error message) tuple.
+    """
+    clip_name, keyframes, output_dir, formats, sprite_dir, hue = args
+    try:
+        images = render_clip(keyframes, sprite_dir, hue, FrameCache())
+        output_files = []
+        for output_format in formats:
+            output_file = os.path.join(output_dir, "%s.%s" % (clip_name, output_format))
+            if output_format == CONTACT_SHEET_FORMAT:
+                proc_face.write_png(output_file, make_contact_sheet(images))
+            elif output_format == GIF_FORMAT:
+                write_gif(output_file, images)
+            elif output_format == MP4_FORMAT:
+                write_mp4(output_file, images)
+            output_files.append(output_file)
+        return (clip_name, output_files, None)
+    except Exception as e:
+        return (clip_name, [], "%s: %s" % (type(e).__name__, e))
+
+
+def render_clips(paths, output_dir, formats=DEFAULT_FORMATS, sprite_dir=None,
+                 num_workers=None, hue=proc_face.DEFAULT_HUE, force=False):
+    """
+    Renders every clip in the provided .json/.tar files and directories that
+    changed since the last run (unless force is True) into output_dir using a
+    pool of processes. Returns a dict of clip name -> error message for the
+    clips that failed.
+    """
+    for output_format in formats:
+        if output_format not in ALL_FORMATS:
+            raise ValueError("Unsupported output format '%s' (use one of %s)" % (output_format, ALL_FORMATS))
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = {}
+    if not force and os.path.isfile(manifest_file):
+        try:
+            with open(manifest_file, 'r') as fh:
+                manifest = json.load(fh)
+        except ValueError as e:
+            print("Ignoring unreadable manifest %s because: %s" % (manifest_file, e))
+
+    clips = get_clips(paths)
+    jobs = []
+    clip_hashes = {}
+    for clip_name in sorted(clips):
+        clip_hashes[clip_name] = get_clip_hash(clips[clip_name], sprite_dir, formats, hue)
+        if manifest.get(clip_name) == clip_hashes[clip_name]:
+            continue
+        jobs.append((clip_name, clips[clip_name], output_dir, formats, sprite_dir, hue))
+    print("Rendering %s of %s clips (%s are unchanged)" % (len(jobs), len(clips), len(clips) - len(jobs)))
+
+    errors = {}
+    if jobs:
+        num_workers = min(num_workers or multiprocessing.cpu_count(), len(jobs))
+        if num_workers > 1:
+            pool = multiprocessing.Pool(num_workers)
+            try:
+                results = pool.imap_unordered(_render_one_clip, jobs)
+                results = list(results)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_render_one_clip(x) for x in jobs]
+        for clip_name, output_files, error in results:
+            if error:
+                errors[clip_name] = error
+                manifest.pop(clip_name, None)
+                print("Failed to render %s because: %s" % (clip_name, error))
+            else:
+                manifest[clip_name] = clip_hashes[clip_name]
+                print("Rendered %s" % ", ".join(output_files))
+
+    with open(manifest_file, 'w') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    return errors
+
+
+def main(args):
+    formats = DEFAULT_FORMATS
+    sprite_dir = None
+    num_workers = None
+    force = False
+    paths = []
+    idx = 0
+    while idx < len(args):
+        arg = args[idx]
+        if arg == FORMAT_FLAG:
+            idx += 1
+            formats = args[idx].split(",")
+        elif arg == SPRITE_DIR_FLAG:
+            idx += 1
+            sprite_dir = args[idx]
+        elif arg == NUM_WORKERS_FLAG:
+            idx += 1
+            num_workers = int(args[idx])
+        elif arg == FORCE_FLAG:
+            force = True
+        else:
+            paths.append(arg)
+        idx += 1
+    if len(paths) < 2:
+        print("Usage: %s [%s %s] [%s <sprite_dir>] [%s <n>] [%s] <anim_json_tar_or_dir> ... <output_dir>"
+              % (os.path.basename(__file__), FORMAT_FLAG, ",".join(ALL_FORMATS), SPRITE_DIR_FLAG,
+                 NUM_WORKERS_FLAG, FORCE_FLAG))
+        return 1
+    errors = render_clips(paths[:-1], paths[-1], formats, sprite_dir, num_workers, force=force)
+    if errors:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+"""
+This script simulates where the robot drives during exported animation clips,
+so clips that would drive it off a table can be caught without a robot.
+
+The BodyMotionKeyFrame, RecordHeadingKeyFrame and TurnToRecordedHeadingKeyFrame
+track of each clip is played back one tick (33 ms) at a time the way the robot
+streams it: a keyframe starts at the first tick at or after its trigger time,
+replaces the body motion that was running and (for BodyMotionKeyFrame) stops
+after its duration. The differential drive motion of each tick is integrated
+exactly (on an arc, straight line or in place) from the starting pose of the
+robot at (0, 0) facing along the x axis, with positive angles counterclockwise.
+Wheel acceleration, slip and the robot's own motion controllers are not
+modeled, so the result is where an ideal robot would end up.
+
+Body motion that exceeds the robot's max wheel speed (MAX_WHEEL_SPEED_MMPS)
+or max rotation speed (MAX_BODY_ROTATION_SPEED_DEG_PER_SEC) is reported and
+simulated at the speed the robot is able to drive. Clips that move the robot
+further than -max_distance mm from where it started are reported too.
+
+Input can be exported .json files, .tar files of .json files or directories
+that contain those. Clips are simulated in parallel by a pool of processes,
+and -output writes the pose trajectory of each clip to a <clip name>.json file
+as a list of [time_ms, x_mm, y_mm, heading_deg] poses, one per tick.
+
+Usage:
+
+    simulate_body_motion.py [-output <dir>] [-max_distance <mm>] [-workers <n>]
+                            <anim_json_tar_or_dir> ...
+"""
+
+import sys
+import os
+import json
+import math
+import multiprocessing
+
+from robot_config import MAX_WHEEL_SPEED_MMPS, MAX_BODY_ROTATION_SPEED_DEG_PER_SEC, WHEEL_DIST_MM
+from ankiutils import anim_files
+
+
+OUTPUT_DIR_FLAG = "-output"
+MAX_DISTANCE_FLAG = "-max_distance"
+NUM_WORKERS_FLAG = "-workers"
+
+TICK_MS = 33
+
+KEYFRAME_TYPE_KEY = "Name"
+TRIGGER_TIME_KEY = "triggerTime_ms"
+DURATION_TIME_KEY = "durationTime_ms"
+
+BODY_MOTION_KEYFRAME = "BodyMotionKeyFrame"
+RECORD_HEADING_KEYFRAME = "RecordHeadingKeyFrame"
+TURN_TO_RECORDED_HEADING_KEYFRAME = "TurnToRecordedHeadingKeyFrame"
+BODY_TRACK_KEYFRAMES = [BODY_MOTION_KEYFRAME, RECORD_HEADING_KEYFRAME, TURN_TO_RECORDED_HEADING_KEYFRAME]
+
+SPEED_KEY = "speed"
+RADIUS_KEY = "radius_mm"
+STRAIGHT_RADIUS = "STRAIGHT"
+TURN_IN_PLACE_RADIUS = "TURN_IN_PLACE"
+
+OFFSET_KEY = "offset_deg"
+TURN_SPEED_KEY = "speed_degPerSec"
+ACCEL_KEY = "accel_degPerSec2"
+DECEL_KEY = "decel_degPerSec2"
+TOLERANCE_KEY = "tolerance_deg"
+NUM_HALF_REVS_KEY = "numHalfRevs"
+USE_SHORTEST_DIR_KEY = "useShortestDir"
+
+# A turn to the recorded heading keeps going after the end of the clip until it
+# reaches that heading, but a turn that can never get there is given up on
+MAX_TURN_TIME_MS = 10000
+
+
+def get_wheel_speeds(speed, radius):
+    """
+    Returns the (left, right) wheel speeds in mm/s of a BodyMotionKeyFrame,
+    where speed is in mm/s (or deg/s if radius is TURN_IN_PLACE_RADIUS) and
+    a positive radius in mm turns counterclockwise when driving forward.
+    """
+    if radius == STRAIGHT_RADIUS:
+        return speed, speed
+    if radius == TURN_IN_PLACE_RADIUS:
+        wheel_speed = math.radians(speed) * WHEEL_DIST_MM / 2.0
+        return -wheel_speed, wheel_speed
+    half_dist_speed = speed * WHEEL_DIST_MM / (2.0 * radius)
+    return speed - half_dist_speed, speed + half_dist_speed
+
+
+def clamp_body_motion(speed, radius, max_wheel_speed=MAX_WHEEL_SPEED_MMPS,
+                      max_rotation_speed=MAX_BODY_ROTATION_SPEED_DEG_PER_SEC):
+    """
+    Returns the speed that the robot is able to drive for a BodyMotionKeyFrame
+    (which keeps the radius the same), or the same speed if it is in limits.
+    """
+    if radius == TURN_IN_PLACE_RADIUS:
+        return max(-max_rotation_speed, min(max_rotation_speed, speed))
+    fastest_wheel_speed = max(abs(x) for x in get_wheel_speeds(speed, radius))
+    if fastest_wheel_speed > max_wheel_speed:
+        return speed * max_wheel_speed / fastest_wheel_speed
+    return speed
+
+
+def _wrap_angle(angle_deg):
+    """
+    Returns an angle in degrees in the range [-180, 180).
+    """
+    return (angle_deg + 180.0) % 360.0 - 180.0
+
+
+class Pose(object):
+    """
+    Where the robot is (in mm) and which way it is facing (in degrees,
+    counterclockwise from the x axis) at a time in the clip.
+    """
+
+    def __init__(self, time_ms=0, x_mm=0.0, y_mm=0.0, heading_deg=0.0):
+        self.time_ms = time_ms
+        self.x_mm = x_mm
+        self.y_mm = y_mm
+        self.heading_deg = heading_deg
+
+    def get_distance(self):
+        return math.hypot(self.x_mm, self.y_mm)
+
+    def to_list(self):
+        return [self.time_ms, round(self.x_mm, 3), round(self.y_mm, 3), round(self.heading_deg, 3)]
+
+    def __repr__(self):
+        return "Pose(%s ms, x=%.1f mm, y=%.1f mm, heading=%.1f deg)" % tuple(self.to_list())
+
+
+class _Turn(object):
+    """
+    The state of a TurnToRecordedHeadingKeyFrame while it turns the robot
+    with a trapezoidal velocity profile.
+    """
+
+    def __init__(self, keyframe, heading_deg, recorded_heading_deg,
+                 max_rotation_speed=MAX_BODY_ROTATION_SPEED_DEG_PER_SEC):
+        speed = keyframe.get(TURN_SPEED_KEY, 0)
+        self.max_speed = min(abs(speed), max_rotation_speed)
+        self.accel = abs(keyframe.get(ACCEL_KEY, 0)) or float("inf")
+        self.decel = abs(keyframe.get(DECEL_KEY, 0)) or float("inf")
+        self.tolerance = abs(keyframe.get(TOLERANCE_KEY, 0))
+        self.speed = 0.0
+        diff = _wrap_angle(recorded_heading_deg + keyframe.get(OFFSET_KEY, 0) - heading_deg)
+        if keyframe.get(USE_SHORTEST_DIR_KEY, False) or speed == 0:
+            self.direction = -1 if diff < 0 else 1
+            self.remaining = abs(diff)
+        else:
+            self.direction = -1 if speed < 0 else 1
+            self.remaining = (diff * self.direction) % 360.0
+        self.remaining += 180.0 * keyframe.get(NUM_HALF_REVS_KEY, 0)
+
+    def is_done(self):
+        return self.remaining <= self.tolerance or self.max_speed <= 0
+
+    def step(self, dt_sec):
+        """
+        Returns the signed angle in degrees that the robot turns in one tick.
+        """
+        stopping_speed = math.sqrt(2.0 * self.decel * self.remaining)
+        self.speed = min(self.speed + self.accel * dt_sec, self.max_speed, stopping_speed)
+        angle = min(self.speed * dt_sec, self.remaining)
+        self.remaining -= angle
+        return self.direction * angle
+
+
+class SimulationResult(object):
+    """
+    The trajectory of a clip (one pose per tick) and the problems found in it.
+    """
+
+    def __init__(self):
+        self.poses = []
+        self.problems = []
+        self.max_distance_mm = 0.0
+
+    def get_final_pose(self):
+        return self.poses[-1] if self.poses else Pose()
+
+    def add_pose(self, pose):
+        self.poses.append(pose)
+        self.max_distance_mm = max(self.max_distance_mm, pose.get_distance())
+
+    def add_problem(self, time_ms, msg):
+        self.problems.append("%s ms: %s" % (time_ms, msg))
+
+    def get_trajectory(self):
+        return [x.to_list() for x in self.poses]
+
+
+class BodyMotionSimulator(object):
+    """
+    Integrates the differential drive motion of a clip's body track at the
+    robot's tick rate. Call simulate() with the keyframes of a clip.
+    """
+
+    def __init__(self, tick_ms=TICK_MS, max_wheel_speed=MAX_WHEEL_SPEED_MMPS,
+                 max_rotation_speed=MAX_BODY_ROTATION_SPEED_DEG_PER_SEC):
+        self.tick_ms = tick_ms
+        self.max_wheel_speed = max_wheel_speed
+        self.max_rotation_speed = max_rotation_speed
+
+    def check_body_motion(self, keyframe, result):
+        """
+        Reports a BodyMotionKeyFrame that exceeds the speed limits of the robot
+        and returns the speed that it will be simulated at.
+        """
+        speed = keyframe.get(SPEED_KEY, 0)
+        radius = keyframe.get(RADIUS_KEY, STRAIGHT_RADIUS)
+        clamped_speed = clamp_body_motion(speed, radius, self.max_wheel_speed, self.max_rotation_speed)
+        if clamped_speed != speed:
+            if radius == TURN_IN_PLACE_RADIUS:
+                msg = "Turn in place at %s deg/s exceeds the max rotation speed of %s deg/s"
+                result.add_problem(keyframe[TRIGGER_TIME_KEY], msg % (speed, self.max_rotation_speed))
+            else:
+                if radius == STRAIGHT_RADIUS:
+                    movement = "Straight movement"
+                else:
+                    movement = "Arc turn with a radius of %s mm" % radius
+                wheel_speeds = get_wheel_speeds(speed, radius)
+                msg = "%s at %s mm/s needs wheel speeds of %.1f and %.1f mm/s, which " \
+                      "exceeds the max wheel speed of %s mm/s (the robot drives at %.1f mm/s)"
+                result.add_problem(keyframe[TRIGGER_TIME_KEY],
+                                   msg % (movement, speed, wheel_speeds[0], wheel_speeds[1],
+                                          self.max_wheel_speed, clamped_speed))
+        return clamped_speed
+
+    def _move(self, pose, speed, radius, dt_sec):
+        """
+        Moves the pose by driving at the speed and radius of a body motion for
+        the provided time.
+        """
+        heading = math.radians(pose.heading_deg)
+        if radius == TURN_IN_PLACE_RADIUS:
+            pose.heading_deg += speed * dt_sec
+            return
+        distance = speed * dt_sec
+        if radius == STRAIGHT_RADIUS:
+            pose.x_mm += distance * math.cos(heading)
+            pose.y_mm += distance * math.sin(heading)
+            return
+        new_heading = heading + distance / radius
+        pose.x_mm += radius * (math.sin(new_heading) - math.sin(heading))
+        pose.y_mm -= radius * (math.cos(new_heading) - math.cos(heading))
+        pose.heading_deg = math.degrees(new_heading)
+
+    def simulate(self, keyframes):
+        """
+        Returns the SimulationResult of the body track of a list of keyframes.
+        """
+        result = SimulationResult()
+        events = sorted((x for x in keyframes if x.get(KEYFRAME_TYPE_KEY) in BODY_TRACK_KEYFRAMES),
+                        key=lambda x: x[TRIGGER_TIME_KEY])
+        end_time_ms = max([x[TRIGGER_TIME_KEY] + x.get(DURATION_TIME_KEY, 0) for x in events] or [0])
+        dt_sec = self.tick_ms / 1000.0
+        pose = Pose()
+        recorded_heading = None
+        motion = None
+        turn = None
+        event_idx = 0
+        time_ms = 0
+        while True:
+            while event_idx < len(events) and events[event_idx][TRIGGER_TIME_KEY] <= time_ms:
+                keyframe = events[event_idx]
+                event_idx += 1
+                keyframe_type = keyframe[KEYFRAME_TYPE_KEY]
+                if keyframe_type == RECORD_HEADING_KEYFRAME:
+                    recorded_heading = pose.heading_deg
+                    continue
+                motion = turn = None
+                if keyframe_type == BODY_MOTION_KEYFRAME:
+                    motion = (self.check_body_motion(keyframe, result),
+                              keyframe.get(RADIUS_KEY, STRAIGHT_RADIUS),
+                              keyframe[TRIGGER_TIME_KEY] + keyframe.get(DURATION_TIME_KEY, 0))
+                elif recorded_heading is None:
+                    result.add_problem(keyframe[TRIGGER_TIME_KEY],
+                                       "%s without a %s before it"
+                                       % (TURN_TO_RECORDED_HEADING_KEYFRAME, RECORD_HEADING_KEYFRAME))
+                else:
+                    if abs(keyframe.get(TURN_SPEED_KEY, 0)) > self.max_rotation_speed:
+                        result.add_problem(keyframe[TRIGGER_TIME_KEY],
+                                           "%s at %s deg/s exceeds the max rotation speed of %s deg/s"
+                                           % (TURN_TO_RECORDED_HEADING_KEYFRAME,
+                                              keyframe[TURN_SPEED_KEY], self.max_rotation_speed))
+                    turn = _Turn(keyframe, pose.heading_deg, recorded_heading, self.max_rotation_speed)
+                    turn_end_time_ms = keyframe[TRIGGER_TIME_KEY] + keyframe.get(DURATION_TIME_KEY, 0)
+            if motion is not None and time_ms >= motion[2]:
+                motion = None
+            if turn is not None and turn.is_done():
+                if time_ms > turn_end_time_ms:
+                    result.add_problem(time_ms, "%s took longer than its duration (until %s ms)"
+                                       % (TURN_TO_RECORDED_HEADING_KEYFRAME, turn_end_time_ms))
+                turn = None
+
+            result.add_pose(Pose(time_ms, pose.x_mm, pose.y_mm, pose.heading_deg))
+            if motion is None and turn is None and event_idx >= len(events) and time_ms >= end_time_ms:
+                break
+            if time_ms >= end_time_ms + MAX_TURN_TIME_MS:
+                result.add_problem(time_ms, "%s did not reach the recorded heading"
+                                   % TURN_TO_RECORDED_HEADING_KEYFRAME)
+                break
+
+            if motion is not None:
+                self._move(pose, motion[0], motion[1], dt_sec)
+            elif turn is not None:
+                pose.heading_deg += turn.step(dt_sec)
+            time_ms += self.tick_ms
+        return result
+
+
+def get_clips(paths, keyframe_types=BODY_TRACK_KEYFRAMES):
+    """
+    Returns a dict of clip name -> list of keyframes of the provided types
+    (or of all keyframes if keyframe_types is None) for every clip that has
+    any of those keyframes in the provided paths.
+    """
+    return anim_files.get_clips(paths, keyframe_types)
+
+
+def _simulate_one_clip(args):
+    """
+    Simulates one clip and writes its trajectory (run by the process pool).
+    Returns a (clip name, final pose, max distance, list of problems) tuple.
+    """
+    clip_name, keyframes, output_dir, max_distance_mm = args
+    try:
+        result = BodyMotionSimulator().simulate(keyframes)
+    except (KeyError, TypeError, ValueError, ZeroDivisionError) as e:
+        return (clip_name, None, 0.0, ["Failed to simulate because: %s: %s" % (type(e).__name__, e)])
+    if max_distance_mm is not None and result.max_distance_mm > max_distance_mm:
+        far_pose = max(result.poses, key=lambda x: x.get_distance())
+        result.add_problem(far_pose.time_ms, "The robot moves %.1f mm from where it started (max is %s mm)"
+                           % (result.max_distance_mm, max_distance_mm))
+    if output_dir:
+        output_file = os.path.join(output_dir, "%s.json" % clip_name)
+        with open(output_file, 'w') as fh:
+            json.dump({"poses": result.get_trajectory(), "problems": result.problems}, fh)
+    return (clip_name, result.get_final_pose(), result.max_distance_mm, result.problems)
+
+
+def simulate_clips(paths, output_dir=None, max_distance_mm=None, num_workers=None):
+    """
+    Simulates every clip in the provided .json/.tar files and directories
+    using a pool of processes and prints where each clip leaves the robot.
+    Returns a dict of clip name -> list of problems for the clips with problems.
+    """
+    if output_dir and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    clips = get_clips(paths)
+    jobs = [(x, clips[x], output_dir, max_distance_mm) for x in sorted(clips)]
+    num_workers = min(num_workers or multiprocessing.cpu_count(), len(jobs))
+    if num_workers > 1:
+        pool = multiprocessing.Pool(num_workers)
+        try:
+            results = pool.map(_simulate_one_clip, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_simulate_one_clip(x) for x in jobs]
+
+    all_problems = {}
+    for clip_name, final_pose, max_distance, problems in results:
+        print("%s: ends at %s, max distance %.1f mm" % (clip_name, final_pose, max_distance))
+        for problem in problems:
+            print("    %s" % problem)
+        if problems:
+            all_problems[clip_name] = problems
+    print("Simulated %s clips (%s with problems)" % (len(results), len(all_problems)))
+    return all_problems
+
+
+def main(args):
+    flags = { OUTPUT_DIR_FLAG : None, MAX_DISTANCE_FLAG : None, NUM_WORKERS_FLAG : None }
+    paths = []
+    idx = 0
+    while idx < len(args):
+        if args[idx] in flags:
+            flags[args[idx]] = args[idx + 1]
+            idx += 2
+        else:
+            paths.append(args[idx])
+            idx += 1
+    if not paths:
+        print("Usage: %s [%s <dir>] [%s <mm>] [%s <n>] <anim_json_tar_or_dir> ..."
+              % (os.path.basename(__file__), OUTPUT_DIR_FLAG, MAX_DISTANCE_FLAG, NUM_WORKERS_FLAG))
+        return 1
+    max_distance_mm = flags[MAX_DISTANCE_FLAG]
+    if max_distance_mm is not None:
+        max_distance_mm = float(max_distance_mm)
+    num_workers = flags[NUM_WORKERS_FLAG]
+    if num_workers is not None:
+        num_workers = int(num_workers)
+    if simulate_clips(paths, flags[OUTPUT_DIR_FLAG], max_distance_mm, num_workers):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+"""
+This module packs a face image sequence (a directory or .tar file of PNG frames,
+eg. 184x96 pixels each) into a single binary blob and unpacks/verifies it again.
+
+The blob holds a frame table followed by the frame data. Each frame's pixels
+are either stored as a key frame (the raw pixels) or as a delta frame (the
+pixels XORed with the previous frame's pixels, which is mostly zeros for face
+animations), and then zlib compressed. Key frames are inserted every
+KEY_FRAME_INTERVAL frames so any frame can be decoded without decoding the
+whole sequence. Any other files in the sequence (eg. definition.json) are
+stored as-is after the frames.
+
+Layout (all integers little-endian):
+
+    header:      magic "ASPK", version (H), width (H), height (H), channels (B),
+                 unused (B), num_frames (I), num_extra_files (I)
+    frame table: num_frames x [frame type (B), data offset (I), data size (I),
+                 name length (H), name (utf-8)]
+    extras:      num_extra_files x [name length (H), name (utf-8), data size (I), data]
+    frame data:  zlib compressed frames, in order
+
+Usage:
+
+    sprite_pack.py pack <png_dir_or_tar> <pack_file>
+    sprite_pack.py unpack <pack_file> <dest_dir>
+    sprite_pack.py verify <pack_file> <png_dir_or_tar>
+"""
+
+import sys
+import os
+import io
+import binascii
+import struct
+import tarfile
+import zlib
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+MAGIC = b"ASPK"
+VERSION = 1
+
+KEY_FRAME = 0
+DELTA_FRAME = 1
+
+KEY_FRAME_INTERVAL = 30
+
+COMPRESSION_LEVEL = 9
+
+IMAGE_FILE_EXT = ".png"
+
+HEADER_FORMAT = "<4sHHHBBII"
+FRAME_ENTRY_FORMAT = "<BIIH"
+NAME_LENGTH_FORMAT = "<H"
+DATA_SIZE_FORMAT = "<I"
+
+CHANNELS_TO_MODE = { 3 : "RGB", 4 : "RGBA" }
+
+
+def _xor_bytes(data, prev_data):
+    """
+    Returns data XOR prev_data (both strings of bytes of the same length).
+    Converting to big integers keeps the per-byte work in C.
+    """
+    num_bytes = len(data)
+    xored = int(binascii.hexlify(data), 16) ^ int(binascii.hexlify(prev_data), 16)
+    return binascii.unhexlify("%0*x" % (num_bytes * 2, xored))
+
+
+def _read_sequence(source):
+    """
+    Reads a sequence directory or .tar file and returns (frames, extras) where
+    frames is a sorted list of (name, png_data) and extras is a list of
+    (name, data) for all other files.
+    """
+    files = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            file_path = os.path.join(source, name)
+            if name.startswith(".") or not os.path.isfile(file_path):
+                continue
+            with open(file_path, 'rb') as fh:
+                files.append((name, fh.read()))
+    else:
+        try:
+            tar = tarfile.open(source)
+        except tarfile.ReadError as e:
+            raise RuntimeError("%s: %s" % (e, source))
+        try:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                name = os.path.basename(member.name)
+                if name.startswith("."):
+                    continue
+                files.append((name, tar.extractfile(member).read()))
+        finally:
+            tar.close()
+        files.sort()
+    frames = [x for x in files if x[0].lower().endswith(IMAGE_FILE_EXT)]
+    extras = [x for x in files if not x[0].lower().endswith(IMAGE_FILE_EXT)]
+    return (frames, extras)
+
+
+def _decode_frames(frames):
+    """
+    Decodes PNG data with Pillow and returns (width, height, channels, pixels)
+    where pixels is a list of raw pixel strings (one per frame).
+    """
+    if Image is None:
+        raise ValueError("Packing image sequences requires Pillow to be installed")
+    images = [Image.open(io.BytesIO(png_data)) for name, png_data in frames]
+    if not images:
+        raise ValueError("No %s files found" % IMAGE_FILE_EXT)
+    size = images[0].size
+    for (name, png_data), image in zip(frames, images):
+        if image.size != size:
+            raise ValueError("%s is %sx%s but the first frame is %sx%s"
+                             % (name, image.size[0], image.size[1], size[0], size[1]))
+    has_alpha = False
+    for image in images:
+        if image.mode in ["RGBA", "LA"] or "transparency" in image.info:
+            has_alpha = True
+            break
+    mode = "RGBA" if has_alpha else "RGB"
+    pixels = [image.convert(mode).tobytes() for image in images]
+    return (size[0], size[1], len(mode), pixels)
+
+
+def pack_sequence(source, pack_file, key_frame_interval=KEY_FRAME_INTERVAL):
+    """
+    Packs a sequence directory or .tar file into pack_file.
+    Returns a dict with the number of frames, key frames, input bytes (sum
+    of the source file sizes) and output bytes.
+    """
+    frames, extras = _read_sequence(source)
+    width, height, channels, pixels = _decode_frames(frames)
+
+    frame_types = []
+    frame_data = []
+    prev_pixels = None
+    for idx, frame_pixels in enumerate(pixels):
+        if prev_pixels is None or idx % key_frame_interval == 0:
+            frame_types.append(KEY_FRAME)
+            raw = frame_pixels
+        else:
+            frame_types.append(DELTA_FRAME)
+            raw = _xor_bytes(frame_pixels, prev_pixels)
+        frame_data.append(zlib.compress(raw, COMPRESSION_LEVEL))
+        prev_pixels = frame_pixels
+
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, width, height, channels, 0,
+                         len(frames), len(extras))
+    table = []
+    table_size = 0
+    for name, png_data in frames:
+        table_size += struct.calcsize(FRAME_ENTRY_FORMAT) + len(name.encode("utf-8"))
+    extras_data = []
+    for name, data in extras:
+        name = name.encode("utf-8")
+        extras_data.append(struct.pack(NAME_LENGTH_FORMAT, len(name)) + name +
+                           struct.pack(DATA_SIZE_FORMAT, len(data)) + data)
+    extras_data = b"".join(extras_data)
+    offset = len(header) + table_size + len(extras_data)
+    for (name, png_data), frame_type, data in zip(frames, frame_types, frame_data):
+        name = name.encode("utf-8")
+        table.append(struct.pack(FRAME_ENTRY_FORMAT, frame_type, offset, len(data), len(name)) + name)
+        offset += len(data)
+
+    with open(pack_file, 'wb') as fh:
+        fh.write(header)
+        fh.write(b"".join(table))
+        fh.write(extras_data)
+        for data in frame_data:
+            fh.write(data)
+
+    stats = { "num_frames" : len(frames),
+              "num_key_frames" : frame_types.count(KEY_FRAME),
+              "bytes_in" : sum([len(x[1]) for x in frames + extras]),
+              "bytes_out" : os.path.getsize(pack_file) }
+    return stats
+
+
+class SpritePack(object):
+    """
+    Reads a pack file (with one sequential read) and decodes its frames.
+    """
+
+    def __init__(self, pack_file):
+        with open(pack_file, 'rb') as fh:
+            self.data = fh.read()
+        header_size = struct.calcsize(HEADER_FORMAT)
+        (magic, version, self.width, self.height, self.channels, unused,
+         num_frames, num_extras) = struct.unpack(HEADER_FORMAT, self.data[:header_size])
+        if magic != MAGIC:
+            raise ValueError("%s is not a sprite pack file" % pack_file)
+        if version > VERSION:
+            raise ValueError("%s is version %s but only version %s is supported"
+                             % (pack_file, version, VERSION))
+        pos = header_size
+        entry_size = struct.calcsize(FRAME_ENTRY_FORMAT)
+        self.frames = []
+        for idx in range(num_frames):
+            frame_type, offset, size, name_len = struct.unpack(FRAME_ENTRY_FORMAT,
+                                                               self.data[pos:pos+entry_size])
+            pos += entry_size
+            name = self.data[pos:pos+name_len].decode("utf-8")
+            pos += name_len
+            self.frames.append((name, frame_type, offset, size))
+        self.extras = []
+        name_len_size = struct.calcsize(NAME_LENGTH_FORMAT)
+        data_size_size = struct.calcsize(DATA_SIZE_FORMAT)
+        for idx in range(num_extras):
+            name_len = struct.unpack(NAME_LENGTH_FORMAT, self.data[pos:pos+name_len_size])[0]
+            pos += name_len_size
+            name = self.data[pos:pos+name_len].decode("utf-8")
+            pos += name_len
+            size = struct.unpack(DATA_SIZE_FORMAT, self.data[pos:pos+data_size_size])[0]
+            pos += data_size_size
+            self.extras.append((name, self.data[pos:pos+size]))
+            pos += size
+
+    def __len__(self):
+        return len(self.frames)
+
+    def get_mode(self):
+        return CHANNELS_TO_MODE[self.channels]
+
+    def _inflate(self, idx):
+        name, frame_type, offset, size = self.frames[idx]
+        return zlib.decompress(self.data[offset:offset+size])
+
+    def get_pixels(self, idx):
+        """
+        Returns the raw pixels of frame idx, decoding from the closest
+        preceding key frame.
+        """
+        key_idx = idx
+        while self.frames[key_idx][1] != KEY_FRAME:
+            key_idx -= 1
+        pixels = self._inflate(key_idx)
+        for delta_idx in range(key_idx + 1, idx + 1):
+            pixels = _xor_bytes(self._inflate(delta_idx), pixels)
+        return pixels
+
+    def iter_pixels(self):
+        """
+        Yields (name, raw pixels) for every frame in order, decoding each
+        frame only once.
+        """
+        pixels = None
+        for idx, (name, frame_type, offset, size) in enumerate(self.frames):
+            raw = self._inflate(idx)
+            if frame_type == KEY_FRAME:
+                pixels = raw
+            else:
+                pixels = _xor_bytes(raw, pixels)
+            yield (name, pixels)
+
+    def iter_images(self):
+        """
+        Yields (name, PIL image) for every frame in order.
+        """
+        size = (self.width, self.height)
+        for name, pixels in self.iter_pixels():
+            yield (name, Image.frombytes(self.get_mode(), size, pixels))
+
+
+def unpack_sequence(pack_file, dest_dir):
+    """
+    Writes every frame of pack_file as a PNG file (plus any extra files,
+    eg. definition.json) to dest_dir and returns the list of written files.
+    """
+    if Image is None:
+        raise ValueError("Unpacking image sequences requires Pillow to be installed")
+    pack = SpritePack(pack_file)
+    if not os.path.isdir(dest_dir):
+        os.makedirs(dest_dir)
+    written_files = []
+    for name, image in pack.iter_images():
+        file_path = os.path.join(dest_dir, name)
+        image.save(file_path, "PNG", optimize=True)
+        written_files.append(file_path)
+    for name, data in pack.extras:
+        file_path = os.path.join(dest_dir, name)
+        with open(file_path, 'wb') as fh:
+            fh.write(data)
+        written_files.append(file_path)
+    return written_files
+
+
+def verify_pack(pack_file, source):
+    """
+    Compares every frame in pack_file with the original sequence directory
+    or .tar file and returns a list of problems (empty if they match).
+    """
+    frames, extras = _read_sequence(source)
+    width, height, channels, pixels = _decode_frames(frames)
+    pack = SpritePack(pack_file)
+    problems = []
+    if (pack.width, pack.height, pack.channels) != (width, height, channels):
+        problems.append("Pack is %sx%s with %s channels but the source is %sx%s with %s channels"
+                        % (pack.width, pack.height, pack.channels, width, height, channels))
+        return problems
+    if len(pack) != len(frames):
+        problems.append("Pack has %s frames but the source has %s" % (len(pack), len(frames)))
+    for (name, png_data), orig_pixels, (packed_name, packed_pixels) in zip(frames, pixels,
+                                                                         pack.iter_pixels()):
+        if name != packed_name:
+            problems.append("Frame %s is named %s in the pack" % (name, packed_name))
+        elif orig_pixels != packed_pixels:
+            problems.append("Frame %s does not match the source" % name)
+    if sorted(extras) != sorted(pack.extras):
+        problems.append("Extra files do not match the source")
+    return problems
+
+
+def main(args):
+    if len(args) != 3 or args[0] not in ["pack", "unpack", "verify"]:
+        print(__doc__)
+        return 1
+    operation, src, dst = args
+    if operation == "pack":
+        stats = pack_sequence(src, dst)
+        print("Packed %s frames (%s key frames) from %s bytes into %s bytes: %s"
+              % (stats["num_frames"], stats["num_key_frames"], stats["bytes_in"],
+                 stats["bytes_out"], dst))
+    elif operation == "unpack":
+        written_files = unpack_sequence(src, dst)
+        print("Unpacked %s files to %s" % (len(written_files), dst))
+    else:
+        problems = verify_pack(src, dst)
+        if problems:
+            print(os.linesep.join(problems))
+            return 1
+        print("%s matches %s" % (src, dst))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
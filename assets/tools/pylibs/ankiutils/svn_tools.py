@@ -182,37 +182,35 @@ def get_env_vars_for_svn(path_var="PATH", xcode_bin=XCODE_BIN_DIR):
 def rename_svn_file(src, dst):
     """
     Given an SVN file, this will rename the file in the same directory.
-    A temporary intermediate file is used in case we are simply trying
-    to change the case of the name on a Mac.
+    A temporary intermediate file is used if we are simply trying to
+    change the case of the name on a Mac, otherwise the file is moved
+    with a single "svn move" command.
     """
     dir_name = os.path.dirname(src)
     file_ext = os.path.splitext(src)[1]
 
-    temp_file = str(uuid.uuid4())
-    temp_file = os.path.join(dir_name, temp_file)
-
     dst = os.path.basename(dst)
     dst = os.path.join(dir_name, dst)
     if not dst.endswith(file_ext):
         dst += file_ext
 
-    svn_move_cmd = SVN_MOVE_CMD % (src, temp_file)
-    #print("Running: %s" % svn_move_cmd)
-    p = subprocess.Popen(svn_move_cmd.split(), stdout=subprocess.PIPE,
-                         stderr=subprocess.PIPE, env=get_env_vars_for_svn())
-    (stdout, stderr) = p.communicate()
-    status = p.poll()
-    if status != 0:
-        raise RuntimeError("Failed to move %s to %s" % (src, temp_file))
+    if src.lower() == dst.lower():
+        temp_file = str(uuid.uuid4())
+        temp_file = os.path.join(dir_name, temp_file)
+        _run_svn_move(src, temp_file)
+        src = temp_file
+    _run_svn_move(src, dst)
+
 
-    svn_move_cmd = SVN_MOVE_CMD % (temp_file, dst)
+def _run_svn_move(src, dst):
+    svn_move_cmd = SVN_MOVE_CMD % (src, dst)
     #print("Running: %s" % svn_move_cmd)
     p = subprocess.Popen(svn_move_cmd.split(), stdout=subprocess.PIPE,
                          stderr=subprocess.PIPE, env=get_env_vars_for_svn())
     (stdout, stderr) = p.communicate()
     status = p.poll()
     if status != 0:
-        raise RuntimeError("Failed to move %s to %s" % (temp_file, dst))
+        raise RuntimeError("Failed to move %s to %s" % (src, dst))
 
 
 def get_svn_file_rev(file_from_svn, cred='', raise_on_fail=False):
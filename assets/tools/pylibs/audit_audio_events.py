@@ -31,6 +31,13 @@ import xml.etree.ElementTree as ET
 
 from audit_anim_clips import unpack_tarball
 
+try:
+    from ankimaya.audio_index import get_audio_index
+except ImportError:
+    # The audio index is only available within Maya, so without it
+    # audio events that were exported by ID are listed by ID
+    get_audio_index = None
+
 
 # Animators typically have tar files exported to the directory defined by TAR_FILE_DIR1, but Ben
 # uses the directory defined by TAR_FILE_DIR2 instead, so we use the second in main() if the first
@@ -94,14 +101,35 @@ def get_audio_event_of_interest():
     return audio_event
 
 
-def get_audio_event_usage(tar_file_dict, audio_event):
+def load_audio_index():
+    if get_audio_index is None:
+        return None
+    try:
+        return get_audio_index()
+    except ValueError, e:
+        print("Unable to map audio event IDs to names because: %s" % e)
+        return None
+
+
+def get_event_names_from_ids(event_ids, audio_index=None):
+    if audio_index is None:
+        return event_ids
+    event_names = []
+    for event_id in event_ids:
+        event_name = audio_index.get_event_name(event_id)
+        event_names.append(event_id if event_name is None else event_name)
+    return event_names
+
+
+def get_audio_event_usage(tar_file_dict, audio_event, audio_index=None):
     events_by_anim_clip = {}
     anim_clips_by_event = {}
     for file_name, file_paths in tar_file_dict.items():
         file_path = file_paths[0]
         unpacked_files = unpack_tarball(file_path)
         for json_file in unpacked_files:
-            events_by_anim_clip_in_anim, anim_clips_by_event_in_anim = get_audio_event_usage_in_anim(json_file)
+            events_by_anim_clip_in_anim, anim_clips_by_event_in_anim = \
+                get_audio_event_usage_in_anim(json_file, audio_index)
             events_by_anim_clip.update(events_by_anim_clip_in_anim)
             for event, anim_clips in anim_clips_by_event_in_anim.items():
                 if event not in anim_clips_by_event:
@@ -110,7 +138,7 @@ def get_audio_event_usage(tar_file_dict, audio_event):
     return (events_by_anim_clip, anim_clips_by_event)
 
 
-def get_audio_event_usage_in_anim(json_file):
+def get_audio_event_usage_in_anim(json_file, audio_index=None):
     events_by_anim_clip = {}
     anim_clips_by_event = {}
     fh = open(json_file, 'r')
@@ -145,7 +173,8 @@ def get_audio_event_usage_in_anim(json_file):
                         try:
                             audio_events.extend(event_group[AUDIO_EVENT_NAMES_ATTR])
                         except KeyError:
-                            audio_events.extend(event_group[AUDIO_EVENT_IDS_ATTR])
+                            audio_events.extend(get_event_names_from_ids(event_group[AUDIO_EVENT_IDS_ATTR],
+                                                                         audio_index))
                 for audio_event in audio_events:
                     audio_event = str(audio_event)
                     if audio_event not in anim_clips_by_event:
@@ -174,7 +203,9 @@ def main():
     tar_file_dict = fill_file_dict(tar_files)
     #pprint.pprint(tar_file_dict)
 
-    events_by_anim_clip, anim_clips_by_event = get_audio_event_usage(tar_file_dict, audio_event)
+    audio_index = load_audio_index()
+    events_by_anim_clip, anim_clips_by_event = get_audio_event_usage(tar_file_dict, audio_event,
+                                                                     audio_index)
     all_audio_events_in_use = anim_clips_by_event.keys()
     all_audio_events_in_use.sort()
     print("---------------------------------------------------------")
@@ -3,30 +3,41 @@ This script can be used to generate the definition.json file.
 Run this script from the same directory as the .png image sequence
 and it will spit out the definition.json file in the same directory.
 
+If the -dedup argument is provided, frames that are pixel-identical to an
+earlier frame are listed in the definition as references to that earlier
+frame's file, so the duplicate .png files do not need to be packaged.
+
+If the -root <dir> argument is provided, then every image sequence directory
+under that directory is found and its definition.json file is regenerated,
+but only if the set of .png files (names and modification times) changed
+since the last run, which is tracked in a manifest file in the root directory.
+Use -force to regenerate every definition.json file regardless.
+
 This is a modified copy of tools/animationScripts/generateSpriteSequence.py
 from the 'victor' git repo.
 """
 
 import os
+import sys
 import glob
+import json
+from collections import OrderedDict
+from ankiutils.image_files import get_pixel_hash
+from ankiutils.check_image_sequences import parse_sequence_names
 
 
-preSeqString = """
-{
-  "loop" : "doNothing", 
-  "sequence" :[
-    {
-      "segmentType" : "straightThrough",
-      // file names relative to folder
-      "fileList": [
-"""
+DEDUP_FLAG = "-dedup"
+ROOT_DIR_FLAG = "-root"
+FORCE_FLAG = "-force"
 
+DEFINITION_FILE = "definition.json"
 
-postSequenceString = """\n      ]
-    }
-  ]
-}
-"""
+MANIFEST_FILE = ".sprite_sequence_manifest.json"
+
+MANIFEST_VERSION = 1
+
+LOOP_MODE = "doNothing"
+SEGMENT_TYPE = "straightThrough"
 
 
 def writeJsonFile(fullJSONPath, outString):
@@ -37,29 +48,144 @@ def writeJsonFile(fullJSONPath, outString):
     f.close()
 
 
-def main(outputFile="definition.json"):
-    thisDir = os.getcwd()
-    fullJSONPath = os.path.join(thisDir, outputFile)
-
-    # Make a list of all the .png files and sort them alphabetically
-    files = glob.glob(os.path.join(thisDir, "*.png"))
-    files = map(os.path.basename, files)
-    files.sort()
-
-    fileList = ""
-    for entry in files:
-        fileList += '        "%s",' % entry + os.linesep
-
-    outString = preSeqString + fileList + postSequenceString
-
-    # remove final comma
-    commaIdx = outString.rfind(",")
-    outString = outString[:commaIdx] + outString[commaIdx + 1:]
-
-    writeJsonFile(fullJSONPath, outString)
+def dedupFrames(files):
+    """
+    Given a sorted list of .png files, this function returns a tuple of
+    (frameList, uniqueFiles) where frameList has one entry per frame that
+    names the first file with identical pixels and uniqueFiles is the list
+    of files that are still needed.
+    """
+    firstFileForHash = {}
+    frameList = []
+    uniqueFiles = []
+    for pngFile in files:
+        pixelHash = get_pixel_hash(pngFile)
+        if pixelHash not in firstFileForHash:
+            firstFileForHash[pixelHash] = pngFile
+            uniqueFiles.append(pngFile)
+        frameList.append(firstFileForHash[pixelHash])
+    return (frameList, uniqueFiles)
+
+
+def makeDefinition(frameList):
+    """
+    Given the list of file names (one per frame, names may repeat),
+    this function returns the contents of the definition.json file.
+    """
+    segment = OrderedDict([("segmentType", SEGMENT_TYPE),
+                           ("fileList", [os.path.basename(x) for x in frameList])])
+    definition = OrderedDict([("loop", LOOP_MODE), ("sequence", [segment])])
+    return json.dumps(definition, indent=2, separators=(",", " : ")) + "\n"
+
+
+def getSequenceFiles(seqDir):
+    """
+    Returns the sorted list of .png file names in a directory, or an empty
+    list if those files are not a single '<prefix>_<number>.png' sequence.
+    """
+    files = sorted(os.path.basename(x) for x in glob.glob(os.path.join(seqDir, "*.png")))
+    if not files:
+        return []
+    setName, frames, problems = parse_sequence_names(files)
+    if problems:
+        return []
+    return files
+
+
+def generateDefinition(seqDir, files=None, outputFile=DEFINITION_FILE, dedup=False):
+    """
+    Writes the definition.json file for the .png image sequence in seqDir
+    and returns the path to that file.
+    """
+    if files is None:
+        files = sorted(os.path.basename(x) for x in glob.glob(os.path.join(seqDir, "*.png")))
+    if dedup:
+        frameList, uniqueFiles = dedupFrames([os.path.join(seqDir, x) for x in files])
+        numDuplicates = len(frameList) - len(uniqueFiles)
+        if numDuplicates:
+            print("%s of %s frames in %s are duplicates and reference earlier files"
+                  % (numDuplicates, len(frameList), seqDir))
+        files = frameList
+    fullJSONPath = os.path.join(seqDir, outputFile)
+    writeJsonFile(fullJSONPath, makeDefinition(files))
+    return fullJSONPath
+
+
+def findSequenceDirs(rootDir):
+    """
+    Returns a sorted list of (directory, .png file names) tuples for every
+    image sequence directory at or below rootDir.
+    """
+    sequences = []
+    for dirPath, dirNames, fileNames in os.walk(rootDir):
+        dirNames.sort()
+        if not [x for x in fileNames if x.endswith(".png")]:
+            continue
+        files = getSequenceFiles(dirPath)
+        if files:
+            sequences.append((dirPath, files))
+    return sequences
+
+
+def _getFileState(seqDir, files):
+    return dict((x, os.path.getmtime(os.path.join(seqDir, x))) for x in files)
+
+
+def _loadManifest(manifestPath):
+    if not os.path.isfile(manifestPath):
+        return {}
+    try:
+        with open(manifestPath, "r") as fh:
+            manifest = json.load(fh)
+    except (IOError, OSError, ValueError), e:
+        print("Ignoring unreadable manifest %s because: %s" % (manifestPath, e))
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("sequences", {})
+
+
+def _saveManifest(manifestPath, sequences):
+    manifest = { "version" : MANIFEST_VERSION, "sequences" : sequences }
+    writeJsonFile(manifestPath, json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+
+
+def regenerateDefinitions(rootDir, outputFile=DEFINITION_FILE, dedup=False, force=False):
+    """
+    Finds every image sequence directory under rootDir and regenerates its
+    definition.json file if the .png files in that directory (names and
+    modification times) or the dedup setting changed since the last run, or
+    if the definition.json file is missing. Returns the list of definition
+    files that were written.
+    """
+    rootDir = os.path.abspath(rootDir)
+    manifestPath = os.path.join(rootDir, MANIFEST_FILE)
+    oldManifest = {} if force else _loadManifest(manifestPath)
+    newManifest = {}
+    updatedFiles = []
+    for seqDir, files in findSequenceDirs(rootDir):
+        key = os.path.relpath(seqDir, rootDir).replace(os.sep, "/")
+        state = { "files" : _getFileState(seqDir, files), "dedup" : dedup }
+        newManifest[key] = state
+        if oldManifest.get(key) == state and os.path.isfile(os.path.join(seqDir, outputFile)):
+            continue
+        updatedFiles.append(generateDefinition(seqDir, files, outputFile, dedup))
+        print("Updated %s (%s frames)" % (updatedFiles[-1], len(files)))
+    _saveManifest(manifestPath, newManifest)
+    print("%s of %s image sequences needed a new %s" % (len(updatedFiles), len(newManifest), outputFile))
+    return updatedFiles
+
+
+def main(outputFile=DEFINITION_FILE, dedup=False):
+    generateDefinition(os.getcwd(), outputFile=outputFile, dedup=dedup)
 
 
 if __name__ == "__main__":
-    main()
-
+    args = sys.argv[1:]
+    dedup = DEDUP_FLAG in args
+    if ROOT_DIR_FLAG in args:
+        rootDir = args[args.index(ROOT_DIR_FLAG) + 1]
+        regenerateDefinitions(rootDir, dedup=dedup, force=(FORCE_FLAG in args))
+    else:
+        main(dedup=dedup)
 
@@ -21,6 +21,7 @@ import json
 import time
 from datetime import datetime, timedelta
 import anim_groups
+from ankiutils.git_history import get_history_index, LAST_DATE_KEY
 
 
 # For timestamps
@@ -61,6 +62,11 @@ class AnimationFinder:
 
         self.some_days_ago = datetime.now() - timedelta(days=CUTOFF_DAY)
 
+        # Git history of the anim clips, which is built with one 'git log' for
+        # all files (None if those files are not in a Git repo)
+        self.history_index = None
+        self._history_index_checked = False
+
     def main(self):
         self.find_all_clips()
         # self.all_clip_names = self.get_all_clips()
@@ -83,7 +89,7 @@ class AnimationFinder:
                 self.all_clip_names.append(file_in_question[:-5])
                 self.untared_clips.append(file_in_question[:-5])
             elif file_in_question[-4:] == ".tar":
-                last_modyfied = datetime.fromtimestamp(os.path.getctime(self.anim_clips_path + "/" + file_in_question))
+                last_modyfied = self.get_last_modified(self.anim_clips_path + "/" + file_in_question)
                 self.tars_clips[self.anim_clips_path + "/" + file_in_question] = []
                 files_in_tar = get_files_in_tar(self.anim_clips_path+"/"+file_in_question)
                 for file_name in files_in_tar:
@@ -97,6 +103,23 @@ class AnimationFinder:
                         else:
                             self.new_clips.append(file_name[:-5])
 
+    def get_last_modified(self, file_path):
+        """
+        Returns the datetime of the last commit of a file if it is in Git
+        or else the ctime of that file
+        """
+        if not self._history_index_checked:
+            self._history_index_checked = True
+            try:
+                self.history_index = get_history_index(self.anim_clips_path)
+            except (ValueError, OSError):
+                self.history_index = None
+        if self.history_index:
+            entry = self.history_index.get_entry(file_path)
+            if entry:
+                return datetime.fromtimestamp(entry[LAST_DATE_KEY])
+        return datetime.fromtimestamp(os.path.getctime(file_path))
+
     def find_unused_tars(self):
         for tar, clip_list in self.tars_clips.iteritems():
             if self.are_clips_used(clip_list):
@@ -157,8 +180,7 @@ class AnimationFinder:
                 self.no_event_animgroups_clips[anim_group] = \
                     anim_groups.get_clips_in_anim_group(self.anim_groups_names_paths[anim_group])
 
-                last_modyfied = datetime.fromtimestamp(
-                    os.path.getctime(self.anim_groups_names_paths[anim_group]))
+                last_modyfied = self.get_last_modified(self.anim_groups_names_paths[anim_group])
                 if last_modyfied < self.some_days_ago:
                     self.old_anim_groups.append(anim_group)
                 else: